@@ -14,10 +14,12 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.services.chat_excel.engine import ChatExcelEngine
+from app.services.chat_excel.executor import query_executor
+from app.services.chat_excel.reader import reader_registry
 from app.llm.client import chat_completion_stream
 from app.core.logger import get_session_logger
 from app.llm.llm_config import get_default_llm_provider
-from app.dal.conversation import add_message, get_messages
+from app.dal.conversation import add_message, next_order_no
 
 router = APIRouter()
 
@@ -33,6 +35,18 @@ class ChatExcelRequest(BaseModel):
     model_name: str = ""
 
 
+@router.get("/excel/readers")
+async def chat_excel_readers():
+    """DuckDB 会话连接注册表指标：打开连接数、命中/未命中/淘汰次数"""
+    return reader_registry.stats()
+
+
+@router.get("/excel/executor")
+async def chat_excel_executor():
+    """分析 SQL 执行器指标：排队深度、运行中任务数、超时/截断次数与延迟分位数"""
+    return query_executor.stats()
+
+
 @router.post("/excel")
 async def chat_excel(req: ChatExcelRequest):
     """模块1 ChatExcel — SSE 流式接口"""
@@ -86,7 +100,7 @@ async def chat_excel(req: ChatExcelRequest):
                     yield f"data: {json.dumps({'type': 'text', 'content': full_text}, ensure_ascii=False)}\n\n"
                 # 保存纯 LLM 对话到数据库，切换会话后可恢复历史
                 try:
-                    order_no = len(await get_messages(conv_uid))
+                    order_no = await next_order_no(conv_uid)
                     await add_message(conv_uid, "human", req.user_input, order_no=order_no)
                     order_no += 1
                     await add_message(
@@ -18,7 +18,7 @@ from pydantic import BaseModel
 
 from app.services.react_agent.engine import ReactEngine
 from app.llm.client import chat_completion_stream
-from app.dal.conversation import add_message, create_conversation, get_conversation, get_messages
+from app.dal.conversation import add_message, create_conversation, get_conversation, get_messages, next_order_no
 from app.core.logger import get_session_logger
 from app.llm.llm_config import get_default_llm_provider
 from app.core import config
@@ -29,11 +29,6 @@ router = APIRouter()
 _engines: dict = {}
 
 
-def _next_order_no(messages: list[dict]) -> int:
-    """根据已有消息数量计算下一条消息顺序号。"""
-    return len(messages)
-
-
 def _find_step(steps: list[dict], step_id: str) -> dict | None:
     """按步骤 ID 查找 ReAct 步骤。"""
     for step in steps:
@@ -97,7 +92,7 @@ async def _save_react_round(conv_uid: str, user_input: str, content: str, steps:
     """保存 ReAct 一轮用户提问和 AI 回复，供前端从数据库恢复历史展示。"""
     if not user_input and not content and not steps:
         return
-    order_no = _next_order_no(await get_messages(conv_uid))
+    order_no = await next_order_no(conv_uid)
     if user_input:
         await add_message(conv_uid, "human", user_input, order_no=order_no)
         order_no += 1
@@ -5,8 +5,9 @@ import glob
 import logging
 import os
 import shutil
+from typing import Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from pydantic import BaseModel
 
 from app.dal.conversation import (
@@ -130,7 +131,7 @@ async def api_delete_conversation(conv_uid: str):
     # 1. 清理引擎缓存 & 关闭 DuckDB 连接
     from app.api.chat_excel import _engines as excel_engines
     from app.api.chat_react import _engines as react_engines
-    from app.services.chat_excel.reader import ExcelReader
+    from app.services.chat_excel.reader import reader_registry
 
     if conv_uid in excel_engines:
         try:
@@ -141,16 +142,16 @@ async def api_delete_conversation(conv_uid: str):
         except Exception as e:
             logger.warning(f"关闭 ExcelReader 失败: {e}")
         del excel_engines[conv_uid]
-    # 清理 ExcelReader 类级缓存
-    if conv_uid in ExcelReader._instances:
+    # 清理 ExcelReader 注册表
+    registered_reader = reader_registry.get(conv_uid)
+    if registered_reader is not None:
         try:
-            for table_info in ExcelReader._instances[conv_uid].table_infos:
+            for table_info in registered_reader.table_infos:
                 if table_info.get('file_path'):
                     upload_file_paths.add(table_info['file_path'])
-            ExcelReader._instances[conv_uid].close()
+            registered_reader.close()
         except Exception as e:
-            logger.warning(f"清理 ExcelReader._instances 失败: {e}")
-        del ExcelReader._instances[conv_uid]
+            logger.warning(f"清理 ExcelReader 注册表失败: {e}")
 
     if conv_uid in react_engines:
         try:
@@ -159,6 +160,10 @@ async def api_delete_conversation(conv_uid: str):
             logger.warning(f"关闭 ReactEngine 失败: {e}")
         del react_engines[conv_uid]
 
+    # 结束 code_interpreter 常驻进程
+    from app.core.sandbox.worker_pool import code_worker_pool
+    code_worker_pool.discard(conv_uid)
+
     # 强制 GC 释放 DuckDB 文件锁（Windows 必须）
     gc.collect()
 
@@ -224,5 +229,9 @@ async def api_add_message(req: AddMessageRequest):
 
 
 @router.get("/messages/{conv_uid}")
-async def api_get_messages(conv_uid: str):
-    return await get_messages(conv_uid)
+async def api_get_messages(
+    conv_uid: str,
+    since: Optional[int] = Query(None, description="上一页最后一条消息的 order_no，不含"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="本页条数，不传返回全部"),
+):
+    return await get_messages(conv_uid, since=since, limit=limit)
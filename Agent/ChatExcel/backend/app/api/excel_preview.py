@@ -1,17 +1,26 @@
-"""Excel 预览 API — 返回文件所有 sheet 的原始数据
+"""Excel 预览 API — 按窗口分页返回文件各 sheet 的原始数据
 
 用于前端右侧收缩栏预览，像浏览 Excel 一样查看所有 sheet 和数据。
-数据过大时返回提示信息而不返回全量数据。
+- /excel-preview/sheets: 只返回各 sheet 的行数、列数
+- /excel-preview/window: 按 offset/limit 返回一页行、按 col_offset/col_limit 返回一段列
+- /excel-preview: 兼容旧接口，返回每个 sheet 的第一页
+
+文件已入库（会话 DuckDB 中有对应 temp 表）时用独立 cursor 从 DuckDB 按 rowid 顺序取页；
+未入库时 xlsx 用 openpyxl read_only 流式读取、csv 用 pandas 跳行读取，内存占用与页大小相关而与文件大小无关。
 """
 
+import asyncio
+import math
 import os
-import json
 import logging
-import math
-from datetime import date, datetime
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, List, Tuple
 
 from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
 
 from app.core import config
 
@@ -27,132 +36,447 @@ def _display_file_name(file_path: str) -> str:
     return file_name
 
 
-# 预览行数上限（单 sheet）
+# 旧接口每个 sheet 返回的第一页行数
+DEFAULT_PAGE_ROWS = 200
+# 单页行数上限
 MAX_PREVIEW_ROWS = 5000
-# 预览列数上限（单 sheet）
+# 单页列数上限
 MAX_PREVIEW_COLS = 100
 
+_EXCEL_EXTS = {".xlsx", ".xlsm", ".xls"}
 
-def _json_serial(obj):
-    """JSON 序列化：处理 date/datetime 类型"""
-    if isinstance(obj, (date, datetime)):
-        return obj.isoformat()
-    if isinstance(obj, (bytes, bytearray)):
-        return obj.decode('utf-8', errors='replace')
-    raise TypeError(f"Type {type(obj)} not serializable")
+# 未入库文件的行数统计需要扫描整个文件，按 (路径, 修改时间, 大小) 缓存
+_ROW_COUNT_CACHE: "OrderedDict[Tuple[str, float, int, str], Tuple[int, int]]" = OrderedDict()
+_ROW_COUNT_CACHE_SIZE = 256
+_row_count_lock = threading.Lock()
 
 
-def _sanitize_rows(rows: list) -> list:
-    """将 NaN/Inf 替换为 None，避免 JSON 序列化报错"""
-    for row in rows:
-        for i, val in enumerate(row):
-            if isinstance(val, float) and (math.isnan(val) or math.isinf(val)):
-                row[i] = None
-    return rows
+def _jsonable(value: Any) -> Any:
+    """单元格值转为可 JSON 序列化的值：日期转 ISO 字符串，NaN/Inf 转 None"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, (str, int, bool)):
+        return value
+    # numpy / pandas 标量
+    item = getattr(value, "item", None)
+    if callable(item):
+        try:
+            return _jsonable(item())
+        except Exception:
+            pass
+    if value != value:  # pandas NaT / NA
+        return None
+    return str(value)
 
 
-@router.get("/excel-preview")
-async def excel_preview(file_path: str = Query(..., description="Excel 文件绝对路径")):
-    """读取 Excel 文件，返回所有 sheet 的原始数据"""
-    # 安全校验：文件必须在 UPLOAD_DIR 内
+def _jsonable_rows(rows) -> List[list]:
+    return [[_jsonable(v) for v in row] for row in rows]
+
+
+def _resolve_path(file_path: str) -> str:
+    """安全校验：文件必须在 UPLOAD_DIR 内且存在"""
     upload_dir = os.path.abspath(config.UPLOAD_DIR)
     abs_path = os.path.abspath(file_path)
     if not abs_path.startswith(upload_dir):
         raise HTTPException(status_code=403, detail="文件路径不在允许范围内")
-
     if not os.path.exists(abs_path):
         raise HTTPException(status_code=404, detail="文件不存在")
+    return abs_path
+
+
+def _cache_key(abs_path: str, sheet: str) -> Tuple[str, float, int, str]:
+    stat = os.stat(abs_path)
+    return abs_path, stat.st_mtime, stat.st_size, sheet
 
-    # 判断扩展名
-    _, ext = os.path.splitext(abs_path)
-    ext = ext.lower()
 
+def _cached_shape(abs_path: str, sheet: str, builder) -> Tuple[int, int]:
+    key = _cache_key(abs_path, sheet)
+    with _row_count_lock:
+        if key in _ROW_COUNT_CACHE:
+            _ROW_COUNT_CACHE.move_to_end(key)
+            return _ROW_COUNT_CACHE[key]
+    shape = builder()
+    with _row_count_lock:
+        _ROW_COUNT_CACHE[key] = shape
+        while len(_ROW_COUNT_CACHE) > _ROW_COUNT_CACHE_SIZE:
+            _ROW_COUNT_CACHE.popitem(last=False)
+    return shape
+
+
+# ── 已入库：会话 DuckDB ─────────────────────────────────────
+
+def _ingested_tables(conv_uid: str, abs_path: str):
+    """返回 (reader, [table_info])：文件已加载到会话 DuckDB 时从 temp 表取数据"""
+    if not conv_uid:
+        return None, []
+    from app.services.chat_excel.reader import reader_registry
+
+    reader = reader_registry.get(conv_uid)
+    if reader is None:
+        return None, []
+    infos = [
+        info for info in reader.table_infos
+        if info.get("file_path") and os.path.abspath(info["file_path"]) == abs_path
+    ]
+    return reader, infos
+
+
+@contextmanager
+def _duckdb_cursor(reader):
+    """与 SQL 执行器一致：固定会话连接并使用独立 cursor，不与其他线程共用同一个连接对象"""
+    from app.services.chat_excel.reader import reader_registry
+
+    reader_registry.pin(reader)
     try:
-        if ext == ".csv":
-            # CSV 按 pandas 读取，检测编码
-            import pandas as pd
-            import chardet
-            with open(abs_path, "rb") as f:
-                raw = f.read()
-            encoding = chardet.detect(raw).get("encoding") or "utf-8"
-            try:
-                raw.decode(encoding)
-            except (UnicodeDecodeError, LookupError):
-                for enc in ["gbk", "gb2312", "gb18030", "utf-8-sig", "latin-1"]:
-                    try:
-                        raw.decode(enc)
-                        encoding = enc
-                        break
-                    except (UnicodeDecodeError, LookupError):
-                        continue
-            df = pd.read_csv(abs_path, encoding=encoding, on_bad_lines="skip")
-            total_rows = len(df)
-            total_cols = len(df.columns)
-
-            if total_rows > MAX_PREVIEW_ROWS:
-                return {
-                    "file_name": _display_file_name(abs_path),
-                    "sheets": [{
-                        "name": "CSV",
-                        "total_rows": total_rows,
-                        "total_cols": total_cols,
-                        "too_large": True,
-                        "message": f"数据量过大（{total_rows} 行），不支持预览",
-                    }],
-                }
-
-            columns = list(df.columns)
-            rows = df.values.tolist()
-            return {
-                "file_name": _display_file_name(abs_path),
-                "sheets": [{
-                    "name": "CSV",
-                    "total_rows": total_rows,
-                    "total_cols": total_cols,
-                    "too_large": False,
-                    "columns": columns,
-                    "rows": json.loads(json.dumps(_sanitize_rows(rows), default=_json_serial)),
-                }],
-            }
+        cursor = reader.db.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+    finally:
+        reader_registry.unpin(reader)
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _duckdb_shape(cursor, table: str) -> Tuple[List[str], int, bool]:
+    """返回 (列名, 行数, rowid 是否连续)"""
+    col_rows = cursor.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE schema_name = 'main' AND table_name = ? ORDER BY column_index",
+        [table],
+    ).fetchall()
+    total_rows, max_rowid = cursor.execute(f"SELECT COUNT(*), MAX(rowid) FROM {_quote_identifier(table)}").fetchone()
+    total_rows = int(total_rows or 0)
+    # rowid 从 0 开始且互不相同，最大值为行数 - 1 时说明没有被 DELETE 留下的空洞
+    contiguous = total_rows == 0 or max_rowid == total_rows - 1
+    return [row[0] for row in col_rows], total_rows, contiguous
+
+
+def _duckdb_window(cursor, table: str, offset: int, limit: int, col_offset: int, col_limit: int) -> dict:
+    columns, total_rows, contiguous = _duckdb_shape(cursor, table)
+    selected = columns[col_offset:col_offset + col_limit]
+    rows: List[list] = []
+    if selected and offset < total_rows:
+        select_list = ", ".join(_quote_identifier(c) for c in selected)
+        if contiguous:
+            # rowid 连续时按 rowid 区间取页，不需要扫描 offset 之前的数据
+            sql = (
+                f"SELECT {select_list} FROM {_quote_identifier(table)} "
+                f"WHERE rowid >= {offset} AND rowid < {offset + limit} ORDER BY rowid"
+            )
         else:
-            # xlsx/xls 用 openpyxl 或 pandas 读取所有 sheet
-            import pandas as pd
-            xls = pd.ExcelFile(abs_path)
-            sheets = []
-            for sheet_name in xls.sheet_names:
-                df = pd.read_excel(xls, sheet_name=sheet_name)
-                df = df.dropna(how="all").dropna(axis=1, how="all")
-                if df.empty:
-                    continue
-                total_rows = len(df)
-                total_cols = len(df.columns)
-
-                if total_rows > MAX_PREVIEW_ROWS or total_cols > MAX_PREVIEW_COLS:
-                    sheets.append({
-                        "name": sheet_name,
-                        "total_rows": total_rows,
-                        "total_cols": total_cols,
-                        "too_large": True,
-                        "message": f"数据量过大（{total_rows} 行 x {total_cols} 列），不支持预览",
-                    })
-                    continue
-
-                columns = list(df.columns)
-                rows = df.values.tolist()
-                sheets.append({
-                    "name": sheet_name,
-                    "total_rows": total_rows,
-                    "total_cols": total_cols,
-                    "too_large": False,
-                    "columns": columns,
-                    "rows": json.loads(json.dumps(_sanitize_rows(rows), default=_json_serial)),
-                })
-
-            return {
-                "file_name": _display_file_name(abs_path),
-                "sheets": sheets,
-            }
+            # 表被 DELETE 过，rowid 有空洞，只能按 rowid 排序后跳过 offset 行
+            sql = f"SELECT {select_list} FROM {_quote_identifier(table)} ORDER BY rowid LIMIT {limit} OFFSET {offset}"
+        rows = cursor.execute(sql).fetchall()
+    return {
+        "total_rows": total_rows,
+        "total_cols": len(columns),
+        "columns": selected,
+        "rows": _jsonable_rows(rows),
+    }
+
+
+# ── 未入库：直接读文件 ──────────────────────────────────────
+
+def _header_names(values) -> List[str]:
+    return [str(v) if v is not None else f"Unnamed: {i}" for i, v in enumerate(values)]
+
+
+def _csv_encoding(abs_path: str) -> str:
+    from app.services.chat_excel.reader import _sniff_encoding
+    return _sniff_encoding(abs_path)
+
+
+def _csv_shape(abs_path: str) -> Tuple[int, int]:
+    import pandas as pd
+
+    def _build():
+        encoding = _csv_encoding(abs_path)
+        header = pd.read_csv(abs_path, encoding=encoding, nrows=0)
+        # 没有引号和空行时换行数就是行数；否则引号内可能有换行，按与 _csv_window 相同的解析方式分块计数
+        lines = 0
+        last = b"\n"
+        simple = True
+        with open(abs_path, "rb") as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                joined = last + block
+                if b'"' in block or b"\n\n" in joined or b"\n\r\n" in joined:
+                    simple = False
+                    break
+                lines += block.count(b"\n")
+                last = block[-1:]
+        if not simple:
+            rows = 0
+            for chunk in pd.read_csv(
+                abs_path, encoding=encoding, on_bad_lines="skip", usecols=[0], dtype=str, chunksize=1_000_000
+            ):
+                rows += len(chunk)
+            return rows, len(header.columns)
+        if last != b"\n":
+            lines += 1
+        return max(lines - 1, 0), len(header.columns)
+
+    return _cached_shape(abs_path, "CSV", _build)
+
+
+def _csv_window(abs_path: str, offset: int, limit: int, col_offset: int, col_limit: int) -> dict:
+    import pandas as pd
+
+    total_rows, total_cols = _csv_shape(abs_path)
+    encoding = _csv_encoding(abs_path)
+    usecols = list(range(col_offset, min(col_offset + col_limit, total_cols)))
+    columns: List[str] = []
+    rows: List[list] = []
+    if usecols:
+        df = pd.read_csv(
+            abs_path,
+            encoding=encoding,
+            on_bad_lines="skip",
+            # 传 callable 而不是 range：range 会被 pandas 展开成包含所有跳过行号的集合，深分页时又慢又占内存
+            skiprows=lambda i: 0 < i <= offset,
+            nrows=limit,
+            usecols=usecols,
+        )
+        columns = [str(c) for c in df.columns]
+        rows = df.values.tolist()
+    return {"total_rows": total_rows, "total_cols": total_cols, "columns": columns, "rows": _jsonable_rows(rows)}
+
+
+def _xlsx_sheet_shape(ws) -> Tuple[int, int]:
+    max_row, max_col = ws.max_row, ws.max_column
+    if max_row is None or max_col is None:
+        # 文件未记录 dimension 时只能流式数一遍
+        max_row, max_col = 0, 0
+        for row in ws.iter_rows(values_only=True):
+            max_row += 1
+            max_col = max(max_col, len(row))
+    return max(max_row - 1, 0), max_col
 
+
+def _xlsx_sheets(abs_path: str) -> List[dict]:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(abs_path, read_only=True, data_only=True)
+    try:
+        sheets = []
+        for ws in wb.worksheets:
+            total_rows, total_cols = _cached_shape(abs_path, ws.title, lambda: _xlsx_sheet_shape(ws))
+            if total_cols == 0:
+                continue
+            sheets.append({"name": ws.title, "total_rows": total_rows, "total_cols": total_cols})
+        return sheets
+    finally:
+        wb.close()
+
+
+def _xlsx_window(abs_path: str, sheet: str, offset: int, limit: int, col_offset: int, col_limit: int) -> dict:
+    import openpyxl
+
+    wb = openpyxl.load_workbook(abs_path, read_only=True, data_only=True)
+    try:
+        if sheet not in wb.sheetnames:
+            raise HTTPException(status_code=404, detail=f"sheet 不存在: {sheet}")
+        ws = wb[sheet]
+        total_rows, total_cols = _cached_shape(abs_path, sheet, lambda: _xlsx_sheet_shape(ws))
+        last_col = min(col_offset + col_limit, total_cols)
+        if col_offset >= last_col:
+            return {"total_rows": total_rows, "total_cols": total_cols, "columns": [], "rows": []}
+
+        width = last_col - col_offset
+        header = next(ws.iter_rows(min_row=1, max_row=1, min_col=col_offset + 1, max_col=last_col, values_only=True), ())
+        rows = []
+        if offset < total_rows:
+            for row in ws.iter_rows(
+                min_row=offset + 2,
+                max_row=offset + limit + 1,
+                min_col=col_offset + 1,
+                max_col=last_col,
+                values_only=True,
+            ):
+                row = list(row)
+                rows.append(row + [None] * (width - len(row)))
+        columns = _header_names(list(header) + [None] * (width - len(header)))
+        columns = [c if not c.startswith("Unnamed: ") else f"Unnamed: {col_offset + i}" for i, c in enumerate(columns)]
+        return {"total_rows": total_rows, "total_cols": total_cols, "columns": columns, "rows": _jsonable_rows(rows)}
+    finally:
+        wb.close()
+
+
+def _xls_sheet_shape(xls, name: str) -> Tuple[int, int]:
+    """xlrd 的工作表对象自带行列数，不必为了计数把整张表读成 DataFrame"""
+    import pandas as pd
+
+    book = getattr(xls, "book", None)
+    if book is not None and hasattr(book, "sheet_by_name"):
+        ws = book.sheet_by_name(name)
+        return max(ws.nrows - 1, 0), ws.ncols
+    df = pd.read_excel(xls, sheet_name=name)
+    return len(df), len(df.columns)
+
+
+def _xls_sheets(abs_path: str) -> List[dict]:
+    import pandas as pd
+
+    with pd.ExcelFile(abs_path) as xls:
+        sheets = []
+        for name in xls.sheet_names:
+            total_rows, total_cols = _cached_shape(abs_path, name, lambda name=name: _xls_sheet_shape(xls, name))
+            if total_cols == 0:
+                continue
+            sheets.append({"name": name, "total_rows": total_rows, "total_cols": total_cols})
+        return sheets
+
+
+def _xls_window(abs_path: str, sheet: str, offset: int, limit: int, col_offset: int, col_limit: int) -> dict:
+    import pandas as pd
+
+    with pd.ExcelFile(abs_path) as xls:
+        if sheet not in xls.sheet_names:
+            raise HTTPException(status_code=404, detail=f"sheet 不存在: {sheet}")
+        total_rows, total_cols = _cached_shape(abs_path, sheet, lambda: _xls_sheet_shape(xls, sheet))
+        df = pd.read_excel(xls, sheet_name=sheet, skiprows=lambda i: 0 < i <= offset, nrows=limit)
+    df = df.iloc[:, col_offset:col_offset + col_limit]
+    return {
+        "total_rows": total_rows,
+        "total_cols": total_cols,
+        "columns": [str(c) for c in df.columns],
+        "rows": _jsonable_rows(df.values.tolist()),
+    }
+
+
+# ── 统一入口 ────────────────────────────────────────────────
+
+def _list_sheets(abs_path: str, conv_uid: str = "") -> Tuple[str, List[dict]]:
+    """返回 (数据来源, sheet 列表)"""
+    reader, infos = _ingested_tables(conv_uid, abs_path)
+    if infos:
+        sheets = []
+        with _duckdb_cursor(reader) as cursor:
+            for info in infos:
+                columns, total_rows, _ = _duckdb_shape(cursor, info["temp_table"])
+                sheets.append({"name": info.get("sheet_name") or "CSV", "total_rows": total_rows, "total_cols": len(columns)})
+        return "duckdb", sheets
+
+    ext = os.path.splitext(abs_path)[1].lower()
+    if ext == ".csv":
+        total_rows, total_cols = _csv_shape(abs_path)
+        return "file", [{"name": "CSV", "total_rows": total_rows, "total_cols": total_cols}]
+    if ext == ".xls":
+        return "file", _xls_sheets(abs_path)
+    if ext in _EXCEL_EXTS:
+        return "file", _xlsx_sheets(abs_path)
+    raise HTTPException(status_code=400, detail=f"不支持预览的文件类型: {ext}")
+
+
+def _read_window(
+    abs_path: str,
+    sheet: str,
+    offset: int,
+    limit: int,
+    col_offset: int,
+    col_limit: int,
+    conv_uid: str = "",
+) -> Tuple[str, dict]:
+    """返回 (数据来源, 窗口数据)"""
+    reader, infos = _ingested_tables(conv_uid, abs_path)
+    for info in infos:
+        if (info.get("sheet_name") or "CSV") == sheet:
+            with _duckdb_cursor(reader) as cursor:
+                return "duckdb", _duckdb_window(cursor, info["temp_table"], offset, limit, col_offset, col_limit)
+
+    ext = os.path.splitext(abs_path)[1].lower()
+    if ext == ".csv":
+        return "file", _csv_window(abs_path, offset, limit, col_offset, col_limit)
+    if ext == ".xls":
+        return "file", _xls_window(abs_path, sheet, offset, limit, col_offset, col_limit)
+    if ext in _EXCEL_EXTS:
+        return "file", _xlsx_window(abs_path, sheet, offset, limit, col_offset, col_limit)
+    raise HTTPException(status_code=400, detail=f"不支持预览的文件类型: {ext}")
+
+
+def _run_preview(func, abs_path: str, *args):
+    try:
+        return func(abs_path, *args)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Excel 预览失败: file_path=%s, error=%s", abs_path, e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"读取文件失败: {str(e)}")
+
+
+@router.get("/excel-preview/sheets")
+async def excel_preview_sheets(
+    file_path: str = Query(..., description="Excel 文件绝对路径"),
+    conv_uid: str = Query("", description="会话 ID，文件已入库时从会话 DuckDB 读取"),
+):
+    """返回文件各 sheet 的行数、列数，不读取数据"""
+    abs_path = _resolve_path(file_path)
+    source, sheets = await asyncio.to_thread(_run_preview, _list_sheets, abs_path, conv_uid)
+    return {"file_name": _display_file_name(abs_path), "source": source, "sheets": sheets}
+
+
+@router.get("/excel-preview/window")
+async def excel_preview_window(
+    file_path: str = Query(..., description="Excel 文件绝对路径"),
+    sheet: str = Query("CSV", description="sheet 名称，CSV 文件固定为 CSV"),
+    offset: int = Query(0, ge=0, description="起始行（不含表头，从 0 开始）"),
+    limit: int = Query(DEFAULT_PAGE_ROWS, ge=1, le=MAX_PREVIEW_ROWS, description="本页行数"),
+    col_offset: int = Query(0, ge=0, description="起始列（从 0 开始）"),
+    col_limit: int = Query(MAX_PREVIEW_COLS, ge=1, le=MAX_PREVIEW_COLS, description="本页列数"),
+    conv_uid: str = Query("", description="会话 ID，文件已入库时从会话 DuckDB 读取"),
+):
+    """按行/列窗口返回一页数据"""
+    abs_path = _resolve_path(file_path)
+    source, window = await asyncio.to_thread(
+        _run_preview, _read_window, abs_path, sheet, offset, limit, col_offset, col_limit, conv_uid
+    )
+    return {
+        "file_name": _display_file_name(abs_path),
+        "sheet": sheet,
+        "source": source,
+        "offset": offset,
+        "limit": limit,
+        "col_offset": col_offset,
+        "has_more": offset + len(window["rows"]) < window["total_rows"],
+        **window,
+    }
+
+
+@router.get("/excel-preview")
+async def excel_preview(
+    file_path: str = Query(..., description="Excel 文件绝对路径"),
+    conv_uid: str = Query("", description="会话 ID，文件已入库时从会话 DuckDB 读取"),
+    limit: int = Query(DEFAULT_PAGE_ROWS, ge=1, le=MAX_PREVIEW_ROWS, description="每个 sheet 返回的行数"),
+):
+    """返回所有 sheet 的第一页数据，后续页通过 /excel-preview/window 获取"""
+    abs_path = _resolve_path(file_path)
+
+    def _build():
+        source, sheet_list = _list_sheets(abs_path, conv_uid)
+        sheets = []
+        for meta in sheet_list:
+            _, window = _read_window(abs_path, meta["name"], 0, limit, 0, MAX_PREVIEW_COLS, conv_uid)
+            sheets.append({
+                **meta,
+                "too_large": False,
+                "columns": window["columns"],
+                "rows": window["rows"],
+                "has_more": len(window["rows"]) < meta["total_rows"],
+            })
+        return source, sheets
+
+    source, sheets = await asyncio.to_thread(_run_preview, lambda _path: _build(), abs_path)
+    return {"file_name": _display_file_name(abs_path), "source": source, "sheets": sheets}
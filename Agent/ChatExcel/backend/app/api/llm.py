@@ -2,6 +2,7 @@
 
 from fastapi import APIRouter
 
+from app.llm.client import latency_tracker
 from app.llm.llm_config import get_llm_providers
 
 router = APIRouter()
@@ -15,3 +16,9 @@ async def list_llm_models():
         {"name": p.name, "model": p.model}
         for p in providers
     ]
+
+
+@router.get("/llm/latency")
+async def llm_latency():
+    """返回各模型按调用方式（stream 首 token / full 完整响应）统计的延迟 EWMA / p95 / 失败率，供排查对冲与排序效果。"""
+    return latency_tracker.snapshot()
@@ -14,6 +14,7 @@
         ...
 """
 
+import asyncio
 import os
 import uuid
 
@@ -24,6 +25,9 @@ from app.core.logger import get_session_logger
 
 router = APIRouter()
 
+# 上传文件分块写盘的块大小，避免大文件整体读入内存
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def _resolve_upload_dir(user_no: str, chat_mode: str, conv_uid: str = "") -> str:
     """根据用户、模式和会话计算上传目录，并确保目录存在"""
@@ -67,26 +71,33 @@ async def upload_file(
             detail=f"不支持的文件类型: {ext}，仅支持 {config.ALLOWED_EXTENSIONS}",
         )
 
-    # 校验大小
-    content = await file.read()
-    if len(content) > config.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
-        logger.warning("文件大小超限: %d bytes", len(content))
-        raise HTTPException(
-            status_code=400,
-            detail=f"文件超过 {config.MAX_UPLOAD_SIZE_MB}MB 限制",
-        )
-    logger.info("文件校验通过: ext=%s, size=%d bytes", ext, len(content))
-
     # 按用户+模式+会话确定存储目录
     upload_dir = _resolve_upload_dir(user_no, chat_mode, conv_uid)
 
-    # 保存文件（用 uuid 防冲突）
+    # 保存文件（用 uuid 防冲突），分块写盘并同时校验大小
     file_id = uuid.uuid4().hex[:12]
     safe_name = f"{file_id}_{file.filename}"
     file_path = os.path.join(upload_dir, safe_name)
 
+    max_bytes = config.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    file_size = 0
     with open(file_path, "wb") as f:
-        f.write(content)
+        while True:
+            chunk = await file.read(_UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            file_size += len(chunk)
+            if file_size > max_bytes:
+                break
+            f.write(chunk)
+    if file_size > max_bytes:
+        os.remove(file_path)
+        logger.warning("文件大小超限: > %d bytes", max_bytes)
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件超过 {config.MAX_UPLOAD_SIZE_MB}MB 限制",
+        )
+    logger.info("文件校验通过: ext=%s, size=%d bytes", ext, file_size)
 
     abs_file_path = os.path.normpath(os.path.abspath(file_path))
     logger.info("文件已保存: %s", abs_file_path)
@@ -111,18 +122,18 @@ async def upload_file(
         except Exception as e:
             logger.warning("更新对话记录失败: %s", e)
 
+        def _on_ingest_progress(event: dict):
+            logger.info("入库进度: %s", event)
+
         if conv_uid in _engines:
             engine = _engines[conv_uid]
-            engine.add_file(abs_file_path, file.filename)
             logger.info("引擎已存在，追加文件: %s", abs_file_path)
         else:
-            engine = ChatExcelEngine(
-                conv_uid=conv_uid,
-                file_path=abs_file_path,
-                file_name=file.filename,
-            )
+            engine = ChatExcelEngine(conv_uid=conv_uid, file_name=file.filename)
             _engines[conv_uid] = engine
             logger.info("创建新引擎: conv_uid=%s", conv_uid)
+        # 入库放到线程中执行，大文件加载期间不阻塞事件循环上的其他请求
+        await asyncio.to_thread(engine.add_file, abs_file_path, file.filename, _on_ingest_progress)
     elif chat_mode == "react_agent" and conv_uid:
         logger.info("【分支2】react_agent 模式，准备加载文件到引擎")
         from app.api.chat_react import _engines
@@ -169,7 +180,7 @@ async def upload_file(
         "file_id": file_id,
         "file_path": abs_file_path,
         "file_name": file.filename,
-        "file_size": len(content),
+        "file_size": file_size,
         "chat_mode": chat_mode,
         "user_no": user_no,
         "conv_uid": conv_uid,
@@ -25,13 +25,44 @@ UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(__file__)
 MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50"))
 ALLOWED_EXTENSIONS: set = {".xlsx", ".xls", ".csv", ".json", ".parquet"}
 
+# ── 大文件流式入库 ────────────────────────────────────────
+# 超过该大小（MB）的 CSV/XLSX 走流式入库：DuckDB 原生读取或分块读取，清洗在 SQL 中完成
+INGEST_STREAMING_THRESHOLD_MB: int = int(os.getenv("INGEST_STREAMING_THRESHOLD_MB", "20"))
+# 编码检测只读取文件开头的字节数
+INGEST_SNIFF_BYTES: int = int(os.getenv("INGEST_SNIFF_BYTES", str(1024 * 1024)))
+# DuckDB 原生读取失败时，分块读取的每块行数
+INGEST_CHUNK_ROWS: int = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+
+# ── 学习结果缓存 ──────────────────────────────────────────
+# 按表结构指纹（列名/类型 + 取值分布概要）缓存学习阶段结果，同模板表格重复上传时跳过 LLM 学习
+LEARN_CACHE_ENABLED: bool = os.getenv("LEARN_CACHE_ENABLED", "true").lower() == "true"
+# 精确指纹未命中时，同列结构下取值分布概要的最低相似度（0~1），达到即复用
+LEARN_CACHE_FUZZY_THRESHOLD: float = float(os.getenv("LEARN_CACHE_FUZZY_THRESHOLD", "0.8"))
+
 # ── 数据库 ────────────────────────────────────────────────
 DB_PATH: str = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), '..', '..', 'storage', 'db', 'chat_excel.db'))
+# SQLite 连接池大小、busy 等待超时（毫秒）、每个连接缓存的预编译语句数
+SQLITE_POOL_SIZE: int = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHED_STATEMENTS: int = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
 
 # ── 沙箱 ──────────────────────────────────────────────────
 SANDBOX_TIMEOUT: int = int(os.getenv("SANDBOX_TIMEOUT", "60"))
 SANDBOX_MAX_MEMORY_MB: int = int(os.getenv("SANDBOX_MAX_MEMORY_MB", "512"))
 SANDBOX_MAX_OUTPUT_CHARS: int = int(os.getenv("SANDBOX_MAX_OUTPUT_CHARS", "2000"))
+# 常驻 Python 进程池：关闭后回退为每次执行新起子进程
+CODE_WORKER_ENABLED: bool = os.getenv("CODE_WORKER_ENABLED", "true").lower() == "true"
+# 同时保留的会话进程数上限（超过按 LRU 关闭）、预热备用进程数、进程启动超时（秒）
+CODE_WORKER_MAX_WORKERS: int = int(os.getenv("CODE_WORKER_MAX_WORKERS", "8"))
+CODE_WORKER_PREFORK: int = int(os.getenv("CODE_WORKER_PREFORK", "1"))
+CODE_WORKER_START_TIMEOUT: float = float(os.getenv("CODE_WORKER_START_TIMEOUT", "30"))
+# 进程执行多少次 / 常驻内存超过多少 MB 后回收，<=0 表示不限制
+CODE_WORKER_MAX_EXECUTIONS: int = int(os.getenv("CODE_WORKER_MAX_EXECUTIONS", "50"))
+CODE_WORKER_MAX_RSS_MB: int = int(os.getenv("CODE_WORKER_MAX_RSS_MB", "1024"))
+# 进程地址空间上限（MB，仅 POSIX 生效），<=0 表示不限制
+CODE_WORKER_MEMORY_LIMIT_MB: int = int(os.getenv("CODE_WORKER_MEMORY_LIMIT_MB", "4096"))
+# 进程空闲超过该秒数后关闭，<=0 表示不按空闲时间关闭
+CODE_WORKER_IDLE_TTL_SECONDS: float = float(os.getenv("CODE_WORKER_IDLE_TTL_SECONDS", "900"))
 
 # ── 上下文压缩 ────────────────────────────────────────────
 CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "120000"))
@@ -44,6 +75,8 @@ REACT_MAX_RETRY_COUNT: int = int(os.getenv("REACT_MAX_RETRY_COUNT", "30"))
 SHORT_TERM_MEMORY_BUFFER_SIZE: int = int(os.getenv("SHORT_TERM_MEMORY_BUFFER_SIZE", "5"))
 # ReAct 短期记忆保留最近几轮 ReAct 步骤（Thought+Observation），超过后早期步骤被挤出
 SKILLS_DIR: str = os.getenv("SKILLS_DIR", os.path.join(os.path.dirname(__file__), '..', '..', 'skills'))
+# 数据分析 Skill 输入文件超过该大小（MB）时走快速模式（DuckDB 聚合 + 抽样/近似统计），并由后端导出已入库表快照
+SKILL_FAST_MODE_THRESHOLD_MB: float = float(os.getenv("SKILL_FAST_MODE_THRESHOLD_MB", "50"))
 # ReAct 跨问题历史：从 DB 加载最近几轮对话（用户问+AI结论）拼接进 system prompt
 REACT_HISTORY_ROUNDS: int = int(os.getenv("REACT_HISTORY_ROUNDS", "10"))
 
@@ -53,6 +86,18 @@ CHAT_EXCEL_HISTORY_ROUNDS: int = int(os.getenv("CHAT_EXCEL_HISTORY_ROUNDS", "10"
 
 # ── DuckDB ────────────────────────────────────────────────
 DUCKDB_DIR: str = os.getenv("DUCKDB_DIR", os.path.join(os.path.dirname(__file__), '..', '..', 'storage', 'duckdb'))
+# 每个会话一个 DuckDB 文件；同时打开的连接数上限，超过后按 LRU 关闭最久未用的连接（下次访问自动重连）
+DUCKDB_MAX_OPEN_CONNECTIONS: int = int(os.getenv("DUCKDB_MAX_OPEN_CONNECTIONS", "32"))
+# 连接空闲超过该秒数后关闭，<=0 表示不按空闲时间关闭
+DUCKDB_IDLE_TTL_SECONDS: float = float(os.getenv("DUCKDB_IDLE_TTL_SECONDS", "600"))
+# 单个连接的 DuckDB memory_limit（如 "1GB"）与 threads，留空/0 使用 DuckDB 默认值
+DUCKDB_MEMORY_LIMIT: str = os.getenv("DUCKDB_MEMORY_LIMIT", "")
+DUCKDB_THREADS: int = int(os.getenv("DUCKDB_THREADS", "0"))
+# 分析阶段 SQL 在独立线程池执行：线程数、单条查询超时（秒，超时后 interrupt）、返回行数上限、Arrow 批大小
+QUERY_MAX_WORKERS: int = int(os.getenv("QUERY_MAX_WORKERS", "4"))
+QUERY_TIMEOUT_SECONDS: float = float(os.getenv("QUERY_TIMEOUT_SECONDS", "60"))
+QUERY_MAX_ROWS: int = int(os.getenv("QUERY_MAX_ROWS", "10000"))
+QUERY_BATCH_ROWS: int = int(os.getenv("QUERY_BATCH_ROWS", "2048"))
 
 # ── 日志 ──────────────────────────────────────────────────
 LOG_DIR: str = os.getenv("LOG_DIR", os.path.join(os.path.dirname(__file__), '..', '..', 'logs'))
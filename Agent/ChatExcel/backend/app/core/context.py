@@ -8,9 +8,10 @@ L4: ReactiveCompact — 紧急模式，只保留最近2轮
 """
 
 import logging
-from typing import List
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-from app.llm.client import chat_completion_full, count_tokens
+from app.llm.client import chat_completion_full, count_tokens_batch
 from app.core.memory import MemoryFragment, ShortTermMemory
 
 from app.core import config
@@ -33,26 +34,58 @@ class ContextBudgetConfig:
 class ContextManager:
     """上下文管理器 — 管理 token 预算和压缩"""
 
+    # token 计数缓存条目上限（按文本长度 + 哈希为 key，不持有原文）
+    TOKEN_CACHE_SIZE = 4096
+
     def __init__(self):
         self.budget = ContextBudgetConfig()
+        # 每轮 ReAct 都会重新组装 messages，但 system prompt / 历史 / 记忆片段大多不变，
+        # 缓存后每轮只需对新增或变化的文本分词
+        self._token_cache: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+
+    @staticmethod
+    def _message_texts(msg: dict) -> List[str]:
+        content = msg.get("content", "")
+        if isinstance(content, str):
+            return [content]
+        texts = []
+        if isinstance(content, list):
+            for part in content:
+                if isinstance(part, str):
+                    texts.append(part)
+                elif isinstance(part, dict):
+                    texts.append(str(part))
+        return texts
 
     def count_messages_tokens(self, messages: list) -> int:
+        texts = [text for msg in messages for text in self._message_texts(msg)]
+        cache = self._token_cache
+        keys = [(len(text), hash(text)) for text in texts]
+
+        # 只对缓存中没有的文本分词，同一批内重复文本只算一次
+        missing: Dict[Tuple[int, int], str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cache and key not in missing:
+                missing[key] = text
+        if missing:
+            for key, tokens in zip(missing, count_tokens_batch(list(missing.values()))):
+                cache[key] = tokens
+
         total = 0
-        for msg in messages:
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                total += count_tokens(content)
-            elif isinstance(content, list):
-                for part in content:
-                    if isinstance(part, str):
-                        total += count_tokens(part)
-                    elif isinstance(part, dict):
-                        total += count_tokens(str(part))
+        for key in keys:
+            total += cache[key]
+            cache.move_to_end(key)
+        while len(cache) > self.TOKEN_CACHE_SIZE:
+            cache.popitem(last=False)
         return total
 
-    def get_context_state(self, messages: list) -> str:
-        """返回当前上下文状态: normal / warning / error / overflow"""
-        used = self.count_messages_tokens(messages)
+    def get_context_state(self, messages: list, used: Optional[int] = None) -> str:
+        """返回当前上下文状态: normal / warning / error / overflow
+
+        used 为已算好的 token 数，传入时不再重复计数
+        """
+        if used is None:
+            used = self.count_messages_tokens(messages)
         budget = self.budget.effective_budget
         if budget <= 0:
             return "overflow"
@@ -177,7 +210,7 @@ class ContextManager:
         used = self.count_messages_tokens(messages)
         budget = self.budget.effective_budget
         ratio = round(used / budget, 4) if budget > 0 else 1.0
-        state = self.get_context_state(messages)
+        state = self.get_context_state(messages, used=used)
         return {
             "type": "context.status",
             "used": used,
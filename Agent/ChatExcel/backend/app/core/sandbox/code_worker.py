@@ -0,0 +1,148 @@
+"""常驻 Python 执行进程 — 由 worker_pool 以独立脚本方式启动
+
+不依赖 app 包，单独运行: python -X utf8 code_worker.py
+协议: 每行一个 JSON 请求 / 一个 JSON 响应（走启动时复制出来的 stdin/stdout 文件描述符）
+  请求: {"code": str, "cwd": str, "isolated": bool, "max_output": int}
+  响应: {"returncode": int, "stdout": str, "stderr": str}
+
+- 启动时预先 import pandas / numpy / matplotlib(Agg)，并按环境变量设置内存上限
+- 同一进程内多次执行共享全局命名空间（isolated=True 时使用独立命名空间），
+  前一步加载的 DataFrame 在下一步可以直接使用
+- 用户代码的 print/异常输出被捕获后随响应返回，不会污染协议通道
+"""
+
+import builtins
+import contextlib
+import io
+import json
+import linecache
+import os
+import sys
+import traceback
+
+# 协议通道: 复制原 stdin/stdout，再把 0/1 号描述符指向空设备/标准错误，
+# 避免用户代码 input() 或直接写 fd 1 时破坏协议
+_PROTO_IN = os.fdopen(os.dup(0), "rb")
+_PROTO_OUT = os.fdopen(os.dup(1), "wb")
+_devnull = os.open(os.devnull, os.O_RDONLY)
+os.dup2(_devnull, 0)
+os.close(_devnull)
+os.dup2(2, 1)
+
+_FILENAME = "<code_interpreter>"
+
+
+def _apply_limits() -> None:
+    """按 CODE_WORKER_MEMORY_LIMIT_MB 限制地址空间（仅 POSIX）"""
+    limit_mb = int(os.environ.get("CODE_WORKER_MEMORY_LIMIT_MB", "0") or 0)
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except Exception:
+        pass
+
+
+def _preload() -> None:
+    """预热常用分析库，首个请求不再支付 import 开销"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot  # noqa: F401
+    except Exception:
+        pass
+    for name in ("numpy", "pandas"):
+        try:
+            __import__(name)
+        except Exception:
+            pass
+
+
+def _new_namespace() -> dict:
+    return {"__name__": "__main__", "__builtins__": builtins}
+
+
+def _close_figures() -> None:
+    """每次执行后关闭 matplotlib 图，与一次性子进程的行为一致"""
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is not None:
+        try:
+            plt.close("all")
+        except Exception:
+            pass
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit > 0 and len(text) > limit:
+        return text[:limit] + f"\n... (output truncated, {len(text)} chars)"
+    return text
+
+
+def _execute(request: dict, namespace: dict) -> dict:
+    cwd = request.get("cwd") or ""
+    if cwd:
+        os.makedirs(cwd, exist_ok=True)
+        os.chdir(cwd)
+    ns = _new_namespace() if request.get("isolated") else namespace
+
+    code = request.get("code", "")
+    # 登记源码，异常 traceback 中可以显示出错的代码行
+    linecache.cache[_FILENAME] = (len(code), None, code.splitlines(True), _FILENAME)
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    returncode = 0
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(compile(code, _FILENAME, "exec"), ns)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                returncode = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except BaseException:
+            # 去掉 worker 自身的栈帧，只保留用户代码部分
+            etype, value, tb = sys.exc_info()
+            traceback.print_exception(etype, value, tb.tb_next)
+            returncode = 1
+    _close_figures()
+
+    max_output = int(request.get("max_output") or 0)
+    return {
+        "returncode": returncode,
+        "stdout": _truncate(stdout.getvalue(), max_output),
+        "stderr": _truncate(stderr.getvalue(), max_output),
+    }
+
+
+def main() -> None:
+    _apply_limits()
+    _preload()
+    namespace = _new_namespace()
+
+    # 就绪信号: 父进程据此判断预热完成
+    _PROTO_OUT.write(b'{"ready": true}\n')
+    _PROTO_OUT.flush()
+
+    for line in _PROTO_IN:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            response = _execute(request, namespace)
+        except MemoryError:
+            response = {"returncode": 1, "stdout": "", "stderr": "MemoryError"}
+        except Exception as e:
+            response = {"returncode": 1, "stdout": "", "stderr": f"worker error: {e}"}
+        _PROTO_OUT.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        _PROTO_OUT.flush()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (BrokenPipeError, KeyboardInterrupt):
+        # 父进程关闭管道 / 结束进程时静默退出
+        pass
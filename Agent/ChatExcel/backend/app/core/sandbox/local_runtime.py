@@ -2,6 +2,7 @@
 
 复刻自 packages/dbgpt-sandbox/src/dbgpt_sandbox/sandbox/execution_layer/local_runtime.py
 精简: 只保留 Python 执行，去掉多语言支持。
+CODE_WORKER_ENABLED 时代码交给 worker_pool 中的常驻进程执行，变量在多次 execute 之间保留。
 """
 
 import asyncio
@@ -98,8 +99,16 @@ class LocalSandboxSession(SandboxSession):
             print(f"Start sandbox failed: {e}")
             return False
 
+    @property
+    def worker_key(self) -> str:
+        """在常驻进程池中的 key，与 ReAct 会话的 conv_id 区分开"""
+        return f"sandbox:{self.session_id}"
+
     async def stop(self) -> bool:
         try:
+            if config.CODE_WORKER_ENABLED:
+                from app.core.sandbox.worker_pool import code_worker_pool
+                await asyncio.to_thread(code_worker_pool.discard, self.worker_key)
             for pid in self.process_pool:
                 ProcessManager.kill_process_tree(pid)
             if self.work_dir and os.path.exists(self.work_dir):
@@ -122,6 +131,9 @@ class LocalSandboxSession(SandboxSession):
             # 在生产环境可以改为阻止执行
             pass
 
+        if config.CODE_WORKER_ENABLED:
+            return await self._execute_in_worker(code)
+
         code_file = None
         try:
             # 写入临时 Python 文件
@@ -161,6 +173,35 @@ class LocalSandboxSession(SandboxSession):
             if code_file and os.path.exists(code_file):
                 os.unlink(code_file)
 
+    async def _execute_in_worker(self, code: str) -> ExecutionResult:
+        """交给常驻进程执行，同一会话的变量在多次 execute 之间保留"""
+        from app.core.sandbox.worker_pool import code_worker_pool
+
+        start_time = time.time()
+        result = await code_worker_pool.execute(
+            self.worker_key, code, cwd=self.work_dir, timeout=self.config.timeout,
+        )
+        execution_time = time.time() - start_time
+
+        if result["returncode"] == -1 and execution_time >= self.config.timeout:
+            return ExecutionResult(
+                status=ExecutionStatus.TIMEOUT,
+                error=f"执行超时 ({self.config.timeout}秒)",
+                execution_time=execution_time,
+            )
+
+        output = result["stdout"]
+        if len(output) > config.SANDBOX_MAX_OUTPUT_CHARS:
+            output = output[:config.SANDBOX_MAX_OUTPUT_CHARS] + "\n... (output truncated)"
+
+        return ExecutionResult(
+            status=ExecutionStatus.SUCCESS if result["returncode"] == 0 else ExecutionStatus.ERROR,
+            output=output,
+            error=result["stderr"],
+            execution_time=execution_time,
+            exit_code=result["returncode"],
+        )
+
     async def _run_with_limits(self, command: List[str]) -> Dict[str, Any]:
         process = None
         try:
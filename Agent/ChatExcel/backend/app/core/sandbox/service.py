@@ -104,6 +104,13 @@ async def api_disconnect(req: DisconnectRequest):
     return await svc.disconnect(req.session_id)
 
 
+@router.get("/workers")
+async def sandbox_workers():
+    """常驻 Python 进程池状态"""
+    from app.core.sandbox.worker_pool import code_worker_pool
+    return code_worker_pool.stats()
+
+
 @router.get("/health")
 async def sandbox_health():
     return {"status": "ok"}
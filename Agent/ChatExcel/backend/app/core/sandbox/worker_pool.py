@@ -0,0 +1,403 @@
+"""常驻 Python 执行进程池 — code_interpreter / 沙箱会话复用预热好的解释器
+
+每次工具调用都新起一个解释器时，启动 + import pandas/matplotlib 往往就要 1~3 秒。
+这里按会话维护常驻的 code_worker.py 进程:
+- 进程启动时预先 import pandas / numpy / matplotlib，并保留一个预热好的备用进程，新会话直接领用
+- 代码通过管道发送（每行一个 JSON），同一会话的多次执行共享命名空间，DataFrame 在步骤间保留
+- 单次执行超时后结束整个进程树；执行次数或内存超过上限后回收进程，下次调用自动新建
+- 进程数超过上限时按 LRU 关闭最久未用的空闲进程，空闲超时的进程由后台任务清理
+"""
+
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+from app.core import config
+from app.core.sandbox.local_runtime import ProcessManager
+
+logger = logging.getLogger(__name__)
+
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code_worker.py")
+
+# 单次执行回传的 stdout/stderr 字符上限，避免超大输出塞满管道；展示层另有更短的截断
+_MAX_OUTPUT_CHARS = 100_000
+# 进程自身 stderr（fd 级输出、崩溃信息）保留的最近行数
+_STDERR_TAIL_LINES = 200
+
+
+class CodeWorker:
+    """一个常驻 Python 进程，同一时间只执行一段代码"""
+
+    def __init__(self):
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        env["PYTHONUTF8"] = "1"
+        env["MPLBACKEND"] = "Agg"
+        env["CODE_WORKER_MEMORY_LIMIT_MB"] = str(config.CODE_WORKER_MEMORY_LIMIT_MB)
+        if config.CODE_WORKER_MEMORY_LIMIT_MB > 0:
+            # 限制地址空间时，OpenBLAS 每个线程预留的内存会很快耗尽额度
+            env.setdefault("OPENBLAS_NUM_THREADS", "1")
+
+        self.proc = subprocess.Popen(
+            [sys.executable, "-X", "utf8", _WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        self.created_at = time.time()
+        self.last_used = time.time()
+        self.executions = 0
+        self.busy = False
+        # 已交给调用方、尚未归还的次数；由进程池在池锁内增减，淘汰时跳过
+        self.leases = 0
+        self.dead = False
+        self._lock = threading.Lock()
+        # 后台持续读取进程 stderr（C 扩展直接写 fd、解释器崩溃信息），避免管道写满阻塞进程
+        self._stderr_tail: "deque[str]" = deque(maxlen=_STDERR_TAIL_LINES)
+        self._stderr_lock = threading.Lock()
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, name="code-worker-stderr", daemon=True)
+        self._stderr_thread.start()
+
+        ready = self._read_line(config.CODE_WORKER_START_TIMEOUT)
+        if not ready or not ready.get("ready"):
+            self.kill()
+            detail = self._take_stderr(wait=1.0).strip()
+            raise RuntimeError(f"Python worker 启动失败: {detail}" if detail else "Python worker 启动失败")
+        # 启动阶段（import 告警等）的输出不计入第一次执行
+        self._take_stderr()
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def in_use(self) -> bool:
+        return self.busy or self.leases > 0
+
+    def is_alive(self) -> bool:
+        return not self.dead and self.proc.poll() is None
+
+    def rss_mb(self) -> float:
+        try:
+            return psutil.Process(self.proc.pid).memory_info().rss / (1024 * 1024)
+        except Exception:
+            return 0.0
+
+    def kill(self) -> None:
+        alive = self.is_alive()
+        self.dead = True
+        if alive:
+            ProcessManager.kill_process_tree(self.proc.pid)
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _drain_stderr(self) -> None:
+        try:
+            for line in iter(self.proc.stderr.readline, b""):
+                with self._stderr_lock:
+                    self._stderr_tail.append(line.decode("utf-8", errors="replace"))
+        except Exception:
+            pass
+        finally:
+            try:
+                self.proc.stderr.close()
+            except Exception:
+                pass
+
+    def _take_stderr(self, wait: float = 0.0) -> str:
+        """取出并清空已收集的进程 stderr；进程已结束时最多等待 wait 秒读完剩余输出"""
+        if wait > 0:
+            self._stderr_thread.join(wait)
+        with self._stderr_lock:
+            text = "".join(self._stderr_tail)
+            self._stderr_tail.clear()
+        return text[-_MAX_OUTPUT_CHARS:]
+
+    @staticmethod
+    def _with_stderr(result: Dict[str, Any], extra: str) -> Dict[str, Any]:
+        if extra:
+            stderr = result.get("stderr") or ""
+            result["stderr"] = f"{stderr.rstrip()}\n{extra}" if stderr else extra
+        return result
+
+    def _read_line(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """读取一行响应；超时由定时器结束进程来打断阻塞读，返回 None"""
+        timer = threading.Timer(timeout, self.kill) if timeout and timeout > 0 else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            line = self.proc.stdout.readline()
+        except Exception:
+            line = b""
+        finally:
+            if timer:
+                timer.cancel()
+        if not line:
+            return None
+        return json.loads(line)
+
+    def execute(self, code: str, cwd: str, timeout: float, isolated: bool = False) -> Dict[str, Any]:
+        """同步执行一段代码，返回 {"returncode", "stdout", "stderr"}"""
+        with self._lock:
+            self.busy = True
+            started = time.monotonic()
+            try:
+                request = {
+                    "code": code,
+                    "cwd": cwd or "",
+                    "isolated": isolated,
+                    "max_output": _MAX_OUTPUT_CHARS,
+                }
+                try:
+                    self.proc.stdin.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.proc.stdin.flush()
+                    response = self._read_line(timeout)
+                except (BrokenPipeError, OSError, ValueError):
+                    response = None
+
+                if response is not None:
+                    return self._with_stderr(response, self._take_stderr())
+                # 超时或进程意外退出，命名空间已不可用，标记为死亡等待回收
+                self.kill()
+                if time.monotonic() - started >= timeout:
+                    return self._with_stderr({
+                        "returncode": -1,
+                        "stdout": "",
+                        "stderr": f"Execution timed out ({timeout:g}s limit)",
+                    }, self._take_stderr(wait=1.0))
+                return self._with_stderr({
+                    "returncode": -1,
+                    "stdout": "",
+                    "stderr": "Python worker exited unexpectedly; variables from previous steps are lost",
+                }, self._take_stderr(wait=1.0))
+            finally:
+                self.executions += 1
+                self.last_used = time.time()
+                self.busy = False
+
+
+class CodeWorkerPool:
+    """按会话 key 分配常驻 worker，并维护预热备用进程"""
+
+    def __init__(self, max_workers: int = 8, prefork: int = 1):
+        self.max_workers = max(1, max_workers)
+        self.prefork = max(0, prefork)
+        self._workers: "OrderedDict[str, CodeWorker]" = OrderedDict()
+        self._spare: List[CodeWorker] = []
+        self._spawning = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.spawned = 0
+        self.recycled = 0
+
+    # ── 进程管理 ──────────────────────────────────────────
+
+    def _spawn(self) -> CodeWorker:
+        worker = CodeWorker()
+        with self._lock:
+            self.spawned += 1
+        return worker
+
+    def _refill_spare(self) -> None:
+        """后台补足预热备用进程"""
+        with self._lock:
+            if self._closed or len(self._spare) + self._spawning >= self.prefork:
+                return
+            self._spawning += 1
+
+        def _run():
+            try:
+                worker = self._spawn()
+            except Exception as e:
+                logger.warning("预热 Python worker 失败: %s", e)
+                return
+            finally:
+                with self._lock:
+                    self._spawning -= 1
+            with self._lock:
+                if not self._closed:
+                    self._spare.append(worker)
+                    return
+            worker.kill()
+
+        threading.Thread(target=_run, name="code-worker-prefork", daemon=True).start()
+
+    def warm_up(self) -> None:
+        """启动时预热备用进程"""
+        self._refill_spare()
+
+    def _acquire(self, key: str) -> CodeWorker:
+        """领用 key 对应的 worker；返回前在池锁内登记租用，调用方用完后须 _release"""
+        with self._lock:
+            worker = self._workers.get(key)
+            if worker is not None and worker.is_alive():
+                self._workers.move_to_end(key)
+                worker.leases += 1
+                return worker
+            if worker is not None:
+                self._workers.pop(key, None)
+            spare = None
+            while self._spare:
+                candidate = self._spare.pop()
+                if candidate.is_alive():
+                    spare = candidate
+                    break
+        worker = spare or self._spawn()
+
+        with self._lock:
+            existing = self._workers.get(key)
+            if existing is not None and existing.is_alive():
+                # 并发请求已为该会话分配了 worker
+                self._spare.append(worker)
+                self._workers.move_to_end(key)
+                existing.leases += 1
+                return existing
+            self._workers[key] = worker
+            worker.leases += 1
+            evicted = self._evict_over_capacity_locked(keep=key)
+        for w in evicted:
+            w.kill()
+        self._refill_spare()
+        return worker
+
+    def _release(self, worker: CodeWorker) -> None:
+        with self._lock:
+            worker.leases = max(0, worker.leases - 1)
+
+    def _evict_over_capacity_locked(self, keep: str) -> List[CodeWorker]:
+        evicted = []
+        for key in list(self._workers.keys()):
+            if len(self._workers) <= self.max_workers:
+                break
+            worker = self._workers[key]
+            if key == keep or worker.in_use():
+                continue
+            evicted.append(self._workers.pop(key))
+        return evicted
+
+    def _maybe_recycle(self, key: str, worker: CodeWorker) -> None:
+        """执行次数 / 内存超限或进程已退出时回收"""
+        reason = ""
+        if not worker.is_alive():
+            reason = "进程已退出"
+        elif config.CODE_WORKER_MAX_EXECUTIONS > 0 and worker.executions >= config.CODE_WORKER_MAX_EXECUTIONS:
+            reason = f"执行次数达到 {worker.executions}"
+        elif config.CODE_WORKER_MAX_RSS_MB > 0 and worker.rss_mb() > config.CODE_WORKER_MAX_RSS_MB:
+            reason = f"内存超过 {config.CODE_WORKER_MAX_RSS_MB}MB"
+        if not reason:
+            return
+        with self._lock:
+            if self._workers.get(key) is worker:
+                self._workers.pop(key)
+            self.recycled += 1
+        worker.kill()
+        logger.info("回收 Python worker: key=%s, pid=%s, 原因=%s", key, worker.pid, reason)
+
+    # ── 对外接口 ──────────────────────────────────────────
+
+    def execute_sync(
+        self,
+        key: str,
+        code: str,
+        cwd: str = "",
+        timeout: Optional[float] = None,
+        isolated: bool = False,
+    ) -> Dict[str, Any]:
+        timeout = timeout or config.SANDBOX_TIMEOUT
+        try:
+            worker = self._acquire(key)
+        except Exception as e:
+            return {"returncode": -1, "stdout": "", "stderr": f"Execution error: {e}"}
+        try:
+            result = worker.execute(code, cwd, timeout, isolated=isolated)
+        finally:
+            self._release(worker)
+        self._maybe_recycle(key, worker)
+        return result
+
+    async def execute(
+        self,
+        key: str,
+        code: str,
+        cwd: str = "",
+        timeout: Optional[float] = None,
+        isolated: bool = False,
+    ) -> Dict[str, Any]:
+        """在 key 对应的常驻进程中执行代码，返回 {"returncode", "stdout", "stderr"}
+
+        isolated=True 时使用独立命名空间，不影响会话中已有的变量
+        """
+        return await asyncio.to_thread(self.execute_sync, key, code, cwd, timeout, isolated)
+
+    def discard(self, key: str) -> bool:
+        """结束 key 对应的进程（会话删除 / 沙箱断开时调用）"""
+        with self._lock:
+            worker = self._workers.pop(key, None)
+        if worker is None:
+            return False
+        worker.kill()
+        return True
+
+    def evict_idle(self, ttl: Optional[float] = None) -> int:
+        ttl = config.CODE_WORKER_IDLE_TTL_SECONDS if ttl is None else ttl
+        if ttl <= 0:
+            return 0
+        now = time.time()
+        with self._lock:
+            stale = [
+                key for key, w in self._workers.items()
+                if not w.in_use() and now - w.last_used > ttl
+            ]
+            evicted = [self._workers.pop(key) for key in stale]
+        for w in evicted:
+            w.kill()
+        return len(evicted)
+
+    def close_all(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers.values()) + self._spare
+            self._workers.clear()
+            self._spare.clear()
+        for w in workers:
+            w.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = [
+                {
+                    "key": key,
+                    "pid": w.pid,
+                    "executions": w.executions,
+                    "busy": w.busy,
+                    "idle_seconds": round(time.time() - w.last_used, 1),
+                }
+                for key, w in self._workers.items()
+            ]
+            return {
+                "max_workers": self.max_workers,
+                "open": len(self._workers),
+                "spare": len(self._spare),
+                "spawned": self.spawned,
+                "recycled": self.recycled,
+                "workers": workers,
+            }
+
+
+code_worker_pool = CodeWorkerPool(
+    max_workers=config.CODE_WORKER_MAX_WORKERS,
+    prefork=config.CODE_WORKER_PREFORK,
+)
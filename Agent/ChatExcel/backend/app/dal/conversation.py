@@ -2,7 +2,7 @@
 
 import json
 from typing import List, Optional
-from app.dal.database import get_db
+from app.dal.database import db_session
 
 
 def _parse_saved_list(value: str) -> List[str]:
@@ -49,8 +49,7 @@ async def create_conversation(
     file_name: str = "",
     title: str = "",
 ) -> dict:
-    db = await get_db()
-    try:
+    async with db_session() as db:
         await db.execute(
             """INSERT OR REPLACE INTO conversations (conv_uid, chat_mode, model_name, file_path, file_name, title)
                VALUES (?, ?, ?, ?, ?, ?)""",
@@ -58,13 +57,10 @@ async def create_conversation(
         )
         await db.commit()
         return {"conv_uid": conv_uid, "chat_mode": chat_mode}
-    finally:
-        await db.close()
 
 
 async def list_conversations(limit: int = 50, offset: int = 0) -> List[dict]:
-    db = await get_db()
-    try:
+    async with db_session() as db:
         cursor = await db.execute(
             """
             SELECT c.*, COUNT(m.id) AS message_count
@@ -78,13 +74,10 @@ async def list_conversations(limit: int = 50, offset: int = 0) -> List[dict]:
         )
         rows = await cursor.fetchall()
         return [_format_conversation(row) for row in rows]
-    finally:
-        await db.close()
 
 
 async def get_conversation(conv_uid: str) -> Optional[dict]:
-    db = await get_db()
-    try:
+    async with db_session() as db:
         cursor = await db.execute("SELECT * FROM conversations WHERE conv_uid = ?", (conv_uid,))
         row = await cursor.fetchone()
         if not row:
@@ -99,8 +92,6 @@ async def get_conversation(conv_uid: str) -> Optional[dict]:
         messages = [dict(r) for r in await cursor.fetchall()]
         conv["messages"] = messages
         return conv
-    finally:
-        await db.close()
 
 
 async def update_conversation(
@@ -110,8 +101,7 @@ async def update_conversation(
     file_path: str = "",
     file_name: str = "",
 ) -> dict:
-    db = await get_db()
-    try:
+    async with db_session() as db:
         sets = []
         params = []
         if title:
@@ -142,19 +132,14 @@ async def update_conversation(
             )
             await db.commit()
         return {"conv_uid": conv_uid}
-    finally:
-        await db.close()
 
 
 async def delete_conversation(conv_uid: str) -> bool:
-    db = await get_db()
-    try:
+    async with db_session() as db:
         await db.execute("DELETE FROM messages WHERE conv_uid = ?", (conv_uid,))
         await db.execute("DELETE FROM conversations WHERE conv_uid = ?", (conv_uid,))
         await db.commit()
         return True
-    finally:
-        await db.close()
 
 
 async def add_message(
@@ -164,8 +149,7 @@ async def add_message(
     order_no: int = 0,
     metadata: str = "",
 ) -> int:
-    db = await get_db()
-    try:
+    async with db_session() as db:
         cursor = await db.execute(
             """INSERT INTO messages (conv_uid, role, content, order_no, metadata)
                VALUES (?, ?, ?, ?, ?)""",
@@ -177,17 +161,30 @@ async def add_message(
         )
         await db.commit()
         return cursor.lastrowid
-    finally:
-        await db.close()
 
 
-async def get_messages(conv_uid: str) -> List[dict]:
-    db = await get_db()
-    try:
+async def next_order_no(conv_uid: str) -> int:
+    """下一条消息的顺序号：走 (conv_uid, order_no) 索引取 MAX，不再加载整段会话"""
+    async with db_session() as db:
         cursor = await db.execute(
-            "SELECT * FROM messages WHERE conv_uid = ? ORDER BY order_no ASC",
+            "SELECT COALESCE(MAX(order_no) + 1, 0) FROM messages WHERE conv_uid = ?",
             (conv_uid,),
         )
+        row = await cursor.fetchone()
+        return int(row[0]) if row else 0
+
+
+async def get_messages(conv_uid: str, since: Optional[int] = None, limit: Optional[int] = None) -> List[dict]:
+    """按 order_no 升序分页读取消息：since 为上一页最后一条的 order_no（不含），limit 为本页条数"""
+    sql = "SELECT * FROM messages WHERE conv_uid = ?"
+    params: list = [conv_uid]
+    if since is not None:
+        sql += " AND order_no > ?"
+        params.append(since)
+    sql += " ORDER BY order_no ASC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    async with db_session() as db:
+        cursor = await db.execute(sql, params)
         return [dict(r) for r in await cursor.fetchall()]
-    finally:
-        await db.close()
@@ -1,24 +1,81 @@
-"""SQLite 数据库连接与表初始化"""
+"""SQLite 数据库连接池与表初始化
 
-import aiosqlite
+连接池中的连接长期复用：开启 WAL（读写互不阻塞）、synchronous=NORMAL，
+并依赖 sqlite3 的语句缓存（cached_statements）复用预编译语句，避免每次调用都重新建连和解析 SQL。
+"""
+
+import asyncio
 import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
 
 from app.core import config
 
 DB_PATH = config.DB_PATH
 
+_pool: Optional[asyncio.Queue] = None
+_pool_connections: List[aiosqlite.Connection] = []
+_pool_lock = asyncio.Lock()
 
-async def get_db() -> aiosqlite.Connection:
-    db = await aiosqlite.connect(DB_PATH)
+
+async def _open_connection() -> aiosqlite.Connection:
+    db = await aiosqlite.connect(DB_PATH, cached_statements=config.SQLITE_CACHED_STATEMENTS)
     db.row_factory = aiosqlite.Row
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA synchronous=NORMAL")
+    await db.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
     return db
 
 
+async def _get_pool() -> asyncio.Queue:
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                pool = asyncio.Queue()
+                for _ in range(max(1, config.SQLITE_POOL_SIZE)):
+                    db = await _open_connection()
+                    _pool_connections.append(db)
+                    pool.put_nowait(db)
+                _pool = pool
+    return _pool
+
+
+@asynccontextmanager
+async def db_session() -> AsyncIterator[aiosqlite.Connection]:
+    """从连接池借出一个连接，用完归还；异常时回滚未提交的事务"""
+    pool = await _get_pool()
+    db = await pool.get()
+    try:
+        yield db
+    except BaseException:
+        if db.in_transaction:
+            await db.rollback()
+        raise
+    finally:
+        pool.put_nowait(db)
+
+
+async def close_db_pool():
+    """关闭连接池中的所有连接（服务关闭时调用）"""
+    global _pool
+    async with _pool_lock:
+        for db in _pool_connections:
+            try:
+                await db.close()
+            except Exception:
+                pass
+        _pool_connections.clear()
+        _pool = None
+
+
 async def init_db():
     """初始化数据库表"""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with db_session() as db:
         await db.executescript("""
             CREATE TABLE IF NOT EXISTS conversations (
                 conv_uid TEXT PRIMARY KEY,
@@ -43,6 +100,22 @@ async def init_db():
             );
 
             CREATE INDEX IF NOT EXISTS idx_messages_conv_uid ON messages(conv_uid);
+            -- MAX(order_no) 与按 order_no 分页读取走该索引，不再随会话长度线性增长
+            CREATE INDEX IF NOT EXISTS idx_messages_conv_order ON messages(conv_uid, order_no);
+
+            -- 学习阶段结果缓存：同一模板表格重复上传时复用 column_analysis，不再调用 LLM
+            CREATE TABLE IF NOT EXISTS learning_cache (
+                fingerprint TEXT PRIMARY KEY,
+                schema_hash TEXT NOT NULL,
+                sketch TEXT DEFAULT '',
+                row_count INTEGER DEFAULT 0,
+                result TEXT DEFAULT '',
+                hit_count INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_learning_cache_schema ON learning_cache(schema_hash, last_used_at);
         """)
         await db.commit()
 
@@ -0,0 +1,54 @@
+"""学习结果缓存 CRUD — 按表结构指纹复用学习阶段的 LLM 输出"""
+
+from typing import List, Optional
+from app.dal.database import db_session
+
+
+async def get_learning_cache(fingerprint: str) -> Optional[dict]:
+    async with db_session() as db:
+        cursor = await db.execute("SELECT * FROM learning_cache WHERE fingerprint = ?", (fingerprint,))
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+
+async def list_learning_cache_by_schema(schema_hash: str, limit: int = 20) -> List[dict]:
+    """同一列名 + 列类型下最近使用的缓存，用于行数等不同时的模糊匹配"""
+    async with db_session() as db:
+        cursor = await db.execute(
+            "SELECT * FROM learning_cache WHERE schema_hash = ? ORDER BY last_used_at DESC LIMIT ?",
+            (schema_hash, limit),
+        )
+        return [dict(r) for r in await cursor.fetchall()]
+
+
+async def save_learning_cache(
+    fingerprint: str,
+    schema_hash: str,
+    sketch: str,
+    row_count: int,
+    result: str,
+) -> None:
+    async with db_session() as db:
+        await db.execute(
+            """INSERT OR REPLACE INTO learning_cache (fingerprint, schema_hash, sketch, row_count, result)
+               VALUES (?, ?, ?, ?, ?)""",
+            (fingerprint, schema_hash, sketch, row_count, result),
+        )
+        await db.commit()
+
+
+async def touch_learning_cache(fingerprint: str) -> None:
+    """命中后更新使用时间和命中次数"""
+    async with db_session() as db:
+        await db.execute(
+            """UPDATE learning_cache SET hit_count = hit_count + 1, last_used_at = CURRENT_TIMESTAMP
+               WHERE fingerprint = ?""",
+            (fingerprint,),
+        )
+        await db.commit()
+
+
+async def delete_learning_cache(fingerprint: str) -> None:
+    async with db_session() as db:
+        await db.execute("DELETE FROM learning_cache WHERE fingerprint = ?", (fingerprint,))
+        await db.commit()
@@ -3,12 +3,19 @@
 import asyncio
 import logging
 import time
-from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
 
 from openai import APIConnectionError, APIError, APITimeoutError, AsyncOpenAI, RateLimitError
 
 from app.llm.llm_config import (
     LLMProviderConfig,
+    get_llm_adaptive_order,
+    get_llm_hedge_default_delay,
+    get_llm_hedge_enabled,
+    get_llm_hedge_quantile,
     get_llm_non_stream_timeout,
     get_llm_providers,
     get_llm_retry_count,
@@ -17,6 +24,8 @@ from app.llm.llm_config import (
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 _clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
 
 
@@ -74,6 +83,173 @@ def _select_provider(providers: List[LLMProviderConfig], model: Optional[str], a
     return provider
 
 
+# 延迟统计按调用方式分开：流式记录首 token 延迟，非流式记录完整响应耗时，两者量级不同不能混在一起
+MODE_STREAM = "stream"
+MODE_FULL = "full"
+
+
+@dataclass
+class _ProviderLatency:
+    """单个模型服务在一种调用方式下的延迟统计。"""
+    ewma: Optional[float] = None
+    failure_rate: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+
+
+class ProviderLatencyTracker:
+    """按 (provider, 调用方式) 记录延迟和失败率：流式为首 token 延迟，非流式为完整响应耗时。
+
+    - EWMA 延迟 × 失败惩罚 作为排序分数，LLM_ADAPTIVE_ORDER 开启时决定 provider 顺序
+    - 最近样本的分位数（默认 p95）作为对冲请求的触发延迟
+    """
+
+    def __init__(self, alpha: float = 0.3, failure_penalty: float = 4.0, min_samples: int = 5):
+        self.alpha = alpha
+        self.failure_penalty = failure_penalty
+        self.min_samples = min_samples
+        self._stats: Dict[Tuple[str, str], _ProviderLatency] = {}
+
+    def _get(self, name: str, mode: str) -> _ProviderLatency:
+        key = (name, mode)
+        if key not in self._stats:
+            self._stats[key] = _ProviderLatency()
+        return self._stats[key]
+
+    def record_success(self, name: str, latency: float, mode: str = MODE_STREAM) -> None:
+        stats = self._get(name, mode)
+        stats.samples.append(latency)
+        stats.ewma = latency if stats.ewma is None else self.alpha * latency + (1 - self.alpha) * stats.ewma
+        stats.failure_rate = (1 - self.alpha) * stats.failure_rate
+
+    def record_failure(self, name: str, mode: str = MODE_STREAM) -> None:
+        stats = self._get(name, mode)
+        stats.failure_rate = self.alpha + (1 - self.alpha) * stats.failure_rate
+
+    def score(self, name: str, default: float, mode: str = MODE_STREAM) -> float:
+        """排序分数，越小越优先；没有延迟样本时用 default 代替 EWMA。"""
+        stats = self._stats.get((name, mode))
+        if stats is None:
+            return default
+        latency = stats.ewma if stats.ewma is not None else default
+        return latency * (1 + self.failure_penalty * stats.failure_rate)
+
+    def hedge_delay(self, name: str, quantile: float, default: float, mode: str = MODE_STREAM) -> float:
+        """对冲延迟：样本足够时取该调用方式最近延迟的分位数，否则用 default。"""
+        stats = self._stats.get((name, mode))
+        if stats is None or len(stats.samples) < self.min_samples:
+            return default
+        return self._quantile(stats.samples, quantile)
+
+    @staticmethod
+    def _quantile(samples: Deque[float], quantile: float) -> float:
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(quantile * (len(ordered) - 1))))
+        return ordered[index]
+
+    def order(
+        self, providers: List[LLMProviderConfig], default: float, mode: str = MODE_STREAM
+    ) -> List[LLMProviderConfig]:
+        """按分数稳定排序，分数相同保持配置顺序。"""
+        return sorted(providers, key=lambda p: self.score(p.name, default, mode))
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (name, mode), stats in self._stats.items():
+            result.setdefault(name, {})[mode] = {
+                "ewma": round(stats.ewma, 3) if stats.ewma is not None else None,
+                "failure_rate": round(stats.failure_rate, 3),
+                "samples": len(stats.samples),
+                "p95": round(self._quantile(stats.samples, 0.95), 3) if stats.samples else None,
+            }
+        return result
+
+
+latency_tracker = ProviderLatencyTracker()
+
+
+def _rank_providers(
+    providers: List[LLMProviderConfig], preferred_model: Optional[str], mode: str
+) -> List[LLMProviderConfig]:
+    """确定 provider 尝试顺序：开启 LLM_ADAPTIVE_ORDER 时先按该调用方式的延迟排序，首选模型始终排最前。"""
+    if get_llm_adaptive_order():
+        providers = latency_tracker.order(providers, get_llm_hedge_default_delay(), mode)
+    return _order_providers(providers, preferred_model)
+
+
+def _hedge_delay_for(provider: LLMProviderConfig, upper: float, mode: str) -> float:
+    """对冲延迟不超过单次调用超时，否则对冲失去意义。"""
+    delay = latency_tracker.hedge_delay(
+        provider.name, get_llm_hedge_quantile(), get_llm_hedge_default_delay(), mode
+    )
+    return min(delay, upper)
+
+
+async def _hedged_race(
+    max_attempts: int,
+    start_attempt: Callable[[int], Awaitable[T]],
+    hedge_delay: Callable[[int], float],
+    log: logging.Logger,
+    discard: Optional[Callable[[T], Awaitable[None]]] = None,
+) -> T:
+    """对冲执行：先发起第 1 次尝试，超过对冲延迟仍未返回时并发发起下一次（最多 2 个在途），
+    取最先成功的结果并取消其余；在途请求全部失败时立即发起下一次，直到用完尝试次数。
+    出现不可重试的错误时与串行重试一致，立即结束并取消在途请求。
+    """
+    pending: Dict[asyncio.Task, int] = {}
+    next_attempt = 0
+    last_error: Optional[BaseException] = None
+
+    def _launch() -> None:
+        nonlocal next_attempt
+        task = asyncio.ensure_future(start_attempt(next_attempt))
+        pending[task] = next_attempt
+        next_attempt += 1
+
+    _launch()
+    try:
+        while pending:
+            timeout = None
+            if next_attempt < max_attempts and len(pending) < 2:
+                timeout = hedge_delay(next_attempt - 1)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                log.info(
+                    "LLM 对冲请求: attempt=%d 超过 %.2fs 未返回，并发发起 attempt=%d",
+                    next_attempt, timeout, next_attempt + 1,
+                )
+                _launch()
+                continue
+
+            winner = None
+            for task in done:
+                pending.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                elif winner is None:
+                    winner = task
+                elif discard:
+                    await discard(task.result())
+            if winner is not None:
+                return winner.result()
+            if isinstance(last_error, Exception) and not _is_retryable_error(last_error):
+                raise last_error
+            if not pending and next_attempt < max_attempts:
+                _launch()
+        raise last_error or RuntimeError("LLM 调用失败")
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _wrap_error(last_error: Optional[BaseException], label: str, max_attempts: int) -> BaseException:
+    """TimeoutError 等异常的 str() 可能为空，包装成可读消息避免前端显示空白"""
+    if last_error and not str(last_error):
+        error = RuntimeError(f"{label}: {type(last_error).__name__} (已重试 {max_attempts} 次)")
+        error.__cause__ = last_error
+        return error
+    return last_error or RuntimeError(label)
+
+
 async def chat_completion(
     messages: List[dict],
     model: Optional[str] = None,
@@ -89,19 +265,20 @@ async def chat_completion(
 
     preferred_model 指定用户首选模型名称，会将其对应的 provider 排到最前优先使用。
     on_provider 回调在每次选定 provider 时触发，调用方可据此通知前端当前使用的模型。
+    LLM_HEDGE_ENABLED 开启时走对冲模式，on_provider 只对最终采用的 provider 触发。
     """
     log = logger or globals()["logger"]
     providers = get_llm_providers()
     if not providers:
         raise RuntimeError("未配置可用的大模型服务")
-    providers = _order_providers(providers, preferred_model)
+    providers = _rank_providers(providers, preferred_model, MODE_FULL)
     retry_count = get_llm_retry_count()
     max_attempts = max(1, retry_count)
-    last_error: Exception | None = None
+    hedged = get_llm_hedge_enabled() and max_attempts > 1 and len(providers) > 1
 
-    for attempt in range(max_attempts):
+    async def _attempt(attempt: int, notify: bool):
         provider = _select_provider(providers, model, attempt)
-        if on_provider:
+        if notify and on_provider:
             on_provider(provider.name)
         client = get_llm_client(provider)
         resolved_temperature = temperature if temperature is not None else provider.temperature
@@ -113,7 +290,7 @@ async def chat_completion(
                 **dict(request_kwargs.get("extra_body") or {}),
             }
         # 估算输入 token 数
-        input_tokens = sum(count_tokens(m.get("content", ""), provider.model) for m in (messages or []))
+        input_tokens = sum(count_tokens_batch([m.get("content", "") for m in (messages or [])], provider.model))
         log.info(
             "LLM 调用参数: provider=%s, base_url=%s, model=%s, temperature=%s, max_tokens=%s, stream=%s, messages=%d, input_tokens≈%d, attempt=%d/%d, non_stream_timeout=%s, extra_params=%s",
             provider.name,
@@ -144,33 +321,53 @@ async def chat_completion(
                 timeout=get_llm_non_stream_timeout(),
             )
             elapsed = time.time() - start_time
+            latency_tracker.record_success(provider.name, elapsed, MODE_FULL)
             log.info(
                 "LLM 调用完成: provider=%s, model=%s, attempt=%d/%d, 耗时=%.2fs",
                 provider.name, provider.model, attempt + 1, max_attempts, elapsed,
             )
-            return result
+            return provider, result
         except Exception as exc:
-            last_error = exc
-            retryable = _is_retryable_error(exc)
+            latency_tracker.record_failure(provider.name, MODE_FULL)
             log.warning(
                 "LLM 调用失败: provider=%s, model=%s, attempt=%d/%d, retryable=%s, error_type=%s, error=%s",
                 provider.name,
                 provider.model,
                 attempt + 1,
                 max_attempts,
-                retryable,
+                _is_retryable_error(exc),
                 type(exc).__name__,
                 exc,
             )
-            if not retryable or attempt >= max_attempts - 1:
+            raise
+
+    if hedged:
+        try:
+            provider, result = await _hedged_race(
+                max_attempts,
+                lambda attempt: _attempt(attempt, notify=False),
+                lambda attempt: _hedge_delay_for(
+                    _select_provider(providers, model, attempt), get_llm_non_stream_timeout(), MODE_FULL
+                ),
+                log,
+            )
+        except Exception as exc:
+            raise _wrap_error(exc, "LLM 调用失败", max_attempts)
+        if on_provider:
+            on_provider(provider.name)
+        return result
+
+    last_error: Exception | None = None
+    for attempt in range(max_attempts):
+        try:
+            _, result = await _attempt(attempt, notify=True)
+            return result
+        except Exception as exc:
+            last_error = exc
+            if not _is_retryable_error(exc) or attempt >= max_attempts - 1:
                 break
 
-    # TimeoutError 等异常的 str() 可能为空，包装成可读消息避免前端显示空白
-    if last_error and not str(last_error):
-        raise RuntimeError(
-            f"LLM 调用失败: {type(last_error).__name__} (已重试 {max_attempts} 次)"
-        ) from last_error
-    raise last_error or RuntimeError("LLM 调用失败")
+    raise _wrap_error(last_error, "LLM 调用失败", max_attempts)
 
 
 async def chat_completion_stream(
@@ -187,19 +384,25 @@ async def chat_completion_stream(
 
     preferred_model 指定用户首选模型名称，会将其对应的 provider 排到最前优先使用。
     on_provider 回调在每次选定 provider 时触发，调用方可据此通知前端当前使用的模型。
+    LLM_HEDGE_ENABLED 开启时，首个模型超过对冲延迟仍未吐出首个内容 chunk 就并发请求下一个模型，
+    采用先吐出内容的流并关闭其余请求；on_provider 只对最终采用的 provider 触发。
     """
     log = logger or globals()["logger"]
     providers = get_llm_providers()
     if not providers:
         raise RuntimeError("未配置可用的大模型服务")
-    providers = _order_providers(providers, preferred_model)
+    providers = _rank_providers(providers, preferred_model, MODE_STREAM)
     max_attempts = max(1, get_llm_retry_count())
     first_chunk_timeout = get_llm_stream_first_chunk_timeout()
-    last_error: Exception | None = None
+    hedged = get_llm_hedge_enabled() and max_attempts > 1 and len(providers) > 1
 
-    for attempt in range(max_attempts):
+    async def _open(attempt: int, notify: bool):
+        """创建流式响应并读取第一个有内容的 chunk，返回 (provider, response, iterator, 首个内容, 开始时间)。
+
+        流在吐出内容前结束时 iterator 为 None。
+        """
         provider = _select_provider(providers, model, attempt)
-        if on_provider:
+        if notify and on_provider:
             on_provider(provider.name)
         client = get_llm_client(provider)
         resolved_temperature = temperature if temperature is not None else provider.temperature
@@ -211,10 +414,9 @@ async def chat_completion_stream(
                 **dict(request_kwargs.get("extra_body") or {}),
             }
 
-        first_content_yielded = False
         stream_start_time = time.time()
         # 估算输入 token 数
-        input_tokens = sum(count_tokens(m.get("content", ""), provider.model) for m in (messages or []))
+        input_tokens = sum(count_tokens_batch([m.get("content", "") for m in (messages or [])], provider.model))
         log.info(
             "LLM 流式调用参数: provider=%s, base_url=%s, model=%s, temperature=%s, max_tokens=%s, messages=%d, input_tokens≈%d, attempt=%d/%d, first_chunk_timeout=%s, extra_params=%s",
             provider.name,
@@ -229,67 +431,115 @@ async def chat_completion_stream(
             first_chunk_timeout,
             sorted(request_kwargs.keys()),
         )
-        try:
-            async def _create_stream_and_read_first_content():
-                """创建流式响应并读取第一个有内容的 chunk。"""
-                response = await client.chat.completions.create(
-                    model=provider.model,
-                    messages=messages,
-                    temperature=resolved_temperature,
-                    max_tokens=resolved_max_tokens,
-                    stream=True,
-                    **request_kwargs,
-                )
-                iterator = response.__aiter__()
-                while True:
+
+        async def _create_stream_and_read_first_content():
+            """创建流式响应并读取第一个有内容的 chunk。"""
+            response = await client.chat.completions.create(
+                model=provider.model,
+                messages=messages,
+                temperature=resolved_temperature,
+                max_tokens=resolved_max_tokens,
+                stream=True,
+                **request_kwargs,
+            )
+            iterator = response.__aiter__()
+            while True:
+                try:
                     chunk = await iterator.__anext__()
-                    content = chunk.choices[0].delta.content if chunk.choices else ""
-                    if content:
-                        return iterator, content
+                except StopAsyncIteration:
+                    return response, None, ""
+                content = chunk.choices[0].delta.content if chunk.choices else ""
+                if content:
+                    return response, iterator, content
 
-            iterator, first_content = await asyncio.wait_for(
+        try:
+            response, iterator, first_content = await asyncio.wait_for(
                 _create_stream_and_read_first_content(),
                 timeout=first_chunk_timeout,
             )
-            first_content_yielded = True
-            log.info(
-                "LLM 流式首 chunk 到达: provider=%s, model=%s, attempt=%d/%d, 耗时=%.2fs",
-                provider.name, provider.model, attempt + 1, max_attempts, time.time() - stream_start_time,
-            )
-            yield first_content
-
-            async for chunk in iterator:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
-            log.info(
-                "LLM 流式调用完成: provider=%s, model=%s, attempt=%d/%d, 总耗时=%.2fs",
-                provider.name, provider.model, attempt + 1, max_attempts, time.time() - stream_start_time,
-            )
-            return
-        except StopAsyncIteration:
-            return
         except Exception as exc:
-            last_error = exc
-            retryable = _is_retryable_error(exc)
+            latency_tracker.record_failure(provider.name, MODE_STREAM)
             log.warning(
                 "LLM 流式调用失败: provider=%s, model=%s, attempt=%d/%d, retryable=%s, error_type=%s, error=%s",
                 provider.name,
                 provider.model,
                 attempt + 1,
                 max_attempts,
-                retryable,
+                _is_retryable_error(exc),
                 type(exc).__name__,
                 exc,
             )
-            if first_content_yielded or not retryable or attempt >= max_attempts - 1:
-                break
+            raise
+        latency_tracker.record_success(provider.name, time.time() - stream_start_time, MODE_STREAM)
+        if iterator is not None:
+            log.info(
+                "LLM 流式首 chunk 到达: provider=%s, model=%s, attempt=%d/%d, 耗时=%.2fs",
+                provider.name, provider.model, attempt + 1, max_attempts, time.time() - stream_start_time,
+            )
+        return provider, response, iterator, first_content, stream_start_time, attempt
 
-    # TimeoutError 等异常的 str() 可能为空，包装成可读消息避免前端显示空白
-    if last_error and not str(last_error):
-        raise RuntimeError(
-            f"LLM 流式调用失败: {type(last_error).__name__} (已重试 {max_attempts} 次)"
-        ) from last_error
-    raise last_error or RuntimeError("LLM 流式调用失败")
+    async def _close(opened) -> None:
+        """关闭对冲中落选的流式响应"""
+        try:
+            await opened[1].close()
+        except Exception:
+            pass
+
+    opened = None
+    if hedged:
+        try:
+            opened = await _hedged_race(
+                max_attempts,
+                lambda attempt: _open(attempt, notify=False),
+                lambda attempt: _hedge_delay_for(
+                    _select_provider(providers, model, attempt), first_chunk_timeout, MODE_STREAM
+                ),
+                log,
+                discard=_close,
+            )
+        except Exception as exc:
+            raise _wrap_error(exc, "LLM 流式调用失败", max_attempts)
+        if on_provider:
+            on_provider(opened[0].name)
+    else:
+        last_error: Exception | None = None
+        for attempt in range(max_attempts):
+            try:
+                opened = await _open(attempt, notify=True)
+                break
+            except Exception as exc:
+                last_error = exc
+                if not _is_retryable_error(exc) or attempt >= max_attempts - 1:
+                    break
+        if opened is None:
+            raise _wrap_error(last_error, "LLM 流式调用失败", max_attempts)
+
+    provider, _response, iterator, first_content, stream_start_time, attempt = opened
+    if iterator is None:
+        return
+    yield first_content
+
+    # 已吐出内容后不再切换模型，直接抛出异常
+    try:
+        async for chunk in iterator:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as exc:
+        log.warning(
+            "LLM 流式调用失败: provider=%s, model=%s, attempt=%d/%d, retryable=%s, error_type=%s, error=%s",
+            provider.name,
+            provider.model,
+            attempt + 1,
+            max_attempts,
+            _is_retryable_error(exc),
+            type(exc).__name__,
+            exc,
+        )
+        raise _wrap_error(exc, "LLM 流式调用失败", max_attempts)
+    log.info(
+        "LLM 流式调用完成: provider=%s, model=%s, attempt=%d/%d, 总耗时=%.2fs",
+        provider.name, provider.model, attempt + 1, max_attempts, time.time() - stream_start_time,
+    )
 
 
 async def chat_completion_full(
@@ -320,12 +570,42 @@ async def chat_completion_full(
     return content
 
 
+@lru_cache(maxsize=32)
+def _get_encoding(model: str):
+    """按模型名缓存 tiktoken 编码器，未知模型返回 None（回退为按字符数估算）。"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
 def count_tokens(text: str, model: str = None) -> int:
     """粗略估算 token 数（使用 tiktoken）。"""
+    return count_tokens_batch([text], model)[0]
+
+
+def count_tokens_batch(texts: List[str], model: str = None) -> List[int]:
+    """批量估算 token 数，编码器只取一次，多条文本走 tiktoken 的批量编码。
+
+    非字符串或编码失败时按字符数 / 3 估算，与 count_tokens 一致。
+    """
+    texts = list(texts)
+    counts = [int(len(t) / 3) for t in texts]
+    default_model = get_llm_providers()[0].model if get_llm_providers() else "gpt-4o"
+    enc = _get_encoding(model or default_model)
+    if enc is None:
+        return counts
+    indexes = [i for i, t in enumerate(texts) if isinstance(t, str)]
+    if not indexes:
+        return counts
     try:
-        import tiktoken
-        default_model = get_llm_providers()[0].model if get_llm_providers() else "gpt-4o"
-        enc = tiktoken.encoding_for_model(model or default_model)
-        return len(enc.encode(text))
+        if len(indexes) == 1:
+            encoded = [enc.encode_ordinary(texts[indexes[0]])]
+        else:
+            encoded = enc.encode_ordinary_batch([texts[i] for i in indexes])
     except Exception:
-        return int(len(text) / 3)
+        return counts
+    for i, tokens in zip(indexes, encoded):
+        counts[i] = len(tokens)
+    return counts
@@ -84,6 +84,26 @@ def get_llm_stream_first_chunk_timeout() -> float:
     return max(1.0, _safe_float(os.getenv("LLM_STREAM_FIRST_CHUNK_TIMEOUT", "10"), 10.0))
 
 
+def get_llm_hedge_enabled() -> bool:
+    """是否开启对冲请求：首个模型迟迟不出首 token 时并发请求下一个模型，默认关闭。"""
+    return os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+
+
+def get_llm_hedge_quantile() -> float:
+    """对冲延迟取该模型历史首 token 延迟的分位数，默认 p95。"""
+    return min(0.999, max(0.5, _safe_float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"), 0.95)))
+
+
+def get_llm_hedge_default_delay() -> float:
+    """延迟样本不足时使用的对冲延迟（秒），默认 3 秒。"""
+    return max(0.1, _safe_float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3"), 3.0))
+
+
+def get_llm_adaptive_order() -> bool:
+    """是否按各模型的延迟 EWMA / 失败率排序 provider（首选模型仍排第一），默认关闭。"""
+    return os.getenv("LLM_ADAPTIVE_ORDER", "false").lower() == "true"
+
+
 def get_llm_providers() -> List[LLMProviderConfig]:
     """读取代码中配置的大模型服务列表。"""
     providers: List[LLMProviderConfig] = []
@@ -12,11 +12,13 @@ import logging
 import re
 import uuid
 from datetime import date, datetime
-from typing import AsyncIterator, Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 
+from app.services.chat_excel.executor import query_executor
+from app.services.chat_excel.learning_cache import compute_fingerprint, discard_learning, lookup_learning, store_learning
 from app.services.chat_excel.reader import ExcelReader
 from app.llm.client import chat_completion_stream, chat_completion_full
-from app.dal.conversation import add_message, get_messages
+from app.dal.conversation import add_message, get_messages, next_order_no
 from app.prompts.chat_excel_analyze import (
     build_analyze_messages,
     build_table_selection_messages,
@@ -98,6 +100,10 @@ def _chart_view_content(chart_type: str, sql: str, data: list) -> str:
     )
 
 
+def _truncation_notice() -> str:
+    return f"\n结果超过 {config.QUERY_MAX_ROWS} 行，仅展示前 {config.QUERY_MAX_ROWS} 行"
+
+
 class ChatExcelEngine:
     """模块1 ChatExcel 引擎 — 一个会话对应多个 Excel 表。"""
 
@@ -115,9 +121,10 @@ class ChatExcelEngine:
                 self.logger.info("初始化时加载文件: %s, 新增 %d 个表", file_path, len(self._last_added_tables))
         self.logger.info("ChatExcelEngine 初始化完成: conv_uid=%s, table_infos=%d", self.conv_uid, len(self.reader.table_infos))
 
-    def add_file(self, file_path: str, file_name: str = "") -> List[dict]:
+    def add_file(self, file_path: str, file_name: str = "", on_progress: Optional[Callable[[dict], None]] = None) -> List[dict]:
+        """加载文件到 DuckDB；大文件走流式入库，on_progress 接收入库进度事件。"""
         self.logger.info("add_file: file_path=%s, file_name=%s", file_path, file_name)
-        added = self.reader.add_file(file_path, file_name)
+        added = self.reader.add_file(file_path, file_name, on_progress=on_progress)
         self._last_added_tables = added
         if added:
             self._learned = False
@@ -135,6 +142,26 @@ class ChatExcelEngine:
         else:
             self.logger.info("开始学习表: temp_table=%s, file_name=%s, sheet_name=%s",
                              table_info["temp_table"], table_info.get("file_name"), table_info.get("sheet_name"))
+        table_summary = self.reader.get_summary(table_name=table_info["temp_table"])
+
+        # 同一模板表格重复上传时直接复用缓存的学习结果，跳过 LLM 学习
+        fingerprint = compute_fingerprint(table_summary)
+        cached = await lookup_learning(fingerprint) if fingerprint else None
+        if cached is not None:
+            cache_key, cached_result = cached
+            self.logger.info("命中学习缓存，跳过 LLM 学习: temp_table=%s, 行数=%d",
+                             table_info["temp_table"], fingerprint.row_count)
+            applied = self._apply_learning(cached_result, table_info)
+            if not table_info.get("transform_failed"):
+                return applied
+            # 缓存的学习结果套用失败（已回退为原始字段复制）：删除该条目，撤销回退表后重新走 LLM 学习
+            self.logger.warning("学习缓存套用失败，删除缓存并重新学习: temp_table=%s", table_info["temp_table"])
+            try:
+                await discard_learning(cache_key)
+            except Exception as e:
+                self.logger.warning("删除学习缓存失败: %s", e)
+            self.reader.reset_transform(table_info)
+
         table_schema = self.reader.get_create_table_sql(table_name=table_info["temp_table"])
         columns, datas = self.reader.get_sample_data(table_name=table_info["temp_table"])
         data_example = json.dumps(
@@ -142,7 +169,6 @@ class ChatExcelEngine:
             ensure_ascii=False,
             default=_json_serial,
         )
-        table_summary = self.reader.get_summary(table_name=table_info["temp_table"])
         messages = build_learning_messages(
             table_schema=table_schema,
             data_example=data_example,
@@ -181,6 +207,16 @@ class ChatExcelEngine:
         )
 
         parsed = parse_learning_response(llm_result)
+        parsed = self._apply_learning(parsed, table_info)
+        if fingerprint and table_info.get("transformed") and not table_info.get("transform_failed"):
+            try:
+                await store_learning(fingerprint, parsed)
+            except Exception as e:
+                self.logger.warning("保存学习缓存失败: %s", e)
+        return parsed
+
+    def _apply_learning(self, parsed: dict, table_info: dict) -> dict:
+        """按学习结果转换表（column_analysis 为空时直接复制），补充表信息和展示消息。"""
         if parsed.get("column_analysis"):
             self.reader.transform_table(parsed, table_info=table_info)
             self.logger.info("表转换完成，column_analysis 数量=%d", len(parsed.get("column_analysis", [])))
@@ -284,7 +320,7 @@ class ChatExcelEngine:
 
     async def _next_order_no(self) -> int:
         try:
-            return len(await get_messages(self.conv_uid))
+            return await next_order_no(self.conv_uid)
         except Exception:
             return 0
 
@@ -454,7 +490,9 @@ class ChatExcelEngine:
                     saved_chart_type = api_call["chart_type"]
                     yield {"type": "sql", "content": api_call["sql"]}
                     try:
-                        df = self.reader.get_df_by_sql(api_call["sql"])
+                        df, truncated = await query_executor.fetch_df(self.reader, api_call["sql"])
+                        if truncated:
+                            self.logger.warning("SQL 结果超过 %d 行，已截断", config.QUERY_MAX_ROWS)
                         split_data = json.loads(
                             df.to_json(
                                 orient="split",
@@ -474,7 +512,12 @@ class ChatExcelEngine:
                             "sql": api_call["sql"],
                             "data": chart_data,
                             "chart_view": chart_view,
+                            "truncated": truncated,
                         }
+                        if truncated:
+                            notice = _truncation_notice()
+                            view_message += notice
+                            yield {"type": "text", "content": notice}
                     except Exception as e:
                         self.logger.error("SQL 执行失败: %s", e)
                         err_msg = f"SQL 执行失败: {str(e)}"
@@ -493,7 +536,9 @@ class ChatExcelEngine:
                     saved_sql = fallback_sql
                     yield {"type": "sql", "content": fallback_sql}
                     try:
-                        df = self.reader.get_df_by_sql(fallback_sql)
+                        df, truncated = await query_executor.fetch_df(self.reader, fallback_sql)
+                        if truncated:
+                            self.logger.warning("兜底 SQL 结果超过 %d 行，已截断", config.QUERY_MAX_ROWS)
                         split_data = json.loads(df.to_json(orient="split", date_format="iso", date_unit="s", force_ascii=False))
                         chart_data = {"columns": split_data["columns"], "rows": split_data["data"]}
                         name_match = re.search(r"<name>\s*(.*?)\s*</name>", full_text)
@@ -503,7 +548,11 @@ class ChatExcelEngine:
                         chart_view = _chart_view_content(chart_type, fallback_sql, chart_data)
                         view_message += f"<chart-view content='{chart_view}'/>"
                         self.logger.info("兜底 SQL 执行成功")
-                        yield {"type": "chart", "chart_type": chart_type, "sql": fallback_sql, "data": chart_data, "chart_view": chart_view}
+                        yield {"type": "chart", "chart_type": chart_type, "sql": fallback_sql, "data": chart_data, "chart_view": chart_view, "truncated": truncated}
+                        if truncated:
+                            notice = _truncation_notice()
+                            view_message += notice
+                            yield {"type": "text", "content": notice}
                     except Exception as e:
                         self.logger.error("兜底 SQL 执行失败: %s", e)
                         yield {"type": "text", "content": f"\nSQL 执行失败: {str(e)}"}
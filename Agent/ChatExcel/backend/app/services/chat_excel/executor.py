@@ -0,0 +1,231 @@
+"""DuckDB 异步查询执行器 — 把 LLM 生成的 SQL 放到有界线程池执行，不阻塞事件循环。
+
+- 每条查询使用会话连接的独立 cursor，超时后通过 cursor.interrupt() 中断
+- 结果以 Arrow RecordBatch 分批取回，并按行数上限截断，不再 fetchall 全量结果
+- 统计排队深度与端到端延迟分位数
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from app.core import config
+from app.services.chat_excel.reader import ExcelReader, reader_registry
+
+logger = logging.getLogger(__name__)
+
+# 延迟样本保留个数，用于计算分位数
+_LATENCY_WINDOW = 1000
+
+
+class QueryTimeoutError(ValueError):
+    """查询超过执行时限被中断"""
+
+
+class _QueryHandle:
+    """一次查询的执行状态：cursor、批读取器与超时计时器"""
+
+    def __init__(self, reader: ExcelReader, timeout: float):
+        self.reader = reader
+        self.timeout = timeout
+        self.cursor = None
+        self.batches = None
+        self.timer: Optional[threading.Timer] = None
+        self.timed_out = False
+
+    def interrupt(self, timed_out: bool = False):
+        self.timed_out = self.timed_out or timed_out
+        if self.cursor is not None:
+            try:
+                self.cursor.interrupt()
+            except Exception as e:
+                logger.warning(f"Failed to interrupt query: {e}")
+
+
+class QueryExecutor:
+    """有界线程池上的 DuckDB 查询执行器"""
+
+    def __init__(self, max_workers: int, timeout: float, max_rows: int, batch_rows: int):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="duckdb-query")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._truncated = 0
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+
+    async def _submit(self, func, *args):
+        """提交到线程池，并记录排队/运行中的任务数"""
+        with self._lock:
+            self._queued += 1
+
+        def _task():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, _task)
+
+    def _open(self, handle: _QueryHandle, sql: str, max_rows: int):
+        reader_registry.pin(handle.reader)
+        handle.cursor = handle.reader.db.cursor()
+        if handle.timeout and handle.timeout > 0:
+            handle.timer = threading.Timer(handle.timeout, handle.interrupt, kwargs={"timed_out": True})
+            handle.timer.daemon = True
+            handle.timer.start()
+        relation = handle.cursor.sql(sql)
+        if relation is None:
+            # DDL/DML 等无结果集语句
+            return
+        # 多取一行用于判断是否被截断
+        handle.batches = relation.limit(max_rows + 1).fetch_record_batch(self.batch_rows)
+
+    @staticmethod
+    def _next_batch(handle: _QueryHandle) -> Optional[pa.RecordBatch]:
+        if handle.batches is None:
+            return None
+        try:
+            return handle.batches.read_next_batch()
+        except StopIteration:
+            return None
+
+    @staticmethod
+    def _close(handle: _QueryHandle):
+        if handle.timer is not None:
+            handle.timer.cancel()
+        if handle.cursor is not None:
+            try:
+                handle.cursor.close()
+            except Exception:
+                pass
+        reader_registry.unpin(handle.reader)
+
+    async def stream_batches(
+        self,
+        reader: ExcelReader,
+        sql: str,
+        timeout: float = None,
+        max_rows: int = None,
+        stats: dict = None,
+    ) -> AsyncIterator[pa.RecordBatch]:
+        """逐批返回查询结果，累计超过 max_rows 时截断并在 stats["truncated"] 标记。"""
+        timeout = self.timeout if timeout is None else timeout
+        max_rows = max_rows or self.max_rows
+        stats = stats if stats is not None else {}
+        stats["truncated"] = False
+        handle = _QueryHandle(reader, timeout)
+        started = time.perf_counter()
+        rows = 0
+        ok = False
+        try:
+            try:
+                await self._submit(self._open, handle, sql, max_rows)
+                if handle.batches is not None:
+                    stats["schema"] = handle.batches.schema
+                while True:
+                    batch = await self._submit(self._next_batch, handle)
+                    if batch is None:
+                        break
+                    if rows + batch.num_rows > max_rows:
+                        batch = batch.slice(0, max_rows - rows)
+                        stats["truncated"] = True
+                    rows += batch.num_rows
+                    if batch.num_rows:
+                        yield batch
+                    if stats["truncated"]:
+                        break
+                ok = True
+            except asyncio.CancelledError:
+                handle.interrupt()
+                raise
+            except Exception as e:
+                if handle.timed_out:
+                    raise QueryTimeoutError(f"查询超过 {timeout} 秒未完成，已中断。\nSQL[{sql}]") from e
+                raise ValueError(f"Data Query Exception!\nSQL[{sql}].\nError: {e}") from e
+        finally:
+            await asyncio.shield(self._submit(self._close, handle))
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+                if ok:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                if handle.timed_out:
+                    self._timeouts += 1
+                if stats["truncated"]:
+                    self._truncated += 1
+            stats["rows"] = rows
+
+    async def fetch_df(
+        self,
+        reader: ExcelReader,
+        sql: str,
+        table_name: str = None,
+        transform: bool = True,
+        timeout: float = None,
+        max_rows: int = None,
+    ) -> Tuple[pd.DataFrame, bool]:
+        """执行 SQL 并返回 (DataFrame, 是否被截断)，DataFrame 最多 max_rows 行。"""
+        sql = reader.prepare_sql(sql, table_name, transform)
+        logger.info(f"Executing SQL (async): {sql}")
+        stats = {}
+        batches = [batch async for batch in self.stream_batches(reader, sql, timeout=timeout, max_rows=max_rows, stats=stats)]
+        if stats.get("schema") is None:
+            return pd.DataFrame(), False
+        # 与 DuckDB .df() 保持一致：DECIMAL 转 float64，日期列转 datetime64，而不是 Decimal/date 对象
+        table = pa.Table.from_batches(batches, schema=stats["schema"])
+        for idx, field in enumerate(table.schema):
+            if pa.types.is_decimal(field.type):
+                table = table.set_column(idx, field.name, table.column(idx).cast(pa.float64()))
+        return table.to_pandas(date_as_object=False), stats["truncated"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "truncated": self._truncated,
+                "latency_ms": {
+                    "p50": _percentile_ms(latencies, 0.50),
+                    "p95": _percentile_ms(latencies, 0.95),
+                    "p99": _percentile_ms(latencies, 0.99),
+                },
+            }
+
+
+def _percentile_ms(sorted_values: list, q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[idx] * 1000, 2)
+
+
+query_executor = QueryExecutor(
+    max_workers=config.QUERY_MAX_WORKERS,
+    timeout=config.QUERY_TIMEOUT_SECONDS,
+    max_rows=config.QUERY_MAX_ROWS,
+    batch_rows=config.QUERY_BATCH_ROWS,
+)
@@ -0,0 +1,160 @@
+"""学习结果缓存 — 同一模板表格重复上传时复用学习阶段的 LLM 输出
+
+指纹由两部分组成:
+- schema_hash: 列名 + 列类型（顺序敏感），决定 column_analysis 能否直接套用
+- sketch: 每列的取值分布概要（空值率分桶、基数档位、低基数列的取值范围），与行数无关
+
+精确指纹 = schema_hash + sketch + 行数；精确未命中时，在同一 schema_hash 的缓存中
+按 sketch 相似度模糊匹配（只有行数不同的同模板数据仍可命中）。
+"""
+
+import copy
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import config
+from app.dal.learning_cache import (
+    delete_learning_cache,
+    get_learning_cache,
+    list_learning_cache_by_schema,
+    save_learning_cache,
+    touch_learning_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+# 低基数列（如类别、状态）的取值范围也计入 sketch
+_LOW_CARDINALITY = 20
+
+# 缓存中只保存可复用的学习结果字段
+_CACHED_KEYS = ("data_analysis", "column_analysis", "analysis_program")
+
+
+@dataclass
+class SchemaFingerprint:
+    fingerprint: str
+    schema_hash: str
+    sketch: List[Dict[str, Any]]
+    row_count: int
+
+
+def _sha256(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _cardinality_class(approx_unique: int, count: int) -> str:
+    if approx_unique <= 1:
+        return "const"
+    if approx_unique <= _LOW_CARDINALITY:
+        return "low"
+    ratio = approx_unique / count if count else 0
+    if ratio >= 0.9:
+        return "unique"
+    if ratio >= 0.3:
+        return "high"
+    return "mid"
+
+
+def compute_fingerprint(table_summary: str) -> Optional[SchemaFingerprint]:
+    """根据 SUMMARIZE 结果（ExcelReader.get_summary 的 JSON）计算表指纹，解析失败返回 None"""
+    try:
+        summary = json.loads(table_summary)
+        names = summary["column_name"]
+    except Exception:
+        return None
+
+    schema = []
+    sketch = []
+    row_count = 0
+    for idx in sorted(names, key=int):
+        name = names[idx]
+        column_type = summary["column_type"][idx]
+        count = int(summary.get("count", {}).get(idx) or 0)
+        approx_unique = int(summary.get("approx_unique", {}).get(idx) or 0)
+        null_pct = float(summary.get("null_percentage", {}).get(idx) or 0)
+        row_count = max(row_count, count)
+        schema.append([name, column_type])
+
+        cardinality = _cardinality_class(approx_unique, count)
+        item = {
+            "name": name,
+            "nulls": int(round(null_pct / 10)),
+            "card": cardinality,
+        }
+        if cardinality in ("const", "low"):
+            item["range"] = [summary.get("min", {}).get(idx), summary.get("max", {}).get(idx)]
+        sketch.append(item)
+
+    schema_hash = _sha256(schema)
+    return SchemaFingerprint(
+        fingerprint=_sha256([schema_hash, sketch, row_count]),
+        schema_hash=schema_hash,
+        sketch=sketch,
+        row_count=row_count,
+    )
+
+
+def _sketch_similarity(a: List[Dict[str, Any]], b: List[Dict[str, Any]]) -> float:
+    if len(a) != len(b) or not a:
+        return 0.0
+    same = sum(1 for x, y in zip(a, b) if x == y)
+    return same / len(a)
+
+
+async def lookup_learning(fp: SchemaFingerprint) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """查找可复用的学习结果：先精确匹配指纹，再按 sketch 相似度模糊匹配。
+
+    返回 (命中的缓存指纹, 学习结果的深拷贝)（transform_table 会改写 column_analysis），未命中返回 None
+    """
+    if not config.LEARN_CACHE_ENABLED:
+        return None
+    row = await get_learning_cache(fp.fingerprint)
+    match = "exact"
+    if row is None:
+        best, best_score = None, 0.0
+        for candidate in await list_learning_cache_by_schema(fp.schema_hash):
+            try:
+                score = _sketch_similarity(fp.sketch, json.loads(candidate["sketch"]))
+            except Exception:
+                continue
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < config.LEARN_CACHE_FUZZY_THRESHOLD:
+            return None
+        row, match = best, f"fuzzy({best_score:.2f})"
+
+    try:
+        result = json.loads(row["result"])
+    except Exception:
+        return None
+    if not result.get("column_analysis"):
+        return None
+    await touch_learning_cache(row["fingerprint"])
+    logger.info(
+        "学习缓存命中: match=%s, fingerprint=%s, 缓存行数=%s, 当前行数=%s",
+        match, row["fingerprint"][:12], row.get("row_count"), fp.row_count,
+    )
+    return row["fingerprint"], copy.deepcopy(result)
+
+
+async def discard_learning(fingerprint: str) -> None:
+    """删除套用失败的缓存条目，之后同指纹的表重新走 LLM 学习"""
+    await delete_learning_cache(fingerprint)
+    logger.info("学习缓存已删除: fingerprint=%s", fingerprint[:12])
+
+
+async def store_learning(fp: SchemaFingerprint, parsed: Dict[str, Any]) -> None:
+    """保存学习结果；column_analysis 为空（学习失败）时不缓存，调用方只应在表转换成功后调用"""
+    if not config.LEARN_CACHE_ENABLED or not parsed.get("column_analysis"):
+        return
+    result = {key: parsed.get(key) for key in _CACHED_KEYS}
+    await save_learning_cache(
+        fingerprint=fp.fingerprint,
+        schema_hash=fp.schema_hash,
+        sketch=json.dumps(fp.sketch, ensure_ascii=False),
+        row_count=fp.row_count,
+        result=json.dumps(result, ensure_ascii=False),
+    )
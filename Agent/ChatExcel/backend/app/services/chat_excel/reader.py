@@ -1,10 +1,16 @@
 """DuckDB Excel 读取器 — 支持同一会话多文件、多 sheet、多表分析。"""
 
+import codecs
+import functools
 import io
+import json
 import logging
 import os
 import re
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 
 import chardet
 import duckdb
@@ -41,6 +47,23 @@ def _detect_encoding(raw: bytes) -> str:
     return "utf-8"
 
 
+def _sniff_encoding(file_path: str, sample_size: int = None) -> str:
+    """只读取文件开头一段字节检测编码，避免大文件整体读入内存"""
+    sample_size = sample_size or config.INGEST_SNIFF_BYTES
+    with open(file_path, "rb") as f:
+        raw = f.read(sample_size)
+        truncated = bool(f.read(1))
+    if truncated:
+        # 截断处可能落在多字节字符中间，UTF-16 按偶数字节对齐，其余编码截到最后一个换行
+        if raw[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+            raw = raw[: len(raw) - len(raw) % 2]
+        else:
+            cut = raw.rfind(b"\n")
+            if cut > 0:
+                raw = raw[: cut + 1]
+    return _detect_encoding(raw)
+
+
 def excel_colunm_format(old_name: str) -> str:
     """空格替换为下划线"""
     return old_name.strip().replace(" ", "_")
@@ -190,9 +213,7 @@ def read_direct(db, file_path: str, file_name: str, table_name: str):
 
     # CSV 需要先检测编码，DuckDB 默认按 UTF-8 读取会导致非 UTF-8 文件乱码或报错
     if ext == ".csv":
-        with open(file_path, "rb") as f:
-            raw = f.read()
-        encoding = _detect_encoding(raw)
+        encoding = _sniff_encoding(file_path)
         load_func = "read_csv"
         load_params = {}
         if encoding.lower() not in ("utf-8", "utf8"):
@@ -221,16 +242,332 @@ def read_direct(db, file_path: str, file_name: str, table_name: str):
         return read_from_df(db, file_path, file_name, table_name)
 
 
+# ── 流式入库 ──────────────────────────────────────────────
+# 大文件不再整体读入 pandas：先以全 VARCHAR 落到 DuckDB 暂存表，再用一条 SQL 完成清洗与类型推断，
+# 峰值内存只与分块大小（或 DuckDB 自身的缓冲）相关，与文件大小无关。
+
+# DuckDB read_csv 原生支持的编码名称映射，其余编码交给 DuckDB encodings 扩展尝试
+_DUCKDB_ENCODINGS = {"utf-8": "utf-8", "utf8": "utf-8", "utf-8-sig": "utf-8", "ascii": "utf-8",
+                     "utf-16": "utf-16", "utf-16le": "utf-16", "utf-16be": "utf-16",
+                     "latin-1": "latin-1", "iso-8859-1": "latin-1"}
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _emit_progress(on_progress: Optional[Callable[[dict], None]], **event):
+    if not on_progress:
+        return
+    try:
+        on_progress(event)
+    except Exception as e:
+        logger.warning(f"Ingest progress callback failed: {e}")
+
+
+def _append_chunk(db, chunk: pd.DataFrame, staging_table: str, created: bool):
+    db.register("temp_chunk_df", chunk)
+    try:
+        if created:
+            db.execute(f"INSERT INTO {staging_table} SELECT * FROM temp_chunk_df")
+        else:
+            db.execute(f"CREATE TABLE {staging_table} AS SELECT * FROM temp_chunk_df")
+    finally:
+        db.unregister("temp_chunk_df")
+
+
+def _stream_csv_to_staging(db, file_path: str, staging_table: str, on_progress=None, **progress_info):
+    """CSV 以全 VARCHAR 读入暂存表：优先 DuckDB read_csv，失败时按固定行数分块读取。"""
+    total_bytes = os.path.getsize(file_path)
+    encoding = _sniff_encoding(file_path)
+    _emit_progress(on_progress, stage="sniff", encoding=encoding, total_bytes=total_bytes, **progress_info)
+
+    params = ["header=true", "all_varchar=true", "ignore_errors=true"]
+    params.append(f"encoding={_sql_literal(_DUCKDB_ENCODINGS.get(encoding.lower(), encoding.lower()))}")
+    try:
+        db.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        db.execute(f"CREATE TABLE {staging_table} AS SELECT * FROM read_csv({_sql_literal(file_path)}, {', '.join(params)})")
+        _emit_progress(on_progress, stage="load", bytes_read=total_bytes, total_bytes=total_bytes, **progress_info)
+        return
+    except Exception as e:
+        logger.warning(f"DuckDB read_csv failed, falling back to chunked pandas: {e}")
+
+    db.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    rows = 0
+    with open(file_path, "rb") as f:
+        chunks = pd.read_csv(f, index_col=False, encoding=encoding, on_bad_lines="skip",
+                             dtype=str, chunksize=config.INGEST_CHUNK_ROWS)
+        for idx, chunk in enumerate(chunks):
+            _append_chunk(db, chunk, staging_table, created=idx > 0)
+            rows += len(chunk)
+            _emit_progress(on_progress, stage="load", rows=rows, bytes_read=f.tell(), total_bytes=total_bytes, **progress_info)
+
+
+def _list_xlsx_sheets(file_path: str) -> List[str]:
+    """read_only 模式只解析工作簿目录，不加载单元格"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def _stream_xlsx_to_staging(db, file_path: str, sheet: str, staging_table: str, on_progress=None, **progress_info):
+    """XLSX 单个 sheet 以全 VARCHAR 读入暂存表：优先 DuckDB read_xlsx，失败时用 openpyxl 流式分块读取。"""
+    params = [f"sheet={_sql_literal(sheet)}", "all_varchar=true", "ignore_errors=true", "stop_at_empty=false"]
+    try:
+        db.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        db.execute(f"CREATE TABLE {staging_table} AS SELECT * FROM read_xlsx({_sql_literal(file_path)}, {', '.join(params)})")
+        _emit_progress(on_progress, stage="load", **progress_info)
+        return
+    except Exception as e:
+        logger.warning(f"DuckDB read_xlsx failed, falling back to chunked openpyxl: {e}")
+
+    import openpyxl
+
+    db.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        row_iter = wb[sheet].iter_rows(values_only=True)
+        header = next(row_iter, None)
+        if not header:
+            return
+        header_row = ["" if col is None else str(col) for col in header]
+        width = len(header_row)
+        columns = [f"__col_{idx}" for idx in range(width)]
+        buffer, rows, created = [], 0, False
+        for row in row_iter:
+            values = [None if val is None else str(val) for val in row[:width]]
+            buffer.append(values + [None] * (width - len(values)))
+            if len(buffer) >= config.INGEST_CHUNK_ROWS:
+                _append_chunk(db, pd.DataFrame(buffer, columns=columns, dtype=object), staging_table, created)
+                created, rows, buffer = True, rows + len(buffer), []
+                _emit_progress(on_progress, stage="load", rows=rows, **progress_info)
+        if buffer or not created:
+            _append_chunk(db, pd.DataFrame(buffer, columns=columns, dtype=object), staging_table, created)
+            rows += len(buffer)
+            _emit_progress(on_progress, stage="load", rows=rows, **progress_info)
+        # 分块时列名用占位符保证位置对齐，最后再改回表头
+        for placeholder, name in zip(columns, _dedupe_columns(header_row)):
+            db.execute(f'ALTER TABLE {staging_table} RENAME COLUMN "{placeholder}" TO "{name}"')
+    finally:
+        wb.close()
+
+
+def _clean_staging_table(db, staging_table: str, table_name: str) -> int:
+    """SQL 版 _clean_dataframe：空串转 NULL、删除全空行/列、列名规范化、日期/数值类型推断。
+
+    类型推断只做一次聚合扫描，返回清洗后的行数；结果为空时不建表并返回 0。
+    """
+    exists = db.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ? AND schema_name = 'main'", [staging_table]
+    ).fetchone()[0]
+    if not exists:
+        return 0
+    old_columns = [row[0] for row in db.execute(f"DESCRIBE {staging_table}").fetchall()]
+    new_columns = _dedupe_columns([excel_colunm_format(str(col)) for col in old_columns])
+    values = [f"NULLIF(CAST(\"{col.replace(chr(34), chr(34) * 2)}\" AS VARCHAR), '')" for col in old_columns]
+    if not values:
+        db.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        return 0
+
+    stats_exprs = []
+    for value in values:
+        stats_exprs.extend([
+            f"COUNT({value})",
+            f"COUNT(TRY_CAST({value} AS TIMESTAMP))",
+            # TRY_CAST 会把 '1.5' 四舍五入成 BIGINT，整数列需先用正则确认
+            f"COUNT(CASE WHEN regexp_full_match(TRIM({value}), '[+-]?[0-9]+') THEN TRY_CAST({value} AS BIGINT) END)",
+            f"COUNT(TRY_CAST({value} AS DOUBLE))",
+        ])
+    stats = db.execute(f"SELECT {', '.join(stats_exprs)} FROM {staging_table}").fetchone()
+
+    select_list = []
+    for idx, (value, new_name) in enumerate(zip(values, new_columns)):
+        non_null, as_ts, as_int, as_num = stats[idx * 4: idx * 4 + 4]
+        if not non_null:
+            continue
+        if as_ts == non_null:
+            expr = f"strftime(TRY_CAST({value} AS TIMESTAMP), '%Y-%m-%d')"
+        elif as_int == non_null:
+            expr = f"TRY_CAST({value} AS BIGINT)"
+        elif as_num == non_null:
+            expr = f"TRY_CAST({value} AS DOUBLE)"
+        else:
+            expr = value
+        select_list.append(f"{expr} AS \"{new_name.replace(chr(34), chr(34) * 2)}\"")
+
+    row_count = 0
+    if select_list:
+        db.execute(f"DROP TABLE IF EXISTS {table_name}")
+        db.execute(
+            f"CREATE TABLE {table_name} AS SELECT {', '.join(select_list)} FROM {staging_table} "
+            f"WHERE COALESCE({', '.join(values)}) IS NOT NULL"
+        )
+        row_count = db.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        if not row_count:
+            db.execute(f"DROP TABLE {table_name}")
+    db.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    return row_count
+
+
+# ── 会话读取器注册表 ──────────────────────────────────────
+# 每个会话一个 DuckDB 文件；注册表限制同时打开的连接数，按 LRU 淘汰、空闲超时关闭，
+# 读取器对象本身保留（表信息很轻），下次访问 db 时透明地重新打开对应的 .duckdb 文件。
+
+
+def _pinned(func):
+    """执行期间固定连接，避免长查询/入库过程中被注册表淘汰关闭"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        reader_registry.pin(self)
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            reader_registry.unpin(self)
+    return wrapper
+
+
+class ReaderRegistry:
+    """ExcelReader 注册表：连接数上限 + 空闲 TTL + LRU 淘汰，并统计命中/未命中/淘汰次数。"""
+
+    def __init__(self, max_open: int, idle_ttl: float, memory_limit: str = "", threads: int = 0):
+        self.max_open = max_open
+        self.idle_ttl = idle_ttl
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self._readers: "OrderedDict[str, ExcelReader]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, conv_uid: str) -> "ExcelReader":
+        self.evict_idle()
+        with self._lock:
+            reader = self._readers.get(conv_uid)
+            if reader is not None and reader.is_open:
+                self.hits += 1
+                self._touch_locked(conv_uid)
+                return reader
+            if reader is None:
+                reader = ExcelReader(conv_uid)
+                self._readers[conv_uid] = reader
+            return reader
+
+    def connect(self, reader: "ExcelReader") -> duckdb.DuckDBPyConnection:
+        """打开（或重新打开）会话的 DuckDB 文件，并按连接数上限淘汰最久未用的连接"""
+        duck_config = {}
+        if self.memory_limit:
+            duck_config["memory_limit"] = self.memory_limit
+        if self.threads:
+            duck_config["threads"] = self.threads
+        db = duckdb.connect(database=reader.db_path, read_only=False, config=duck_config)
+        with self._lock:
+            self.misses += 1
+            self._readers.setdefault(reader.conv_uid, reader)
+            self._touch_locked(reader.conv_uid)
+            self._evict_over_capacity_locked(keep=reader.conv_uid)
+        return db
+
+    def touch(self, reader: "ExcelReader"):
+        with self._lock:
+            if self._readers.get(reader.conv_uid) is reader:
+                self._touch_locked(reader.conv_uid)
+
+    def _touch_locked(self, conv_uid: str):
+        self._readers.move_to_end(conv_uid)
+        self._last_access[conv_uid] = time.monotonic()
+
+    def pin(self, reader: "ExcelReader"):
+        with self._lock:
+            self._pins[reader.conv_uid] = self._pins.get(reader.conv_uid, 0) + 1
+
+    def unpin(self, reader: "ExcelReader"):
+        with self._lock:
+            count = self._pins.get(reader.conv_uid, 0) - 1
+            if count > 0:
+                self._pins[reader.conv_uid] = count
+            else:
+                self._pins.pop(reader.conv_uid, None)
+            self._last_access[reader.conv_uid] = time.monotonic()
+
+    def _evict_over_capacity_locked(self, keep: str):
+        # keep 是正在打开的会话，此时其连接尚未赋值，但要计入占用
+        open_readers = [uid for uid, r in self._readers.items() if r.is_open or uid == keep]
+        overflow = len(open_readers) - self.max_open
+        for conv_uid in open_readers:
+            if overflow <= 0:
+                break
+            if conv_uid == keep or self._pins.get(conv_uid):
+                continue
+            self._readers[conv_uid].release_connection()
+            self.evictions += 1
+            overflow -= 1
+
+    def evict_idle(self):
+        """关闭空闲超过 TTL 的连接"""
+        if self.idle_ttl <= 0:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        with self._lock:
+            for conv_uid, reader in self._readers.items():
+                if not reader.is_open or self._pins.get(conv_uid):
+                    continue
+                if self._last_access.get(conv_uid, 0) < deadline:
+                    reader.release_connection()
+                    self.evictions += 1
+
+    def discard(self, reader: "ExcelReader"):
+        with self._lock:
+            if self._readers.get(reader.conv_uid) is reader:
+                del self._readers[reader.conv_uid]
+                self._last_access.pop(reader.conv_uid, None)
+                self._pins.pop(reader.conv_uid, None)
+
+    def get(self, conv_uid: str) -> Optional["ExcelReader"]:
+        with self._lock:
+            return self._readers.get(conv_uid)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "readers": len(self._readers),
+                "open_connections": sum(1 for r in self._readers.values() if r.is_open),
+                "max_open": self.max_open,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+reader_registry = ReaderRegistry(
+    max_open=config.DUCKDB_MAX_OPEN_CONNECTIONS,
+    idle_ttl=config.DUCKDB_IDLE_TTL_SECONDS,
+    memory_limit=config.DUCKDB_MEMORY_LIMIT,
+    threads=config.DUCKDB_THREADS,
+)
+
+
+# 表元数据缓存（DDL、列信息、表注释、SUMMARIZE）持久化在会话 DuckDB 文件中，
+# 按表版本号失效：add_file 建表、transform_table/回退复制建表时版本号 +1
+_META_CACHE_TABLE = "__table_meta_cache"
+_META_VERSION_TABLE = "__table_versions"
+
+
 class ExcelReader:
     """会话级 Excel 读取器：一个文件/Sheet 对应一张 DuckDB 表。"""
 
-    _instances: Dict[str, "ExcelReader"] = {}
-
     @classmethod
     def get_or_create(cls, conv_uid: str, file_path: str = "", file_name: str = None) -> "ExcelReader":
-        if conv_uid not in cls._instances:
-            cls._instances[conv_uid] = cls(conv_uid)
-        reader = cls._instances[conv_uid]
+        reader = reader_registry.get_or_create(conv_uid)
         if file_path:
             reader.add_file(file_path, file_name)
         return reader
@@ -243,9 +580,43 @@ class ExcelReader:
         self.table_infos: List[dict] = []
         self._transformed = False
 
-        db_path = os.path.join(config.DUCKDB_DIR, f"_chat_excel_{conv_uid}.duckdb")
-        self.db: duckdb.DuckDBPyConnection = duckdb.connect(database=db_path, read_only=False)
+        self.db_path = os.path.join(config.DUCKDB_DIR, f"_chat_excel_{conv_uid}.duckdb")
+        self._db: Optional[duckdb.DuckDBPyConnection] = None
+        self._closed = False
+        self._db_lock = threading.Lock()
+        self._meta_cache: Dict[Tuple[str, str], Tuple[int, object]] = {}
+        self._table_versions: Dict[str, int] = {}
         self._load_existing_tables()
+        self._init_meta_cache()
+
+    @property
+    def db(self) -> duckdb.DuckDBPyConnection:
+        """会话连接；被注册表淘汰后在下次访问时透明重连"""
+        if self._closed:
+            raise ValueError(f"ExcelReader for conversation {self.conv_uid} is closed")
+        if self._db is None:
+            with self._db_lock:
+                if self._db is None:
+                    self._db = reader_registry.connect(self)
+                    return self._db
+        reader_registry.touch(self)
+        return self._db
+
+    @property
+    def is_open(self) -> bool:
+        return self._db is not None
+
+    def release_connection(self):
+        """仅关闭底层连接（注册表淘汰用），读取器仍可继续使用。
+
+        注册表持锁调用，这里不能再取 _db_lock，否则会与重连路径互相等待。
+        """
+        db, self._db = self._db, None
+        if db is not None:
+            try:
+                db.close()
+            except Exception as e:
+                logger.warning(f"Failed to close DuckDB connection for {self.conv_uid}: {e}")
 
     def _load_existing_tables(self):
         try:
@@ -267,13 +638,76 @@ class ExcelReader:
         except Exception as e:
             logger.warning(f"Failed to load existing tables: {e}")
 
+    def _init_meta_cache(self):
+        try:
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {_META_VERSION_TABLE} (table_name VARCHAR PRIMARY KEY, version BIGINT)"
+            )
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {_META_CACHE_TABLE} ("
+                "table_name VARCHAR, kind VARCHAR, version BIGINT, payload VARCHAR, PRIMARY KEY (table_name, kind))"
+            )
+            rows = self.db.execute(f"SELECT table_name, version FROM {_META_VERSION_TABLE}").fetchall()
+            self._table_versions = {row[0]: row[1] for row in rows}
+        except Exception as e:
+            logger.warning(f"Failed to init table metadata cache: {e}")
+
+    def table_version(self, table_name: str) -> int:
+        return self._table_versions.get(table_name, 0)
+
+    def _bump_table_version(self, table_name: str, conn: Optional[duckdb.DuckDBPyConnection] = None):
+        """表结构或注释发生变化时调用，使该表的元数据缓存失效；conn 为调用方线程自己的 cursor"""
+        conn = conn or self.db
+        version = self.table_version(table_name) + 1
+        self._table_versions[table_name] = version
+        for key in [key for key in self._meta_cache if key[0] == table_name]:
+            self._meta_cache.pop(key, None)
+        try:
+            conn.execute(f"INSERT OR REPLACE INTO {_META_VERSION_TABLE} VALUES (?, ?)", [table_name, version])
+            conn.execute(f"DELETE FROM {_META_CACHE_TABLE} WHERE table_name = ?", [table_name])
+        except Exception as e:
+            logger.warning(f"Failed to persist table version for {table_name}: {e}")
+
+    def _cached_meta(self, table_name: str, kind: str, builder: Callable[[], object]):
+        """按 (表名, 类型) 读取元数据：内存缓存 -> 会话 DuckDB 持久缓存 -> builder 现算并回写"""
+        version = self.table_version(table_name)
+        key = (table_name, kind)
+        cached = self._meta_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        try:
+            row = self.db.execute(
+                f"SELECT version, payload FROM {_META_CACHE_TABLE} WHERE table_name = ? AND kind = ?",
+                [table_name, kind],
+            ).fetchone()
+        except Exception as e:
+            logger.warning(f"Failed to read table metadata cache: {e}")
+            row = None
+        if row and row[0] == version:
+            value = json.loads(row[1])
+        else:
+            value = builder()
+            try:
+                self.db.execute(
+                    f"INSERT OR REPLACE INTO {_META_CACHE_TABLE} VALUES (?, ?, ?, ?)",
+                    [table_name, kind, version, json.dumps(value, ensure_ascii=False, default=str)],
+                )
+            except Exception as e:
+                logger.warning(f"Failed to write table metadata cache: {e}")
+        self._meta_cache[key] = (version, value)
+        return value
+
     def close(self):
-        if self.db:
-            self.db.close()
-            self.db = None
+        """关闭连接并从注册表移除，之后不再重连"""
+        self.release_connection()
+        self._closed = True
+        reader_registry.discard(self)
 
     def __del__(self):
-        self.close()
+        try:
+            self.close()
+        except Exception:
+            pass
 
     @property
     def curr_table(self) -> str:
@@ -298,30 +732,51 @@ class ExcelReader:
         self._transformed = bool(self.table_infos) and all(info.get("transformed") for info in self.table_infos)
         return pending
 
-    def _table_exists(self, table_name: str) -> bool:
+    def _table_exists(self, table_name: str, conn: Optional[duckdb.DuckDBPyConnection] = None) -> bool:
         try:
-            self.db.sql(f"SELECT 1 FROM {table_name} LIMIT 1")
+            (conn or self.db).sql(f"SELECT 1 FROM {table_name} LIMIT 1")
             return True
         except Exception:
             return False
 
-    def _unique_table_name(self, base: str) -> str:
+    def _unique_table_name(self, base: str, conn: Optional[duckdb.DuckDBPyConnection] = None) -> str:
         name = base
         idx = 2
-        while self._table_exists(name) or any(info["temp_table"] == name or info["table_name"] == name for info in self.table_infos):
+        while self._table_exists(name, conn) or any(info["temp_table"] == name or info["table_name"] == name for info in self.table_infos):
             name = f"{base}_{idx}"
             idx += 1
         return name
 
-    def _register_dataframe(self, df: pd.DataFrame, table_name: str):
-        self.db.register("temp_df_table", df)
-        self.db.execute(f"CREATE TABLE {table_name} AS SELECT * FROM temp_df_table")
+    def _register_dataframe(self, df: pd.DataFrame, table_name: str, conn: Optional[duckdb.DuckDBPyConnection] = None):
+        conn = conn or self.db
+        conn.register("temp_df_table", df)
+        conn.execute(f"CREATE TABLE {table_name} AS SELECT * FROM temp_df_table")
         try:
-            self.db.unregister("temp_df_table")
+            conn.unregister("temp_df_table")
         except Exception:
             pass
-
-    def add_file(self, file_path: str, file_name: Optional[str] = None) -> List[dict]:
+        self._bump_table_version(table_name, conn)
+
+    def _allocate_table_names(self, base: str, conn: Optional[duckdb.DuckDBPyConnection] = None) -> Tuple[str, str]:
+        suffix = self._unique_table_name(base, conn).replace("temp_", "")
+        temp_table = self._unique_table_name(f"temp_{suffix}", conn)
+        table_name = self._unique_table_name(f"data_analysis_{suffix}", conn)
+        return temp_table, table_name
+
+    @_pinned
+    def add_file(
+        self,
+        file_path: str,
+        file_name: Optional[str] = None,
+        on_progress: Optional[Callable[[dict], None]] = None,
+        streaming: Optional[bool] = None,
+    ) -> List[dict]:
+        """加载文件，每个非空 sheet 生成一张待学习的 temp 表。
+
+        streaming 为 None 时按 INGEST_STREAMING_THRESHOLD_MB 自动选择；流式模式下
+        on_progress 会收到 sniff/load/clean/done 阶段的进度事件。
+        上传接口在线程中调用，入库全程使用独立 cursor，不与事件循环上的查询共用会话连接。
+        """
         if not file_name:
             file_name = os.path.basename(file_path)
         file_path = os.path.abspath(file_path)
@@ -332,8 +787,23 @@ class ExcelReader:
 
         ext = os.path.splitext(file_path)[1].lower()
         file_key = _safe_identifier(os.path.splitext(file_name)[0], "excel")
-        added = []
+        if streaming is None:
+            streaming = os.path.getsize(file_path) >= config.INGEST_STREAMING_THRESHOLD_MB * 1024 * 1024
+        cursor = self.db.cursor()
+        try:
+            if streaming and ext in (".csv", ".xlsx"):
+                added = self._add_file_streaming(cursor, file_path, file_name, file_key, ext, on_progress)
+            else:
+                added = self._add_file_in_memory(cursor, file_path, file_name, file_key, ext)
+        finally:
+            cursor.close()
+        self.table_infos.extend(added)
+        self._transformed = bool(self.table_infos) and all(info.get("transformed") for info in self.table_infos)
+        return added
 
+    def _add_file_in_memory(self, conn: duckdb.DuckDBPyConnection, file_path: str, file_name: str, file_key: str, ext: str) -> List[dict]:
+        """小文件整表读入 pandas 清洗后注册为 temp 表"""
+        added = []
         if ext == ".csv":
             with open(file_path, "rb") as f:
                 raw = f.read()
@@ -341,10 +811,8 @@ class ExcelReader:
             df = pd.read_csv(io.BytesIO(raw), index_col=False, encoding=encoding, on_bad_lines="skip")
             df = _clean_dataframe(df)
             if not df.empty:
-                suffix = self._unique_table_name(f"{file_key}_csv").replace("temp_", "")
-                temp_table = self._unique_table_name(f"temp_{suffix}")
-                table_name = self._unique_table_name(f"data_analysis_{suffix}")
-                self._register_dataframe(df, temp_table)
+                temp_table, table_name = self._allocate_table_names(f"{file_key}_csv", conn)
+                self._register_dataframe(df, temp_table, conn)
                 added.append({"file_path": file_path, "file_name": file_name, "sheet_name": "CSV", "temp_table": temp_table, "table_name": table_name, "transformed": False})
         elif ext in (".xlsx", ".xls"):
             xls = pd.ExcelFile(file_path)
@@ -354,18 +822,43 @@ class ExcelReader:
                 if df.empty:
                     continue
                 sheet_key = _safe_identifier(sheet_name, f"sheet_{sheet_idx}")
-                suffix = self._unique_table_name(f"{file_key}_{sheet_key}").replace("temp_", "")
-                temp_table = self._unique_table_name(f"temp_{suffix}")
-                table_name = self._unique_table_name(f"data_analysis_{suffix}")
-                self._register_dataframe(df, temp_table)
+                temp_table, table_name = self._allocate_table_names(f"{file_key}_{sheet_key}", conn)
+                self._register_dataframe(df, temp_table, conn)
                 added.append({"file_path": file_path, "file_name": file_name, "sheet_name": sheet_name, "temp_table": temp_table, "table_name": table_name, "transformed": False})
         else:
             raise ValueError(f"Unsupported file format: {ext}")
+        return added
 
-        self.table_infos.extend(added)
-        self._transformed = bool(self.table_infos) and all(info.get("transformed") for info in self.table_infos)
+    def _add_file_streaming(self, conn: duckdb.DuckDBPyConnection, file_path: str, file_name: str, file_key: str, ext: str, on_progress=None) -> List[dict]:
+        """流式入库：不在 Python 侧持有整表数据，清洗与类型推断在 DuckDB 中完成。"""
+        if ext == ".csv":
+            sheets = [("CSV", "csv")]
+        else:
+            sheets = [(name, _safe_identifier(name, f"sheet_{idx}")) for idx, name in enumerate(_list_xlsx_sheets(file_path), 1)]
+
+        added = []
+        for sheet_name, sheet_key in sheets:
+            temp_table, table_name = self._allocate_table_names(f"{file_key}_{sheet_key}", conn)
+            staging_table = f"__ingest_{temp_table}"
+            progress_info = {"file_name": file_name, "sheet_name": sheet_name, "table_name": temp_table}
+            try:
+                if ext == ".csv":
+                    _stream_csv_to_staging(conn, file_path, staging_table, on_progress, **progress_info)
+                else:
+                    _stream_xlsx_to_staging(conn, file_path, sheet_name, staging_table, on_progress, **progress_info)
+                _emit_progress(on_progress, stage="clean", **progress_info)
+                row_count = _clean_staging_table(conn, staging_table, temp_table)
+            except Exception:
+                conn.execute(f"DROP TABLE IF EXISTS {staging_table}")
+                raise
+            _emit_progress(on_progress, stage="done", rows=row_count, **progress_info)
+            if not row_count:
+                continue
+            self._bump_table_version(temp_table, conn)
+            added.append({"file_path": file_path, "file_name": file_name, "sheet_name": sheet_name, "temp_table": temp_table, "table_name": table_name, "transformed": False})
         return added
 
+    @_pinned
     def transform_table(self, transform_data: dict, table_info: dict = None) -> str:
         table_info = table_info or (self.table_infos[0] if self.table_infos else None)
         if not table_info:
@@ -378,7 +871,7 @@ class ExcelReader:
 
         if not columns:
             logger.warning("column_analysis is empty, falling back to direct copy")
-            return self._fallback_copy_table(table_info)
+            return self._fallback_after_failed_transform(table_info)
 
         try:
             _, cl_datas = self.get_columns(old_table_name)
@@ -402,7 +895,7 @@ class ExcelReader:
                 create_columns.append(f"{new_column_name} {new_column_type}")
 
             if not select_sql_list:
-                return self._fallback_copy_table(table_info)
+                return self._fallback_after_failed_transform(table_info)
 
             create_table_str = f"CREATE TABLE {new_table_name}(\n{', '.join(create_columns)}\n);"
             sql = f"""
@@ -429,18 +922,41 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
                 except Exception as e:
                     logger.warning(f"Error while adding comment to column {new_column_name}: {e}")
 
+            self._bump_table_version(new_table_name)
             table_info["transformed"] = True
+            table_info["transform_failed"] = False
             self._transformed = all(info.get("transformed") for info in self.table_infos)
             return new_table_name
         except Exception as e:
             logger.error(f"transform_table failed, falling back to direct copy: {e}", exc_info=True)
-            return self._fallback_copy_table(table_info)
+            # CREATE 成功但 INSERT 失败时会留下空表，先删掉再按原始字段复制
+            try:
+                self.db.execute(f"DROP TABLE IF EXISTS {new_table_name}")
+            except Exception as drop_error:
+                logger.warning(f"Failed to drop partially transformed table {new_table_name}: {drop_error}")
+            return self._fallback_after_failed_transform(table_info)
+
+    def _fallback_after_failed_transform(self, table_info: dict) -> str:
+        """学习结果没能套用：按原始字段复制，并标记 transform_failed 供调用方区分"""
+        table_info["transform_failed"] = True
+        return self._fallback_copy_table(table_info)
+
+    @_pinned
+    def reset_transform(self, table_info: dict) -> None:
+        """撤销 transform_table / _fallback_copy_table 生成的表，该表回到待学习状态"""
+        self.db.execute(f"DROP TABLE IF EXISTS {table_info['table_name']}")
+        self._bump_table_version(table_info["table_name"])
+        table_info["transformed"] = False
+        table_info.pop("transform_failed", None)
+        self._transformed = False
 
+    @_pinned
     def _fallback_copy_table(self, table_info: dict = None) -> str:
         table_info = table_info or (self.table_infos[0] if self.table_infos else None)
         if not table_info:
             try:
                 self.db.sql(f"CREATE TABLE {self.table_name} AS SELECT * FROM {self.temp_table_name}")
+                self._bump_table_version(self.table_name)
                 self._transformed = True
             except Exception as e:
                 logger.error(f"Fallback copy failed: {e}")
@@ -448,19 +964,52 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
 
         try:
             self.db.sql(f"CREATE TABLE {table_info['table_name']} AS SELECT * FROM {table_info['temp_table']}")
+            self._bump_table_version(table_info["table_name"])
         except Exception as e:
             logger.warning(f"Fallback copy may already exist: {e}")
         table_info["transformed"] = True
         self._transformed = all(info.get("transformed") for info in self.table_infos)
         return table_info["table_name"]
 
-    def run(self, sql: str, table_name: str = None, df_res: bool = False, transform: bool = True):
+    @_pinned
+    def export_table_snapshot(self, file_path: str, target_dir: str) -> Optional[str]:
+        """把某个已入库文件（多 sheet 时取第一个）的清洗后数据导出为 Parquet 快照，供 Skill 子进程读取。
+
+        会话 .duckdb 文件由后端以读写方式持有，子进程无法直接打开；快照按表版本命名，版本不变时复用。
+        """
+        file_path = os.path.abspath(file_path)
+        table_info = next((info for info in self.table_infos if info.get("file_path") == file_path), None)
+        if not table_info:
+            return None
+        temp_table = table_info["temp_table"]
+        snapshot = os.path.join(target_dir, f"_snapshot_{temp_table}_v{self.table_version(temp_table)}.parquet")
+        if os.path.exists(snapshot):
+            return snapshot
+        tmp_path = f"{snapshot}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # 由 Skill 执行线程调用，使用独立 cursor，不与其他线程共用会话连接
+        cursor = self.db.cursor()
+        try:
+            cursor.execute(f"COPY (SELECT * FROM {temp_table}) TO {_sql_literal(tmp_path)} (FORMAT PARQUET)")
+            os.replace(tmp_path, snapshot)
+        finally:
+            cursor.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return snapshot
+
+    def prepare_sql(self, sql: str, table_name: str = None, transform: bool = True) -> str:
+        """执行前的 SQL 规整：去掉表名多余引号、给中文列名加引号"""
         table_name = table_name or self.curr_table
+        if table_name and f'"{table_name}"' in sql:
+            sql = sql.replace(f'"{table_name}"', table_name)
+        if transform:
+            sql = add_quotes_to_chinese_columns(sql)
+        return sql
+
+    @_pinned
+    def run(self, sql: str, table_name: str = None, df_res: bool = False, transform: bool = True):
         try:
-            if table_name and f'"{table_name}"' in sql:
-                sql = sql.replace(f'"{table_name}"', table_name)
-            if transform:
-                sql = add_quotes_to_chinese_columns(sql)
+            sql = self.prepare_sql(sql, table_name, transform)
             logger.info(f"Executing SQL: {sql}")
             if df_res:
                 return self.db.sql(sql).df()
@@ -469,6 +1018,7 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
             logger.error(f"SQL execution error: {e}")
             raise ValueError(f"Data Query Exception!\nSQL[{sql}].\nError: {e}")
 
+    @_pinned
     def _run_sql(self, sql: str) -> Tuple[List[str], List]:
         results = self.db.sql(sql)
         columns = [desc[0] for desc in results.description]
@@ -497,12 +1047,18 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
         return samples
 
     def get_create_table_sql(self, table_name: str = None) -> str:
-        """生成包含表注释和列注释的 CREATE TABLE DDL。"""
+        """生成包含表注释和列注释的 CREATE TABLE DDL（按表版本缓存）。"""
         table_name = table_name or self.curr_table
-        sql = f"""SELECT comment, table_name, database_name FROM duckdb_tables()
-                  WHERE table_name = '{table_name}'"""
-        _, datas = self._run_sql(sql)
-        table_comment = datas[0][0] if datas else ""
+        return self._cached_meta(table_name, "ddl", lambda: self._build_create_table_sql(table_name))
+
+    def _get_table_comment(self, table_name: str) -> str:
+        def _build():
+            _, datas = self._run_sql(f"SELECT comment FROM duckdb_tables() WHERE table_name = '{table_name}'")
+            return datas[0][0] if datas else ""
+        return self._cached_meta(table_name, "comment", _build)
+
+    def _build_create_table_sql(self, table_name: str) -> str:
+        table_comment = self._get_table_comment(table_name)
 
         _, cl_datas = self.get_columns(table_name)
         ddl_sql = f"CREATE TABLE {table_name} (\n"
@@ -595,9 +1151,7 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
                 continue
             table_name = info["table_name"]
             # 表注释
-            sql = f"""SELECT comment FROM duckdb_tables() WHERE table_name = '{table_name}'"""
-            _, t_datas = self._run_sql(sql)
-            table_comment = t_datas[0][0] if t_datas else ""
+            table_comment = self._get_table_comment(table_name)
             # 列名 + 列注释
             _, cl_datas = self.get_columns(table_name)
             columns = []
@@ -618,8 +1172,11 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
         return index
 
     def get_columns(self, table_name: str = None):
-        """获取表的列信息，包含列名、类型、是否可空、列注释。"""
+        """获取表的列信息，包含列名、类型、是否可空、列注释（按表版本缓存）。"""
         table_name = table_name or self.curr_table
+        return self._cached_meta(table_name, "columns", lambda: self._query_columns(table_name))
+
+    def _query_columns(self, table_name: str):
         sql = f"""
         SELECT dc.column_name, dc.data_type AS column_type,
                CASE WHEN dc.is_nullable THEN 'YES' ELSE 'NO' END AS "null",
@@ -630,8 +1187,13 @@ INSERT INTO {new_table_name} SELECT {', '.join(select_sql_list)} FROM {old_table
         return self._run_sql(sql)
 
     def get_summary(self, table_name: str = None) -> str:
+        """SUMMARIZE 需要全表扫描，结果按表版本缓存"""
         table_name = table_name or self.curr_table
-        return self.run(f"SUMMARIZE {table_name}", df_res=True, transform=False).to_json(force_ascii=False)
+        return self._cached_meta(
+            table_name,
+            "summary",
+            lambda: self.run(f"SUMMARIZE {table_name}", df_res=True, transform=False).to_json(force_ascii=False),
+        )
 
     def get_row_count(self, table_name: str = None) -> int:
         table_name = table_name or self.curr_table
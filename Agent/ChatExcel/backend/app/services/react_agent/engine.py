@@ -182,6 +182,9 @@ class ReactEngine:
         self._todo_tool_count: int = 0
         # 最近一次自动推进的 todo 索引，用于通知 LLM
         self._last_auto_advanced_idx: Optional[int] = None
+        # 精简历史缓存：已配对的轮次及已读取到的最后一条消息 order_no（本次运行内增量追加）
+        self._history_lines: List[str] = []
+        self._history_since: Optional[int] = None
 
     # ── todo 轮次计数兜底 ────────────────────────────────────
 
@@ -238,55 +241,69 @@ class ReactEngine:
         self._todo_tool_count = 0
         return active_idx
 
+    @staticmethod
+    def _format_history_round(human_msg: dict, ai_msg: Optional[dict]) -> str:
+        """把一轮 human 问题 + ai 消息(含 finalContent)格式化为一行精简历史"""
+        question = human_msg["content"][:200]  # 截断过长的问题
+        final_content = ""
+        if ai_msg is not None:
+            metadata_str = ai_msg.get("metadata", "")
+            if metadata_str:
+                try:
+                    metadata = json.loads(metadata_str) if isinstance(metadata_str, str) else metadata_str
+                    final_content = metadata.get("finalContent", "") or ""
+                except (json.JSONDecodeError, TypeError):
+                    pass
+        if final_content:
+            final_content = final_content[:500]  # 截断过长的结论
+            return f"- 用户问: {question}\n  结论: {final_content}"
+        return f"- 用户问: {question}\n  结论: (分析未完成)"
+
     async def _build_conversation_history(self) -> str:
         """从 DB 读取历史消息,提取每轮"用户问题 + finalContent"拼成精简历史
 
         精简历史只包含结论性文字,不带 ReAct 中间过程,
         避免裸露的 terminate(result=xxx) 触发 LLM 抄答案。
+
+        本次运行内增量维护:已配对的轮次缓存在 _history_lines,
+        每次只读取 order_no 大于 _history_since 的新消息并追加,不再整表重读、重复解析 metadata。
+        末尾还没有 ai 回复的问题不计入缓存,下次连同新消息一起重新读取。
         """
         try:
-            history_msgs = await get_messages(self.conv_uid)
+            new_msgs = await get_messages(self.conv_uid, since=self._history_since)
         except Exception as e:
-            self.logger.warning("读取历史消息失败,跳过精简历史: %s", e)
-            return ""
-
-        if not history_msgs:
-            return ""
+            self.logger.warning("读取历史消息失败,跳过新增历史: %s", e)
+            new_msgs = []
 
         # 按 order_no 配对: human 问题 + 紧随其后的 ai 消息(含 finalContent)
-        lines = []
+        tail_line = ""
+        added = 0
         i = 0
-        while i < len(history_msgs):
-            msg = history_msgs[i]
+        while i < len(new_msgs):
+            msg = new_msgs[i]
             if msg.get("role") == "human" and msg.get("content"):
-                question = msg["content"][:200]  # 截断过长的问题
-                # 找紧随其后的 ai 消息
-                final_content = ""
-                if i + 1 < len(history_msgs) and history_msgs[i + 1].get("role") == "ai":
-                    ai_msg = history_msgs[i + 1]
-                    metadata_str = ai_msg.get("metadata", "")
-                    if metadata_str:
-                        try:
-                            metadata = json.loads(metadata_str) if isinstance(metadata_str, str) else metadata_str
-                            final_content = metadata.get("finalContent", "") or ""
-                        except (json.JSONDecodeError, TypeError):
-                            pass
+                if i + 1 >= len(new_msgs):
+                    # 末尾的问题暂未回答,只临时展示,不推进 _history_since
+                    tail_line = self._format_history_round(msg, None)
+                    break
+                if new_msgs[i + 1].get("role") == "ai":
+                    self._history_lines.append(self._format_history_round(msg, new_msgs[i + 1]))
                     i += 2  # 跳过 ai 消息
                 else:
+                    self._history_lines.append(self._format_history_round(msg, None))
                     i += 1
-                if final_content:
-                    final_content = final_content[:500]  # 截断过长的结论
-                    lines.append(f"- 用户问: {question}\n  结论: {final_content}")
-                else:
-                    lines.append(f"- 用户问: {question}\n  结论: (分析未完成)")
+                added += 1
             else:
                 i += 1
+            self._history_since = new_msgs[i - 1]["order_no"]
 
+        lines = self._history_lines + ([tail_line] if tail_line else [])
         if not lines:
             return ""
 
         history_text = "\n".join(lines)
-        self.logger.info("精简历史已构建: %d 轮对话", len(lines))
+        if added or tail_line:
+            self.logger.info("精简历史已构建: %d 轮对话(新增 %d 轮)", len(lines), added)
         return history_text
 
     async def _build_system_prompt(self) -> str:
@@ -1,16 +1,20 @@
 """轻量级 Skill 支持：只服务 ReAct Excel/CSV 数据分析场景。"""
 
 import json
+import logging
 import os
 import re
 import subprocess
 import sys
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.core import config
 
+logger = logging.getLogger(__name__)
+
 DATA_ANALYSIS_KEYWORDS = {
     "csv",
     "excel",
@@ -75,24 +79,87 @@ def _is_data_analysis_skill(skill: SkillInfo) -> bool:
     return any(keyword.lower() in text for keyword in DATA_ANALYSIS_KEYWORDS)
 
 
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class _SkillRegistry:
+    """按 mtime 缓存的 skill 列表
+
+    每次访问只 stat skills 目录、各子目录下的 SKILL.md（含尚不存在的），
+    都未变化时直接返回缓存；目录增删子目录或任一 SKILL.md 新增/修改/删除时才重新扫描解析。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._skills_dir: Optional[str] = None
+        self._dir_mtime: Optional[int] = None
+        self._file_mtimes: Tuple[Tuple[Path, Optional[int]], ...] = ()
+        self._skills: List[SkillInfo] = []
+        self._by_name: Dict[str, SkillInfo] = {}
+
+    def _is_fresh(self, skills_dir: Path) -> bool:
+        if self._skills_dir != str(skills_dir) or self._dir_mtime != _mtime_ns(skills_dir):
+            return False
+        return all(_mtime_ns(path) == mtime for path, mtime in self._file_mtimes)
+
+    def _reload(self, skills_dir: Path) -> None:
+        dir_mtime = _mtime_ns(skills_dir)
+        candidates = sorted(sub / "SKILL.md" for sub in skills_dir.iterdir() if sub.is_dir()) if dir_mtime else []
+        file_mtimes = tuple((path, _mtime_ns(path)) for path in candidates)
+        skills: List[SkillInfo] = []
+        for path, mtime in file_mtimes:
+            if mtime is None:
+                continue
+            skill = _parse_skill_md(path)
+            if skill and _is_data_analysis_skill(skill):
+                skills.append(skill)
+        self._skills = sorted(skills, key=lambda item: item.name)
+        self._by_name = {}
+        for skill in self._skills:
+            self._by_name.setdefault(skill.name.lower(), skill)
+        self._skills_dir = str(skills_dir)
+        self._dir_mtime = dir_mtime
+        self._file_mtimes = file_mtimes
+        logger.info("Skill 列表已重新加载: %s", [skill.name for skill in self._skills])
+
+    def _ensure_fresh(self) -> None:
+        skills_dir = Path(config.SKILLS_DIR)
+        if not self._is_fresh(skills_dir):
+            self._reload(skills_dir)
+
+    def skills(self) -> List[SkillInfo]:
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._skills)
+
+    def get(self, skill_name: str) -> Optional[SkillInfo]:
+        with self._lock:
+            self._ensure_fresh()
+            return self._by_name.get((skill_name or "").lower())
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._skills_dir = None
+
+
+_registry = _SkillRegistry()
+
+
 def load_data_analysis_skills() -> List[SkillInfo]:
-    skills_dir = Path(config.SKILLS_DIR)
-    if not skills_dir.exists():
-        return []
-    skills: List[SkillInfo] = []
-    for skill_md in skills_dir.glob("*/SKILL.md"):
-        skill = _parse_skill_md(skill_md)
-        if skill and _is_data_analysis_skill(skill):
-            skills.append(skill)
-    return sorted(skills, key=lambda item: item.name)
+    return _registry.skills()
+
+
+def invalidate_skill_cache() -> None:
+    """强制下次访问时重新扫描 skills 目录"""
+    _registry.invalidate()
 
 
 def get_skill(skill_name: str) -> Optional[SkillInfo]:
-    target = (skill_name or "").lower()
-    for skill in load_data_analysis_skills():
-        if skill.name.lower() == target:
-            return skill
-    return None
+    return _registry.get(skill_name)
 
 
 def match_skill(query: str, has_file: bool = False) -> Optional[SkillInfo]:
@@ -170,7 +237,33 @@ def _copy_generated_images(output_dir: Path) -> List[Dict[str, str]]:
     return chunks
 
 
+# 会读取 duckdb_snapshot 参数的 (skill, 脚本)，其他脚本不导出快照
+_SNAPSHOT_CONSUMERS = {("csv-data-analysis", "csv_analyzer.py")}
+
+
+def _export_input_snapshot(skill_name: str, script_name: str, payload: dict, conv_id: str, work_dir: Path) -> Optional[str]:
+    """大文件且已入库时导出会话表的 Parquet 快照，Skill 快速模式直接读快照，免去重新解析原文件"""
+    if (skill_name, script_name) not in _SNAPSHOT_CONSUMERS or payload.get("mode") == "full":
+        return None
+    input_file = payload.get("input_file") or payload.get("file_path") or payload.get("csv_file")
+    if not input_file or not os.path.isfile(input_file):
+        return None
+    if os.path.getsize(input_file) < config.SKILL_FAST_MODE_THRESHOLD_MB * 1024 * 1024:
+        return None
+    from app.services.chat_excel.reader import reader_registry
+
+    reader = reader_registry.get(conv_id)
+    if reader is None:
+        return None
+    try:
+        return reader.export_table_snapshot(input_file, str(work_dir))
+    except Exception as e:
+        logger.warning(f"Failed to export table snapshot for {input_file}: {e}")
+        return None
+
+
 def execute_skill_script_file(skill_name: str, script_file_name: str, args: Optional[dict], conv_id: str) -> str:
+    """同步执行（快照导出 + 子进程），异步调用方需放到线程中执行"""
     skill = get_skill(skill_name)
     if not skill:
         return json.dumps(
@@ -193,6 +286,9 @@ def execute_skill_script_file(skill_name: str, script_file_name: str, args: Opti
     work_dir.mkdir(parents=True, exist_ok=True)
     payload = dict(args or {})
     payload.setdefault("output_dir", str(work_dir))
+    snapshot = _export_input_snapshot(skill.name, script_path.name, payload, conv_id, work_dir)
+    if snapshot:
+        payload.setdefault("duckdb_snapshot", snapshot)
     env = os.environ.copy()
     env["OUTPUT_DIR"] = str(work_dir)
     proc = subprocess.run(
@@ -29,6 +29,7 @@ from typing import Any, Dict, List, Optional
 
 from app.core import config
 from app.core.logger import get_session_logger
+from app.core.sandbox.worker_pool import code_worker_pool
 from app.services.react_agent.skills import (
     get_skill,
     get_skills_context,
@@ -118,8 +119,8 @@ summary = {{
 }}
 print(json.dumps(summary, ensure_ascii=False, default=str))
 """
-    # 使用 code_interpreter 的子进程方式执行
-    result = await _run_code_subprocess(analysis_code, conv_id)
+    # 使用 code_interpreter 同一个会话进程执行，但不污染会话命名空间
+    result = await _run_code_subprocess(analysis_code, conv_id, isolated=True)
 
     chunks: List[Dict[str, Any]] = [
         {"output_type": "code", "content": analysis_code.strip()},
@@ -186,7 +187,7 @@ async def tool_code_interpreter(code: str, file_path: str = "", conv_id: str = "
     核心逻辑:
     1. 前奏注入: import json, os, pandas, numpy; PLOT_DIR; FILE_PATH
     2. 语法检查 + 自动修复截断代码
-    3. 子进程执行 (cwd=会话工作目录)
+    3. 会话常驻进程执行 (cwd=会话工作目录，变量在多次调用间保留)
     4. 输出截断 (2000字符)
     5. 图片捕获 (扫描工作目录新图片 → 拷贝到静态目录)
     6. 返回 chunks 格式
@@ -259,7 +260,7 @@ async def tool_code_interpreter(code: str, file_path: str = "", conv_id: str = "
                 ensure_ascii=False,
             )
 
-    # 子进程执行
+    # 会话常驻进程执行
     result = await _run_code_subprocess(full_code, conv_id, cwd=work_dir)
 
     output_text = result.get("stdout", "")
@@ -555,8 +556,8 @@ async def tool_execute_skill_script(skill_name: str, script_name: str, args: Opt
 
     执行 skill 中定义的内联脚本（非 scripts/ 目录下的文件）。
     """
-    # 当前轻量实现中，内联脚本和脚本文件使用同一执行路径
-    return _execute_skill_script_file_impl(skill_name, script_name, args, conv_id)
+    # 当前轻量实现中，内联脚本和脚本文件使用同一执行路径；快照导出和子进程都是阻塞调用，放到线程中执行
+    return await asyncio.to_thread(_execute_skill_script_file_impl, skill_name, script_name, args, conv_id)
 
 
 async def tool_execute_skill_script_file(
@@ -586,7 +587,8 @@ async def tool_execute_skill_script_file(
             if key in _FILE_PATH_KEYS:
                 args[key] = real_file_path
 
-    result_str = _execute_skill_script_file_impl(skill_name, script_file_name, args, conv_id)
+    # 快照导出和子进程都是阻塞调用，放到线程中执行，不阻塞事件循环
+    result_str = await asyncio.to_thread(_execute_skill_script_file_impl, skill_name, script_file_name, args, conv_id)
 
     # 读取脚本源码作为 code chunk 前置显示 — 1:1 复刻原版
     script_source = None
@@ -722,11 +724,17 @@ async def execute_tool(
 
 
 # ══════════════════════════════════════════════════════════
-# 子进程执行器
+# 代码执行器
 # ══════════════════════════════════════════════════════════
 
-async def _run_code_subprocess(code: str, conv_id: str = "default", cwd: str = None) -> Dict[str, Any]:
-    """在子进程中执行 Python 代码 — 1:1 复刻原版 code_interpreter 的执行方式
+async def _run_code_subprocess(
+    code: str, conv_id: str = "default", cwd: str = None, isolated: bool = False,
+) -> Dict[str, Any]:
+    """执行 Python 代码
+
+    默认交给会话的常驻进程执行（预加载 pandas/numpy/matplotlib，变量在步骤间保留，
+    isolated=True 时使用独立命名空间）；CODE_WORKER_ENABLED=false 时
+    回退为原版 code_interpreter 的一次性子进程方式。
 
     返回: {"returncode": int, "stdout": str, "stderr": str}
     """
@@ -735,6 +743,11 @@ async def _run_code_subprocess(code: str, conv_id: str = "default", cwd: str = N
         cwd = os.path.abspath(cwd)
     os.makedirs(cwd, exist_ok=True)
 
+    if config.CODE_WORKER_ENABLED:
+        return await code_worker_pool.execute(
+            conv_id, code, cwd=cwd, timeout=config.SANDBOX_TIMEOUT, isolated=isolated,
+        )
+
     tmp_path = os.path.join(cwd, "_run.py")
     try:
         with open(tmp_path, "w", encoding="utf-8") as f:
@@ -750,7 +763,7 @@ async def _run_code_subprocess(code: str, conv_id: str = "default", cwd: str = N
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 cwd=cwd,
-                timeout=60,
+                timeout=config.SANDBOX_TIMEOUT,
                 text=True,
                 encoding="utf-8",
                 errors="replace",
@@ -770,7 +783,7 @@ async def _run_code_subprocess(code: str, conv_id: str = "default", cwd: str = N
             return {
                 "returncode": -1,
                 "stdout": "",
-                "stderr": "Execution timed out (60s limit)",
+                "stderr": f"Execution timed out ({config.SANDBOX_TIMEOUT}s limit)",
             }
     except Exception as e:
         return {
@@ -1,5 +1,6 @@
 """Chat Excel 独立项目 — FastAPI 入口"""
 
+import asyncio
 import logging
 import os
 import traceback
@@ -67,10 +68,54 @@ os.makedirs(STATIC_IMG_DIR, exist_ok=True)
 app.mount("/images", StaticFiles(directory=STATIC_IMG_DIR), name="images")
 
 
+async def _evict_idle_readers():
+    """定期关闭空闲超时的 DuckDB 会话连接"""
+    from app.core import config
+    from app.services.chat_excel.reader import reader_registry
+
+    interval = max(config.DUCKDB_IDLE_TTL_SECONDS / 2, 5)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reader_registry.evict_idle()
+        except Exception as e:
+            logger.warning("清理空闲 DuckDB 连接失败: %s", e)
+
+
+async def _evict_idle_code_workers():
+    """定期关闭空闲超时的 code_interpreter 常驻进程"""
+    from app.core import config
+    from app.core.sandbox.worker_pool import code_worker_pool
+
+    interval = max(config.CODE_WORKER_IDLE_TTL_SECONDS / 2, 5)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(code_worker_pool.evict_idle)
+        except Exception as e:
+            logger.warning("清理空闲 Python worker 失败: %s", e)
+
+
 @app.on_event("startup")
 async def startup():
+    from app.core import config
     from app.dal.database import init_db
     await init_db()
+    if config.DUCKDB_IDLE_TTL_SECONDS > 0:
+        asyncio.create_task(_evict_idle_readers())
+    if config.CODE_WORKER_ENABLED:
+        from app.core.sandbox.worker_pool import code_worker_pool
+        code_worker_pool.warm_up()
+        if config.CODE_WORKER_IDLE_TTL_SECONDS > 0:
+            asyncio.create_task(_evict_idle_code_workers())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    from app.core.sandbox.worker_pool import code_worker_pool
+    from app.dal.database import close_db_pool
+    await close_db_pool()
+    await asyncio.to_thread(code_worker_pool.close_all)
 
 
 @app.get("/api/health")
@@ -5,8 +5,17 @@ import json
 import warnings
 import sys
 
+import fast_profile
+
 warnings.filterwarnings("ignore")
 
+# 数值摘要使用的分位点
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# 快速模式：文件达到该大小（MB）时自动启用；阈值与后端导出已入库表快照的阈值一致
+FAST_MODE_THRESHOLD_MB = float(os.getenv("SKILL_FAST_MODE_THRESHOLD_MB", "50"))
+# 快速模式蓄水池样本行数（分位数、散点图、内存估计基于该样本）
+FAST_SAMPLE_ROWS = 100_000
+
 
 def log(*args, **kwargs):
     """将日志输出到 stderr，避免污染 stdout 的 JSON 输出"""
@@ -39,7 +48,26 @@ def classify_cv(value):
 
 
 def select_primary_metric(df, numeric_cols):
-    if not numeric_cols:
+    metric_stats = []
+    for col in numeric_cols:
+        series = df[col].dropna()
+        metric_stats.append(
+            (
+                col,
+                int(df[col].nunique()),
+                int(len(series)),
+                float(series.std()) if len(series) > 0 else 0.0,
+            )
+        )
+    return rank_primary_metric(metric_stats)
+
+
+def rank_primary_metric(metric_stats):
+    """
+    按列名关键词与取值区分度为数值列打分，返回得分最高的列作为核心分析指标。
+    metric_stats 为 (列名, 唯一值数, 非空数, 标准差) 列表，完整模式与快速模式共用
+    """
+    if not metric_stats:
         return None
 
     preferred_keywords = [
@@ -70,9 +98,8 @@ def select_primary_metric(df, numeric_cols):
     skip_keywords = ["rank", "ranking", "id", "index_id", "序号", "排名", "编号"]
 
     candidates = []
-    for col in numeric_cols:
+    for col, unique_cnt, non_null_cnt, std_val in metric_stats:
         col_lower = str(col).lower()
-        unique_cnt = int(df[col].nunique())
         score = 0
         if unique_cnt > 5:
             score += 2
@@ -80,15 +107,14 @@ def select_primary_metric(df, numeric_cols):
             score += 2
         if any(kw in col_lower for kw in preferred_keywords):
             score += 4
-        series = df[col].dropna()
-        if len(series) > 0:
+        if non_null_cnt > 0:
             score += 1
-            if float(series.std()) > 0:
+            if std_val > 0:
                 score += 1
         candidates.append((score, col))
 
     candidates.sort(key=lambda x: x[0], reverse=True)
-    return candidates[0][1] if candidates else numeric_cols[0]
+    return candidates[0][1]
 
 
 def select_label_col(df):
@@ -98,610 +124,1163 @@ def select_label_col(df):
     return None
 
 
-def analyze_csv(file_path):
+# ==========================================
+# 输出结构构建（完整模式与快速模式共用，保证 CHART_DATA_JSON 结构一致）
+# ==========================================
+
+
+def build_overview(n_rows, n_cols, missing_cells, duplicate_rows, memory_bytes):
+    total_cells = int(n_rows * n_cols)
+    return {
+        "rows": int(n_rows),
+        "cols": int(n_cols),
+        "missing_cells": int(missing_cells),
+        "missing_pct": round((missing_cells / total_cells) * 100, 2)
+        if total_cells > 0
+        else 0,
+        "duplicate_rows": int(duplicate_rows),
+        "memory_kb": round(memory_bytes / 1024, 1),
+    }
+
+
+def build_data_quality(columns, missing_counts, dtypes, unique_counts, n_rows):
+    """返回 (data_quality, 按缺失率降序的 [(列名, 缺失率, 缺失数)])"""
+    missing_rates = [
+        round((col_missing / n_rows) * 100, 1) if n_rows > 0 else 0
+        for col_missing in missing_counts
+    ]
+    # dtype breakdown for overview
+    dtype_counts = {}
+    for dt in dtypes:
+        cat = (
+            "numeric"
+            if "int" in dt or "float" in dt
+            else ("datetime" if "datetime" in dt else "text")
+        )
+        dtype_counts[cat] = dtype_counts.get(cat, 0) + 1
+    data_quality = {
+        "columns": [str(col) for col in columns],
+        "missing_rates": missing_rates,
+        "dtypes": list(dtypes),
+        "unique_counts": [int(x) for x in unique_counts],
+        "dtype_summary": dtype_counts,
+    }
+    missing_by_col = sorted(
+        zip(columns, missing_rates, [int(x) for x in missing_counts]),
+        key=lambda x: x[1],
+        reverse=True,
+    )
+    return data_quality, missing_by_col
+
+
+def build_histogram(counts, bin_edges):
+    return {
+        "bins": [
+            f"{bin_edges[i]:.1f}~{bin_edges[i + 1]:.1f}" for i in range(len(counts))
+        ],
+        "counts": [int(x) for x in counts],
+    }
+
+
+def summarize_numeric(min_val, max_val, mean_val, std_val, quantiles, skew_val, kurt_val):
+    """quantiles 为 {分位点: 值}，至少包含 SUMMARY_QUANTILES"""
+    cv = round(abs(std_val / mean_val) * 100, 1) if mean_val != 0 else 0.0
+    return {
+        "min": float(min_val),
+        "max": float(max_val),
+        "mean": round(mean_val, 4),
+        "median": float(quantiles[0.5]),
+        "std": round(std_val, 4),
+        "q25": float(quantiles[0.25]),
+        "q75": float(quantiles[0.75]),
+        "p5": float(quantiles[0.05]),
+        "p95": float(quantiles[0.95]),
+        "cv": cv,
+        "spread": round(float(max_val) - float(min_val), 4),
+        "skewness": round(skew_val, 3),
+        "kurtosis": round(kurt_val, 3),
+    }
+
+
+def build_correlations(numeric_cols, corr_matrix):
+    """corr_matrix 为已 fillna(0) 并保留两位小数的相关系数方阵，返回 (correlations, correlation_highlights)"""
+    correlations = {"cols": numeric_cols, "data": []}
+    corr_pairs = []
+    for i, col1 in enumerate(numeric_cols):
+        for j, col2 in enumerate(numeric_cols):
+            correlations["data"].append([i, j, float(corr_matrix[i][j])])
+            if i < j:
+                corr_pairs.append((col1, col2, float(corr_matrix[i][j])))
+    corr_pairs = sorted(corr_pairs, key=lambda x: x[2], reverse=True)
+    correlation_highlights = {
+        "positive": corr_pairs[:3],
+        "negative": sorted(corr_pairs, key=lambda x: x[2])[:3],
+    }
+    return correlations, correlation_highlights
+
+
+def build_category_summary(val_counts, n_unique, total_non_null):
+    """val_counts 为按频次降序的前 10 个取值计数，返回 (categories 条目, cat_summary 条目)"""
+    category = {
+        "labels": [str(x) for x in val_counts.index.tolist()],
+        "values": [int(x) for x in val_counts.values],
+    }
+    top1 = val_counts.index[0]
+    top1_count = val_counts.values[0]
+    # Shannon entropy (log2)
+    probs = np.array(val_counts.values, dtype=float)
+    if total_non_null > 0:
+        probs = probs / float(total_non_null)
+    entropy = -float(np.sum(probs * np.log2(probs + 1e-12)))
+    # Concentration ratio: top-3 share
+    top3_share = (
+        round(val_counts.head(3).sum() / total_non_null * 100, 1)
+        if total_non_null > 0
+        else 0
+    )
+    summary = {
+        "n_unique": int(n_unique),
+        "top1": str(top1),
+        "top1_count": int(top1_count),
+        "top1_share": round(safe_div(top1_count, total_non_null) * 100, 1)
+        if total_non_null > 0
+        else 0,
+        "entropy": round(entropy, 3),
+        "top3_share": top3_share,
+    }
+    return category, summary
+
+
+def build_segment_leaders(names, counts, means, sums):
+    return [
+        {
+            "name": str(name),
+            "count": int(count),
+            "mean": round(float(mean), 2),
+            "sum": round(float(total), 2),
+        }
+        for name, count, mean, total in zip(names, counts, means, sums)
+    ]
+
+
+def build_segment_comparison(segment_breakdown):
+    if not segment_breakdown:
+        return {}
+    lead_segment = segment_breakdown[0]
+    leaders = lead_segment["leaders"][:8]
+    return {
+        "dimension": lead_segment["dimension"],
+        "metric": lead_segment["metric"],
+        "labels": [item["name"] for item in leaders],
+        "values": [item["mean"] for item in leaders],
+        "counts": [item["count"] for item in leaders],
+    }
+
+
+def build_time_series(name, series):
+    """series 为以日期为索引的聚合均值序列"""
+    return {
+        "name": name,
+        "dates": [x.strftime("%Y-%m-%d") for x in series.index],
+        "values": [round(float(x), 2) for x in series.values],
+    }
+
+
+def build_time_series_diagnostics(date_col, metric, monthly):
+    idx = np.arange(len(monthly), dtype=float)
+    slope = float(np.polyfit(idx, monthly.values.astype(float), 1)[0])
+    first_val = float(monthly.iloc[0])
+    last_val = float(monthly.iloc[-1])
+    peak_idx = int(np.argmax(monthly.values))
+    trough_idx = int(np.argmin(monthly.values))
+    pct_change = safe_div(last_val - first_val, abs(first_val)) * 100
+    return {
+        "date_col": date_col,
+        "metric": metric,
+        "points": int(len(monthly)),
+        "start": round(first_val, 2),
+        "end": round(last_val, 2),
+        "change_pct": round(pct_change, 1),
+        "slope": round(slope, 4),
+        "volatility_pct": round(
+            safe_div(monthly.std(), abs(monthly.mean())) * 100,
+            1,
+        )
+        if float(monthly.mean()) != 0
+        else 0,
+        "peak_date": monthly.index[peak_idx].strftime("%Y-%m-%d"),
+        "peak_value": round(float(monthly.iloc[peak_idx]), 2),
+        "trough_date": monthly.index[trough_idx].strftime("%Y-%m-%d"),
+        "trough_value": round(float(monthly.iloc[trough_idx]), 2),
+    }
+
+
+def pick_scatter_columns(numeric_cols, primary_metric, correlations):
+    """优先取与核心指标相关性绝对值最高的列作为散点图 X 轴"""
+    if primary_metric and correlations["data"]:
+        corr_candidates = []
+        for i, j, val in correlations["data"]:
+            left = numeric_cols[i]
+            right = numeric_cols[j]
+            if left == right:
+                continue
+            if left == primary_metric:
+                corr_candidates.append((abs(val), right, primary_metric))
+            elif right == primary_metric:
+                corr_candidates.append((abs(val), left, primary_metric))
+        corr_candidates.sort(key=lambda x: x[0], reverse=True)
+        if corr_candidates:
+            _, partner, metric = corr_candidates[0]
+            return partner, metric
+    return numeric_cols[0], numeric_cols[1]
+
+
+def build_scatter(col_x, col_y, df_scatter):
+    return {
+        "x_name": col_x,
+        "y_name": col_y,
+        "x": df_scatter[col_x].astype(float).round(4).tolist(),
+        "y": df_scatter[col_y].astype(float).round(4).tolist(),
+    }
+
+
+def build_box_plot(min_val, max_val, q1, median, q3, outlier_list):
+    iqr = q3 - q1
+    return {
+        "min": round(min_val, 4),
+        "q1": round(q1, 4),
+        "median": round(median, 4),
+        "q3": round(q3, 4),
+        "max": round(max_val, 4),
+        "lower_fence": round(max(min_val, q1 - 1.5 * iqr), 4),
+        "upper_fence": round(min(max_val, q3 + 1.5 * iqr), 4),
+        "outliers": outlier_list,
+    }
+
+
+def build_outlier_summary(n_outliers, n_values, lower, upper):
+    return {
+        "count": int(n_outliers),
+        "pct": round((n_outliers / n_values) * 100, 1) if n_values > 0 else 0,
+        "lower_bound": round(lower, 4),
+        "upper_bound": round(upper, 4),
+    }
+
+
+def extract_ranked(subset, rank_col, label_col):
+    """向量化提取排名标签与数值；无标签列时使用行索引"""
+    if label_col:
+        labels = subset[label_col].astype(str).str.slice(0, 30)
+    else:
+        labels = subset.index.to_series().astype(str)
+    return {
+        "labels": labels.tolist(),
+        "values": subset[rank_col].astype(float).round(2).tolist(),
+    }
+
+
+def build_ranking_signal(top_bottom):
+    if not (top_bottom["top5"]["values"] and top_bottom["bottom5"]["values"]):
+        return {}
+    top_avg = float(np.mean(top_bottom["top5"]["values"]))
+    bottom_avg = float(np.mean(top_bottom["bottom5"]["values"]))
+    return {
+        "top_avg": round(top_avg, 2),
+        "bottom_avg": round(bottom_avg, 2),
+        "gap": round(top_avg - bottom_avg, 2),
+    }
+
+
+def build_anomaly_overview(
+    metric,
+    mean_val,
+    median_val,
+    std_val,
+    q10,
+    q90,
+    top_group_size,
+    bottom_group_size,
+    top_group_mean,
+    bottom_group_mean,
+    band_values,
+    primary_outlier,
+):
+    return {
+        "metric": metric,
+        "mean": round(mean_val, 2),
+        "median": round(median_val, 2),
+        "std": round(std_val, 2),
+        "q10": round(q10, 2),
+        "q90": round(q90, 2),
+        "top_group_size": int(top_group_size),
+        "bottom_group_size": int(bottom_group_size),
+        "top_group_mean": round(top_group_mean, 2) if top_group_size > 0 else 0,
+        "bottom_group_mean": round(bottom_group_mean, 2) if bottom_group_size > 0 else 0,
+        "gap": round(top_group_mean - bottom_group_mean, 2)
+        if top_group_size > 0 and bottom_group_size > 0
+        else 0,
+        "band_labels": ["P0-P25", "P25-P50", "P50-P75", "P75-P100"],
+        "band_values": band_values,
+        "outlier_count": int(primary_outlier.get("count", 0)),
+        "outlier_pct": float(primary_outlier.get("pct", 0)),
+    }
+
+
+def build_driver_item(col, corr_val, top_mean, bottom_mean, col_std):
+    gap_ratio = safe_div(top_mean - bottom_mean, col_std if col_std else 1)
+    score = round(min(100, abs(corr_val) * 55 + min(abs(gap_ratio), 3) * 15), 1)
+    return {
+        "name": col,
+        "corr": round(corr_val, 3),
+        "top_mean": round(top_mean, 2),
+        "bottom_mean": round(bottom_mean, 2),
+        "gap_ratio": round(gap_ratio, 2),
+        "score": score,
+    }
+
+
+def build_stats_table(numeric_summary):
+    stats_table = {"headers": [], "rows": []}
+    if not numeric_summary:
+        return stats_table
+    stats_table["headers"] = [
+        "变量",
+        "最小值",
+        "P5",
+        "Q25",
+        "中位数",
+        "均值",
+        "Q75",
+        "P95",
+        "最大值",
+        "标准差",
+        "CV%",
+        "偏度",
+        "峰度",
+    ]
+    for col, s in numeric_summary.items():
+        stats_table["rows"].append(
+            [
+                col,
+                round(s["min"], 2),
+                round(s["p5"], 2),
+                round(s["q25"], 2),
+                round(s["median"], 2),
+                round(s["mean"], 2),
+                round(s["q75"], 2),
+                round(s["p95"], 2),
+                round(s["max"], 2),
+                round(s["std"], 2),
+                s["cv"],
+                s["skewness"],
+                s["kurtosis"],
+            ]
+        )
+    return stats_table
+
+
+def read_dataframe(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in (".xls", ".xlsx"):
+        return pd.read_excel(file_path)
+    if ext == ".tsv":
+        return pd.read_csv(file_path, sep="\t")
+    return pd.read_csv(file_path)
+
+
+def analyze_dataframe(df):
     """
-    分析CSV文件，提取用于 ECharts 渲染的数据结构和用于 LLM 分析的统计摘要。
-    输出包含: overview, data_quality, distributions, correlations, categories,
-    time_series, scatter, stats_table, box_plots, outliers, top_bottom
+    完整模式：在内存中的 DataFrame 上精确计算全部统计项，返回 build_summary 所需的分析结果
     """
+    # ==========================================
+    # 1. 基础概览数据
+    # ==========================================
+    missing_counts = [int(x) for x in df.isnull().sum().tolist()]
+    overview = build_overview(
+        int(df.shape[0]),
+        int(df.shape[1]),
+        sum(missing_counts),
+        int(df.duplicated().sum()),
+        float(df.memory_usage(deep=True).sum()),
+    )
+
+    # ==========================================
+    # 1b. 数据质量分析 (每列缺失率 + 数据类型)
+    # ==========================================
+    data_quality, missing_by_col = build_data_quality(
+        list(df.columns),
+        missing_counts,
+        [str(df[col].dtype) for col in df.columns],
+        [int(df[col].nunique()) for col in df.columns],
+        len(df),
+    )
+
+    # ==========================================
+    # 2. 数值列分析 (直方图分布 & 相关性)
+    # ==========================================
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    primary_metric = select_primary_metric(df, numeric_cols)
+    label_col = select_label_col(df)
+    distributions = {}
+    correlations = {"cols": numeric_cols, "data": []}
+    numeric_summary = {}
+    correlation_highlights = {"positive": [], "negative": []}
+
+    if numeric_cols:
+        # 取最多前 8 个数值列画分布图
+        for col in numeric_cols[:8]:
+            s = df[col].dropna()
+            if len(s) > 0:
+                # 使用 numpy 计算直方图 (10个 bin)
+                hist, bin_edges = np.histogram(s, bins=10)
+                distributions[col] = build_histogram(hist, bin_edges)
+                # Skewness & Kurtosis
+                numeric_summary[col] = summarize_numeric(
+                    float(s.min()),
+                    float(s.max()),
+                    float(s.mean()),
+                    float(s.std()),
+                    {q: float(s.quantile(q)) for q in SUMMARY_QUANTILES},
+                    float(s.skew()) if len(s) > 2 else 0.0,
+                    float(s.kurtosis()) if len(s) > 3 else 0.0,
+                )
+
+        # 相关性矩阵 (取全部数值列)
+        if len(numeric_cols) > 1:
+            corr_df = df[numeric_cols].corr(method="pearson").fillna(0).round(2)  # type: ignore[call-overload]
+            correlations, correlation_highlights = build_correlations(
+                numeric_cols, corr_df.values
+            )
+
+    # ==========================================
+    # 3. 分类列分析 (饼图/柱状图 + 熵/集中度)
+    # ==========================================
+    categorical_cols = df.select_dtypes(
+        include=["object", "category"]
+    ).columns.tolist()
+    categories = {}
+    cat_summary = {}
+    segment_breakdown = []
+    segment_comparison = {}
+
+    if categorical_cols:
+        # 取最多前 6 个分类列
+        for col in categorical_cols[:6]:
+            if df[col].nunique() <= 50:
+                val_counts = df[col].value_counts().head(10)
+                if len(val_counts) > 0:
+                    categories[col], cat_summary[col] = build_category_summary(
+                        val_counts, int(df[col].nunique()), int(df[col].notna().sum())
+                    )
+
+        if primary_metric:
+            for col in categorical_cols[:3]:
+                grouped = (
+                    df[[col, primary_metric]]
+                    .dropna()
+                    .groupby(col)[primary_metric]
+                    .agg(["count", "mean", "sum"])
+                )
+                grp = (
+                    pd.DataFrame(grouped)
+                    .reset_index()
+                    .sort_values("sum", ascending=False)
+                    .head(5)
+                )
+                if not grp.empty:
+                    segment_breakdown.append(
+                        {
+                            "dimension": col,
+                            "metric": primary_metric,
+                            "leaders": build_segment_leaders(
+                                grp[col], grp["count"], grp["mean"], grp["sum"]
+                            ),
+                        }
+                    )
+            segment_comparison = build_segment_comparison(segment_breakdown)
+
+    # ==========================================
+    # 4. 时间序列分析 (支持多个数值列)
+    # ==========================================
+    time_series = {"name": "", "dates": [], "values": []}
+    time_series_multi = []  # 额外的时序列数据
+    time_series_diagnostics = {}
+
+    if numeric_cols:
+        date_col = None
+        for col in df.columns:
+            if df[col].dtype == "object":
+                try:
+                    pd.to_datetime(df[col].dropna().head(100))
+                    date_col = col
+                    break
+                except Exception:
+                    pass
+
+        if date_col:
+            df_ts = df.copy()
+            df_ts[date_col] = pd.to_datetime(df_ts[date_col], errors="coerce")
+            df_ts = df_ts.dropna(subset=[date_col])
+
+            # 主时序：第一个数值列
+            num_col = primary_metric or numeric_cols[0]
+            df_ts_main = df_ts.dropna(subset=[num_col]).copy()
+            if not df_ts_main.empty:
+                df_ts_main = df_ts_main.set_index(date_col)
+                try:
+                    monthly = df_ts_main[num_col].resample("M").mean().dropna()
+                    if len(monthly) < 3:
+                        monthly = df_ts_main[num_col].resample("D").mean().dropna()
+                    monthly = monthly.tail(100)
+
+                    time_series = build_time_series(num_col, monthly)
+                    if len(monthly) >= 2:
+                        time_series_diagnostics = build_time_series_diagnostics(
+                            date_col, num_col, monthly
+                        )
+                except Exception as e:
+                    log(f"时间序列处理失败: {e}")
+
+            # 额外时序列（最多再加2个）
+            for extra_col in numeric_cols[1:3]:
+                df_ts_extra = df_ts.dropna(subset=[extra_col]).copy()
+                if not df_ts_extra.empty:
+                    df_ts_extra = df_ts_extra.set_index(date_col)
+                    try:
+                        monthly_e = (
+                            df_ts_extra[extra_col].resample("M").mean().dropna()
+                        )
+                        if len(monthly_e) < 3:
+                            monthly_e = (
+                                df_ts_extra[extra_col].resample("D").mean().dropna()
+                            )
+                        monthly_e = monthly_e.tail(100)
+                        if len(monthly_e) >= 2:
+                            time_series_multi.append(
+                                build_time_series(extra_col, monthly_e)
+                            )
+                    except Exception:
+                        pass
+
+    # ==========================================
+    # 5. 散点图数据 (前两个数值列)
+    # ==========================================
+    scatter = {}
+    if len(numeric_cols) >= 2:
+        col_x, col_y = pick_scatter_columns(numeric_cols, primary_metric, correlations)
+        df_scatter = df[[col_x, col_y]].dropna()
+        # 限制最多 500 个点，避免数据过大
+        if len(df_scatter) > 500:
+            df_scatter = df_scatter.sample(500, random_state=42)
+        scatter = build_scatter(col_x, col_y, df_scatter)
+
+    # ==========================================
+    # 5b. 箱线图数据 (Box Plot) — 前 8 个数值列
+    # ==========================================
+    box_plots = {}
+    if numeric_cols:
+        for col in numeric_cols[:8]:
+            s = df[col].dropna()
+            if len(s) > 0:
+                q1 = float(s.quantile(0.25))
+                q3 = float(s.quantile(0.75))
+                iqr = q3 - q1
+                lower_fence = q1 - 1.5 * iqr
+                upper_fence = q3 + 1.5 * iqr
+                outlier_vals = s[(s < lower_fence) | (s > upper_fence)]
+                # Limit outlier points to 50 for rendering
+                outlier_list = [
+                    round(float(v), 4)
+                    for v in outlier_vals.head(50).tolist()  # type: ignore[union-attr]
+                ]
+                box_plots[col] = build_box_plot(
+                    float(s.min()), float(s.max()), q1, float(s.median()), q3, outlier_list
+                )
+
+    # ==========================================
+    # 5c. 异常值检测汇总 (IQR method)
+    # ==========================================
+    outliers = {}
+    if numeric_cols:
+        for col in numeric_cols[:8]:
+            s = df[col].dropna()
+            if len(s) > 0:
+                q1 = float(s.quantile(0.25))
+                q3 = float(s.quantile(0.75))
+                iqr = q3 - q1
+                lower = q1 - 1.5 * iqr
+                upper = q3 + 1.5 * iqr
+                n_outliers = int(((s < lower) | (s > upper)).sum())
+                outliers[col] = build_outlier_summary(n_outliers, len(s), lower, upper)
+
+    # ==========================================
+    # 5d. Top/Bottom 排名 (数值列的 Top5 / Bottom5)
+    # ==========================================
+    top_bottom = {}
+    ranking_signal = {}
+    if numeric_cols and len(df) > 0:
+        rank_col = primary_metric or numeric_cols[0]
+
+        if rank_col:
+            df_sorted = df.dropna(subset=[rank_col]).sort_values(
+                rank_col, ascending=False
+            )
+            top5 = df_sorted.head(5)
+            bottom5 = df_sorted.tail(5).iloc[::-1]  # reverse so worst first
+
+            top_bottom = {
+                "rank_col": rank_col,
+                "label_col": label_col or "index",
+                "top5": extract_ranked(top5, rank_col, label_col),
+                "bottom5": extract_ranked(bottom5, rank_col, label_col),
+            }
+            ranking_signal = build_ranking_signal(top_bottom)
+
+    # ==========================================
+    # 6b. 主指标异动概览与归因结构
+    # ==========================================
+    anomaly_overview = {}
+    driver_analysis = {"metric": "", "items": []}
+    if primary_metric and primary_metric in df.columns:
+        metric_series = df[primary_metric].dropna()
+        if len(metric_series) > 0:
+            q10 = float(metric_series.quantile(0.1))
+            q25 = float(metric_series.quantile(0.25))
+            q50 = float(metric_series.quantile(0.5))
+            q75 = float(metric_series.quantile(0.75))
+            q90 = float(metric_series.quantile(0.9))
+            band_values = [
+                int((metric_series <= q25).sum()),
+                int(((metric_series > q25) & (metric_series <= q50)).sum()),
+                int(((metric_series > q50) & (metric_series <= q75)).sum()),
+                int((metric_series > q75).sum()),
+            ]
+            top_group = df[df[primary_metric] >= q90]
+            bottom_group = df[df[primary_metric] <= q10]
+            anomaly_overview = build_anomaly_overview(
+                primary_metric,
+                float(metric_series.mean()),
+                float(metric_series.median()),
+                float(metric_series.std()),
+                q10,
+                q90,
+                int(len(top_group)),
+                int(len(bottom_group)),
+                float(top_group[primary_metric].mean()) if len(top_group) > 0 else 0,
+                float(bottom_group[primary_metric].mean()) if len(bottom_group) > 0 else 0,
+                band_values,
+                outliers.get(primary_metric, {}),
+            )
+
+            driver_items = []
+            for col in numeric_cols:
+                if col == primary_metric:
+                    continue
+                pair = df[[primary_metric, col]].dropna()
+                if len(pair) < 5:
+                    continue
+                metric_pair_series = pair.iloc[:, 0]
+                col_pair_series = pair.iloc[:, 1]
+                corr_val = float(metric_pair_series.corr(col_pair_series))
+                top_mean = (
+                    float(top_group[col].mean())
+                    if len(top_group) > 0 and col in top_group.columns
+                    else 0
+                )
+                bottom_mean = (
+                    float(bottom_group[col].mean())
+                    if len(bottom_group) > 0 and col in bottom_group.columns
+                    else 0
+                )
+                col_std = float(col_pair_series.std()) if len(pair) > 1 else 0
+                driver_items.append(
+                    build_driver_item(col, corr_val, top_mean, bottom_mean, col_std)
+                )
+            driver_items.sort(key=lambda x: x["score"], reverse=True)
+            driver_analysis = {"metric": primary_metric, "items": driver_items[:8]}
+
+    # ==========================================
+    # 6. 统计汇总表格 (含新增 P5/P95/CV 列)
+    # ==========================================
+    stats_table = build_stats_table(numeric_summary)
+
+    # ==========================================
+    # 构建给 ECharts 渲染的完整 JSON 数据结构
+    # ==========================================
+    chart_data = {
+        "overview": overview,
+        "data_quality": data_quality,
+        "numeric_cols": numeric_cols,
+        "distributions": distributions,
+        "correlations": correlations,
+        "correlation_highlights": correlation_highlights,
+        "categories": categories,
+        "segment_breakdown": segment_breakdown,
+        "time_series": time_series,
+        "time_series_multi": time_series_multi,
+        "time_series_diagnostics": time_series_diagnostics,
+        "scatter": scatter,
+        "box_plots": box_plots,
+        "outliers": outliers,
+        "primary_metric": primary_metric,
+        "anomaly_overview": anomaly_overview,
+        "driver_analysis": driver_analysis,
+        "segment_comparison": segment_comparison,
+        "top_bottom": top_bottom,
+        "ranking_signal": ranking_signal,
+        "stats_table": stats_table,
+    }
+
+    return {
+        "chart_data": chart_data,
+        "numeric_summary": numeric_summary,
+        "cat_summary": cat_summary,
+        "categorical_cols": categorical_cols,
+        "missing_by_col": missing_by_col,
+        "notes": [],
+    }
+
+
+def resolve_mode(file_path, mode="auto", snapshot_path=None):
+    """返回实际使用的分析模式：auto 时按文件大小（或后端是否提供了已入库表快照）选择 full / fast"""
+    mode = (mode or "auto").lower()
+    if mode == "full":
+        return "full"
+    if fast_profile.duckdb is None:
+        if mode == "fast":
+            log("未安装 duckdb，快速模式不可用，改用完整模式")
+        return "full"
+    if mode == "fast" or snapshot_path:
+        return "fast"
+    threshold = FAST_MODE_THRESHOLD_MB * 1024 * 1024
+    return "fast" if os.path.getsize(file_path) >= threshold else "full"
+
+
+def analyze_fast(file_path, snapshot_path=None, sample_size=FAST_SAMPLE_ROWS):
+    """
+    快速模式：整表扫描与聚合交给 DuckDB，分位数取自蓄水池样本，唯一值数用 HyperLogLog 估计。
+    返回结构与 analyze_dataframe 一致，notes 中给出各项近似统计的误差界
+    """
+    log(f"快速模式读取: {snapshot_path or file_path}")
+    source = fast_profile.DuckDBSource(file_path, snapshot_path)
+    q = fast_profile.quote_ident
+    as_double = fast_profile.as_double
+    to_float = fast_profile.to_float
     try:
-        log(f"正在读取文件: {file_path}")
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext in (".xls", ".xlsx"):
-            df = pd.read_excel(file_path)
-        elif ext == ".tsv":
-            df = pd.read_csv(file_path, sep="\t")
-        else:
-            df = pd.read_csv(file_path)
+        columns = source.columns
+        numeric_cols = [col for col in columns if source.is_numeric(col)]
+        categorical_cols = [
+            col
+            for col in columns
+            if not source.is_numeric(col) and not source.is_boolean(col)
+        ]
 
         # ==========================================
-        # 1. 基础概览数据
+        # 1. 单次扫描：行数、各列非空数、数值列最值与矩（口径与 pandas 一致）
         # ==========================================
-        total_cells = int(df.shape[0] * df.shape[1])
-        missing_cells = int(df.isnull().sum().sum())
-        missing_pct = (
-            round((missing_cells / total_cells) * 100, 2) if total_cells > 0 else 0
+        select_list = ["COUNT(*)"] + [f"COUNT({q(col)})" for col in columns]
+        for col in numeric_cols:
+            x = as_double(col)
+            select_list += [
+                f"MIN({x})",
+                f"MAX({x})",
+                f"AVG({x})",
+                f"STDDEV_SAMP({x})",
+                f"SKEWNESS({x})",
+                f"KURTOSIS({x})",
+            ]
+        row = source.query(f"SELECT {', '.join(select_list)} FROM data")[0]
+        n_rows = int(row[0])
+        non_null = {col: int(v) for col, v in zip(columns, row[1 : len(columns) + 1])}
+        moments = {}
+        offset = len(columns) + 1
+        for col in numeric_cols:
+            moments[col] = dict(
+                zip(
+                    ("min", "max", "mean", "std", "skew", "kurt"),
+                    [to_float(v) for v in row[offset : offset + 6]],
+                )
+            )
+            offset += 6
+
+        distinct_rows = source.query("SELECT COUNT(*) FROM (SELECT DISTINCT * FROM data)")[0][0]
+        distinct = source.distinct_estimates(columns)
+        sample = source.reservoir_sample(sample_size)
+
+        overview = build_overview(
+            n_rows,
+            len(columns),
+            sum(n_rows - non_null[col] for col in columns),
+            n_rows - int(distinct_rows),
+            float(sample.memory_usage(deep=True).sum()) * safe_div(n_rows, len(sample)),
+        )
+        data_quality, missing_by_col = build_data_quality(
+            columns,
+            [n_rows - non_null[col] for col in columns],
+            [source.pandas_dtype(col, non_null[col] < n_rows) for col in columns],
+            [distinct[col] for col in columns],
+            n_rows,
         )
-        duplicate_rows = int(df.duplicated().sum())
-
-        overview = {
-            "rows": int(df.shape[0]),
-            "cols": int(df.shape[1]),
-            "missing_cells": missing_cells,
-            "missing_pct": missing_pct,
-            "duplicate_rows": duplicate_rows,
-            "memory_kb": round(df.memory_usage(deep=True).sum() / 1024, 1),
-        }
+
+        primary_metric = rank_primary_metric(
+            [(col, distinct[col], non_null[col], moments[col]["std"]) for col in numeric_cols]
+        )
+        label_col = next((col for col in categorical_cols if distinct[col] > 1), None)
 
         # ==========================================
-        # 1b. 数据质量分析 (每列缺失率 + 数据类型)
+        # 2. 分位数：取自蓄水池样本；样本中有效值过少的稀疏列改为精确计算
         # ==========================================
-        data_quality = {
-            "columns": [],
-            "missing_rates": [],
-            "dtypes": [],
-            "unique_counts": [],
-            "dtype_summary": {},
-        }
-        for col in df.columns:
-            data_quality["columns"].append(str(col))
-            col_missing = int(df[col].isnull().sum())
-            rate = round((col_missing / len(df)) * 100, 1) if len(df) > 0 else 0
-            data_quality["missing_rates"].append(rate)
-            data_quality["dtypes"].append(str(df[col].dtype))
-            data_quality["unique_counts"].append(int(df[col].nunique()))
-
-        # dtype breakdown for overview
-        dtype_counts = {}
-        for dt in data_quality["dtypes"]:
-            cat = (
-                "numeric"
-                if "int" in dt or "float" in dt
-                else ("datetime" if "datetime" in dt else "text")
-            )
-            dtype_counts[cat] = dtype_counts.get(cat, 0) + 1
-        data_quality["dtype_summary"] = dtype_counts
-        missing_by_col = sorted(
-            [
-                (col, rate, int(df[col].isnull().sum()))
-                for col, rate in zip(df.columns, data_quality["missing_rates"])
-            ],
-            key=lambda x: x[1],
-            reverse=True,
-        )
+        quantile_levels = sorted(set(SUMMARY_QUANTILES) | {0.1, 0.9})
+        sample_quantiles = {}
+        sample_sizes = {}
+        for col in numeric_cols:
+            if non_null[col] == 0:
+                continue
+            s = pd.to_numeric(sample[col], errors="coerce").dropna()
+            if len(s) < min(non_null[col], 1000):
+                values = source.query(
+                    f"SELECT quantile_cont({as_double(col)}, ?) FROM data",
+                    [quantile_levels],
+                )[0][0]
+                sample_quantiles[col] = dict(zip(quantile_levels, [float(v) for v in values]))
+                sample_sizes[col] = non_null[col]
+            else:
+                sample_quantiles[col] = {
+                    level: float(v) for level, v in s.quantile(quantile_levels).items()
+                }
+                sample_sizes[col] = len(s)
 
         # ==========================================
-        # 2. 数值列分析 (直方图分布 & 相关性)
+        # 3. 直方图（精确计数，分箱边界与 np.histogram 一致）与数值摘要
         # ==========================================
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        primary_metric = select_primary_metric(df, numeric_cols)
-        label_col = select_label_col(df)
         distributions = {}
-        correlations = {"cols": numeric_cols, "data": []}
         numeric_summary = {}
-        correlation_highlights = {"positive": [], "negative": []}
+        hist_cols = [col for col in numeric_cols[:8] if non_null[col] > 0]
+        if hist_cols:
+            hist_exprs = []
+            hist_params = []
+            bin_edges = {}
+            for col in hist_cols:
+                lo, hi = moments[col]["min"], moments[col]["max"]
+                if lo == hi:
+                    lo, hi = lo - 0.5, hi + 0.5
+                bin_edges[col] = np.linspace(lo, hi, 11)
+                # GREATEST/LEAST 会忽略 NULL，缺失值须显式排除，否则会被计入第一个分箱
+                x = as_double(col)
+                hist_exprs.append(
+                    f"histogram(LEAST(GREATEST(CAST(FLOOR(({x} - ?) / ?) AS BIGINT), 0), 9)) "
+                    f"FILTER (WHERE {x} IS NOT NULL)"
+                )
+                hist_params += [lo, (hi - lo) / 10]
+            hist_row = source.query(f"SELECT {', '.join(hist_exprs)} FROM data", hist_params)[0]
+            for col, hist_map in zip(hist_cols, hist_row):
+                hist_map = hist_map or {}
+                counts = [int(hist_map.get(i, 0)) for i in range(10)]
+                distributions[col] = build_histogram(counts, bin_edges[col])
+                m = moments[col]
+                numeric_summary[col] = summarize_numeric(
+                    m["min"],
+                    m["max"],
+                    m["mean"],
+                    m["std"],
+                    sample_quantiles[col],
+                    m["skew"] if non_null[col] > 2 else 0.0,
+                    m["kurt"] if non_null[col] > 3 else 0.0,
+                )
 
-        if numeric_cols:
-            # 取最多前 8 个数值列画分布图
-            for col in numeric_cols[:8]:
-                s = df[col].dropna()
-                if len(s) > 0:
-                    # 使用 numpy 计算直方图 (10个 bin)
-                    hist, bin_edges = np.histogram(s, bins=10)
-                    bins = [
-                        f"{bin_edges[i]:.1f}~{bin_edges[i + 1]:.1f}"
-                        for i in range(len(hist))
-                    ]
-                    distributions[col] = {
-                        "bins": bins,
-                        "counts": [int(x) for x in hist],
-                    }
-                    # Skewness & Kurtosis
-                    skew_val = float(s.skew()) if len(s) > 2 else 0.0
-                    kurt_val = float(s.kurtosis()) if len(s) > 3 else 0.0
-                    mean_val = float(s.mean())
-                    std_val = float(s.std())
-                    cv = (
-                        round(abs(std_val / mean_val) * 100, 1)
-                        if mean_val != 0
-                        else 0.0
-                    )
-                    spread = float(s.max()) - float(s.min())
-                    numeric_summary[col] = {
-                        "min": float(s.min()),
-                        "max": float(s.max()),
-                        "mean": round(mean_val, 4),
-                        "median": float(s.median()),
-                        "std": round(std_val, 4),
-                        "q25": float(s.quantile(0.25)),
-                        "q75": float(s.quantile(0.75)),
-                        "p5": float(s.quantile(0.05)),
-                        "p95": float(s.quantile(0.95)),
-                        "cv": cv,
-                        "spread": round(spread, 4),
-                        "skewness": round(skew_val, 3),
-                        "kurtosis": round(kurt_val, 3),
-                    }
-
-            # 相关性矩阵 (取全部数值列)
-            if len(numeric_cols) > 1:
-                corr_df = df[numeric_cols].corr(method="pearson").fillna(0).round(2)  # type: ignore[call-overload]
-                corr_pairs = []
-                for i, col1 in enumerate(numeric_cols):
-                    for j, col2 in enumerate(numeric_cols):
-                        correlations["data"].append([i, j, float(corr_df.iloc[i, j])])
-                        if i < j:
-                            corr_pairs.append((col1, col2, float(corr_df.iloc[i, j])))
-                corr_pairs = sorted(corr_pairs, key=lambda x: x[2], reverse=True)
-                correlation_highlights["positive"] = corr_pairs[:3]
-                correlation_highlights["negative"] = sorted(
-                    corr_pairs, key=lambda x: x[2]
-                )[:3]
+        # ==========================================
+        # 4. 相关性矩阵（DuckDB CORR，成对剔除缺失值，与 pandas 一致）
+        # ==========================================
+        correlations = {"cols": numeric_cols, "data": []}
+        correlation_highlights = {"positive": [], "negative": []}
+        raw_corr = np.zeros((len(numeric_cols), len(numeric_cols)))
+        if len(numeric_cols) > 1:
+            pairs = [
+                (i, j)
+                for i in range(len(numeric_cols))
+                for j in range(i + 1, len(numeric_cols))
+            ]
+            corr_row = source.query(
+                "SELECT "
+                + ", ".join(
+                    f"CORR({as_double(numeric_cols[i])}, {as_double(numeric_cols[j])})"
+                    for i, j in pairs
+                )
+                + " FROM data"
+            )[0]
+            for (i, j), val in zip(pairs, corr_row):
+                raw_corr[i][j] = raw_corr[j][i] = to_float(val)
+            for i, col in enumerate(numeric_cols):
+                raw_corr[i][i] = 1.0 if moments[col]["std"] > 0 else 0.0
+            correlations, correlation_highlights = build_correlations(
+                numeric_cols, np.round(raw_corr, 2)
+            )
 
         # ==========================================
-        # 3. 分类列分析 (饼图/柱状图 + 熵/集中度)
+        # 5. 分类列频次（精确）与分类维度切片
         # ==========================================
-        categorical_cols = df.select_dtypes(
-            include=["object", "category"]
-        ).columns.tolist()
         categories = {}
         cat_summary = {}
+        for col in categorical_cols[:6]:
+            # HyperLogLog 估计留出余量，是否 <= 50 以分组后的精确唯一值数为准
+            if distinct[col] > 60:
+                continue
+            rows = source.query(
+                f"SELECT v, n, COUNT(*) OVER () FROM ("
+                f"SELECT {q(col)} AS v, COUNT(*) AS n FROM data WHERE {q(col)} IS NOT NULL GROUP BY 1"
+                f") ORDER BY n DESC LIMIT 10"
+            )
+            if not rows or rows[0][2] > 50:
+                continue
+            val_counts = pd.Series([r[1] for r in rows], index=[r[0] for r in rows])
+            categories[col], cat_summary[col] = build_category_summary(
+                val_counts, int(rows[0][2]), non_null[col]
+            )
+
         segment_breakdown = []
-        segment_comparison = {}
-
-        if categorical_cols:
-            # 取最多前 6 个分类列
-            for col in categorical_cols[:6]:
-                if df[col].nunique() <= 50:
-                    val_counts = df[col].value_counts().head(10)
-                    if len(val_counts) > 0:
-                        categories[col] = {
-                            "labels": [str(x) for x in val_counts.index.tolist()],
-                            "values": [int(x) for x in val_counts.values],
-                        }
-                        top1 = val_counts.index[0]
-                        top1_count = val_counts.values[0]
-                        n_unique = df[col].nunique()
-                        total_non_null = int(df[col].notna().sum())
-                        # Shannon entropy (log2)
-                        probs = np.array(val_counts.values, dtype=float)
-                        if total_non_null > 0:
-                            probs = probs / float(total_non_null)
-                        entropy = -float(np.sum(probs * np.log2(probs + 1e-12)))
-                        # Concentration ratio: top-3 share
-                        top3_share = (
-                            round(val_counts.head(3).sum() / total_non_null * 100, 1)
-                            if total_non_null > 0
-                            else 0
-                        )
-                        cat_summary[col] = {
-                            "n_unique": n_unique,
-                            "top1": str(top1),
-                            "top1_count": int(top1_count),
-                            "top1_share": round(
-                                safe_div(top1_count, total_non_null) * 100, 1
-                            )
-                            if total_non_null > 0
-                            else 0,
-                            "entropy": round(entropy, 3),
-                            "top3_share": top3_share,
+        if categorical_cols and primary_metric:
+            metric = as_double(primary_metric)
+            for col in categorical_cols[:3]:
+                rows = source.query(
+                    f"SELECT {q(col)}, COUNT({metric}), AVG({metric}), SUM({metric}) FROM data "
+                    f"WHERE {q(col)} IS NOT NULL AND {q(primary_metric)} IS NOT NULL "
+                    f"GROUP BY 1 ORDER BY 4 DESC LIMIT 5"
+                )
+                if rows:
+                    names, counts, means, sums = zip(*rows)
+                    segment_breakdown.append(
+                        {
+                            "dimension": col,
+                            "metric": primary_metric,
+                            "leaders": build_segment_leaders(names, counts, means, sums),
                         }
-
-            if primary_metric:
-                for col in categorical_cols[:3]:
-                    grouped = (
-                        df[[col, primary_metric]]
-                        .dropna()
-                        .groupby(col)[primary_metric]
-                        .agg(["count", "mean", "sum"])
                     )
-                    grp = (
-                        pd.DataFrame(grouped)
-                        .reset_index()
-                        .sort_values("sum", ascending=False)
-                        .head(5)
-                    )
-                    if not grp.empty:
-                        segment_breakdown.append(
-                            {
-                                "dimension": col,
-                                "metric": primary_metric,
-                                "leaders": [
-                                    {
-                                        "name": str(row[col]),
-                                        "count": int(row["count"]),
-                                        "mean": round(float(row["mean"]), 2),
-                                        "sum": round(float(row["sum"]), 2),
-                                    }
-                                    for _, row in grp.iterrows()
-                                ],
-                            }
-                        )
-                if segment_breakdown:
-                    lead_segment = segment_breakdown[0]
-                    leaders = lead_segment["leaders"][:8]
-                    segment_comparison = {
-                        "dimension": lead_segment["dimension"],
-                        "metric": lead_segment["metric"],
-                        "labels": [item["name"] for item in leaders],
-                        "values": [item["mean"] for item in leaders],
-                        "counts": [item["count"] for item in leaders],
-                    }
+        segment_comparison = build_segment_comparison(segment_breakdown)
 
         # ==========================================
-        # 4. 时间序列分析 (支持多个数值列)
+        # 6. 时间序列（按月聚合，不足 3 个月按日聚合）
         # ==========================================
         time_series = {"name": "", "dates": [], "values": []}
-        time_series_multi = []  # 额外的时序列数据
+        time_series_multi = []
         time_series_diagnostics = {}
-
         if numeric_cols:
             date_col = None
-            for col in df.columns:
-                if df[col].dtype == "object":
-                    try:
-                        pd.to_datetime(df[col].dropna().head(100))
-                        date_col = col
-                        break
-                    except Exception:
-                        pass
+            for col in categorical_cols:
+                head = source.query(f"SELECT {q(col)} FROM data WHERE {q(col)} IS NOT NULL LIMIT 100")
+                try:
+                    pd.to_datetime(pd.Series([r[0] for r in head], dtype=object))
+                    date_col = col
+                    break
+                except Exception:
+                    pass
 
             if date_col:
-                df_ts = df.copy()
-                df_ts[date_col] = pd.to_datetime(df_ts[date_col], errors="coerce")
-                df_ts = df_ts.dropna(subset=[date_col])
+                ts = f"TRY_CAST({q(date_col)} AS TIMESTAMP)"
+
+                def mean_by_date(metric_col):
+                    for bucket in (f"last_day(CAST({ts} AS DATE))", f"CAST({ts} AS DATE)"):
+                        rows = source.query(
+                            f"SELECT {bucket}, AVG({as_double(metric_col)}) FROM data "
+                            f"WHERE {ts} IS NOT NULL AND {q(metric_col)} IS NOT NULL "
+                            f"GROUP BY 1 ORDER BY 1"
+                        )
+                        series = pd.Series(
+                            [r[1] for r in rows],
+                            index=pd.to_datetime([r[0] for r in rows]),
+                            dtype=float,
+                        )
+                        if len(series) >= 3:
+                            break
+                    return series.tail(100)
 
-                # 主时序：第一个数值列
                 num_col = primary_metric or numeric_cols[0]
-                df_ts_main = df_ts.dropna(subset=[num_col]).copy()
-                if not df_ts_main.empty:
-                    df_ts_main = df_ts_main.set_index(date_col)
-                    try:
-                        monthly = df_ts_main[num_col].resample("M").mean().dropna()
-                        if len(monthly) < 3:
-                            monthly = df_ts_main[num_col].resample("D").mean().dropna()
-                        monthly = monthly.tail(100)
-
-                        time_series["name"] = num_col
-                        time_series["dates"] = [
-                            x.strftime("%Y-%m-%d") for x in monthly.index
-                        ]
-                        time_series["values"] = [
-                            round(float(x), 2) for x in monthly.values
-                        ]
-                        if len(monthly) >= 2:
-                            idx = np.arange(len(monthly), dtype=float)
-                            slope = float(
-                                np.polyfit(idx, monthly.values.astype(float), 1)[0]
-                            )
-                            first_val = float(monthly.iloc[0])
-                            last_val = float(monthly.iloc[-1])
-                            peak_idx = int(np.argmax(monthly.values))
-                            trough_idx = int(np.argmin(monthly.values))
-                            pct_change = (
-                                safe_div(last_val - first_val, abs(first_val)) * 100
-                            )
-                            time_series_diagnostics = {
-                                "date_col": date_col,
-                                "metric": num_col,
-                                "points": int(len(monthly)),
-                                "start": round(first_val, 2),
-                                "end": round(last_val, 2),
-                                "change_pct": round(pct_change, 1),
-                                "slope": round(slope, 4),
-                                "volatility_pct": round(
-                                    safe_div(monthly.std(), abs(monthly.mean())) * 100,
-                                    1,
-                                )
-                                if float(monthly.mean()) != 0
-                                else 0,
-                                "peak_date": monthly.index[peak_idx].strftime(
-                                    "%Y-%m-%d"
-                                ),
-                                "peak_value": round(float(monthly.iloc[peak_idx]), 2),
-                                "trough_date": monthly.index[trough_idx].strftime(
-                                    "%Y-%m-%d"
-                                ),
-                                "trough_value": round(
-                                    float(monthly.iloc[trough_idx]), 2
-                                ),
-                            }
-                    except Exception as e:
-                        log(f"时间序列处理失败: {e}")
-
-                # 额外时序列（最多再加2个）
+                try:
+                    monthly = mean_by_date(num_col)
+                    if len(monthly) > 0:
+                        time_series = build_time_series(num_col, monthly)
+                    if len(monthly) >= 2:
+                        time_series_diagnostics = build_time_series_diagnostics(
+                            date_col, num_col, monthly
+                        )
+                except Exception as e:
+                    log(f"时间序列处理失败: {e}")
+
                 for extra_col in numeric_cols[1:3]:
-                    df_ts_extra = df_ts.dropna(subset=[extra_col]).copy()
-                    if not df_ts_extra.empty:
-                        df_ts_extra = df_ts_extra.set_index(date_col)
-                        try:
-                            monthly_e = (
-                                df_ts_extra[extra_col].resample("M").mean().dropna()
-                            )
-                            if len(monthly_e) < 3:
-                                monthly_e = (
-                                    df_ts_extra[extra_col].resample("D").mean().dropna()
-                                )
-                            monthly_e = monthly_e.tail(100)
-                            if len(monthly_e) >= 2:
-                                time_series_multi.append(
-                                    {
-                                        "name": extra_col,
-                                        "dates": [
-                                            x.strftime("%Y-%m-%d")
-                                            for x in monthly_e.index
-                                        ],
-                                        "values": [
-                                            round(float(x), 2) for x in monthly_e.values
-                                        ],
-                                    }
-                                )
-                        except Exception:
-                            pass
+                    try:
+                        monthly_e = mean_by_date(extra_col)
+                        if len(monthly_e) >= 2:
+                            time_series_multi.append(build_time_series(extra_col, monthly_e))
+                    except Exception:
+                        pass
 
         # ==========================================
-        # 5. 散点图数据 (前两个数值列)
+        # 7. 散点图（样本点）、箱线图与异常值（边界取自样本分位数，计数精确）
         # ==========================================
         scatter = {}
         if len(numeric_cols) >= 2:
-            if primary_metric and correlations["data"]:
-                corr_candidates = []
-                for i, j, val in correlations["data"]:
-                    left = numeric_cols[i]
-                    right = numeric_cols[j]
-                    if left == right:
-                        continue
-                    if left == primary_metric:
-                        corr_candidates.append((abs(val), right, primary_metric))
-                    elif right == primary_metric:
-                        corr_candidates.append((abs(val), left, primary_metric))
-                corr_candidates.sort(key=lambda x: x[0], reverse=True)
-                if corr_candidates:
-                    _, partner, metric = corr_candidates[0]
-                    col_x, col_y = partner, metric
-                else:
-                    col_x, col_y = numeric_cols[0], numeric_cols[1]
-            else:
-                col_x, col_y = numeric_cols[0], numeric_cols[1]
-            df_scatter = df[[col_x, col_y]].dropna()
-            # 限制最多 500 个点，避免数据过大
+            col_x, col_y = pick_scatter_columns(numeric_cols, primary_metric, correlations)
+            df_scatter = sample[[col_x, col_y]].dropna()
             if len(df_scatter) > 500:
                 df_scatter = df_scatter.sample(500, random_state=42)
-            scatter = {
-                "x_name": col_x,
-                "y_name": col_y,
-                "x": [round(float(v), 4) for v in df_scatter[col_x].tolist()],
-                "y": [round(float(v), 4) for v in df_scatter[col_y].tolist()],
-            }
+            scatter = build_scatter(col_x, col_y, df_scatter)
 
-        # ==========================================
-        # 5b. 箱线图数据 (Box Plot) — 前 8 个数值列
-        # ==========================================
         box_plots = {}
-        if numeric_cols:
-            for col in numeric_cols[:8]:
-                s = df[col].dropna()
-                if len(s) > 0:
-                    q1 = float(s.quantile(0.25))
-                    q3 = float(s.quantile(0.75))
-                    iqr = q3 - q1
-                    lower_fence = q1 - 1.5 * iqr
-                    upper_fence = q3 + 1.5 * iqr
-                    outlier_vals = s[(s < lower_fence) | (s > upper_fence)]
-                    # Limit outlier points to 50 for rendering
-                    outlier_list = [
-                        round(float(v), 4)
-                        for v in outlier_vals.head(50).tolist()  # type: ignore[union-attr]
-                    ]
-                    box_plots[col] = {
-                        "min": round(float(s.min()), 4),
-                        "q1": round(q1, 4),
-                        "median": round(float(s.median()), 4),
-                        "q3": round(q3, 4),
-                        "max": round(float(s.max()), 4),
-                        "lower_fence": round(max(float(s.min()), lower_fence), 4),
-                        "upper_fence": round(min(float(s.max()), upper_fence), 4),
-                        "outliers": outlier_list,
-                    }
-
-        # ==========================================
-        # 5c. 异常值检测汇总 (IQR method)
-        # ==========================================
         outliers = {}
-        if numeric_cols:
-            for col in numeric_cols[:8]:
-                s = df[col].dropna()
-                if len(s) > 0:
-                    q1 = float(s.quantile(0.25))
-                    q3 = float(s.quantile(0.75))
-                    iqr = q3 - q1
-                    lower = q1 - 1.5 * iqr
-                    upper = q3 + 1.5 * iqr
-                    n_outliers = int(((s < lower) | (s > upper)).sum())
-                    outliers[col] = {
-                        "count": n_outliers,
-                        "pct": round((n_outliers / len(s)) * 100, 1)
-                        if len(s) > 0
-                        else 0,
-                        "lower_bound": round(lower, 4),
-                        "upper_bound": round(upper, 4),
-                    }
+        box_cols = [col for col in numeric_cols[:8] if col in sample_quantiles]
+        if box_cols:
+            fences = {}
+            count_exprs = []
+            count_params = []
+            for col in box_cols:
+                q1 = sample_quantiles[col][0.25]
+                q3 = sample_quantiles[col][0.75]
+                fences[col] = (q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1))
+                count_exprs.append(
+                    f"COUNT(*) FILTER (WHERE {as_double(col)} < ? OR {as_double(col)} > ?)"
+                )
+                count_params += list(fences[col])
+            count_row = source.query(f"SELECT {', '.join(count_exprs)} FROM data", count_params)[0]
+            for col, n_outliers in zip(box_cols, count_row):
+                lower, upper = fences[col]
+                # Limit outlier points to 50 for rendering
+                outlier_list = [
+                    round(float(r[0]), 4)
+                    for r in source.query(
+                        f"SELECT {as_double(col)} FROM data WHERE {as_double(col)} < ? OR {as_double(col)} > ? LIMIT 50",
+                        [lower, upper],
+                    )
+                ]
+                box_plots[col] = build_box_plot(
+                    moments[col]["min"],
+                    moments[col]["max"],
+                    sample_quantiles[col][0.25],
+                    sample_quantiles[col][0.5],
+                    sample_quantiles[col][0.75],
+                    outlier_list,
+                )
+                outliers[col] = build_outlier_summary(n_outliers, non_null[col], lower, upper)
 
         # ==========================================
-        # 5d. Top/Bottom 排名 (数值列的 Top5 / Bottom5)
+        # 8. Top/Bottom 排名（ORDER BY ... LIMIT，向量化提取标签）
         # ==========================================
         top_bottom = {}
         ranking_signal = {}
-        if numeric_cols and len(df) > 0:
+        if numeric_cols and n_rows > 0:
             rank_col = primary_metric or numeric_cols[0]
-
-            if rank_col:
-                df_sorted = df.dropna(subset=[rank_col]).sort_values(
-                    rank_col, ascending=False
+            label_expr = (
+                f"COALESCE(CAST({q(label_col)} AS VARCHAR), 'nan')" if label_col else "rowid"
+            )
+            label_name = label_col or "index"
+            ranked = {}
+            for key, order in (("top5", "DESC"), ("bottom5", "ASC")):
+                subset = source.query_df(
+                    f"SELECT {label_expr} AS {q(label_name)}, {as_double(rank_col)} AS {q(rank_col)} "
+                    f"FROM data WHERE {q(rank_col)} IS NOT NULL ORDER BY 2 {order} LIMIT 5"
                 )
-                top5 = df_sorted.head(5)
-                bottom5 = df_sorted.tail(5).iloc[::-1]  # reverse so worst first
-
-                def extract_ranked(subset):
-                    labels = []
-                    values = []
-                    for _, row in subset.iterrows():
-                        lbl = str(row[label_col])[:30] if label_col else str(row.name)
-                        labels.append(lbl)
-                        values.append(round(float(row[rank_col]), 2))
-                    return {"labels": labels, "values": values}
-
-                top_bottom = {
-                    "rank_col": rank_col,
-                    "label_col": label_col or "index",
-                    "top5": extract_ranked(top5),
-                    "bottom5": extract_ranked(bottom5),
-                }
-                if top_bottom["top5"]["values"] and top_bottom["bottom5"]["values"]:
-                    top_avg = float(np.mean(top_bottom["top5"]["values"]))
-                    bottom_avg = float(np.mean(top_bottom["bottom5"]["values"]))
-                    ranking_signal = {
-                        "top_avg": round(top_avg, 2),
-                        "bottom_avg": round(bottom_avg, 2),
-                        "gap": round(top_avg - bottom_avg, 2),
-                    }
+                if not label_col:
+                    subset = subset.set_index(label_name)
+                ranked[key] = extract_ranked(subset, rank_col, label_col)
+            top_bottom = {
+                "rank_col": rank_col,
+                "label_col": label_name,
+                "top5": ranked["top5"],
+                "bottom5": ranked["bottom5"],
+            }
+            ranking_signal = build_ranking_signal(top_bottom)
 
         # ==========================================
-        # 6b. 主指标异动概览与归因结构
+        # 9. 主指标异动概览与归因结构（阈值取自样本分位数，分组计数与均值精确）
         # ==========================================
         anomaly_overview = {}
         driver_analysis = {"metric": "", "items": []}
-        if primary_metric and primary_metric in df.columns:
-            metric_series = df[primary_metric].dropna()
-            if len(metric_series) > 0:
-                q10 = float(metric_series.quantile(0.1))
-                q25 = float(metric_series.quantile(0.25))
-                q50 = float(metric_series.quantile(0.5))
-                q75 = float(metric_series.quantile(0.75))
-                q90 = float(metric_series.quantile(0.9))
-                band_labels = ["P0-P25", "P25-P50", "P50-P75", "P75-P100"]
-                band_values = [
-                    int((metric_series <= q25).sum()),
-                    int(((metric_series > q25) & (metric_series <= q50)).sum()),
-                    int(((metric_series > q50) & (metric_series <= q75)).sum()),
-                    int((metric_series > q75).sum()),
+        if primary_metric and primary_metric in sample_quantiles:
+            quantiles = sample_quantiles[primary_metric]
+            q10, q25, q50, q75, q90 = (quantiles[level] for level in (0.1, 0.25, 0.5, 0.75, 0.9))
+            metric = as_double(primary_metric)
+            others = [col for col in numeric_cols if col != primary_metric]
+            exprs = [
+                f"COUNT(*) FILTER (WHERE {metric} <= ?)",
+                f"COUNT(*) FILTER (WHERE {metric} > ? AND {metric} <= ?)",
+                f"COUNT(*) FILTER (WHERE {metric} > ? AND {metric} <= ?)",
+                f"COUNT(*) FILTER (WHERE {metric} > ?)",
+                f"COUNT(*) FILTER (WHERE {metric} >= ?)",
+                f"AVG({metric}) FILTER (WHERE {metric} >= ?)",
+                f"COUNT(*) FILTER (WHERE {metric} <= ?)",
+                f"AVG({metric}) FILTER (WHERE {metric} <= ?)",
+            ]
+            params = [q25, q25, q50, q50, q75, q75, q90, q90, q10, q10]
+            for col in others:
+                x = as_double(col)
+                exprs += [
+                    f"COUNT(*) FILTER (WHERE {metric} IS NOT NULL AND {x} IS NOT NULL)",
+                    f"AVG({x}) FILTER (WHERE {metric} >= ?)",
+                    f"AVG({x}) FILTER (WHERE {metric} <= ?)",
+                    f"STDDEV_SAMP({x}) FILTER (WHERE {metric} IS NOT NULL)",
                 ]
-                top_group = df[df[primary_metric] >= q90]
-                bottom_group = df[df[primary_metric] <= q10]
-                primary_outlier = outliers.get(primary_metric, {})
-                anomaly_overview = {
-                    "metric": primary_metric,
-                    "mean": round(float(metric_series.mean()), 2),
-                    "median": round(float(metric_series.median()), 2),
-                    "std": round(float(metric_series.std()), 2),
-                    "q10": round(q10, 2),
-                    "q90": round(q90, 2),
-                    "top_group_size": int(len(top_group)),
-                    "bottom_group_size": int(len(bottom_group)),
-                    "top_group_mean": round(float(top_group[primary_metric].mean()), 2)
-                    if len(top_group) > 0
-                    else 0,
-                    "bottom_group_mean": round(
-                        float(bottom_group[primary_metric].mean()), 2
-                    )
-                    if len(bottom_group) > 0
-                    else 0,
-                    "gap": round(
-                        float(top_group[primary_metric].mean())
-                        - float(bottom_group[primary_metric].mean()),
-                        2,
-                    )
-                    if len(top_group) > 0 and len(bottom_group) > 0
-                    else 0,
-                    "band_labels": band_labels,
-                    "band_values": band_values,
-                    "outlier_count": int(primary_outlier.get("count", 0)),
-                    "outlier_pct": float(primary_outlier.get("pct", 0)),
-                }
-
-                driver_items = []
-                metric_std = float(metric_series.std()) if len(metric_series) > 1 else 0
-                for col in numeric_cols:
-                    if col == primary_metric:
-                        continue
-                    pair = df[[primary_metric, col]].dropna()
-                    if len(pair) < 5:
-                        continue
-                    metric_pair_series = pair.iloc[:, 0]
-                    col_pair_series = pair.iloc[:, 1]
-                    corr_val = float(metric_pair_series.corr(col_pair_series))
-                    top_mean = (
-                        float(top_group[col].mean())
-                        if len(top_group) > 0 and col in top_group.columns
-                        else 0
-                    )
-                    bottom_mean = (
-                        float(bottom_group[col].mean())
-                        if len(bottom_group) > 0 and col in bottom_group.columns
-                        else 0
-                    )
-                    col_std = float(col_pair_series.std()) if len(pair) > 1 else 0
-                    gap_ratio = safe_div(
-                        top_mean - bottom_mean, col_std if col_std else 1
-                    )
-                    score = round(
-                        min(100, abs(corr_val) * 55 + min(abs(gap_ratio), 3) * 15), 1
-                    )
-                    driver_items.append(
-                        {
-                            "name": col,
-                            "corr": round(corr_val, 3),
-                            "top_mean": round(top_mean, 2),
-                            "bottom_mean": round(bottom_mean, 2),
-                            "gap_ratio": round(gap_ratio, 2),
-                            "score": score,
-                        }
-                    )
-                driver_items.sort(key=lambda x: x["score"], reverse=True)
-                driver_analysis = {"metric": primary_metric, "items": driver_items[:8]}
+                params += [q90, q10]
+            row = source.query(f"SELECT {', '.join(exprs)} FROM data", params)[0]
+            anomaly_overview = build_anomaly_overview(
+                primary_metric,
+                moments[primary_metric]["mean"],
+                q50,
+                moments[primary_metric]["std"],
+                q10,
+                q90,
+                int(row[4]),
+                int(row[6]),
+                to_float(row[5]),
+                to_float(row[7]),
+                [int(v) for v in row[:4]],
+                outliers.get(primary_metric, {}),
+            )
 
-        # ==========================================
-        # 6. 统计汇总表格 (含新增 P5/P95/CV 列)
-        # ==========================================
-        stats_table = {"headers": [], "rows": []}
-        if numeric_summary:
-            stats_table["headers"] = [
-                "变量",
-                "最小值",
-                "P5",
-                "Q25",
-                "中位数",
-                "均值",
-                "Q75",
-                "P95",
-                "最大值",
-                "标准差",
-                "CV%",
-                "偏度",
-                "峰度",
-            ]
-            for col, s in numeric_summary.items():
-                stats_table["rows"].append(
-                    [
+            driver_items = []
+            metric_idx = numeric_cols.index(primary_metric)
+            for idx, col in enumerate(others):
+                pair_count, top_mean, bottom_mean, col_std = row[8 + 4 * idx : 12 + 4 * idx]
+                if pair_count < 5:
+                    continue
+                driver_items.append(
+                    build_driver_item(
                         col,
-                        round(s["min"], 2),
-                        round(s["p5"], 2),
-                        round(s["q25"], 2),
-                        round(s["median"], 2),
-                        round(s["mean"], 2),
-                        round(s["q75"], 2),
-                        round(s["p95"], 2),
-                        round(s["max"], 2),
-                        round(s["std"], 2),
-                        s["cv"],
-                        s["skewness"],
-                        s["kurtosis"],
-                    ]
+                        float(raw_corr[metric_idx][numeric_cols.index(col)]),
+                        to_float(top_mean),
+                        to_float(bottom_mean),
+                        to_float(col_std),
+                    )
                 )
+            driver_items.sort(key=lambda x: x["score"], reverse=True)
+            driver_analysis = {"metric": primary_metric, "items": driver_items[:8]}
 
         # ==========================================
-        # 构建给 ECharts 渲染的完整 JSON 数据结构
+        # 10. 近似统计的误差说明
         # ==========================================
+        notes = [
+            "已启用快速模式："
+            + ("读取已入库表的快照" if source.source == "snapshot" else "由 DuckDB 直接读取原文件")
+            + "，整表扫描与聚合在 DuckDB 中完成",
+            "精确值：行数、缺失值、重复行、最值/均值/标准差/偏度/峰度、直方图、相关系数、分类频次、"
+            "分类切片、时间序列、Top/Bottom 排名，以及按分位阈值划分的分组计数与均值",
+        ]
+        sampled_cols = [col for col in sample_quantiles if sample_sizes[col] < non_null[col]]
+        if sampled_cols:
+            min_size = min(sample_sizes[col] for col in sampled_cols)
+            eps = fast_profile.dkw_epsilon(min_size) * 100
+            notes.append(
+                f"分位数（P5~P95、箱线图四分位与异常值边界、P10/P90 高低位阈值）取自 {len(sample)} 行均匀蓄水池样本，"
+                f"各列至少 {min_size} 个有效值；95% 置信下排名误差不超过 ±{eps:.2f} 个百分位（DKW 不等式），"
+                f"例如报告的中位数在真实分布中位于 P{50 - eps:.1f}~P{50 + eps:.1f} 之间"
+            )
+        else:
+            notes.append("分位数为精确值（样本已覆盖全部有效数据）")
+        notes.append(
+            f"各列唯一值数为 HyperLogLog 估计（相对标准误差约 ±{fast_profile.HLL_RELATIVE_ERROR * 100:.2f}%），"
+            "分类摘要中的唯一值数与频次为精确值"
+        )
+        notes.append("散点图点位来自样本，内存占用为按样本外推的估计值")
+        if source.source == "snapshot":
+            notes.append("列名与类型来自入库清洗后的表，可能与原文件表头略有差异")
+
         chart_data = {
             "overview": overview,
             "data_quality": data_quality,
@@ -723,201 +1302,265 @@ def analyze_csv(file_path):
             "segment_comparison": segment_comparison,
             "top_bottom": top_bottom,
             "ranking_signal": ranking_signal,
-            "stats_table": stats_table,
+            "stats_table": build_stats_table(numeric_summary),
+        }
+        return {
+            "chart_data": chart_data,
+            "numeric_summary": numeric_summary,
+            "cat_summary": cat_summary,
+            "categorical_cols": categorical_cols,
+            "missing_by_col": missing_by_col,
+            "notes": notes,
         }
+    finally:
+        source.close()
 
-        chart_data_json_str = json.dumps(chart_data, ensure_ascii=False)
 
-        # ==========================================
-        # 构建给 LLM 深度分析阅读的文本摘要
-        # ==========================================
-        summary_lines = [
-            "==================================================",
-            "【数据概览】",
-            f"- 数据集尺寸: {overview['rows']} 行 × {overview['cols']} 列",
-            f"- 缺失值情况: 共有 {overview['missing_cells']} 个单元格缺失，整体数据完整率 {100 - overview['missing_pct']}%",
-            f"- 重复行: {overview['duplicate_rows']} 行",
-            f"- 内存占用: {overview['memory_kb']} KB",
-            f"- 数值型列 ({len(numeric_cols)}): {', '.join(numeric_cols[:10])}",
-            f"- 分类型列 ({len(categorical_cols)}): {', '.join(categorical_cols[:10])}",
-            f"- 数据类型分布: {dtype_counts}",
+def build_summary(report):
+    """
+    构建给 LLM 深度分析阅读的文本摘要，末尾附带 ECharts 渲染用的 CHART_DATA_JSON。
+    report 为 analyze_dataframe / analyze_fast 的返回值，notes 非空时输出【快速模式说明】
+    """
+    chart_data = report["chart_data"]
+    numeric_summary = report["numeric_summary"]
+    cat_summary = report["cat_summary"]
+    categorical_cols = report["categorical_cols"]
+    missing_by_col = report["missing_by_col"]
+    overview = chart_data["overview"]
+    numeric_cols = chart_data["numeric_cols"]
+    dtype_counts = chart_data["data_quality"]["dtype_summary"]
+    correlations = chart_data["correlations"]
+    correlation_highlights = chart_data["correlation_highlights"]
+    segment_breakdown = chart_data["segment_breakdown"]
+    time_series = chart_data["time_series"]
+    time_series_multi = chart_data["time_series_multi"]
+    time_series_diagnostics = chart_data["time_series_diagnostics"]
+    scatter = chart_data["scatter"]
+    outliers = chart_data["outliers"]
+    anomaly_overview = chart_data["anomaly_overview"]
+    driver_analysis = chart_data["driver_analysis"]
+    top_bottom = chart_data["top_bottom"]
+    ranking_signal = chart_data["ranking_signal"]
+
+    chart_data_json_str = json.dumps(chart_data, ensure_ascii=False)
+
+    # ==========================================
+    # 构建给 LLM 深度分析阅读的文本摘要
+    # ==========================================
+    summary_lines = [
+        "==================================================",
+        "【数据概览】",
+        f"- 数据集尺寸: {overview['rows']} 行 × {overview['cols']} 列",
+        f"- 缺失值情况: 共有 {overview['missing_cells']} 个单元格缺失，整体数据完整率 {100 - overview['missing_pct']}%",
+        f"- 重复行: {overview['duplicate_rows']} 行",
+        f"- 内存占用: {overview['memory_kb']} KB",
+        f"- 数值型列 ({len(numeric_cols)}): {', '.join(numeric_cols[:10])}",
+        f"- 分类型列 ({len(categorical_cols)}): {', '.join(categorical_cols[:10])}",
+        f"- 数据类型分布: {dtype_counts}",
+        "",
+        "【质量关注点】",
+    ]
+    quality_focus = [
+        (col, rate, miss_count)
+        for col, rate, miss_count in missing_by_col[:5]
+        if rate > 0
+    ]
+    if quality_focus:
+        for col, rate, miss_count in quality_focus:
+            summary_lines.append(f"- {col}: 缺失 {miss_count} 个，占比 {rate}%")
+    else:
+        summary_lines.append("- 所有字段均无缺失，数据完整性较高")
+
+    if report.get("notes"):
+        summary_lines.append("")
+        summary_lines.append("【快速模式说明】")
+        summary_lines.extend(f"- {note}" for note in report["notes"])
+
+    summary_lines.extend(
+        [
             "",
-            "【质量关注点】",
-        ]
-        quality_focus = [
-            (col, rate, miss_count)
-            for col, rate, miss_count in missing_by_col[:5]
-            if rate > 0
+            "【数值型特征统计 (Top 8)】",
         ]
-        if quality_focus:
-            for col, rate, miss_count in quality_focus:
-                summary_lines.append(f"- {col}: 缺失 {miss_count} 个，占比 {rate}%")
-        else:
-            summary_lines.append("- 所有字段均无缺失，数据完整性较高")
-
-        summary_lines.extend(
-            [
-                "",
-                "【数值型特征统计 (Top 8)】",
-            ]
+    )
+    for col, s in numeric_summary.items():
+        summary_lines.append(
+            f"- {col}: min={s['min']:.2f}, P5={s['p5']:.2f}, Q25={s['q25']:.2f}, "
+            f"median={s['median']:.2f}, mean={s['mean']:.2f}, Q75={s['q75']:.2f}, "
+            f"P95={s['p95']:.2f}, max={s['max']:.2f}, std={s['std']:.2f}, "
+            f"CV={s['cv']}%({classify_cv(s['cv'])}), spread={s['spread']:.2f}, "
+            f"skew={s['skewness']}({classify_skewness(s['skewness'])}), kurtosis={s['kurtosis']}"
         )
-        for col, s in numeric_summary.items():
+
+    if numeric_summary:
+        volatile_cols = sorted(
+            numeric_summary.items(), key=lambda x: x[1]["cv"], reverse=True
+        )[:3]
+        summary_lines.append("")
+        summary_lines.append("【波动性与偏态重点】")
+        for col, s in volatile_cols:
             summary_lines.append(
-                f"- {col}: min={s['min']:.2f}, P5={s['p5']:.2f}, Q25={s['q25']:.2f}, "
-                f"median={s['median']:.2f}, mean={s['mean']:.2f}, Q75={s['q75']:.2f}, "
-                f"P95={s['p95']:.2f}, max={s['max']:.2f}, std={s['std']:.2f}, "
-                f"CV={s['cv']}%({classify_cv(s['cv'])}), spread={s['spread']:.2f}, "
-                f"skew={s['skewness']}({classify_skewness(s['skewness'])}), kurtosis={s['kurtosis']}"
+                f"- {col}: 波动等级={classify_cv(s['cv'])}, CV={s['cv']}%, 偏态={classify_skewness(s['skewness'])}"
             )
 
-        if numeric_summary:
-            volatile_cols = sorted(
-                numeric_summary.items(), key=lambda x: x[1]["cv"], reverse=True
-            )[:3]
-            summary_lines.append("")
-            summary_lines.append("【波动性与偏态重点】")
-            for col, s in volatile_cols:
+    # 异常值摘要
+    if outliers:
+        summary_lines.append("")
+        summary_lines.append("【异常值检测 (IQR 方法)】")
+        for col, info in outliers.items():
+            if info["count"] > 0:
                 summary_lines.append(
-                    f"- {col}: 波动等级={classify_cv(s['cv'])}, CV={s['cv']}%, 偏态={classify_skewness(s['skewness'])}"
+                    f"- {col}: {info['count']} 个异常值 ({info['pct']}%), "
+                    f"正常范围 [{info['lower_bound']}, {info['upper_bound']}]"
                 )
+        if not any(info["count"] > 0 for info in outliers.values()):
+            summary_lines.append("- 未检测到显著异常值")
 
-        # 异常值摘要
-        if outliers:
-            summary_lines.append("")
-            summary_lines.append("【异常值检测 (IQR 方法)】")
-            for col, info in outliers.items():
-                if info["count"] > 0:
-                    summary_lines.append(
-                        f"- {col}: {info['count']} 个异常值 ({info['pct']}%), "
-                        f"正常范围 [{info['lower_bound']}, {info['upper_bound']}]"
-                    )
-            if not any(info["count"] > 0 for info in outliers.values()):
-                summary_lines.append("- 未检测到显著异常值")
-
-        # Top/Bottom 排名
-        if top_bottom:
-            summary_lines.append("")
-            summary_lines.append(
-                f"【Top 5 / Bottom 5 排名 (按 {top_bottom['rank_col']})】"
-            )
-            summary_lines.append(
-                f"  Top 5: {list(zip(top_bottom['top5']['labels'], top_bottom['top5']['values']))}"
-            )
+    # Top/Bottom 排名
+    if top_bottom:
+        summary_lines.append("")
+        summary_lines.append(
+            f"【Top 5 / Bottom 5 排名 (按 {top_bottom['rank_col']})】"
+        )
+        summary_lines.append(
+            f"  Top 5: {list(zip(top_bottom['top5']['labels'], top_bottom['top5']['values']))}"
+        )
+        summary_lines.append(
+            f"  Bottom 5: {list(zip(top_bottom['bottom5']['labels'], top_bottom['bottom5']['values']))}"
+        )
+        if ranking_signal:
             summary_lines.append(
-                f"  Bottom 5: {list(zip(top_bottom['bottom5']['labels'], top_bottom['bottom5']['values']))}"
+                f"  排名断层: Top5均值={ranking_signal['top_avg']}, Bottom5均值={ranking_signal['bottom_avg']}, 差值={ranking_signal['gap']}"
             )
-            if ranking_signal:
-                summary_lines.append(
-                    f"  排名断层: Top5均值={ranking_signal['top_avg']}, Bottom5均值={ranking_signal['bottom_avg']}, 差值={ranking_signal['gap']}"
-                )
 
-        if anomaly_overview:
-            summary_lines.append("")
-            summary_lines.append("【数据异动概述】")
-            summary_lines.append(
-                f"- 核心分析指标: {anomaly_overview['metric']}，均值={anomaly_overview['mean']}，中位数={anomaly_overview['median']}，P10={anomaly_overview['q10']}，P90={anomaly_overview['q90']}"
-            )
-            summary_lines.append(
-                f"- 高位组({anomaly_overview['top_group_size']}个样本)均值={anomaly_overview['top_group_mean']}，低位组({anomaly_overview['bottom_group_size']}个样本)均值={anomaly_overview['bottom_group_mean']}，差值={anomaly_overview['gap']}"
-            )
+    if anomaly_overview:
+        summary_lines.append("")
+        summary_lines.append("【数据异动概述】")
+        summary_lines.append(
+            f"- 核心分析指标: {anomaly_overview['metric']}，均值={anomaly_overview['mean']}，中位数={anomaly_overview['median']}，P10={anomaly_overview['q10']}，P90={anomaly_overview['q90']}"
+        )
+        summary_lines.append(
+            f"- 高位组({anomaly_overview['top_group_size']}个样本)均值={anomaly_overview['top_group_mean']}，低位组({anomaly_overview['bottom_group_size']}个样本)均值={anomaly_overview['bottom_group_mean']}，差值={anomaly_overview['gap']}"
+        )
+        summary_lines.append(
+            f"- 主指标异常值数量={anomaly_overview['outlier_count']}，占比={anomaly_overview['outlier_pct']}%，分位带样本分布={list(zip(anomaly_overview['band_labels'], anomaly_overview['band_values']))}"
+        )
+
+    if driver_analysis.get("items"):
+        summary_lines.append("")
+        summary_lines.append("【归因分析线索】")
+        for item in driver_analysis["items"][:5]:
             summary_lines.append(
-                f"- 主指标异常值数量={anomaly_overview['outlier_count']}，占比={anomaly_overview['outlier_pct']}%，分位带样本分布={list(zip(anomaly_overview['band_labels'], anomaly_overview['band_values']))}"
+                f"- {item['name']}: 综合驱动分={item['score']}，与 {driver_analysis['metric']} 的相关系数={item['corr']}，高位组均值={item['top_mean']}，低位组均值={item['bottom_mean']}，组间差异强度={item['gap_ratio']}"
             )
 
-        if driver_analysis.get("items"):
-            summary_lines.append("")
-            summary_lines.append("【归因分析线索】")
-            for item in driver_analysis["items"][:5]:
-                summary_lines.append(
-                    f"- {item['name']}: 综合驱动分={item['score']}，与 {driver_analysis['metric']} 的相关系数={item['corr']}，高位组均值={item['top_mean']}，低位组均值={item['bottom_mean']}，组间差异强度={item['gap_ratio']}"
-                )
+    summary_lines.append("")
+    summary_lines.append("【分类型特征摘要 (Top 6)】")
+    for col, stats in cat_summary.items():
+        summary_lines.append(
+            f"- {col}: 唯一值={stats['n_unique']}, 最常见={stats['top1']} "
+            f"(出现{stats['top1_count']}次, 占比{stats['top1_share']}%), 熵={stats['entropy']}, "
+            f"Top3集中度={stats['top3_share']}%"
+        )
 
+    if segment_breakdown:
         summary_lines.append("")
-        summary_lines.append("【分类型特征摘要 (Top 6)】")
-        for col, stats in cat_summary.items():
+        summary_lines.append("【分类维度切片表现】")
+        for segment in segment_breakdown:
+            leaders = segment["leaders"][:3]
+            leader_text = "; ".join(
+                [
+                    f"{item['name']}(样本{item['count']}, 均值{item['mean']}, 总量{item['sum']})"
+                    for item in leaders
+                ]
+            )
             summary_lines.append(
-                f"- {col}: 唯一值={stats['n_unique']}, 最常见={stats['top1']} "
-                f"(出现{stats['top1_count']}次, 占比{stats['top1_share']}%), 熵={stats['entropy']}, "
-                f"Top3集中度={stats['top3_share']}%"
+                f"- 维度 {segment['dimension']} 对指标 {segment['metric']} 的高贡献分组: {leader_text}"
             )
 
-        if segment_breakdown:
-            summary_lines.append("")
-            summary_lines.append("【分类维度切片表现】")
-            for segment in segment_breakdown:
-                leaders = segment["leaders"][:3]
-                leader_text = "; ".join(
-                    [
-                        f"{item['name']}(样本{item['count']}, 均值{item['mean']}, 总量{item['sum']})"
-                        for item in leaders
-                    ]
-                )
-                summary_lines.append(
-                    f"- 维度 {segment['dimension']} 对指标 {segment['metric']} 的高贡献分组: {leader_text}"
+    summary_lines.append("")
+    summary_lines.append("【核心相关性】")
+    if correlations["data"]:
+        strong_corrs = []
+        for item in correlations["data"]:
+            i, j, val = item
+            if i < j and abs(val) >= 0.5:
+                strong_corrs.append(
+                    f"{numeric_cols[i]} 与 {numeric_cols[j]} (相关系数: {val})"
                 )
+        if strong_corrs:
+            summary_lines.extend([f"- {c}" for c in strong_corrs])
+        else:
+            summary_lines.append("- 没有发现强相关的数值变量组合（|r| >= 0.5）。")
+        if correlation_highlights["positive"]:
+            summary_lines.append("- 最高正相关组合:")
+            for c1, c2, val in correlation_highlights["positive"]:
+                summary_lines.append(f"  * {c1} vs {c2}: {val}")
+        if correlation_highlights["negative"]:
+            summary_lines.append("- 最低相关组合:")
+            for c1, c2, val in correlation_highlights["negative"]:
+                summary_lines.append(f"  * {c1} vs {c2}: {val}")
+
+    if scatter:
+        summary_lines.append("")
+        summary_lines.append(
+            f"【散点图】已生成 {scatter['x_name']} vs {scatter['y_name']} 的散点图数据"
+        )
 
+    # 时间序列摘要
+    if time_series["dates"]:
         summary_lines.append("")
-        summary_lines.append("【核心相关性】")
-        if correlations["data"]:
-            strong_corrs = []
-            for item in correlations["data"]:
-                i, j, val = item
-                if i < j and abs(val) >= 0.5:
-                    strong_corrs.append(
-                        f"{numeric_cols[i]} 与 {numeric_cols[j]} (相关系数: {val})"
-                    )
-            if strong_corrs:
-                summary_lines.extend([f"- {c}" for c in strong_corrs])
-            else:
-                summary_lines.append("- 没有发现强相关的数值变量组合（|r| >= 0.5）。")
-            if correlation_highlights["positive"]:
-                summary_lines.append("- 最高正相关组合:")
-                for c1, c2, val in correlation_highlights["positive"]:
-                    summary_lines.append(f"  * {c1} vs {c2}: {val}")
-            if correlation_highlights["negative"]:
-                summary_lines.append("- 最低相关组合:")
-                for c1, c2, val in correlation_highlights["negative"]:
-                    summary_lines.append(f"  * {c1} vs {c2}: {val}")
-
-        if scatter:
-            summary_lines.append("")
+        summary_lines.append(
+            f"【时间序列】检测到时间列，已按月/日聚合 {time_series['name']} 趋势"
+        )
+        if time_series_diagnostics:
             summary_lines.append(
-                f"【散点图】已生成 {scatter['x_name']} vs {scatter['y_name']} 的散点图数据"
+                f"- 时间字段={time_series_diagnostics['date_col']}, 观测点={time_series_diagnostics['points']}, "
+                f"起点={time_series_diagnostics['start']}, 终点={time_series_diagnostics['end']}, "
+                f"整体变化={time_series_diagnostics['change_pct']}%, 斜率={time_series_diagnostics['slope']}, "
+                f"波动率={time_series_diagnostics['volatility_pct']}%"
             )
-
-        # 时间序列摘要
-        if time_series["dates"]:
-            summary_lines.append("")
             summary_lines.append(
-                f"【时间序列】检测到时间列，已按月/日聚合 {time_series['name']} 趋势"
+                f"- 峰值出现在 {time_series_diagnostics['peak_date']} ({time_series_diagnostics['peak_value']}), "
+                f"谷值出现在 {time_series_diagnostics['trough_date']} ({time_series_diagnostics['trough_value']})"
             )
-            if time_series_diagnostics:
-                summary_lines.append(
-                    f"- 时间字段={time_series_diagnostics['date_col']}, 观测点={time_series_diagnostics['points']}, "
-                    f"起点={time_series_diagnostics['start']}, 终点={time_series_diagnostics['end']}, "
-                    f"整体变化={time_series_diagnostics['change_pct']}%, 斜率={time_series_diagnostics['slope']}, "
-                    f"波动率={time_series_diagnostics['volatility_pct']}%"
-                )
-                summary_lines.append(
-                    f"- 峰值出现在 {time_series_diagnostics['peak_date']} ({time_series_diagnostics['peak_value']}), "
-                    f"谷值出现在 {time_series_diagnostics['trough_date']} ({time_series_diagnostics['trough_value']})"
-                )
-            if time_series_multi:
-                extra_names = [ts_m["name"] for ts_m in time_series_multi]
-                summary_lines.append(f"  额外趋势列: {', '.join(extra_names)}")
+        if time_series_multi:
+            extra_names = [ts_m["name"] for ts_m in time_series_multi]
+            summary_lines.append(f"  额外趋势列: {', '.join(extra_names)}")
+
+    summary_lines.append("==================================================")
+    summary_lines.append(
+        "请作为数据分析专家，基于以上【统计摘要】为用户撰写深度的数据分析见解（Insights）。每个模块尽量覆盖现象、可能原因、业务影响、行动建议四层内容，避免只重复统计值。"
+    )
+    summary_lines.append(
+        "注意：marker 中包裹的 CHART_DATA_JSON 会由后端自动注入模板，你无需手动传递。"
+    )
+    summary_lines.append("###CHART_DATA_JSON_START###")
+    summary_lines.append(chart_data_json_str)
+    summary_lines.append("###CHART_DATA_JSON_END###")
+
+    return "\n".join(summary_lines)
 
-        summary_lines.append("==================================================")
-        summary_lines.append(
-            "请作为数据分析专家，基于以上【统计摘要】为用户撰写深度的数据分析见解（Insights）。每个模块尽量覆盖现象、可能原因、业务影响、行动建议四层内容，避免只重复统计值。"
-        )
-        summary_lines.append(
-            "注意：marker 中包裹的 CHART_DATA_JSON 会由后端自动注入模板，你无需手动传递。"
-        )
-        summary_lines.append("###CHART_DATA_JSON_START###")
-        summary_lines.append(chart_data_json_str)
-        summary_lines.append("###CHART_DATA_JSON_END###")
 
-        final_text = "\n".join(summary_lines)
+def analyze_csv(file_path, mode="auto", snapshot_path=None, sample_size=FAST_SAMPLE_ROWS):
+    """
+    分析CSV文件，提取用于 ECharts 渲染的数据结构和用于 LLM 分析的统计摘要。
+    输出包含: overview, data_quality, distributions, correlations, categories,
+    time_series, scatter, stats_table, box_plots, outliers, top_bottom
+
+    mode: auto（按文件大小选择）/ full（pandas 全量精确计算）/ fast（DuckDB 聚合 + 抽样与近似统计）
+    snapshot_path: 后端导出的已入库表 Parquet 快照，快速模式优先从快照读取
+    """
+    try:
+        report = None
+        if resolve_mode(file_path, mode, snapshot_path) == "fast":
+            try:
+                report = analyze_fast(file_path, snapshot_path, sample_size)
+            except Exception as e:
+                log(f"快速模式分析失败，改用完整模式: {e}")
+        if report is None:
+            log(f"正在读取文件: {file_path}")
+            report = analyze_dataframe(read_dataframe(file_path))
+        final_text = build_summary(report)
 
         # 输出标准 chunks
         print(
@@ -958,7 +1601,13 @@ def main():
             args.get("input_file") or args.get("file_path") or args.get("csv_file", "")
         )
     except (ValueError, TypeError):
+        args = {}
         csv_file = sys.argv[1]
+    mode = args.get("mode", "auto")
+    snapshot_path = args.get("duckdb_snapshot")
+    if snapshot_path and not os.path.exists(snapshot_path):
+        snapshot_path = None
+    sample_size = int(args.get("sample_size") or FAST_SAMPLE_ROWS)
 
     if not csv_file or not os.path.exists(csv_file):
         result = {
@@ -983,7 +1632,7 @@ def main():
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(1)
 
-    analyze_csv(csv_file)
+    analyze_csv(csv_file, mode, snapshot_path, sample_size)
 
 
 if __name__ == "__main__":
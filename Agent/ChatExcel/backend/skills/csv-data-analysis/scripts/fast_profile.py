@@ -0,0 +1,187 @@
+"""
+csv_analyzer 快速模式的数据源与近似统计工具。
+
+大文件（数百万行）用 pandas 全量读入后逐项计算会超过脚本执行超时。快速模式把整表扫描
+交给 DuckDB（向量化、多线程、流式执行），Python 侧只拉回固定大小的均匀样本和聚合结果：
+
+- 精确统计（行数、缺失、重复行、矩、相关系数、直方图、分组聚合等）直接在 SQL 中完成
+- 分位数取自蓄水池样本，误差界由 DKW 不等式给出
+- 唯一值计数用 HyperLogLog，对 DuckDB 的 hash() 结果分批流式累加，内存占用与行数无关
+"""
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # 快速模式依赖 DuckDB，缺失时由调用方回退到完整模式
+    duckdb = None
+
+HLL_PRECISION = 14
+HLL_RELATIVE_ERROR = 1.04 / math.sqrt(1 << HLL_PRECISION)
+HASH_BATCH_ROWS = 500_000
+
+_NUMERIC_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "UHUGEINT",
+    "FLOAT", "DOUBLE", "REAL", "DECIMAL",
+)
+_INTEGER_TYPES = _NUMERIC_TYPES[:10]
+
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def as_double(col):
+    return f"CAST({quote_ident(col)} AS DOUBLE)"
+
+
+def to_float(value, default=0.0):
+    """SQL 聚合结果转 float，NULL/NaN（如样本不足时的标准差、偏度）取 default"""
+    if value is None:
+        return default
+    value = float(value)
+    return default if math.isnan(value) else value
+
+
+def _sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def dkw_epsilon(n, confidence=0.95):
+    """
+    DKW 不等式：n 个独立同分布样本的经验分布函数与真实分布函数的最大偏差，
+    以 confidence 的概率不超过返回值（即样本分位数的排名误差上界）
+    """
+    if n <= 0:
+        return 1.0
+    return math.sqrt(math.log(2.0 / (1.0 - confidence)) / (2.0 * n))
+
+
+def _bit_length(values):
+    """uint64 数组逐元素的二进制位数（高低 32 位分开处理，float64 可精确表示）"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, np.frexp(high)[1] + 32, np.frexp(low)[1])
+
+
+class HyperLogLog:
+    """64 位哈希上的 HyperLogLog 基数估计，相对标准误差约 1.04 / sqrt(2^precision)"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if hashes.size == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = hashes << np.uint64(self.precision)
+        rank = np.minimum(64 - _bit_length(rest) + 1, 64 - self.precision + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def estimate(self):
+        m = float(self.m)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # 小基数区间用线性计数修正（此时结果接近精确）
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class DuckDBSource:
+    """
+    把待分析数据装入内存 DuckDB 表 data，后续统计都在该表上做 SQL 聚合
+
+    - snapshot_path: 后端导出的已入库表 Parquet 快照（列名与类型已由入库流程清洗）
+    - 否则 CSV/TSV 由 DuckDB 直接读取，Excel 经 pandas 读取后注册
+    """
+
+    def __init__(self, file_path, snapshot_path=None):
+        if duckdb is None:
+            raise RuntimeError("快速模式需要 duckdb")
+        self.con = duckdb.connect()
+        self.source = "snapshot" if snapshot_path else "file"
+        if snapshot_path:
+            self.con.execute(
+                f"CREATE TABLE data AS SELECT * FROM read_parquet({_sql_literal(snapshot_path)})"
+            )
+        else:
+            self._load_file(file_path)
+        described = self.con.execute("DESCRIBE data").fetchall()
+        self.columns = [row[0] for row in described]
+        self.types = {row[0]: str(row[1]).upper() for row in described}
+
+    def _load_file(self, file_path):
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in (".xls", ".xlsx"):
+            self.con.register("excel_df", pd.read_excel(file_path))
+            self.con.execute("CREATE TABLE data AS SELECT * FROM excel_df")
+            self.con.unregister("excel_df")
+            return
+        delim = "\t" if ext == ".tsv" else ","
+        path = _sql_literal(file_path)
+        try:
+            self.con.execute(
+                f"CREATE TABLE data AS SELECT * FROM read_csv({path}, delim={_sql_literal(delim)}, header=true)"
+            )
+        except duckdb.Error:
+            # 类型推断只看文件开头，后面出现不兼容的值时改为全文件推断
+            self.con.execute(
+                f"CREATE TABLE data AS SELECT * FROM read_csv({path}, delim={_sql_literal(delim)}, header=true, sample_size=-1)"
+            )
+
+    def close(self):
+        self.con.close()
+
+    def query(self, sql, params=None):
+        return self.con.execute(sql, params or []).fetchall()
+
+    def query_df(self, sql, params=None):
+        return self.con.execute(sql, params or []).df()
+
+    def is_numeric(self, col):
+        return self.types[col].startswith(_NUMERIC_TYPES)
+
+    def is_integer(self, col):
+        return self.types[col].startswith(_INTEGER_TYPES)
+
+    def is_boolean(self, col):
+        return self.types[col] == "BOOLEAN"
+
+    def pandas_dtype(self, col, has_missing):
+        """按 pandas 读取同一份数据时的 dtype 命名（含缺失值的整数列在 pandas 中为 float64）"""
+        if self.is_integer(col):
+            return "float64" if has_missing else "int64"
+        if self.is_numeric(col):
+            return "float64"
+        if self.is_boolean(col):
+            return "bool"
+        return "object"
+
+    def distinct_estimates(self, columns, precision=HLL_PRECISION):
+        """对各列非空值的 hash() 分批流式累加 HyperLogLog，返回 {列名: 唯一值估计}"""
+        if not columns:
+            return {}
+        sketches = {col: HyperLogLog(precision) for col in columns}
+        select_list = ", ".join(
+            f"CASE WHEN {quote_ident(col)} IS NULL THEN NULL ELSE hash({quote_ident(col)}) END"
+            for col in columns
+        )
+        reader = self.con.execute(f"SELECT {select_list} FROM data").fetch_record_batch(HASH_BATCH_ROWS)
+        for batch in reader:
+            for idx, col in enumerate(columns):
+                sketches[col].add_hashes(batch.column(idx).drop_null().to_numpy())
+        return {col: sketch.estimate() for col, sketch in sketches.items()}
+
+    def reservoir_sample(self, size, seed=42):
+        """蓄水池均匀抽样（行数不超过 size 时即为全表）"""
+        return self.query_df(f"SELECT * FROM data USING SAMPLE reservoir({int(size)} ROWS) REPEATABLE ({int(seed)})")
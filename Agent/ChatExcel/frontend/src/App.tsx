@@ -343,6 +343,7 @@ function App() {
             {showPreview && (
               <ExcelPreview
                 filePaths={activeFilePaths}
+                convUid={activeConvUid}
                 collapsed={previewCollapsed}
                 onToggle={() => setPreviewCollapsed(!previewCollapsed)}
               />
@@ -66,8 +66,40 @@ export async function getMessages(convUid: string): Promise<any[]> {
   return res.json();
 }
 
-export async function getExcelPreview(filePath: string): Promise<any> {
-  const res = await fetch(`${API_BASE}/excel-preview?file_path=${encodeURIComponent(filePath)}`);
+export async function getExcelPreview(filePath: string, convUid?: string): Promise<any> {
+  const params = new URLSearchParams({ file_path: filePath });
+  if (convUid) params.set('conv_uid', convUid);
+  const res = await fetch(`${API_BASE}/excel-preview?${params.toString()}`);
+  if (!res.ok) {
+    let detail = '';
+    try {
+      const errBody = await res.json();
+      detail = errBody?.detail || errBody?.message || '';
+    } catch {}
+    throw new Error(detail || `预览失败 (${res.status})`);
+  }
+  return res.json();
+}
+
+export async function getExcelPreviewWindow(
+  filePath: string,
+  sheet: string,
+  offset: number,
+  limit: number,
+  convUid?: string,
+  colOffset?: number,
+  colLimit?: number,
+): Promise<any> {
+  const params = new URLSearchParams({
+    file_path: filePath,
+    sheet,
+    offset: String(offset),
+    limit: String(limit),
+  });
+  if (convUid) params.set('conv_uid', convUid);
+  if (colOffset !== undefined) params.set('col_offset', String(colOffset));
+  if (colLimit !== undefined) params.set('col_limit', String(colLimit));
+  const res = await fetch(`${API_BASE}/excel-preview/window?${params.toString()}`);
   if (!res.ok) {
     let detail = '';
     try {
@@ -1,8 +1,22 @@
 /** ExcelPreview — 右侧收缩栏，预览 Excel 原始数据，像浏览 Excel 一样 */
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { FileExcelOutlined, LeftOutlined, RightOutlined, WarningOutlined } from '@ant-design/icons';
-import { getExcelPreview } from '../api/client';
+import { getExcelPreview, getExcelPreviewWindow } from '../api/client';
+
+// 每次按窗口请求的行数，与后端首页行数一致
+const PAGE_ROWS = 200;
+// 每次显示的列数，超出时在底部翻页
+const COL_PAGE = 50;
+// 固定行高（与 .preview-table tbody tr 一致），只渲染可视区域附近的行
+const ROW_HEIGHT = 27;
+const HEADER_HEIGHT = 32;
+// 可视区域上下额外渲染的行数
+const OVERSCAN_ROWS = 20;
+// 滚动区域高度上限，行数过多时按比例映射滚动位置，避免超出浏览器元素高度限制
+const MAX_SCROLL_HEIGHT = 10_000_000;
+// 停止滚动后再请求缺失的页，快速拖动滚动条时不请求途经的每一页
+const FETCH_DEBOUNCE_MS = 120;
 
 interface SheetData {
   name: string;
@@ -12,6 +26,7 @@ interface SheetData {
   message?: string;
   columns?: string[];
   rows?: any[][];
+  has_more?: boolean;
 }
 
 interface PreviewData {
@@ -20,21 +35,43 @@ interface PreviewData {
 }
 
 interface PreviewSheet extends SheetData {
+  file_path: string;
   file_name: string;
   display_name: string;
 }
 
+interface PageData {
+  columns: string[];
+  rows: any[][];
+}
+
 interface Props {
   filePaths: string[];
+  convUid?: string;
   collapsed: boolean;
   onToggle: () => void;
 }
 
-export default function ExcelPreview({ filePaths, collapsed, onToggle }: Props) {
+const columnsKey = (sheetIdx: number, colOffset: number) => `${sheetIdx}:${colOffset}`;
+const pageKey = (sheetIdx: number, colOffset: number, page: number) => `${sheetIdx}:${colOffset}:${page}`;
+
+export default function ExcelPreview({ filePaths, convUid, collapsed, onToggle }: Props) {
   const [sheets, setSheets] = useState<PreviewSheet[]>([]);
   const [activeSheet, setActiveSheet] = useState(0);
+  const [colOffset, setColOffset] = useState(0);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  const [scrollTop, setScrollTop] = useState(0);
+  const [viewportHeight, setViewportHeight] = useState(600);
+  const [, setPageVersion] = useState(0);
+  // 只保留可视区域附近的页，滚动离开后丢弃，内存与文件大小无关
+  const pagesRef = useRef<Map<string, PageData>>(new Map());
+  const keepRef = useRef<Set<string>>(new Set());
+  const inflightRef = useRef<Set<string>>(new Set());
+  const columnsRef = useRef<Map<string, string[]>>(new Map());
+  // 文件列表变化后递增，丢弃旧文件仍在途的请求结果
+  const generationRef = useRef(0);
+  const wrapperRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
     const paths = filePaths.filter(Boolean);
@@ -44,17 +81,34 @@ export default function ExcelPreview({ filePaths, collapsed, onToggle }: Props)
       setLoading(true);
       setError('');
       try {
-        const results: PreviewData[] = await Promise.all(paths.map(path => getExcelPreview(path)));
+        const results: PreviewData[] = await Promise.all(paths.map(path => getExcelPreview(path, convUid)));
         if (!cancelled) {
-          const mergedSheets = results.flatMap(result =>
+          const mergedSheets = results.flatMap((result, fileIdx) =>
             result.sheets.map(sheet => ({
               ...sheet,
+              file_path: paths[fileIdx],
               file_name: result.file_name,
               display_name: results.length > 1 ? `${result.file_name} / ${sheet.name}` : sheet.name,
             }))
           );
-          setSheets(mergedSheets);
+          generationRef.current += 1;
+          pagesRef.current.clear();
+          inflightRef.current.clear();
+          columnsRef.current.clear();
+          // 首页数据作为各 sheet 第 0 页的缓存，sheet 状态里只保留行列数等元信息
+          mergedSheets.forEach((sheet, idx) => {
+            if (!sheet.columns || !sheet.rows) return;
+            const columns = sheet.columns.slice(0, COL_PAGE);
+            columnsRef.current.set(columnsKey(idx, 0), columns);
+            pagesRef.current.set(pageKey(idx, 0, 0), {
+              columns,
+              rows: sheet.rows.slice(0, PAGE_ROWS).map(row => row.slice(0, COL_PAGE)),
+            });
+          });
+          setSheets(mergedSheets.map(sheet => ({ ...sheet, rows: undefined })));
           setActiveSheet(0);
+          setColOffset(0);
+          setScrollTop(0);
         }
       } catch (err: any) {
         if (!cancelled) setError(err?.message || '加载预览失败');
@@ -64,9 +118,108 @@ export default function ExcelPreview({ filePaths, collapsed, onToggle }: Props)
     };
     load();
     return () => { cancelled = true; };
-  }, [filePaths.join('|'), collapsed]);
+  }, [filePaths.join('|'), convUid, collapsed]);
 
   const currentSheet = sheets[activeSheet];
+  const showTable = Boolean(currentSheet && !currentSheet.too_large && currentSheet.columns);
+
+  useEffect(() => {
+    const el = wrapperRef.current;
+    if (!el) return;
+    setViewportHeight(el.clientHeight || 600);
+    const observer = new ResizeObserver(() => setViewportHeight(el.clientHeight || 600));
+    observer.observe(el);
+    return () => observer.disconnect();
+  }, [showTable, collapsed]);
+
+  // 可视窗口：超过滚动高度上限时把滚动位置按比例映射到行号
+  const totalRows = currentSheet?.total_rows || 0;
+  const totalCols = currentSheet?.total_cols || 0;
+  const fullHeight = totalRows * ROW_HEIGHT;
+  const scrollHeight = Math.min(fullHeight, MAX_SCROLL_HEIGHT);
+  const scale = fullHeight > scrollHeight && scrollHeight > viewportHeight
+    ? (fullHeight - viewportHeight) / (scrollHeight - viewportHeight)
+    : 1;
+  const virtualTop = scrollTop * scale;
+  const firstRow = Math.min(Math.floor(virtualTop / ROW_HEIGHT), Math.max(totalRows - 1, 0));
+  const startRow = Math.max(0, firstRow - OVERSCAN_ROWS);
+  const endRow = Math.min(totalRows, Math.ceil((virtualTop + viewportHeight) / ROW_HEIGHT) + OVERSCAN_ROWS);
+  const tableTop = Math.max(0, scrollTop - (virtualTop - firstRow * ROW_HEIGHT) - (firstRow - startRow) * ROW_HEIGHT);
+  const firstPage = Math.floor(startRow / PAGE_ROWS);
+  const lastPage = Math.floor(Math.max(endRow - 1, 0) / PAGE_ROWS);
+
+  // 丢弃窗口外的页，防抖后按窗口请求缺失的页
+  useEffect(() => {
+    if (!currentSheet || collapsed || totalRows === 0) return;
+    const sheetIdx = activeSheet;
+    const keep = new Set<string>();
+    for (let page = Math.max(0, firstPage - 1); page <= lastPage + 1; page++) {
+      keep.add(pageKey(sheetIdx, colOffset, page));
+    }
+    keepRef.current = keep;
+    for (const key of Array.from(pagesRef.current.keys())) {
+      if (!keep.has(key)) pagesRef.current.delete(key);
+    }
+
+    const missing: number[] = [];
+    for (let page = firstPage; page <= lastPage; page++) {
+      const key = pageKey(sheetIdx, colOffset, page);
+      if (!pagesRef.current.has(key) && !inflightRef.current.has(key)) missing.push(page);
+    }
+    if (missing.length === 0) return;
+
+    const generation = generationRef.current;
+    const timer = setTimeout(() => {
+      missing.forEach(async page => {
+        const key = pageKey(sheetIdx, colOffset, page);
+        if (inflightRef.current.has(key) || !keepRef.current.has(key)) return;
+        inflightRef.current.add(key);
+        try {
+          const data = await getExcelPreviewWindow(
+            currentSheet.file_path, currentSheet.name, page * PAGE_ROWS, PAGE_ROWS, convUid, colOffset, COL_PAGE,
+          );
+          if (generation !== generationRef.current) return;
+          columnsRef.current.set(columnsKey(sheetIdx, colOffset), data.columns);
+          // 请求期间已滚动离开的页不再缓存
+          if (keepRef.current.has(key)) pagesRef.current.set(key, { columns: data.columns, rows: data.rows });
+          setPageVersion(version => version + 1);
+        } catch (err: any) {
+          if (generation === generationRef.current) setError(err?.message || '加载预览失败');
+        } finally {
+          inflightRef.current.delete(key);
+        }
+      });
+    }, FETCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [sheets, activeSheet, colOffset, firstPage, lastPage, collapsed, convUid]);
+
+  const selectSheet = (idx: number) => {
+    setActiveSheet(idx);
+    setColOffset(0);
+    setScrollTop(0);
+    if (wrapperRef.current) wrapperRef.current.scrollTop = 0;
+  };
+
+  const handleTableScroll = (e: React.UIEvent<HTMLDivElement>) => {
+    setScrollTop(e.currentTarget.scrollTop);
+  };
+
+  const columns = columnsRef.current.get(columnsKey(activeSheet, colOffset)) || [];
+  const visibleRows: React.ReactElement[] = [];
+  for (let rowIdx = startRow; rowIdx < endRow; rowIdx++) {
+    const page = pagesRef.current.get(pageKey(activeSheet, colOffset, Math.floor(rowIdx / PAGE_ROWS)));
+    const row = page?.rows[rowIdx % PAGE_ROWS];
+    visibleRows.push(
+      <tr key={rowIdx}>
+        <td className="preview-row-num">{rowIdx + 1}</td>
+        {row
+          ? row.map((cell: any, ci: number) => (
+            <td key={ci}>{cell === null || cell === undefined ? '' : String(cell)}</td>
+          ))
+          : columns.map((_, ci) => <td key={ci} className="preview-cell-pending" />)}
+      </tr>
+    );
+  }
 
   return (
     <div className={`excel-preview ${collapsed ? 'collapsed' : ''}`}>
@@ -102,7 +255,7 @@ export default function ExcelPreview({ filePaths, collapsed, onToggle }: Props)
                 <button
                   key={`${sheet.file_name}-${sheet.name}-${idx}`}
                   className={`preview-sheet-tab ${idx === activeSheet ? 'active' : ''}`}
-                  onClick={() => setActiveSheet(idx)}
+                  onClick={() => selectSheet(idx)}
                 >
                   {sheet.display_name}
                   <span className="sheet-row-count">{sheet.total_rows}行</span>
@@ -131,28 +284,21 @@ export default function ExcelPreview({ filePaths, collapsed, onToggle }: Props)
                 {currentSheet.message}
               </div>
             )}
-            {currentSheet && !currentSheet.too_large && currentSheet.columns && (
-              <div className="preview-table-wrapper">
-                <table className="preview-table">
-                  <thead>
-                    <tr>
-                      <th className="preview-row-num">#</th>
-                      {currentSheet.columns.map((col, i) => (
-                        <th key={i}>{String(col)}</th>
-                      ))}
-                    </tr>
-                  </thead>
-                  <tbody>
-                    {currentSheet.rows?.map((row, ri) => (
-                      <tr key={ri}>
-                        <td className="preview-row-num">{ri + 1}</td>
-                        {row.map((cell: any, ci: number) => (
-                          <td key={ci}>{cell === null || cell === undefined ? '' : String(cell)}</td>
+            {showTable && (
+              <div className="preview-table-wrapper" ref={wrapperRef} onScroll={handleTableScroll}>
+                <div className="preview-virtual-sizer" style={{ height: scrollHeight + HEADER_HEIGHT }}>
+                  <table className="preview-table" style={{ top: tableTop }}>
+                    <thead>
+                      <tr>
+                        <th className="preview-row-num">#</th>
+                        {columns.map((col, i) => (
+                          <th key={i}>{String(col)}</th>
                         ))}
                       </tr>
-                    ))}
-                  </tbody>
-                </table>
+                    </thead>
+                    <tbody>{visibleRows}</tbody>
+                  </table>
+                </div>
               </div>
             )}
           </div>
@@ -160,6 +306,25 @@ export default function ExcelPreview({ filePaths, collapsed, onToggle }: Props)
           {/* 底部统计 */}
           {currentSheet && (
             <div className="preview-footer">
+              {totalCols > COL_PAGE && (
+                <span className="preview-col-pager">
+                  <button
+                    disabled={colOffset === 0}
+                    onClick={() => setColOffset(Math.max(0, colOffset - COL_PAGE))}
+                    title="上一组列"
+                  >
+                    <LeftOutlined />
+                  </button>
+                  列 {colOffset + 1}-{Math.min(colOffset + COL_PAGE, totalCols)}
+                  <button
+                    disabled={colOffset + COL_PAGE >= totalCols}
+                    onClick={() => setColOffset(colOffset + COL_PAGE)}
+                    title="下一组列"
+                  >
+                    <RightOutlined />
+                  </button>
+                </span>
+              )}
               {currentSheet.total_rows} 行 × {currentSheet.total_cols} 列
             </div>
           )}
@@ -0,0 +1,222 @@
+# coding:utf8
+import os
+import base64
+import threading
+from collections import OrderedDict, deque
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+from langchain_community.retrievers import BM25Retriever
+
+
+class AhoCorasick():
+    """
+    Aho-Corasick 多模式匹配：一次扫描问题文本就能找出其中出现的所有公司名，耗时只与问题长度有关，与公司数量无关
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: 模式串列表，命中时返回其在列表中的下标，空串忽略
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, pattern in enumerate(patterns):
+            if pattern:
+                self._add(pattern, index)
+        self._build_fail()
+
+    def _add(self, pattern, index):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = next_state
+            state = next_state
+        self.output[state].append(index)
+
+    def _build_fail(self):
+        # 按层遍历，失配指针指向更浅的状态，命中结果沿失配指针合并
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """依次返回 text 中命中的模式下标"""
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            yield from self.output[state]
+
+
+class CorpusManager():
+    """
+    招股书语料管理
+    文件列表和公司名匹配器只构建一次；单个公司的分块结果和 FAISS 索引按 LRU 缓存，整个语料的分块结果、BM25 索引常驻内存，
+    批量回答时同一份招股书不再重复读盘、分块、加载索引。首次使用时才读取目录，导入模块不会访问磁盘
+    """
+
+    def __init__(self, data_path, embedding_model, vector_root='RAG/faiss_db', chunk_size=1000, chunk_overlap=20,
+                 max_vector_dbs=8, max_split_docs=32):
+        """
+        :param data_path: 招股书 txt 目录，文件名即公司名
+        :param embedding_model: embedding 模型
+        :param vector_root: 单个公司 FAISS 索引的存储目录
+        :param chunk_size: 单个公司检索时的分块大小
+        :param chunk_overlap: 单个公司检索时允许重叠的字数
+        :param max_vector_dbs: 内存中最多保留几个公司的 FAISS 索引
+        :param max_split_docs: 内存中最多保留几个公司的分块结果
+        """
+        self.data_path = data_path
+        self.embedding_model = embedding_model
+        self.vector_root = vector_root
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_vector_dbs = max_vector_dbs
+        self.max_split_docs = max_split_docs
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._vector_dbs = OrderedDict()
+        self._split_docs = OrderedDict()
+        self._corpus = {}
+        self._splitters = {}
+        self.file_list = None
+        self.companies = None
+        self._matcher = None
+
+    def preload(self):
+        """读取文件列表并构建公司名匹配器，只执行一次"""
+        if self._matcher is not None:
+            return
+        with self._lock:
+            if self._matcher is None:
+                self.file_list = os.listdir(self.data_path)
+                self.companies = [file.split('.')[0] for file in self.file_list]
+                self._matcher = AhoCorasick([company.strip(' 。') for company in self.companies])
+
+    def match_company(self, question):
+        """
+        问题中包含的公司名，多个命中时取文件列表中靠前的那个，与逐个判断 company in question 的结果一致
+        :return: 公司名，没有命中返回 None
+        """
+        self.preload()
+        matches = list(self._matcher.iter_matches(question))
+        if not matches:
+            return None
+        return self.companies[min(matches)]
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _cached(self, cache, key, max_size, builder):
+        """
+        LRU 读取：命中则移到队尾；未命中时同一个 key 只构建一次（多线程并发时其余线程等待结果），超过容量淘汰最久未用的
+        """
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        with self._key_lock(key):
+            with self._lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            value = builder()
+            with self._lock:
+                cache[key] = value
+                while len(cache) > max_size:
+                    cache.popitem(last=False)
+            return value
+
+    def _split(self, text, chunk_size, chunk_overlap):
+        key = (chunk_size, chunk_overlap)
+        if key not in self._splitters:
+            self._splitters[key] = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                length_function=len,
+                is_separator_regex=True,
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return self._splitters[key].create_documents([text])
+
+    def _read(self, file):
+        with open(os.path.join(self.data_path, file), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def split_docs(self, company):
+        """单个公司招股书的分块结果"""
+        return self._cached(
+            self._split_docs, ('split', company), self.max_split_docs,
+            lambda: self._split(self._read(company + '.txt'), self.chunk_size, self.chunk_overlap)
+        )
+
+    def vector_db(self, company):
+        """
+        单个公司的 FAISS 索引：内存中有则直接用，否则从磁盘加载，磁盘上也没有才分块并创建
+        """
+        return self._cached(self._vector_dbs, ('faiss', company), self.max_vector_dbs,
+                            lambda: self._load_or_create_vector_db(company))
+
+    def _load_or_create_vector_db(self, company):
+        # 目录名编码为非中文
+        vector_db_path = os.path.join(self.vector_root, base64.b64encode(company.encode('utf-8')).decode('utf-8'))
+        if os.path.exists(vector_db_path):
+            print('加载向量数据库路径 =》', vector_db_path)
+            return FAISS.load_local(vector_db_path, self.embedding_model, allow_dangerous_deserialization=True)
+        print('创建向量数据库路径 =》', vector_db_path)
+        db = FAISS.from_documents(self.split_docs(company), self.embedding_model)
+        db.save_local(vector_db_path)
+        return db
+
+    def _corpus_cached(self, key, builder):
+        """整个语料级别的结果只构建一次，常驻内存"""
+        if key in self._corpus:
+            return self._corpus[key]
+        with self._key_lock(key):
+            if key not in self._corpus:
+                self._corpus[key] = builder()
+            return self._corpus[key]
+
+    def corpus_docs(self):
+        """所有招股书原文 ['xxx', 'dsfsdg'.....]"""
+        self.preload()
+        return self._corpus_cached(('docs',), lambda: [self._read(file) for file in self.file_list])
+
+    def corpus_text(self):
+        """所有招股书拼接成的全文"""
+        return self._corpus_cached(('text',), lambda: ''.join(self.corpus_docs()))
+
+    def corpus_split_docs(self, chunk_size=256, chunk_overlap=20):
+        """所有招股书的分块结果，metadata['source'] 为文件名"""
+        def build():
+            self.preload()
+            text_split_docs = []
+            for file, text in zip(self.file_list, self.corpus_docs()):
+                for doc in self._split(text, chunk_size, chunk_overlap):
+                    doc.metadata['source'] = file
+                    text_split_docs.append(doc)
+            return text_split_docs
+
+        return self._corpus_cached(('split', chunk_size, chunk_overlap), build)
+
+    def bm25_index(self, chunk_size=256, chunk_overlap=20):
+        """整个语料的 BM25 索引，只构建一次"""
+        return self._corpus_cached(
+            ('bm25', chunk_size, chunk_overlap),
+            lambda: BM25Retriever.from_documents(self.corpus_split_docs(chunk_size, chunk_overlap))
+        )
@@ -20,15 +20,36 @@ from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.retrievers.self_query.base import SelfQueryRetriever
 from langchain.chains.query_constructor.base import AttributeInfo
 import os
+import pickle
+from RAG.corpus_manager import CorpusManager
 
 
 vector_db_path = r"RAG/vector_256"
 embedding_model_path = r'D:\Python_project\NLP\大模型学习\prompt-engineering\model\bge-small-zh-v1.5'
 embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_path, model_kwargs={'device': 'cpu'})
 db = FAISS.load_local(vector_db_path, embedding_model, allow_dangerous_deserialization=True)
+# 整个语料的原文、分块结果和 BM25 索引只构建一次，bm25 / tfidf / ensemble 等检索方式不再逐题重读、重分块
+corpus = CorpusManager(r"D:\Python_project\NLP\大模型学习\prompt-engineering\智能问答系统\data\dataset\pdf_txt_file_new", embedding_model)
 # db = Chroma(persist_directory=vector_db_path, embedding_function=embedding_model)
 
 
+def weighted_reciprocal_rank(doc_lists, weights, c=60):
+    """
+    加权 RRF 融合，算法与 EnsembleRetriever 一致：每路结果按名次累加 weight / (rank + c)，按 page_content 去重
+    :param doc_lists: 多路检索结果，每路已按相关性从高到低排序
+    :param weights: 每路的权重
+    :param c: RRF 平滑常数
+    :return: 按融合分数从高到低排序的文档
+    """
+    scores = {}
+    docs_by_content = {}
+    for docs, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(docs, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight / (rank + c)
+            docs_by_content.setdefault(doc.page_content, doc)
+    return [docs_by_content[content] for content in sorted(scores, key=scores.get, reverse=True)]
+
+
 class Retriever():
 
     @classmethod
@@ -252,6 +273,81 @@ class Retriever():
             retriever_docs = reordering.transform_documents(retriever_docs)
         return retriever_docs
 
+    @classmethod
+    def bm25_index(cls, text_split_docs, bm25_index_path=None, preprocess_func=None):
+        """
+        语料级 BM25 索引：对整个语料只建一次，可存到本地，之后每次检索只对 query 分词打分
+        :param text_split_docs: langchain 分割后的文档对象（整个语料）
+        :param bm25_index_path: 索引存储路径，存在则直接加载；不传则只在内存中构建
+        :param preprocess_func: 分词函数，默认按空格切分，中文语料可传 jieba.lcut
+        :return: BM25Retriever
+        """
+        if bm25_index_path and os.path.exists(bm25_index_path):
+            print('加载 BM25 索引路径 =》', bm25_index_path)
+            with open(bm25_index_path, 'rb') as f:
+                return pickle.load(f)
+        kwargs = {'preprocess_func': preprocess_func} if preprocess_func else {}
+        bm25_retriever = BM25Retriever.from_documents(text_split_docs, **kwargs)
+        if bm25_index_path:
+            print('创建 BM25 索引路径 =》', bm25_index_path)
+            with open(bm25_index_path, 'wb') as f:
+                pickle.dump(bm25_retriever, f)
+        return bm25_retriever
+
+    @classmethod
+    def ensemble_by_index(cls, query, bm25_retriever, db, bm25_topk=5, topk=5, weights=(0.5, 0.5),
+                          long_context=False):
+        """
+        https://python.langchain.com/docs/modules/data_connection/retrievers/ensemble/
+        混合检索（语料级索引版）
+        BM25 索引（bm25_index）和向量数据库都是事先对整个语料建好的，每次检索只对 query 做一次 embedding，
+        不再像 ensemble 那样对候选文档重新建 BM25、重新向量化
+        :param query:
+        :param bm25_retriever: bm25_index 返回的 BM25Retriever，多线程共用时不会修改它的 k
+        :param db: 已加载的向量数据库（FAISS / Chroma）
+        :param bm25_topk: bm25 topk
+        :param topk: 相似性 topk
+        :param weights: BM25 与向量检索的融合权重
+        :param long_context: 长上下文排序
+        :return: 两路结果加权 RRF 融合后的并集，结果可能会小于 bm25_topk + topk
+        """
+        processed_query = bm25_retriever.preprocess_func(query)
+        bm25_docs = bm25_retriever.vectorizer.get_top_n(processed_query, bm25_retriever.docs, n=bm25_topk)
+        dense_docs = db.similarity_search(query, k=topk)
+        retriever_docs = weighted_reciprocal_rank([bm25_docs, dense_docs], weights)
+        if long_context:
+            reordering = LongContextReorder()
+            retriever_docs = reordering.transform_documents(retriever_docs)
+        return retriever_docs
+
+    @classmethod
+    def ensemble_rerank(cls, query, retriever_docs, bm25_topk=5, topk=5, weights=(0.5, 0.5), preprocess_func=None,
+                        long_context=False):
+        """
+        混合检索（一阶段向量召回结果重排）
+        同一个 embedding 模型下，候选文档按向量相似度的排序就是一阶段召回的顺序，直接复用，不再重新向量化；
+        BM25 只在候选集上打分，也不涉及 embedding，所以整个检索只有一阶段那一次 query embedding
+        :param query:
+        :param retriever_docs: similarity 按相似度从高到低返回的候选文档（一阶段不要开 long_context，否则顺序被打乱）
+        :param bm25_topk: bm25 topk
+        :param topk: 相似性 topk，取候选的前 topk 个
+        :param weights: BM25 与向量检索的融合权重
+        :param preprocess_func: BM25 分词函数，默认按空格切分
+        :param long_context: 长上下文排序
+        :return: 两路结果加权 RRF 融合后的并集，结果可能会小于 bm25_topk + topk
+        """
+        if not retriever_docs:
+            return []
+        kwargs = {'preprocess_func': preprocess_func} if preprocess_func else {}
+        bm25_retriever = BM25Retriever.from_documents(retriever_docs, **kwargs)
+        bm25_retriever.k = bm25_topk
+        bm25_docs = bm25_retriever.get_relevant_documents(query)
+        retriever_docs = weighted_reciprocal_rank([bm25_docs, retriever_docs[:topk]], weights)
+        if long_context:
+            reordering = LongContextReorder()
+            retriever_docs = reordering.transform_documents(retriever_docs)
+        return retriever_docs
+
     @classmethod
     def bm25(cls, query, text_split_docs, topk=5, long_context=False):
         """
@@ -382,11 +478,12 @@ def retriever_docs(question, model, topk, retriver_way='similarity'):
     elif retriver_way == 'contextual_compression_by_embedding_split':
         retriever_docs = Retriever.contextual_compression_by_embedding_split(db, question, embedding_model, topk=topk)
     elif retriver_way == 'ensemble':
-        text_split_docs = get_text_split_docs()
-        retriever_docs = Retriever.ensemble(question, text_split_docs, embedding_model, bm25_topk=topk, topk=topk)
+        # db 即整个语料按 256 分块建的向量库，与 BM25 索引同口径，不必对全部分块重新向量化
+        retriever_docs = Retriever.ensemble_by_index(question, corpus.bm25_index(), db, bm25_topk=topk, topk=topk)
     elif retriver_way == 'bm25':
-        text_split_docs = get_text_split_docs()
-        retriever_docs = Retriever.bm25(question, text_split_docs, topk=topk)
+        bm25_retriever = corpus.bm25_index()
+        retriever_docs = bm25_retriever.vectorizer.get_top_n(bm25_retriever.preprocess_func(question),
+                                                             bm25_retriever.docs, n=topk)
     elif retriver_way == 'tfidf':
         docs_lst = get_docs_lst()
         retriever_docs = Retriever.tfidf(question, docs_lst)
@@ -399,30 +496,11 @@ def retriever_docs(question, model, topk, retriver_way='similarity'):
 
 
 def get_docs_lst():
-    path_data = r"D:\Python_project\NLP\大模型学习\prompt-engineering\智能问答系统\data\dataset\pdf_txt_file_new\\"
-    file_list = os.listdir(path_data)
-    docs_lst = []
-    for file in file_list:
-        with open(path_data + file, 'r', encoding='utf-8') as f:
-            txt = f.read()
-            docs_lst.append(txt)
-    return docs_lst
+    return corpus.corpus_docs()
 
 
 def get_text_split_docs():
-    path_data = r"D:\Python_project\NLP\大模型学习\prompt-engineering\智能问答系统\data\dataset\pdf_txt_file_new\\"
-    file_list = os.listdir(path_data)
-    text_split_docs = []
-    for file in file_list:
-        with open(path_data + file, 'r', encoding='utf-8') as f:
-            txt = f.read()
-        text_split = text_split_by_manychar_or_charnum(txt, chunk_size=256, chunk_overlap=20)
-        new_split_text = []
-        for text in text_split:
-            text.metadata['source'] = file
-            new_split_text.append(text)
-        text_split_docs.extend(new_split_text)
-    return text_split_docs
+    return corpus.corpus_split_docs(chunk_size=256, chunk_overlap=20)
 
 
 def text_split_by_manychar_or_charnum(docs, separator=["\n\n", "\n", " ", ""], chunk_size=100, chunk_overlap=20,
@@ -1,41 +1,32 @@
 # coding:utf8
 import os
-import base64
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from utils.prompts import glml4_rag_retriver_prompt
 from llm.llm_chain import base_llm_chain
+from RAG.corpus_manager import CorpusManager
 
 
 data_path = 'data/dataset/pdf_txt_file_new'
-file_list = os.listdir(data_path)
-file_name = [file.split('.')[0] for file in file_list]
 embedding_model_path = r'D:\Python_project\NLP\大模型学习\prompt-engineering\model\bge-small-zh-v1.5'
 embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_path, model_kwargs={'device': 'cpu'})
+# 公司名匹配、分块结果、FAISS 索引都由语料管理器缓存，批量回答时不再逐题读盘、分块、加载索引
+corpus = CorpusManager(data_path, embedding_model, vector_root='RAG/faiss_db', chunk_size=1000, chunk_overlap=20)
 
 
 def retriver_by_rule(question, glm4):
     # 判断招股书的文件名（公司名）是否在问题中
-    for company in file_name:
-        if company.strip(' 。') in question:
-            print(f'有对应招股书-{company}')
-            with open(os.path.join(data_path, company + '.txt'), 'r', encoding='utf-8') as f:
-                text = f.read()
-                break
-    # 都不包含则读入所有文件
-    else:
+    company = corpus.match_company(question)
+    # 都不包含则放弃检索
+    if company is None:
         # print(f'没有找到招股书，全部读入')
-        # company = 'all_text'
         # text = get_docs_lst()
         return '没有找到招股书，放弃检索！'
-
-    # 编码为非中文
-    company = base64.b64encode(company.encode('utf-8')).decode('utf-8')
+    print(f'有对应招股书-{company}')
 
     # 根据招股书，分块；创建向量或读取；检索
-    split_text = text_split_by_manychar_or_charnum(text, chunk_size=1000, chunk_overlap=20)
-    vector_db = faiss_vector_db(split_text, f'RAG/faiss_db/{company}', embedding_model)
+    vector_db = corpus.vector_db(company)
     retriever_docs = similarity(vector_db, question, topk=20)
 
     # llm 回答
@@ -45,13 +36,7 @@ def retriver_by_rule(question, glm4):
 
 def get_docs_lst():
     """读取所有 txt"""
-    file_list = os.listdir(data_path)
-    text = ''
-    for file in file_list:
-        with open(os.path.join(data_path, file), 'r', encoding='utf-8') as f:
-            txt = f.read()
-            text += txt
-    return text
+    return corpus.corpus_text()
 
 
 def text_split_by_manychar_or_charnum(docs, separator=["\n\n", "\n", " ", ""], chunk_size=100, chunk_overlap=20,
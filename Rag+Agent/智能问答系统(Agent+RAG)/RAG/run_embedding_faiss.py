@@ -1,10 +1,10 @@
 # coding:utf8
 import os
-import time
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from incremental_indexer import IncrementalIndexer
 from utils.utils import get_file_size
 
 
@@ -70,26 +70,17 @@ if __name__ == '__main__':
     data_fold = '../data/dataset/pdf_txt_file_new/'
     file_list = os.listdir(data_fold)
 
+    # 目录中已有旧脚本建的向量库（没有 manifest）时，确认可以覆盖后改为 True 重建一次
+    rebuild = False
     embedding_model_path = r'D:\Python_project\NLP\大模型学习\prompt-engineering\model\bge-small-zh-v1.5'
-    embedding_model = load_local_embedding_model(embedding_model_path)
 
-    start_time = time.time()
+    docs = []
     for index, file in enumerate(file_list):
         print(f'-----{index + 1} / {len(file_list)}-----')
         print(f'当前文件：{file}，大小：{get_file_size(data_fold + file)}')
-        cur_start_time = time.time()
-        docs = txt_loader(data_fold + file)
-        split_text = text_split_by_manychar_or_charnum(docs, chunk_size=256, chunk_overlap=20)
+        docs.extend(txt_loader(data_fold + file))
 
-        new_split_text = []
-        for text in split_text:
-            text.metadata['source'] = file
-            new_split_text.append(text)
-
-        faiss_vector_db(new_split_text, '../data/vector', embedding_model)
-        cur_end_time = time.time()
-        print(f'当前文件耗时：{cur_end_time - cur_start_time}s')
-        pass
-
-    end_time = time.time()
-    print(f'耗时：{end_time - start_time}s')
+    # 增量更新：只向量化新增或内容变化的文件，按批交给进程池，已删除的文件从向量库中移除
+    indexer = IncrementalIndexer('../data/vector', embedding_model_path, store='faiss', chunk_size=256,
+                                 chunk_overlap=20, batch_size=64, workers=2)
+    indexer.index(docs, metadata_fn=lambda doc: {'source': os.path.basename(doc.metadata['source'])}, rebuild=rebuild)
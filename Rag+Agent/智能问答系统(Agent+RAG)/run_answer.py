@@ -1,7 +1,8 @@
 # coding:utf8
 import warnings
 import traceback
-from utils.utils import read_jsonl, write_jsonl, classify_question
+from utils.utils import read_jsonl, classify_question
+from utils.batch_runner import BatchRunner
 from llm.llm_glm import zhipu_glm_4
 from llm.llm_tongyi import tongyi_qwen_turbo
 from RAG.retriver_by_rule import retriver_by_rule
@@ -13,6 +14,8 @@ glm4 = zhipu_glm_4(temperature=0.1)
 tongyi_turbo = tongyi_qwen_turbo(temperature=0.1)
 
 debug = False
+# 同时回答的问题数，受 LLM 接口并发限制
+max_workers = 8
 
 
 def get_answer(question):
@@ -35,10 +38,17 @@ def get_answer(question):
         if '招股' in classification and 'sql' in classification:
             answer = answer1 + answer2
         return answer
-    except Exception as e:
+    except Exception:
         if debug:
             traceback.print_exc()
-        return f'系统错误{e}'
+        # 不把错误当答案返回：异常交给 BatchRunner，该题不写断点，重新运行时重做
+        raise
+
+
+def answer_row(row, context=None):
+    answer = get_answer(row['question'])
+    print(f"当前id：{row['id']} | 当前问题：{row['question']}\nanswer: {answer} finish!")
+    return {'id': row['id'], 'question': row['question'], 'answer': answer}
 
 
 if __name__ == '__main__':
@@ -47,18 +57,7 @@ if __name__ == '__main__':
     question_list = read_jsonl(question_path)
     question_list = question_list[500:]
 
+    # 并发回答，每完成一题立即写入 save_path，中断后重新运行会跳过已完成的 id
     save_path = 'data/answer/submit_result.jsonl'
-    content = []
-    for index, row in enumerate(question_list):
-        print(f'-------------- {index} / {len(question_list)} -------------------')
-        id = row['id']
-        question = row['question']
-        print(f'当前id：{id} | 当前问题：{question}')
-
-        # 存入列表
-        answer = get_answer(question)
-        print('answer:', answer, 'finish!')
-        content.append({'id': id, 'question': question, 'answer': answer})
-
-    # 保存
-    write_jsonl(save_path, content)
+    runner = BatchRunner(save_path, max_workers=max_workers)
+    runner.run(question_list, answer_row)
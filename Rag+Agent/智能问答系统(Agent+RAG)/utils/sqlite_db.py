@@ -1,15 +1,94 @@
 # coding:utf8
+import os
 import re
+import time
+import queue
 import sqlite3
-from sqlalchemy import create_engine
-from sqlalchemy import inspect
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+from urllib.request import pathname2url
 from utils.prompts import glm4_generate_sql_prompt
 from llm.llm_chain import base_llm_chain
 
 
 # 设置数据库连接
 db_path = 'data/dataset/博金杯比赛数据.db'
-engine = create_engine(f'sqlite:///{db_path}')
+# 只读连接池大小、单条 sql 最长执行时间（秒）、最多返回行数、结果缓存条数；超时和行数限制设为 None 表示不限制
+pool_size = 8
+sql_timeout = 60
+sql_max_rows = 1000
+result_cache_size = 256
+
+_pool = queue.LifoQueue()
+_pool_lock = threading.Lock()
+_pool_created = 0
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+
+def _connect():
+    """
+    只读连接：比赛数据库运行期间不会被修改，immutable=1 省去文件锁和变更检测，
+    mmap 读取减少系统调用，query_only 防止 agent 生成的语句写库
+    """
+    uri = f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro&immutable=1'
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute('PRAGMA mmap_size = 268435456')
+    conn.execute('PRAGMA cache_size = -65536')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA query_only = 1')
+    return conn
+
+
+def _acquire():
+    """从连接池取连接，池空且未达上限时新建，否则等待其他线程归还"""
+    global _pool_created
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        pass
+    with _pool_lock:
+        create = _pool_created < pool_size
+        if create:
+            _pool_created += 1
+    if not create:
+        return _pool.get()
+    try:
+        return _connect()
+    except Exception:
+        with _pool_lock:
+            _pool_created -= 1
+        raise
+
+
+def _normalize_sql(sql):
+    """结果缓存的 key：引号外的连续空白合并为一个空格，去掉末尾分号，引号内的内容保持原样"""
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", sql.strip().rstrip(';'))
+    return ''.join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts)).strip()
+
+
+def _run_query(sql, timeout=None, max_rows=None):
+    """在池化连接上执行查询，超过 timeout 秒中断；max_rows 不为空时最多取 max_rows + 1 行，用于判断是否截断"""
+    conn = _acquire()
+    try:
+        if timeout:
+            deadline = time.monotonic() + timeout
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        try:
+            cursor = conn.execute(sql)
+            results = cursor.fetchmany(max_rows + 1) if max_rows else cursor.fetchall()
+            cursor.close()
+        except sqlite3.OperationalError as e:
+            if timeout and 'interrupted' in str(e):
+                raise TimeoutError(f'sql 执行超过 {timeout}s，已中断：{sql}')
+            raise
+        finally:
+            if timeout:
+                conn.set_progress_handler(None, 0)
+    finally:
+        _pool.put(conn)
+    return results
 
 
 def execute_sql(sql):
@@ -20,12 +99,22 @@ def execute_sql(sql):
     sql = sql.replace('Observation:', '').replace('`', '').replace('sql', '').replace(':', '') \
             .replace('平均', '')
 
-    conn = sqlite3.connect(db_path, timeout=180)
-    cursor = conn.cursor()
-    cursor.execute(sql)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    # 数据库只读，相同的 sql 结果不变，直接走缓存
+    key = _normalize_sql(sql)
+    with _result_cache_lock:
+        if key in _result_cache:
+            _result_cache.move_to_end(key)
+            return list(_result_cache[key])
+
+    results = _run_query(sql, sql_timeout, sql_max_rows)
+    if sql_max_rows and len(results) > sql_max_rows:
+        results = results[:sql_max_rows] + [f'结果超过 {sql_max_rows} 行，只返回前 {sql_max_rows} 行']
+
+    with _result_cache_lock:
+        _result_cache[key] = results
+        while len(_result_cache) > result_cache_size:
+            _result_cache.popitem(last=False)
+    return list(results)
 
 
 def process_field(sql):
@@ -51,13 +140,16 @@ def process_field(sql):
     return sql
 
 
+@lru_cache(maxsize=None)
 def inspect_db_structure():
-    """获得所有表结构"""
-    inspector = inspect(engine)
+    """获得所有表结构，只读库的结构不会变化，整个进程只查询一次（表名按名称排序，与 SQLAlchemy inspect 一致）"""
+    tables = _run_query("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite~_%' ESCAPE '~' "
+                        "ORDER BY name")
     structure = {}
-    for table_name in inspector.get_table_names():
-        columns = inspector.get_columns(table_name)
-        structure[table_name] = [column['name'] for column in columns]
+    for (table_name,) in tables:
+        quoted_name = table_name.replace('"', '""')
+        columns = _run_query(f'PRAGMA table_info("{quoted_name}")')
+        structure[table_name] = [column[1] for column in columns]
     return structure
 
 
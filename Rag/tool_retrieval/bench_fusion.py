@@ -0,0 +1,258 @@
+"""
+融合阶段基准测试：对比 utils/fusion.py 与重构前 hybrid_retrieval 中的逐候选循环实现
+
+- 用固定随机种子生成 dense / sparse / keyword 三路检索结果（部分工具被多路召回、部分分数为负）
+- 校验三种策略（rank_fusion / adaptive / weighted）下两种实现返回的工具排序完全一致、分数一致
+- 输出不同候选池规模下两种实现的耗时
+
+用法：
+    python bench_fusion.py
+    python bench_fusion.py --sizes 10 100 1000 --repeat 5
+"""
+import argparse
+import random
+import time
+from typing import Dict, Any, List
+from utils.fusion import fuse
+
+
+STRATEGY_WEIGHTS = {
+    'rank_fusion': None,
+    'adaptive': {'dense': 0.3, 'sparse': 0.4, 'keyword': 0.3},
+    'weighted': {'dense': 0.4, 'sparse': 0.3, 'keyword': 0.3},
+}
+
+
+def _deduplicate_results(results: List[Dict[str, Any]], n_results: int, score_key: str = 'score') -> List[Dict[str, Any]]:
+    """
+    与 RetrievalService._deduplicate_results 相同
+    """
+    unique_results = {}
+    for result in results:
+        tool_name = result['tool_id']
+        if tool_name not in unique_results:
+            unique_results[tool_name] = result
+    return sorted(unique_results.values(), key=lambda x: x[score_key], reverse=True)[:n_results]
+
+
+def legacy_fuse(all_results: Dict[str, List[Dict[str, Any]]], n_results: int, strategy: str = "rank_fusion",
+                weights: Dict[str, float] = None) -> List[Dict[str, Any]]:
+    """
+    重构前 hybrid_retrieval 中的融合实现（原样保留，仅作为基准）
+    """
+    # 合并结果并去重
+    merged_results = {}
+
+    for method, results in all_results.items():
+        for item in results:
+            tool_id = item['tool_id']
+
+            # 如果工具ID已存在，则更新分数
+            if tool_id in merged_results:
+                # 使用各方法的分数
+                if method == 'dense':
+                    # dense_retrieval的similarity已经在0-1范围
+                    normalized_score = item['similarity']
+                elif method == 'sparse':
+                    # BM25分数使用预先计算的归一化分数
+                    normalized_score = item['normalized_score']
+                elif method == 'keyword':
+                    # keyword_search的score已经在0-1范围
+                    normalized_score = item['score']
+
+                # 更新合并结果中的分数
+                if 'scores' not in merged_results[tool_id]:
+                    merged_results[tool_id]['scores'] = {}
+
+                merged_results[tool_id]['scores'][method] = normalized_score
+                merged_results[tool_id]['raw_scores'][method] = item.get('similarity', item.get('score', 0))
+            else:
+                # 创建新条目
+                merged_item = {
+                    'tool_id': tool_id,
+                    'metadata': item['metadata'],
+                    'document': item['document'],
+                    'collection': item['collection'],
+                    'scores': {},
+                    'raw_scores': {}
+                }
+
+                # 使用各方法的分数
+                if method == 'dense':
+                    normalized_score = item['similarity']
+                    raw_score = item['similarity']
+                elif method == 'sparse':
+                    normalized_score = item['normalized_score']
+                    raw_score = item['score']
+                elif method == 'keyword':
+                    normalized_score = item['score']
+                    raw_score = item['score']
+
+                merged_item['scores'][method] = normalized_score
+                merged_item['raw_scores'][method] = raw_score
+                merged_results[tool_id] = merged_item
+
+    # 根据策略计算最终分数
+    if strategy == "rank_fusion":
+        # 倒数排名融合（Reciprocal Rank Fusion）
+        for tool_id, item in merged_results.items():
+            rrf_score = 0.0  # 确保初始化为浮点数
+            for method, scores in all_results.items():
+                # 找到该工具在各方法中的排名
+                rank = 1
+                found = False
+                for result in scores:
+                    if result['tool_id'] == tool_id:
+                        rrf_score += 1.0 / (rank + 60)  # 60是一个平滑参数，避免排名靠后的结果分数过低
+                        found = True
+                        break
+                    rank += 1
+                if not found:
+                    # 如果该方法没有返回该工具，给它一个较低的分数
+                    rrf_score += 1.0 / (len(scores) + 60 + 1)
+            # 确保rrf_score是实数
+            if isinstance(rrf_score, complex):
+                rrf_score = rrf_score.real
+            item['weighted_score'] = float(rrf_score)
+    else:
+        # 加权平均策略（包括adaptive策略）
+        for tool_id, item in merged_results.items():
+            weighted_score = 0.0  # 确保初始化为浮点数
+            # 计算各方法的加权分数
+            for method, score in item['scores'].items():
+                if method in weights:
+                    # 确保score是实数
+                    if isinstance(score, complex):
+                        score = score.real
+
+                    # 对分数应用非线性变换，增强高分结果的权重
+                    if strategy == "adaptive":
+                        # 自适应策略：对高分结果应用更强的权重
+                        enhanced_score = float(score) ** 1.5
+                    else:
+                        enhanced_score = float(score)
+                    weighted_score += enhanced_score * weights[method]
+
+            # 确保weighted_score是实数
+            if isinstance(weighted_score, complex):
+                weighted_score = weighted_score.real
+            item['weighted_score'] = float(weighted_score)
+
+    # 使用公共去重函数进行最终去重
+    # 将merged_results转换为适合_deduplicate_results函数的格式
+    dedup_input = []
+    for tool_id, item in merged_results.items():
+        dedup_item = {
+            'tool_id': tool_id,
+            'score': item['weighted_score'],  # 使用加权分数作为去重依据
+            'metadata': item['metadata'],
+            'document': item['document'],
+            'collection': item['collection'],
+            'scores': item['scores'],
+            'raw_scores': item['raw_scores']
+        }
+        dedup_input.append(dedup_item)
+
+    # 使用公共去重函数
+    dedup_results = _deduplicate_results(dedup_input, n_results, 'score')
+
+    # 格式化最终结果
+    formatted_results = []
+    for item in dedup_results:
+        formatted_item = {
+            'tool_id': item['tool_id'],
+            'score': item['score'],  # 使用加权分数作为最终分数
+            'metadata': item['metadata'],
+            'document': item['document'],
+            'collection': item['collection'],
+            'score_type': 'hybrid',
+            'method_scores': item['scores'],  # 各方法的标准化分数
+            'raw_method_scores': item['raw_scores']  # 各方法的原始分数
+        }
+        formatted_results.append(formatted_item)
+
+    return formatted_results
+
+
+def make_results(pool_size: int, seed: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    生成三路检索结果：每路 pool_size 条，工具从 2 * pool_size 个工具中抽取，各路之间部分重叠
+    """
+    rng = random.Random(seed)
+    universe = [f"tool_{i}" for i in range(pool_size * 2)]
+
+    def _item(tool_id: str) -> Dict[str, Any]:
+        return {'tool_id': tool_id, 'metadata': None, 'document': tool_id, 'collection': 'tool_vector'}
+
+    all_results = {}
+    dense = []
+    for tool_id in rng.sample(universe, pool_size):
+        dense.append(dict(_item(tool_id), similarity=rng.uniform(-0.3, 1.0)))
+    all_results['dense'] = sorted(dense, key=lambda x: x['similarity'], reverse=True)
+
+    sparse = []
+    for tool_id in rng.sample(universe, pool_size):
+        sparse.append(dict(_item(tool_id), score=rng.uniform(0, 30)))
+    max_score = max(item['score'] for item in sparse)
+    for item in sparse:
+        item['normalized_score'] = item['score'] / (max_score + 1e-6)
+    all_results['sparse'] = sorted(sparse, key=lambda x: x['score'], reverse=True)
+
+    keyword = []
+    for tool_id in rng.sample(universe, pool_size):
+        # 部分分数取离散值，制造同分情况以校验稳定排序
+        keyword.append(dict(_item(tool_id), score=round(rng.uniform(0, 1), 1)))
+    all_results['keyword'] = sorted(keyword, key=lambda x: x['score'], reverse=True)
+    return all_results
+
+
+def check_identical(expected: List[Dict[str, Any]], actual: List[Dict[str, Any]]) -> None:
+    assert [r['tool_id'] for r in expected] == [r['tool_id'] for r in actual], "排序不一致"
+    for e, a in zip(expected, actual):
+        assert abs(e['score'] - a['score']) <= 1e-12, f"分数不一致: {e['tool_id']} {e['score']} != {a['score']}"
+        assert list(e['method_scores']) == list(a['method_scores']), "method_scores 方法顺序不一致"
+        for method, value in e['method_scores'].items():
+            assert value == a['method_scores'][method]
+            assert e['raw_method_scores'][method] == a['raw_method_scores'][method]
+
+
+def _timeit(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="融合阶段基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500, 2000], help="每路检索结果数（候选池规模）")
+    parser.add_argument('--n-results', type=int, default=5, help="返回结果数量")
+    parser.add_argument('--repeat', type=int, default=3, help="每项重复次数，取最快一次")
+    parser.add_argument('--seeds', type=int, default=20, help="一致性校验使用的随机种子数")
+    args = parser.parse_args()
+
+    # 一致性校验
+    for size in args.sizes:
+        for seed in range(args.seeds if size <= 500 else 2):
+            all_results = make_results(size, seed)
+            for strategy, weights in STRATEGY_WEIGHTS.items():
+                for n_results in (args.n_results, size * 2):
+                    check_identical(
+                        legacy_fuse(all_results, n_results, strategy, weights),
+                        fuse(all_results, n_results, strategy, weights),
+                    )
+    print("一致性校验通过：三种策略下排序与分数完全一致\n")
+
+    print(f"{'候选池':>8} {'策略':>12} {'原实现(ms)':>12} {'向量化(ms)':>12} {'加速比':>8}")
+    for size in args.sizes:
+        all_results = make_results(size, seed=0)
+        for strategy, weights in STRATEGY_WEIGHTS.items():
+            legacy_time = _timeit(lambda: legacy_fuse(all_results, args.n_results, strategy, weights), args.repeat)
+            fused_time = _timeit(lambda: fuse(all_results, args.n_results, strategy, weights), args.repeat)
+            print(f"{size:>8} {strategy:>12} {legacy_time * 1000:>12.3f} {fused_time * 1000:>12.3f} {legacy_time / fused_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
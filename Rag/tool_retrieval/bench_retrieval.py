@@ -0,0 +1,298 @@
+"""
+检索基准测试：在固定查询集上并发压测各检索方法，输出效果和性能指标，并与保存的基线对比
+
+- 检索方法：dense / sparse / keyword，以及 hybrid 的三种融合策略（rank_fusion / adaptive / weighted）
+- 每个方法按 --qps 匀速发出请求（开环，延迟从计划发出时刻算起，包含排队时间），--concurrency 限制同时执行的请求数；
+  --qps 0 时不限速，按 --concurrency 并发全速压测
+- 效果指标：recall@k（标准答案工具出现在前 k 个结果中的比例）、MRR
+- 性能指标：p50 / p95 / p99 延迟（毫秒）、吞吐量（请求/秒）
+- --offline（默认）：使用本地确定性哈希向量（EMBEDDING_BACKEND=local），在临时目录中由 data/tool.json 重建工具库，
+  不访问网络；离线模式没有 LLM，hypothetical_query 集合为空
+- --online：使用 .env 中的向量接口和 --db-path 指定的现有工具库
+- 正式计时前统一预热查询向量（向量缓存生效），各方法不会因先后顺序而承担不同的向量化开销
+
+用法：
+    python bench_retrieval.py
+    python bench_retrieval.py --limit 500 --qps 100 --concurrency 32 --save-baseline bench_baseline.json
+    python bench_retrieval.py --baseline bench_baseline.json --fail-on-regression
+    python bench_retrieval.py --online --db-path db --methods dense hybrid:rank_fusion
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+
+
+ALL_METHODS = ['dense', 'sparse', 'keyword', 'hybrid:rank_fusion', 'hybrid:adaptive', 'hybrid:weighted']
+
+# 与基线对比的指标：效果指标下降、延迟指标上升视为退化
+QUALITY_METRICS = ['mrr']
+LATENCY_METRICS = ['p50_ms', 'p95_ms', 'p99_ms']
+
+
+def load_queries(query_path: str, limit: int, seed: int) -> List[Dict[str, str]]:
+    """
+    读取查询集（需包含 query 和 tool 两列），limit > 0 时按固定随机种子抽样
+    """
+    df = pd.read_excel(query_path)
+    df = df.dropna(subset=['query', 'tool'])
+    if 0 < limit < len(df):
+        df = df.sample(n=limit, random_state=seed)
+    return [{'query': str(row['query']), 'tool': str(row['tool'])} for _, row in df.iterrows()]
+
+
+async def build_offline_catalog(service, tool_json_path: str) -> int:
+    """
+    离线模式：将 tool.json 中的工具写入临时工具库的 tool_vector 集合（与入库接口使用相同的文档格式）
+    """
+    from db_operation.insert import tool_to_document
+
+    with open(tool_json_path, 'r', encoding='utf-8') as f:
+        tools = json.load(f)
+    tools = list({tool['name']: tool for tool in tools if tool.get('name')}.values())
+    documents = [tool_to_document(tool) for tool in tools]
+    embeddings = await service.embedding_api.get_embeddings_batch(documents)
+    service.tool_vector_collection.upsert(
+        ids=[tool['name'] for tool in tools],
+        documents=documents,
+        embeddings=embeddings,
+    )
+    for tool, document in zip(tools, documents):
+        service.sparse_index.upsert("tool_vector", tool['name'], document, persist=False)
+    service.sparse_index.save()
+    service.bump_catalog_version()
+    return len(tools)
+
+
+def make_runner(service, method: str, logger: logging.Logger):
+    """
+    返回 query, n_results -> 检索结果 的协程函数（直接调用检索服务，不经过结果缓存）
+    """
+    if method == 'dense':
+        return lambda query, n: service.dense_retrieval(query, n, logger)
+    if method == 'sparse':
+        return lambda query, n: service.sparse_retrieval_bm25(query, n, logger)
+    if method == 'keyword':
+        return lambda query, n: service.keyword_search(query, n, logger)
+    if method.startswith('hybrid'):
+        strategy = method.split(':', 1)[1] if ':' in method else 'rank_fusion'
+        return lambda query, n: service.hybrid_retrieval(query, n, logger, strategy=strategy)
+    raise ValueError(f"不支持的检索方法: {method}")
+
+
+async def run_method(runner, queries: List[Dict[str, str]], n_results: int, qps: float,
+                     concurrency: int) -> Dict[str, Any]:
+    """
+    按 qps 匀速发出全部查询，返回每个查询的标准答案排名和延迟
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    interval = 1.0 / qps if qps > 0 else 0.0
+    ranks: List[Optional[int]] = [None] * len(queries)
+    latencies: List[Optional[float]] = [None] * len(queries)
+    errors: List[str] = []
+    start = time.perf_counter()
+
+    async def one(i: int, item: Dict[str, str]) -> None:
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with semaphore:
+            begin = time.perf_counter()
+            try:
+                results = await runner(item['query'], n_results)
+            except Exception as e:
+                errors.append(f"{item['query'][:30]}: {e}")
+                return
+            end = time.perf_counter()
+        # 限速时延迟从计划发出时刻算起（包含排队时间），不限速时只算执行时间
+        latencies[i] = end - (scheduled if qps > 0 else begin)
+        tool_ids = [result['tool_id'] for result in results]
+        ranks[i] = tool_ids.index(item['tool']) + 1 if item['tool'] in tool_ids else None
+
+    await asyncio.gather(*(one(i, item) for i, item in enumerate(queries)))
+    wall_time = time.perf_counter() - start
+    return {'ranks': ranks, 'latencies': latencies, 'errors': errors, 'wall_time': wall_time}
+
+
+def summarize(run: Dict[str, Any], ks: List[int]) -> Dict[str, Any]:
+    """
+    计算 recall@k、MRR、延迟分位数和吞吐量（失败的请求计为未命中）
+    """
+    total = len(run['ranks'])
+    ranks = run['ranks']
+    latencies = np.array([latency for latency in run['latencies'] if latency is not None])
+    completed = len(latencies)
+    metrics = {f'recall@{k}': round(sum(1 for r in ranks if r is not None and r <= k) / total, 4) for k in ks}
+    metrics['mrr'] = round(sum(1.0 / r for r in ranks if r is not None) / total, 4)
+    for p in (50, 95, 99):
+        metrics[f'p{p}_ms'] = round(float(np.percentile(latencies, p)) * 1000, 2) if completed else None
+    metrics['throughput'] = round(completed / run['wall_time'], 2) if run['wall_time'] > 0 else None
+    metrics['queries'] = total
+    metrics['errors'] = len(run['errors'])
+    return metrics
+
+
+def print_table(report: Dict[str, Dict[str, Any]], columns: List[str]) -> None:
+    header = f"{'method':<20}" + "".join(f"{column:>12}" for column in columns)
+    print(header)
+    print("-" * len(header))
+    for method, metrics in report.items():
+        cells = "".join(f"{'-' if metrics.get(column) is None else metrics[column]:>12}" for column in columns)
+        print(f"{method:<20}{cells}")
+
+
+def compare_with_baseline(report: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                          quality_metrics: List[str], quality_tolerance: float,
+                          latency_tolerance: float) -> List[str]:
+    """
+    与基线对比并打印差异
+
+    Returns:
+        退化项列表：效果指标下降超过 quality_tolerance（绝对值），或延迟上升超过 latency_tolerance（相对值）
+    """
+    regressions = []
+    print(f"\n{'method':<20}{'metric':>12}{'baseline':>12}{'current':>12}{'delta':>12}")
+    for method, metrics in report.items():
+        base = baseline.get(method)
+        if base is None:
+            print(f"{method:<20}{'(基线中没有该方法)':>12}")
+            continue
+        for metric in quality_metrics + LATENCY_METRICS + ['throughput']:
+            current, previous = metrics.get(metric), base.get(metric)
+            if current is None or previous is None:
+                continue
+            delta = current - previous
+            flag = ""
+            if metric in quality_metrics and delta < -quality_tolerance:
+                flag = "  <-- 退化"
+            elif metric in LATENCY_METRICS and previous > 0 and delta / previous > latency_tolerance:
+                flag = "  <-- 退化"
+            if flag:
+                regressions.append(f"{method} {metric}: {previous} -> {current}")
+            print(f"{method:<20}{metric:>12}{previous:>12}{current:>12}{round(delta, 4):>12}{flag}")
+    return regressions
+
+
+async def run_benchmark(args) -> int:
+    logger = logging.getLogger("bench_retrieval")
+    logger.setLevel(logging.WARNING)
+
+    from utils.retrieval import get_retrieval_service
+
+    if args.offline:
+        work_dir = tempfile.mkdtemp(prefix="bench_retrieval_")
+        db_path = os.path.join(work_dir, "db")
+        service = get_retrieval_service(db_path, logger)
+        tool_count = await build_offline_catalog(service, args.tools)
+        print(f"离线模式：本地哈希向量，临时工具库 {db_path}，工具数 {tool_count}")
+    else:
+        service = get_retrieval_service(args.db_path, logger)
+        print(f"在线模式：向量模型 {service.embedding_api.model}，工具库 {args.db_path}，"
+              f"工具数 {service.tool_vector_collection.count()}")
+
+    queries = load_queries(args.queries, args.limit, args.seed)
+    ks = sorted(set(args.k))
+    n_results = max(ks)
+    print(f"查询数 {len(queries)}，n_results {n_results}，qps {args.qps or '不限速'}，并发 {args.concurrency}")
+
+    # 预热：查询向量写入向量缓存，并让各检索方法完成首次调用
+    await service.embedding_api.get_embeddings_batch([item['query'] for item in queries])
+    for method in args.methods:
+        runner = make_runner(service, method, logger)
+        for item in queries[:args.warmup]:
+            await runner(item['query'], n_results)
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for method in args.methods:
+        run = await run_method(make_runner(service, method, logger), queries, n_results, args.qps, args.concurrency)
+        report[method] = summarize(run, ks)
+        for error in run['errors'][:3]:
+            print(f"  [{method}] 检索失败: {error}")
+
+    print()
+    print_table(report, [f'recall@{k}' for k in ks] + ['mrr', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput', 'errors'])
+
+    result = {
+        'config': {
+            'mode': 'offline' if args.offline else 'online',
+            'embedding_model': service.embedding_api.model,
+            'queries': len(queries),
+            'seed': args.seed,
+            'k': ks,
+            'qps': args.qps,
+            'concurrency': args.concurrency,
+        },
+        'methods': report,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        # 模式、查询集或负载参数不同时，延迟和效果指标不可直接比较
+        baseline_config = baseline.get('config', {})
+        changed = [key for key in ('mode', 'embedding_model', 'queries', 'seed', 'qps', 'concurrency')
+                   if baseline_config.get(key) != result['config'][key]]
+        if changed:
+            print(f"警告: 基线与本次运行的配置不同 ({', '.join(changed)})，对比结果仅供参考")
+        quality_metrics = [f'recall@{k}' for k in ks] + QUALITY_METRICS
+        regressions = compare_with_baseline(report, baseline.get('methods', {}), quality_metrics,
+                                            args.quality_tolerance, args.latency_tolerance)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项退化:")
+            for item in regressions:
+                print(f"  {item}")
+            if args.fail_on_regression:
+                return 1
+        else:
+            print("\n与基线相比没有退化")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索基准测试")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--offline', dest='offline', action='store_true', default=True, help="本地哈希向量 + 临时工具库（默认）")
+    mode.add_argument('--online', dest='offline', action='store_false', help="使用 .env 中的向量接口和现有工具库")
+    parser.add_argument('--db-path', default='db', help="在线模式使用的工具库路径")
+    parser.add_argument('--tools', default=os.path.join('data', 'tool.json'), help="离线模式用于建库的工具文件")
+    parser.add_argument('--queries', default=os.path.join('data', 'query.xlsx'), help="查询集，需包含 query 和 tool 列")
+    parser.add_argument('--limit', type=int, default=200, help="抽样查询数，0 表示全部")
+    parser.add_argument('--seed', type=int, default=42, help="抽样随机种子")
+    parser.add_argument('--methods', nargs='+', default=ALL_METHODS, help="检索方法，hybrid 用 hybrid:<策略> 指定融合策略")
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 3, 5, 10], help="recall@k 的 k 值，最大值作为 n_results")
+    parser.add_argument('--qps', type=float, default=50, help="每个方法的请求速率，0 表示不限速")
+    parser.add_argument('--concurrency', type=int, default=16, help="同时执行的最大请求数")
+    parser.add_argument('--warmup', type=int, default=3, help="每个方法正式计时前的预热查询数")
+    parser.add_argument('--output', help="结果保存路径（JSON）")
+    parser.add_argument('--save-baseline', help="将本次结果保存为基线（JSON）")
+    parser.add_argument('--baseline', help="对比的基线文件（JSON）")
+    parser.add_argument('--quality-tolerance', type=float, default=0.01, help="recall/MRR 允许的最大下降（绝对值）")
+    parser.add_argument('--latency-tolerance', type=float, default=0.2, help="延迟分位数允许的最大上升比例")
+    parser.add_argument('--fail-on-regression', action='store_true', help="存在退化时以退出码 1 结束")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.offline:
+        os.environ['EMBEDDING_BACKEND'] = 'local'
+    sys.exit(asyncio.run(run_benchmark(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,30 @@
-import chromadb
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
+from utils.retrieval import RetrievalService, get_retrieval_service
+from db_operation.bulk_insert import BulkInsertManager
 
 
 # 接收db_path参数的版本
-def create_lifespan(db_path_param):
+def create_lifespan(db_path_param, bulk_insert_logger=None):
     """
     创建接收db_path参数的生命周期管理函数
     
     Args:
         db_path_param: 数据库路径参数
+        bulk_insert_logger: 批量入库任务的日志记录器
     """
     @asynccontextmanager
     async def lifespan_with_args(app: FastAPI):
         """
         FastAPI应用的生命周期管理函数，使用传入的db_path参数
-        在应用启动时初始化向量数据库，在应用关闭时执行清理操作
+        在应用启动时初始化向量数据库和共享检索服务，在应用关闭时执行清理操作
         
         Args:
-            app: FastAPI应用实例（可以删除，因为在此函数中未使用）
+            app: FastAPI应用实例，共享检索服务挂载到 app.state.retrieval_service
         """
         # 使用传入的db_path参数
         chroma_db_path = db_path_param
+        app.state.db_path = db_path_param
         
         # 启动时执行
         print("应用启动，检查向量数据库...")
@@ -32,32 +35,63 @@ def create_lifespan(db_path_param):
             db_path_param.mkdir(exist_ok=True)
         
         # 检查是否存在tools向量数据库
+        app.state.retrieval_service = None
         try:
-            # 尝试连接到Chroma数据库
-            client = chromadb.PersistentClient(path=str(chroma_db_path))
+            # 创建进程内共享的检索服务：Chroma客户端、集合、稀疏索引和向量模型只初始化一次
+            service = get_retrieval_service(str(chroma_db_path))
+            app.state.retrieval_service = service
             
-            # 尝试获取或创建tool_vector集合
-            tool_vector_collection = client.get_or_create_collection(name="tool_vector")
+            # 获取tool_vector集合
+            tool_vector_collection = service.tool_vector_collection
             print(f"Chroma向量数据库已就绪，位于: {chroma_db_path}")
             
             # 检查tool_vector集合中是否有数据
             tool_vector_count = tool_vector_collection.count()
             print(f"tool_vector集合中现有工具数量: {tool_vector_count}")
             
-            # 尝试获取或创建hypothetical_query集合
-            hypothetical_query_collection = client.get_or_create_collection(name="hypothetical_query")
+            # 获取hypothetical_query集合
+            hypothetical_query_collection = service.hypothetical_query_collection
             
             # 检查hypothetical_query集合中是否有数据
             hypothetical_query_count = hypothetical_query_collection.count()
             print(f"hypothetical_query集合中现有查询数量: {hypothetical_query_count}")
+
+            # 稀疏索引在检索服务初始化时已与Chroma对账（优先复用 db/cache 中的缓存）
+            print(f"稀疏索引已就绪，文档数量: {len(service.sparse_index.docs)}")
             
         except Exception as e:
-            print(f"初始化Chroma向量数据库时出错: {e}")
-            print("请确保已安装chromadb库: pip install chromadb")
+            print(f"初始化检索服务时出错: {e}")
+            print("请确保已安装chromadb库并配置MODELSCOPE_API_KEY，首次请求时将重新尝试初始化")
+
+        # 批量入库任务管理，续跑上次未完成的任务
+        bulk_insert_manager = BulkInsertManager(str(chroma_db_path), bulk_insert_logger)
+        app.state.bulk_insert_manager = bulk_insert_manager
+        resumed = bulk_insert_manager.resume_unfinished()
+        if resumed:
+            print(f"续跑未完成的批量入库任务: {resumed}")
         
         yield  # 应用运行期间
         
         # 关闭时执行
+        await bulk_insert_manager.shutdown()
         print("应用关闭")
     
     return lifespan_with_args
+
+
+def get_service(request: Request) -> RetrievalService:
+    """
+    FastAPI 依赖：返回启动时创建的共享检索服务；启动时初始化失败则在此重试
+    """
+    service = getattr(request.app.state, "retrieval_service", None)
+    if service is None:
+        service = get_retrieval_service(str(request.app.state.db_path))
+        request.app.state.retrieval_service = service
+    return service
+
+
+def get_bulk_insert_manager(request: Request) -> BulkInsertManager:
+    """
+    FastAPI 依赖：返回启动时创建的批量入库任务管理器
+    """
+    return request.app.state.bulk_insert_manager
@@ -0,0 +1,451 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import traceback
+from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+from utils.llm_api import LLM
+from utils.utils import verify_tool
+from utils.sparse_index import cache_dir_for
+from utils.retrieval import get_retrieval_service, RetrievalService
+from db_operation.insert import tool_to_document, tool_description_optimize, generate_hypothetical_query_text
+
+
+# 任务状态：queued / running 的任务在服务重启后会自动续跑
+JOB_UNFINISHED = ("queued", "running")
+
+# 单个工具状态
+TOOL_PENDING = "pending"
+TOOL_DONE = "done"
+TOOL_FAILED = "failed"
+TOOL_SKIPPED = "skipped"
+
+# 流水线各阶段名称，用于统计各阶段完成数
+STAGES = ("optimized", "hyde_generated", "embedded", "written")
+
+
+class BulkInsertJob:
+    """
+    批量入库任务，任务状态以 JSON 存储在 db/cache/bulk_jobs/{job_id}.json
+
+    - tools 为提交的原始工具列表，items 为与之一一对应的状态（pending/done/failed/skipped）
+    - 每次批量写入 Chroma 后落盘一次，崩溃后只需重跑 pending 的工具（写入使用 upsert，重复执行幂等）
+    """
+
+    def __init__(self, job_id: str, tools: List[Dict[str, Any]], tool_optimized: bool = False,
+                 on_conflict: str = "skip", path: str = None):
+        self.job_id = job_id
+        self.tools = tools
+        self.tool_optimized = tool_optimized
+        self.on_conflict = on_conflict
+        self.path = path
+        self.status = "queued"
+        self.items: List[Dict[str, Any]] = [
+            {"name": tool.get("name") if isinstance(tool, dict) else None, "status": TOOL_PENDING, "error": None}
+            for tool in tools
+        ]
+        self.stages = {stage: 0 for stage in STAGES}
+        self.conflicts_checked = False
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        # 本次运行开始时已完成的工具数，用于计算本次运行的吞吐量
+        self._done_at_start = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "tools": self.tools,
+            "tool_optimized": self.tool_optimized,
+            "on_conflict": self.on_conflict,
+            "status": self.status,
+            "items": self.items,
+            "stages": self.stages,
+            "conflicts_checked": self.conflicts_checked,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], path: str = None) -> "BulkInsertJob":
+        job = cls(data["job_id"], data["tools"], data.get("tool_optimized", False),
+                  data.get("on_conflict", "skip"), path)
+        job.status = data.get("status", "queued")
+        job.items = data["items"]
+        job.stages.update(data.get("stages", {}))
+        job.conflicts_checked = data.get("conflicts_checked", False)
+        job.created_at = data.get("created_at", job.created_at)
+        job.started_at = data.get("started_at")
+        job.finished_at = data.get("finished_at")
+        job.error = data.get("error")
+        return job
+
+    def save(self) -> None:
+        """
+        原子写入任务状态（先写临时文件再替换）
+        """
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def count(self, status: str) -> int:
+        return sum(1 for item in self.items if item["status"] == status)
+
+    def pending_indexes(self) -> List[int]:
+        return [i for i, item in enumerate(self.items) if item["status"] == TOOL_PENDING]
+
+    def mark(self, index: int, status: str, error: str = None) -> None:
+        self.items[index]["status"] = status
+        self.items[index]["error"] = error
+
+    def progress(self, max_errors: int = 50) -> Dict[str, Any]:
+        """
+        任务进度：各状态数量、各阶段完成数、耗时和吞吐量（工具/秒）
+        """
+        done = self.count(TOOL_DONE)
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        processed = done - self._done_at_start
+        errors = [
+            {"index": i, "name": item["name"], "error": item["error"]}
+            for i, item in enumerate(self.items) if item["status"] == TOOL_FAILED
+        ]
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": len(self.items),
+            "done": done,
+            "failed": len(errors),
+            "skipped": self.count(TOOL_SKIPPED),
+            "pending": self.count(TOOL_PENDING),
+            "stages": dict(self.stages),
+            "elapsed": round(elapsed, 3),
+            "throughput": round(processed / elapsed, 3) if elapsed > 0 else None,
+            "error": self.error,
+            "errors": errors[:max_errors],
+        }
+
+
+class _EmbeddingBatcher:
+    """
+    向量微批：各工具的文本先进入缓冲区，凑满 batch_size 或等待 max_wait 秒后合并为一次批量请求
+    """
+
+    def __init__(self, service: RetrievalService, batch_size: int, max_wait: float = 0.05):
+        self.service = service
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    def embed(self, text: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[tuple]) -> None:
+        try:
+            vectors = await self.service.embedding_api.get_embeddings_batch([text for text, _ in batch])
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class _ChromaWriter:
+    """
+    批量写入：凑满 batch_size 个工具后一次性 upsert 两个集合并增量更新稀疏索引
+    写入完成（或失败）后回调 on_written(batch, error)
+    """
+
+    def __init__(self, service: RetrievalService, batch_size: int, on_written):
+        self.service = service
+        self.batch_size = batch_size
+        self.on_written = on_written
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+
+    async def add(self, entry: Dict[str, Any]) -> None:
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                # 写入失败时整批标记失败，不影响后续批次
+                self.on_written(batch, e)
+            else:
+                self.on_written(batch, None)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        ids = [entry["tool_id"] for entry in batch]
+        self.service.tool_vector_collection.upsert(
+            ids=ids,
+            documents=[entry["tool_content"] for entry in batch],
+            embeddings=[entry["tool_embedding"] for entry in batch],
+        )
+        self.service.hypothetical_query_collection.upsert(
+            ids=ids,
+            documents=[entry["hypothetical_query"] for entry in batch],
+            embeddings=[entry["hypothetical_query_embedding"] for entry in batch],
+        )
+        # 稀疏索引逐条增量更新，整批只落盘一次
+        sparse_index = self.service.sparse_index
+        for entry in batch:
+            sparse_index.upsert("tool_vector", entry["tool_id"], entry["tool_content"], persist=False)
+            sparse_index.upsert("hypothetical_query", entry["tool_id"], entry["hypothetical_query"], persist=False)
+        sparse_index.save()
+
+        # 工具库变化，使检索结果缓存失效
+        self.service.bump_catalog_version()
+
+
+class BulkInsertManager:
+    """
+    批量入库任务管理：提交任务、查询进度、服务启动时续跑未完成的任务
+
+    每个工具依次经过 优化描述(可选) -> 生成假设问题 -> 向量化 -> 写入 四个阶段，
+    各 LLM 阶段有独立的并发上限，向量化合并为批量请求，写入按批 upsert
+    """
+
+    def __init__(self, db_path: str, logger: logging.Logger = None):
+        self.db_path = str(db_path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.jobs_dir = os.path.join(cache_dir_for(self.db_path), "bulk_jobs")
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.optimize_concurrency = max(1, int(os.getenv('BULK_OPTIMIZE_CONCURRENCY', '4')))
+        self.hyde_concurrency = max(1, int(os.getenv('BULK_HYDE_CONCURRENCY', '4')))
+        self.write_batch_size = max(1, int(os.getenv('BULK_WRITE_BATCH_SIZE', '32')))
+        self.jobs: Dict[str, BulkInsertJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def submit(self, tools: List[Dict[str, Any]], tool_optimized: bool = False, on_conflict: str = "skip") -> BulkInsertJob:
+        """
+        提交批量入库任务并在后台执行
+
+        Args:
+            tools: 工具JSON列表
+            tool_optimized: 是否优化工具描述
+            on_conflict: 工具已存在时的处理方式，"skip" 跳过，"overwrite" 覆盖
+
+        Returns:
+            BulkInsertJob
+        """
+        if on_conflict not in ("skip", "overwrite"):
+            raise HTTPException(status_code=400, detail=f"Invalid on_conflict: {on_conflict}, expected 'skip' or 'overwrite'")
+        if not tools:
+            raise HTTPException(status_code=400, detail="tools cannot be empty")
+        job_id = uuid.uuid4().hex
+        job = BulkInsertJob(job_id, tools, tool_optimized, on_conflict, self._job_path(job_id))
+        job.save()
+        self.jobs[job_id] = job
+        self._start(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[BulkInsertJob]:
+        """
+        获取任务（内存中没有时从磁盘读取历史任务）
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            path = self._job_path(os.path.basename(job_id))
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    job = BulkInsertJob.from_dict(json.load(f), path)
+                self.jobs[job_id] = job
+        return job
+
+    def resume_unfinished(self) -> List[str]:
+        """
+        续跑磁盘上状态为 queued/running 的任务（服务崩溃或重启前未完成的任务）
+        """
+        resumed = []
+        for file_name in sorted(os.listdir(self.jobs_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.jobs_dir, file_name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                self.logger.warning(f"Skip unreadable bulk job file {path}: {e}")
+                continue
+            if data.get("status") not in JOB_UNFINISHED or data["job_id"] in self._tasks:
+                continue
+            job = BulkInsertJob.from_dict(data, path)
+            self.jobs[job.job_id] = job
+            self._start(job)
+            resumed.append(job.job_id)
+        if resumed:
+            self.logger.info(f"Resume bulk insert jobs: {resumed}")
+        return resumed
+
+    async def shutdown(self) -> None:
+        """
+        停止后台任务；任务状态保持 running，下次启动时续跑
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            if job.status in JOB_UNFINISHED:
+                job.save()
+
+    def _start(self, job: BulkInsertJob) -> None:
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+
+    def _check_conflicts(self, job: BulkInsertJob, service: RetrievalService) -> None:
+        """
+        任务首次运行时校验工具格式并处理重名：任务内重复的工具只保留第一个，已入库的工具按 on_conflict 跳过或覆盖
+        """
+        seen = set()
+        for i, tool in enumerate(job.tools):
+            try:
+                if not isinstance(tool, dict):
+                    raise HTTPException(status_code=400, detail="Tool must be a json object")
+                verify_tool(tool, self.logger)
+            except HTTPException as e:
+                job.mark(i, TOOL_FAILED, e.detail)
+                continue
+            if tool["name"] in seen:
+                job.mark(i, TOOL_SKIPPED, "Duplicate tool name in job")
+            seen.add(tool["name"])
+
+        if job.on_conflict == "skip":
+            names = [job.items[i]["name"] for i in job.pending_indexes()]
+            existing = set()
+            for start in range(0, len(names), 500):
+                existing.update(service.tool_vector_collection.get(ids=names[start:start + 500])['ids'])
+            for i in job.pending_indexes():
+                if job.items[i]["name"] in existing:
+                    job.mark(i, TOOL_SKIPPED, "Tool already exists")
+        job.conflicts_checked = True
+
+    async def _run(self, job: BulkInsertJob) -> None:
+        logger = self.logger
+        try:
+            service = get_retrieval_service(self.db_path, logger)
+            job.status = "running"
+            job.started_at = time.time()
+            job.finished_at = None
+            job._done_at_start = job.count(TOOL_DONE)
+            if not job.conflicts_checked:
+                self._check_conflicts(job, service)
+            job.save()
+
+            pending = job.pending_indexes()
+            logger.info(f"Bulk insert job {job.job_id} start: total={len(job.items)}, pending={len(pending)}, "
+                        f"tool_optimized={job.tool_optimized}")
+
+            llm = LLM(logger=logger)
+            optimize_semaphore = asyncio.Semaphore(self.optimize_concurrency)
+            hyde_semaphore = asyncio.Semaphore(self.hyde_concurrency)
+            batcher = _EmbeddingBatcher(service, service.embedding_api.batch_size)
+
+            def on_written(batch: List[Dict[str, Any]], error: Optional[Exception]) -> None:
+                if error is not None:
+                    logger.error(f"Bulk insert job {job.job_id} write batch fail: {error.args}")
+                    for entry in batch:
+                        job.mark(entry["index"], TOOL_FAILED, f"Write to db fail: {error}")
+                else:
+                    for entry in batch:
+                        job.mark(entry["index"], TOOL_DONE)
+                    job.stages["written"] += len(batch)
+                job.save()
+                logger.info(f"Bulk insert job {job.job_id} progress: {job.count(TOOL_DONE)}/{len(job.items)}")
+
+            writer = _ChromaWriter(service, self.write_batch_size, on_written)
+
+            async def process(index: int) -> None:
+                tool = job.tools[index]
+                try:
+                    if job.tool_optimized:
+                        async with optimize_semaphore:
+                            tool = await tool_description_optimize(tool, logger, llm)
+                        if not isinstance(tool, dict) or not tool.get("name"):
+                            raise ValueError("Optimized tool json parse fail")
+                        job.stages["optimized"] += 1
+                    tool_content = tool_to_document(tool)
+
+                    # 工具文档的向量化与假设问题生成并行
+                    tool_embedding = batcher.embed(tool_content)
+                    async with hyde_semaphore:
+                        hypothetical_query = await generate_hypothetical_query_text(tool, logger, llm)
+                    job.stages["hyde_generated"] += 1
+                    hypothetical_query_embedding, tool_embedding = await asyncio.gather(
+                        batcher.embed(hypothetical_query), tool_embedding
+                    )
+                    job.stages["embedded"] += 1
+
+                    await writer.add({
+                        "index": index,
+                        "tool_id": tool["name"],
+                        "tool_content": tool_content,
+                        "tool_embedding": tool_embedding,
+                        "hypothetical_query": hypothetical_query,
+                        "hypothetical_query_embedding": hypothetical_query_embedding,
+                    })
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Bulk insert job {job.job_id} tool '{job.items[index]['name']}' fail: {e.args}")
+                    logger.error(f"Traceback: {traceback.format_exc()}")
+                    job.mark(index, TOOL_FAILED, str(e))
+
+            await asyncio.gather(*(process(index) for index in pending))
+            await writer.flush()
+
+            job.status = "completed"
+            job.finished_at = time.time()
+            job.save()
+            logger.info(f"Bulk insert job {job.job_id} completed: {job.progress(max_errors=0)}")
+        except asyncio.CancelledError:
+            logger.warning(f"Bulk insert job {job.job_id} interrupted, will resume on next startup")
+            raise
+        except Exception as e:
+            logger.error(f"Bulk insert job {job.job_id} fail: {e.args}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            job.status = "failed"
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.save()
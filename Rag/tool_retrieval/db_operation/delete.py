@@ -1,5 +1,5 @@
-import chromadb
 from fastapi import HTTPException
+from utils.retrieval import get_retrieval_service
 
 
 async def delete_tool_from_db(db_path: str, tool_name: str) -> None:
@@ -13,11 +13,9 @@ async def delete_tool_from_db(db_path: str, tool_name: str) -> None:
     Raises:
         HTTPException: 如果ID不存在或删除过程中发生错误
     """
-    # 连接到Chroma数据库
-    client = chromadb.PersistentClient(path=db_path)
-        
-    # 获取tool_vector集合
-    collection = client.get_or_create_collection(name="tool_vector")
+    # 使用共享检索服务中的Chroma集合
+    service = get_retrieval_service(db_path)
+    collection = service.tool_vector_collection
         
     # 检查ID是否存在
     exiting_documents = collection.get(ids=[tool_name])
@@ -28,5 +26,10 @@ async def delete_tool_from_db(db_path: str, tool_name: str) -> None:
     collection.delete(ids=[tool_name])
         
     # 同时从hypothetical_query集合中删除相关数据
-    hypothetical_query_collection = client.get_or_create_collection(name="hypothetical_query")
-    hypothetical_query_collection.delete(ids=[tool_name])
+    service.hypothetical_query_collection.delete(ids=[tool_name])
+
+    # 增量更新稀疏索引
+    service.sparse_index.remove(tool_name)
+
+    # 工具库变化，使检索结果缓存失效
+    service.bump_catalog_version()
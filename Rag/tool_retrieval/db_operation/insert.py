@@ -1,14 +1,20 @@
 import json
-import chromadb
 import logging
-from utils.embedding_api import EmbeddingAPI
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from utils.llm_api import LLM
 from utils.utils import parse_json
+from utils.retrieval import get_retrieval_service
 from fastapi import HTTPException
 
 
-async def tool_description_optimize(tool_json: Dict[str, Any], logger: logging.Logger) -> Dict[str, Any]:
+def tool_to_document(tool_json: Dict[str, Any]) -> str:
+    """
+    将整个工具JSON转换为入库文档字符串（紧凑格式，用于向量化和稀疏检索）
+    """
+    return json.dumps(tool_json, ensure_ascii=False, separators=(',', ':'))
+
+
+async def tool_description_optimize(tool_json: Dict[str, Any], logger: logging.Logger, llm: Optional[LLM] = None) -> Dict[str, Any]:
     """
     优化工具描述，包括参数描述的优化
     
@@ -58,7 +64,7 @@ async def tool_description_optimize(tool_json: Dict[str, Any], logger: logging.L
     #endregion
 
     # 调用LLM优化描述
-    llm = LLM(logger=logger)
+    llm = llm or LLM(logger=logger)
     optimized_description = await llm.infer(promtp.format(tool=tool_json)) 
 
     # 解析LLM输出，提取优化后的描述
@@ -88,11 +94,9 @@ async def insert_tool_to_db(db_path: str, tool_json: Dict[str, Any]) -> None:
     # 提取工具名称作为ID
     tool_id = tool_json["name"]
         
-    # 连接到Chroma数据库
-    client = chromadb.PersistentClient(path=db_path)
-        
-    # 获取或创建tool_vector集合
-    collection = client.get_or_create_collection(name="tool_vector")
+    # 使用共享检索服务中的Chroma集合
+    service = get_retrieval_service(db_path)
+    collection = service.tool_vector_collection
     
     # 检查ID是否已存在
     existing_documents = collection.get(ids=[tool_id])
@@ -100,13 +104,10 @@ async def insert_tool_to_db(db_path: str, tool_json: Dict[str, Any]) -> None:
         raise HTTPException(status_code=409, detail=f"ID '{tool_id}' already exists in the tool_vector collection. Please use the update interface instead.")
         
     # 将整个JSON转换为字符串用于向量化
-    tool_content = json.dumps(tool_json, ensure_ascii=False, separators=(',', ':'))
-        
-    # 初始化向量模型
-    embedding_api = EmbeddingAPI()
+    tool_content = tool_to_document(tool_json)
         
     # 获取工具内容的向量表示
-    embedding_result = await embedding_api.get_embedding(tool_content)
+    embedding_result = await service.embedding_api.get_embedding(tool_content)
         
     # 插入数据到集合中
     collection.add(
@@ -115,15 +116,21 @@ async def insert_tool_to_db(db_path: str, tool_json: Dict[str, Any]) -> None:
         ids=[tool_id]
     )
 
+    # 增量更新稀疏索引
+    service.sparse_index.upsert("tool_vector", tool_id, tool_content)
 
-async def generate_hypothetical_query(db_path: str, tool_json: Dict[str, Any], logger: logging.Logger) -> None:
+    # 工具库变化，使检索结果缓存失效
+    service.bump_catalog_version()
+
+
+async def generate_hypothetical_query_text(tool_json: Dict[str, Any], logger: logging.Logger, llm: Optional[LLM] = None) -> str:
     """
-    基于工具JSON生成假设查询，插入放到 hypothetical_query 集合
+    调用LLM基于工具JSON生成假设查询文本（不入库）
     
     Args:
-        db_path: 数据库路径
         tool_json: 工具JSON数据
         logger: 日志记录器
+        llm: 可复用的LLM实例，为None时新建
 
     Returns:
         假设查询
@@ -222,25 +229,37 @@ async def generate_hypothetical_query(db_path: str, tool_json: Dict[str, Any], l
     """.strip()
     #endregion
     
-    # 提取工具名称作为ID
-    tool_id = tool_json["name"]
-        
     # 生成假设问题查询
-    llm = LLM(logger=logger)
+    llm = llm or LLM(logger=logger)
     hypothetical_query = await llm.infer(prompt=prompt.format(tool_json=tool_json))
     logger.info(f"Generate hypothetical query success! hypothetical_query:\n{hypothetical_query}")
+    return hypothetical_query
+
+
+async def generate_hypothetical_query(db_path: str, tool_json: Dict[str, Any], logger: logging.Logger) -> None:
+    """
+    基于工具JSON生成假设查询，插入放到 hypothetical_query 集合
     
-    # 初始化向量模型
-    embedding_api = EmbeddingAPI()
+    Args:
+        db_path: 数据库路径
+        tool_json: 工具JSON数据
+        logger: 日志记录器
+
+    Returns:
+        假设查询
+    """
+    # 提取工具名称作为ID
+    tool_id = tool_json["name"]
         
+    # 生成假设问题查询
+    hypothetical_query = await generate_hypothetical_query_text(tool_json, logger)
+    
     # 获取生成问题向量表示
-    embedding_result = await embedding_api.get_embedding(hypothetical_query)
-        
-    # 连接到Chroma数据库
-    client = chromadb.PersistentClient(path=db_path)
+    service = get_retrieval_service(db_path)
+    embedding_result = await service.embedding_api.get_embedding(hypothetical_query)
         
-    # 获取或创建tool_vector集合
-    collection = client.get_or_create_collection(name="hypothetical_query")
+    # 使用共享检索服务中的hypothetical_query集合
+    collection = service.hypothetical_query_collection
         
     # 插入数据到集合中
     collection.add(
@@ -248,3 +267,9 @@ async def generate_hypothetical_query(db_path: str, tool_json: Dict[str, Any], l
         embeddings=[embedding_result],
         ids=[tool_id]
     )
+
+    # 增量更新稀疏索引
+    service.sparse_index.upsert("hypothetical_query", tool_id, hypothetical_query)
+
+    # 工具库变化，使检索结果缓存失效
+    service.bump_catalog_version()
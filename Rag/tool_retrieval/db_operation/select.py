@@ -1,6 +1,6 @@
-import chromadb
 import json
 from typing import Optional, List, Dict, Any
+from utils.retrieval import get_retrieval_service
 
 
 async def select_tool_from_db(db_path: str, tool_name: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -14,14 +14,10 @@ async def select_tool_from_db(db_path: str, tool_name: Optional[str] = None) ->
     Returns:
         工具信息列表，包含工具数据和假设性问题
     """
-    # 连接到Chroma数据库
-    client = chromadb.PersistentClient(path=db_path)
-    
-    # 获取tool_vector集合
-    tool_vector_collection = client.get_or_create_collection(name="tool_vector")
-    
-    # 获取hypothetical_query集合
-    hypothetical_query_collection = client.get_or_create_collection(name="hypothetical_query")
+    # 使用共享检索服务中的Chroma集合
+    service = get_retrieval_service(db_path)
+    tool_vector_collection = service.tool_vector_collection
+    hypothetical_query_collection = service.hypothetical_query_collection
     
     # 如果提供了tool_name，则查询特定工具
     if tool_name:
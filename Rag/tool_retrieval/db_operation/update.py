@@ -1,6 +1,5 @@
 import json
-import chromadb
-from utils.embedding_api import EmbeddingAPI
+from utils.retrieval import get_retrieval_service
 from typing import Dict, Any
 from fastapi import HTTPException
 
@@ -19,14 +18,10 @@ async def update_tool_to_db(db_path: str, tool_json: Dict[str, Any]) -> None:
     # 提取工具名称作为ID
     tool_id = tool_json["name"]
         
-    # 连接到Chroma数据库
-    client = chromadb.PersistentClient(path=db_path)
-        
-    # 获取tool_vector集合
-    tool_vector_collection = client.get_or_create_collection(name="tool_vector")
-
-    # 获取hypothetical_query集合
-    hypothetical_query_collection = client.get_or_create_collection(name="hypothetical_query")
+    # 使用共享检索服务中的Chroma集合
+    service = get_retrieval_service(db_path)
+    tool_vector_collection = service.tool_vector_collection
+    hypothetical_query_collection = service.hypothetical_query_collection
     
     # 检查ID是否存在
     existing_documents = tool_vector_collection.get(ids=[tool_id])
@@ -38,15 +33,14 @@ async def update_tool_to_db(db_path: str, tool_json: Dict[str, Any]) -> None:
     
     # 删除假设性问题的旧数据
     hypothetical_query_collection.delete(ids=[tool_id])
+    service.sparse_index.remove(tool_id, persist=False)
+    service.bump_catalog_version()
         
     # 将整个JSON转换为字符串用于向量化
     tool_content = json.dumps(tool_json, ensure_ascii=False, separators=(',', ':'))
         
-    # 初始化向量模型
-    embedding_api = EmbeddingAPI()
-        
     # 获取工具内容的向量表示
-    embedding_result = await embedding_api.get_embedding(tool_content)
+    embedding_result = await service.embedding_api.get_embedding(tool_content)
         
     # 添加新数据到集合中
     tool_vector_collection.add(
@@ -54,3 +48,9 @@ async def update_tool_to_db(db_path: str, tool_json: Dict[str, Any]) -> None:
         embeddings=[embedding_result],
         ids=[tool_id]
     )
+
+    # 增量更新稀疏索引
+    service.sparse_index.upsert("tool_vector", tool_id, tool_content)
+
+    # 工具库变化，使检索结果缓存失效
+    service.bump_catalog_version()
@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 import time
 import requests
 from typing import List, Dict, Any
@@ -162,6 +163,64 @@ def insert_tools_from_json():
             for i, error in enumerate(all_errors, 1):
                 print(f"  {i}. {error}")
 
+def bulk_insert_tools_from_json(poll_interval: float = 2.0):
+    """
+    从tool.json文件中读取工具，提交一个批量入库任务并轮询进度
+    """
+    # 定义文件路径
+    data_dir = "data"
+    tool_json_path = os.path.join(data_dir, "tool.json")
+    
+    # API基础URL - 默认本地服务
+    base_url = "http://localhost:8009"
+    
+    # 读取tool.json文件
+    print(f"正在读取工具文件: {tool_json_path}")
+    with open(tool_json_path, 'r', encoding='utf-8') as f:
+        tools = json.load(f)
+    print(f"成功读取工具文件，共{len(tools)}个工具")
+    
+    # 提交批量入库任务
+    response = requests.post(
+        f"{base_url}/tools/bulk_insert",
+        json={"tools": tools, "tool_optimized": False},
+        timeout=60
+    )
+    if response.status_code != 200:
+        print(f"提交批量入库任务失败, 状态码: {response.status_code}, 响应: {response.text}")
+        return
+    job_id = response.json()['job_id']
+    print(f"批量入库任务已提交: {job_id}")
+    
+    # 轮询任务进度
+    while True:
+        time.sleep(poll_interval)
+        progress = requests.get(f"{base_url}/tools/bulk_insert/{job_id}", timeout=30).json()
+        print(f"  进度: {progress['done']}/{progress['total']}, 失败: {progress['failed']}, 跳过: {progress['skipped']}, "
+              f"耗时: {progress['elapsed']:.2f}秒, 吞吐量: {progress['throughput']} 工具/秒")
+        if progress['status'] not in ('queued', 'running'):
+            break
+    
+    # 打印汇总结果
+    print(f"\n工具入库完成! 任务状态: {progress['status']}")
+    print(f"总工具数: {progress['total']}")
+    print(f"成功入库数: {progress['done']}")
+    print(f"跳过数（已存在或重复）: {progress['skipped']}")
+    print(f"失败数: {progress['failed']}")
+    print(f"总耗时: {progress['elapsed']:.2f}秒")
+    if progress['error']:
+        print(f"任务错误: {progress['error']}")
+    
+    # 打印失败的工具列表
+    if progress['errors']:
+        print(f"\n插入失败的工具 (共{progress['failed']}个):")
+        for i, error in enumerate(progress['errors'], 1):
+            print(f"  {i}. {error['name']}: {error['error']}")
+
+
 if __name__ == "__main__":
-    # 运行函数
-    insert_tools_from_json()
+    # 默认使用批量入库接口，--serial 时逐个串行入库
+    if "--serial" in sys.argv:
+        insert_tools_from_json()
+    else:
+        bulk_insert_tools_from_json()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from sqlalchemy import true
 
@@ -29,6 +29,29 @@ class InsertToolRequest(BaseModel):
     tool_optimized: Optional[bool] = True
 
 
+class BulkInsertToolRequest(BaseModel):
+    """
+    批量入库，tools 为工具 json 列表，返回任务 id，通过 /tools/bulk_insert/{job_id} 查询进度
+    传入可选参数 tool_optimized 是否优化工具描述，默认值为 False
+    传入可选参数 on_conflict 工具已存在时的处理方式，"skip" 跳过（默认），"overwrite" 覆盖
+    示例：
+    {
+        "tools": [
+            {
+                "name": "tool1",
+                "description": "这是一个工具",
+                "parameters": {...}
+            }
+        ],
+        "tool_optimized": false,
+        "on_conflict": "skip"
+    }
+    """
+    tools: List[Dict[str, Any]]
+    tool_optimized: Optional[bool] = False
+    on_conflict: Optional[str] = "skip"
+
+
 class DeleteToolRequest(BaseModel):
     """
     根据 tool_name 删除工具
@@ -83,9 +106,11 @@ class RetrievalToolRequest(BaseModel):
     {
         "query": "检索工具",
         "method": "hybrid",
-        "n_results": 5
+        "n_results": 5,
+        "use_cache": true
     }
     """
     query: str
     method: Optional[str] = "hybrid"  # 可选值为 "dense", "sparse", "hybrid", "keyword"
     n_results: Optional[int] = 5
+    use_cache: Optional[bool] = True  # 是否使用检索结果缓存
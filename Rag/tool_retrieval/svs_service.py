@@ -2,18 +2,19 @@ import uvicorn
 import traceback
 from dotenv import load_dotenv
 from art import text2art
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.responses import JSONResponse
 from pathlib import Path
 from logs.logger import define_log_level
-from db_operation import create_lifespan
+from db_operation import create_lifespan, get_service, get_bulk_insert_manager
 from utils.utils import verify_tool
 from db_operation.insert import insert_tool_to_db, generate_hypothetical_query, tool_description_optimize
+from db_operation.bulk_insert import BulkInsertManager
 from db_operation.delete import delete_tool_from_db
 from db_operation.update import update_tool_to_db
 from db_operation.select import select_tool_from_db
-from utils.retrieval import retrieval_tool_func
-from model import InsertToolRequest, DeleteToolRequest, UpdateToolRequest, SelectToolRequest, RetrievalToolRequest
+from utils.retrieval import retrieval_tool_func, RetrievalService
+from model import InsertToolRequest, BulkInsertToolRequest, DeleteToolRequest, UpdateToolRequest, SelectToolRequest, RetrievalToolRequest
 
 
 # 初始化
@@ -27,13 +28,14 @@ delete_logger = define_log_level(project_root, 'delete')
 update_logger = define_log_level(project_root, 'update')
 select_logger = define_log_level(project_root, 'select')
 retrieval_logger = define_log_level(project_root, 'retrieval')
+bulk_insert_logger = define_log_level(project_root, 'bulk_insert')
 
 # 创建FastAPI应用
 app = FastAPI(
     title="工具管理服务",
     description="提供工具的增删改查和检索功能",
     version="1.0.0",
-    lifespan=create_lifespan(db_path)
+    lifespan=create_lifespan(db_path, bulk_insert_logger)
 )
 
 
@@ -93,6 +95,46 @@ async def insert_tool(requests: InsertToolRequest):
         insert_logger.info(f"=" * 20)
 
 
+@app.post("/tools/bulk_insert")
+async def bulk_insert(requests: BulkInsertToolRequest, manager: BulkInsertManager = Depends(get_bulk_insert_manager)):
+    """
+    批量入库，后台按流水线执行（优化描述 -> 生成假设问题 -> 批量向量化 -> 批量写入），立即返回任务 id
+    示例：
+    {
+        "tools": [{"name": "tool1", "description": "这是一个工具", "parameters": {...}}],
+        "tool_optimized": false,
+        "on_conflict": "skip"
+    }
+    """
+    bulk_insert_logger.info(f"=" * 20)
+    try:
+        bulk_insert_logger.info(f"Bulk insert {len(requests.tools)} tools, tool_optimized: {requests.tool_optimized}, "
+                                f"on_conflict: {requests.on_conflict}")
+        job = manager.submit(requests.tools, requests.tool_optimized, requests.on_conflict)
+        bulk_insert_logger.info(f"Bulk insert job submitted: {job.job_id}")
+        return JSONResponse(status_code=200, content={'job_id': job.job_id, 'total': len(job.items)})
+    except HTTPException as e:
+        bulk_insert_logger.error(f"HTTP Exception: {e.detail}")
+        raise e
+    except Exception as e:
+        bulk_insert_logger.error(f"Error submitting bulk insert job: {e.args}")
+        bulk_insert_logger.error(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Error submitting bulk insert job: {e.args}")
+    finally:
+        bulk_insert_logger.info(f"=" * 20)
+
+
+@app.get("/tools/bulk_insert/{job_id}")
+async def bulk_insert_progress(job_id: str, manager: BulkInsertManager = Depends(get_bulk_insert_manager)):
+    """
+    查询批量入库任务进度：各状态数量、各阶段完成数、耗时、吞吐量（工具/秒）和失败原因
+    """
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Bulk insert job '{job_id}' not found")
+    return JSONResponse(status_code=200, content=job.progress())
+
+
 @app.post("/tools/delete_tool")
 async def delete_tool(requests: DeleteToolRequest):
     """
@@ -213,14 +255,15 @@ async def select_tool(requests: SelectToolRequest):
 
 
 @app.post("/tools/retrieval_tool")
-async def retrieval_tool(requests: RetrievalToolRequest):
+async def retrieval_tool(requests: RetrievalToolRequest, service: RetrievalService = Depends(get_service)):
     """
     根据 query 检索工具
     示例：
     {
         "query": "检索工具",
         "method": "hybrid",
-        "n_results": 5
+        "n_results": 5,
+        "use_cache": true
     }
     """
     retrieval_logger.info(f"=" * 20)
@@ -232,10 +275,13 @@ async def retrieval_tool(requests: RetrievalToolRequest):
         retrieval_logger.info(f"Retrieval tool with query: {query}, method: {method}, n_results: {n_results}")
         
         # 调用检索函数
-        results = await retrieval_tool_func(str(db_path), query, method, n_results, retrieval_logger)
-        retrieval_logger.info(f"Retrieval tool success! Found {len(results)} results.")
+        timings = {}
+        results = await retrieval_tool_func(str(db_path), query, method, n_results, retrieval_logger,
+                                            retrieval_service=service, timings=timings,
+                                            use_cache=requests.use_cache)
+        retrieval_logger.info(f"Retrieval tool success! Found {len(results)} results. Timings: {timings}")
         
-        return JSONResponse(status_code=200, content={'results': results})
+        return JSONResponse(status_code=200, content={'results': results, 'timings': timings})
     except Exception as e:
         retrieval_logger.error(f"Error retrieving tool: {e.args}")
         retrieval_logger.error(f"Traceback: {traceback.format_exc()}")
@@ -244,6 +290,19 @@ async def retrieval_tool(requests: RetrievalToolRequest):
         retrieval_logger.info(f"=" * 20)
 
 
+@app.get("/tools/retrieval_cache_stats")
+async def retrieval_cache_stats(service: RetrievalService = Depends(get_service)):
+    """
+    检索结果缓存和向量缓存的命中率统计，以及当前工具库版本号
+    """
+    embedding_cache = service.embedding_api.cache
+    return JSONResponse(status_code=200, content={
+        'catalog_version': service.catalog_version,
+        'result_cache': service.result_cache.stats(),
+        'embedding_cache': embedding_cache.stats() if embedding_cache is not None else None,
+    })
+
+
 if __name__ == "__main__":
     print(text2art('TOOL_RETRIEVAL'))
     uvicorn.run(app, host="0.0.0.0", port=8009)
@@ -1,63 +1,124 @@
+import asyncio
 import dashscope
 import json
 import os
 from http import HTTPStatus
-from typing import Dict, Any, List
+from typing import Dict, List, Optional
+from utils.embedding_cache import EmbeddingCache
+from utils.local_embedding import local_embedding
 
 
 class EmbeddingAPI:
     """
     多模态嵌入API封装类，用于调用dashscope的多模态嵌入模型
+
+    - 多条文本合并为一次请求（每批最多 EMBEDDING_BATCH_SIZE 条），多个批次按 EMBEDDING_CONCURRENCY 并发
+    - 传入 cache_path 时启用按内容哈希的向量缓存，命中的文本不再调用接口
+    - EMBEDDING_BACKEND=local 时使用本地确定性哈希向量（见 utils/local_embedding.py），不访问网络
     """
-    
-    def __init__(self):
+
+    def __init__(self, cache_path: Optional[str] = None):
         """
         初始化EmbeddingAPI实例
+
+        Args:
+            cache_path: 向量缓存 SQLite 文件路径，为None时不使用缓存
         """
-        self.model = os.getenv('EMBEDDING_MODEL', 'multimodal-embedding-v1')
+        self.backend = os.getenv('EMBEDDING_BACKEND', 'dashscope')
+        self.local_dim = int(os.getenv('LOCAL_EMBEDDING_DIM', '512'))
+        # 本地向量使用单独的模型名，避免与接口向量共用缓存条目
+        self.model = f'local-hash-{self.local_dim}' if self.backend == 'local' else os.getenv('EMBEDDING_MODEL', 'multimodal-embedding-v1')
         self.api_key = os.getenv('MODELSCOPE_API_KEY')
-        
-        if not self.api_key:
+        self.batch_size = max(1, int(os.getenv('EMBEDDING_BATCH_SIZE', '8')))
+        self.concurrency = max(1, int(os.getenv('EMBEDDING_CONCURRENCY', '4')))
+        self.cache = EmbeddingCache(
+            cache_path, max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+        ) if cache_path else None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 实际发出的接口请求次数，便于观察批量和缓存效果
+        self.api_calls = 0
+
+        if self.backend != 'local' and not self.api_key:
             raise ValueError("API密钥未提供，请设置MODELSCOPE_API_KEY环境变量或在初始化时传入api_key参数")
-    
-    async def get_embedding(self, text: str) -> Dict[str, Any]:
+
+    async def get_embedding(self, text: str) -> List[float]:
         """
         获取文本的嵌入向量
-        
+
         Args:
             text: 要获取嵌入向量的文本
-            
+
+        Returns:
+            嵌入向量
+        """
+        return (await self.get_embeddings_batch([text]))[0]
+
+    async def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量获取文本的嵌入向量：先查缓存，未命中的文本去重后按批次并发请求
+
+        Args:
+            texts: 要获取嵌入向量的文本列表
+
         Returns:
-            包含嵌入向量和其他信息的字典
+            与 texts 顺序一致的嵌入向量列表
         """
-        inputs = [{'text': text}]
-        
-        # 调用模型接口
+        if not texts:
+            return []
+
+        embeddings: Dict[str, List[float]] = {}
+        if self.cache is not None:
+            embeddings.update(await asyncio.to_thread(self.cache.get_many, self.model, texts))
+
+        # 未命中的文本去重后分批
+        missing = list(dict.fromkeys(text for text in texts if text not in embeddings))
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            batch_results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+            fetched = {}
+            for batch, vectors in zip(batches, batch_results):
+                fetched.update(zip(batch, vectors))
+            embeddings.update(fetched)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, self.model, fetched)
+
+        return [embeddings[text] for text in texts]
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        一次请求获取一批文本的向量，受并发数限制
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            vectors = await asyncio.to_thread(self._call_api, texts)
+        if len(vectors) != len(texts):
+            # 部分模型对多条输入返回融合向量，此时退回逐条请求
+            vectors = []
+            for text in texts:
+                async with self._semaphore:
+                    vectors.extend(await asyncio.to_thread(self._call_api, [text]))
+        return vectors
+
+    def _call_api(self, texts: List[str]) -> List[List[float]]:
+        """
+        调用模型接口（dashscope 为同步HTTP调用，在线程中执行）
+        """
+        self.api_calls += 1
+        if self.backend == 'local':
+            return local_embedding(texts, self.local_dim)
+
+        inputs = [{'text': text} for text in texts]
         resp = dashscope.MultiModalEmbedding.call(
             model=self.model,
             input=inputs,
             api_key=self.api_key
         )
-        
-        # 根据您提供的返回结构处理响应
+
+        # 根据您提供的返回结构处理响应，按 index 还原输入顺序
         if resp.status_code == HTTPStatus.OK:
-            embedding_content = resp.output['embeddings'][0]['embedding']
-            return embedding_content
+            items = resp.output['embeddings']
+            items = sorted(items, key=lambda item: item.get('index', 0))
+            return [item['embedding'] for item in items]
         else:
             raise Exception(f'获取嵌入向量失败: {resp.status_code} {resp.message}')
-    
-    async def get_embeddings_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
-        """
-        批量获取文本的嵌入向量
-        
-        Args:
-            texts: 要获取嵌入向量的文本列表
-            
-        Returns:
-            包含嵌入向量和其他信息的字典列表
-        """
-        results = []
-        for text in texts:
-            result = await self.get_embedding(text)
-            results.append(result)
-        return results
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class EmbeddingCache:
+    """
+    以文本内容哈希为键的向量缓存，存储在 SQLite 中
+
+    - 键为 sha256(模型名 + 文本)，同一文本换模型后不会误命中
+    - 向量以 float64 二进制存储，读出后与接口返回值完全一致
+    - 内容未变的工具重复入库/更新时不再调用向量接口
+    - 条目数超过 max_entries 时按写入顺序淘汰最早的条目（查询文本也会写入缓存）
+    """
+
+    def __init__(self, cache_path: str, max_entries: int = 200000):
+        """
+        初始化向量缓存
+
+        Args:
+            cache_path: SQLite 文件路径
+            max_entries: 最大条目数，<=0 表示不限制
+        """
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        批量查询缓存
+
+        Args:
+            model: 向量模型名称
+            texts: 文本列表
+
+        Returns:
+            命中的 文本 -> 向量
+        """
+        keys = {self.make_key(model, text): text for text in texts}
+        found: Dict[str, List[float]] = {}
+        key_list = list(keys)
+        with self._lock:
+            # SQLite 单条语句的参数个数有限制，分批查询
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype="<f8").tolist()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """
+        批量写入缓存
+
+        Args:
+            model: 向量模型名称
+            items: 文本 -> 向量
+        """
+        if not items:
+            return
+        rows = [
+            (self.make_key(model, text), model, len(vector), np.asarray(vector, dtype="<f8").tobytes())
+            for text, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if self.max_entries > 0:
+                # INSERT OR REPLACE 会分配新的 rowid，rowid 越小写入越早
+                self._conn.execute(
+                    "DELETE FROM embedding_cache WHERE rowid <= "
+                    "(SELECT MAX(rowid) FROM embedding_cache) - ?",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            total = self.hits + self.misses
+            size = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        return {
+            "entries": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
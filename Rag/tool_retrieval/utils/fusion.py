@@ -0,0 +1,148 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+
+# 倒数排名融合的平滑参数，避免排名靠后的结果分数过低
+RRF_K = 60
+
+# 各检索方法结果中的 (标准化分数字段, 原始分数字段)
+SCORE_FIELDS = {
+    'dense': ('similarity', 'similarity'),      # 余弦相似度已经在0-1范围
+    'sparse': ('normalized_score', 'score'),    # BM25分数使用预先计算的归一化分数
+    'keyword': ('score', 'score'),              # TF-IDF余弦相似度已经在0-1范围
+}
+
+
+@dataclass
+class CandidatePool:
+    """
+    混合检索的候选池：候选按首次出现的顺序编号，各方法的排名/分数存为 (方法数, 候选数) 的数组
+    """
+    methods: List[str]
+    tool_ids: List[str]
+    items: List[Dict[str, Any]]     # 每个候选首次出现时的结果，用于取 metadata/document/collection
+    ranks: np.ndarray               # 1 起的排名；未被该方法召回时为 该方法结果数 + 1
+    present: np.ndarray             # 是否被该方法召回
+    scores: np.ndarray              # 标准化分数，未召回为 0
+    raw_scores: np.ndarray          # 原始分数，未召回为 0
+
+
+def build_pool(all_results: Dict[str, List[Dict[str, Any]]]) -> CandidatePool:
+    """
+    根据各方法的检索结果构建候选池
+
+    Args:
+        all_results: 方法名 -> 该方法按分数降序的结果列表（已按工具去重）
+
+    Returns:
+        CandidatePool
+    """
+    methods = [method for method in all_results if method in SCORE_FIELDS]
+    index: Dict[str, int] = {}
+    tool_ids: List[str] = []
+    items: List[Dict[str, Any]] = []
+    positions = []
+    for method in methods:
+        method_positions = []
+        for item in all_results[method]:
+            tool_id = item['tool_id']
+            idx = index.get(tool_id)
+            if idx is None:
+                idx = index[tool_id] = len(tool_ids)
+                tool_ids.append(tool_id)
+                items.append(item)
+            method_positions.append(idx)
+        positions.append(method_positions)
+
+    n_methods, n_candidates = len(methods), len(tool_ids)
+    ranks = np.empty((n_methods, n_candidates), dtype=np.float64)
+    present = np.zeros((n_methods, n_candidates), dtype=bool)
+    scores = np.zeros((n_methods, n_candidates), dtype=np.float64)
+    raw_scores = np.zeros((n_methods, n_candidates), dtype=np.float64)
+    for m, method in enumerate(methods):
+        results = all_results[method]
+        score_field, raw_field = SCORE_FIELDS[method]
+        cols = np.asarray(positions[m], dtype=np.intp)
+        ranks[m, :] = len(results) + 1
+        if not len(cols):
+            continue
+        ranks[m, cols] = np.arange(1, len(cols) + 1)
+        present[m, cols] = True
+        scores[m, cols] = [item[score_field] for item in results]
+        raw_scores[m, cols] = [item.get(raw_field, 0) for item in results]
+    return CandidatePool(methods, tool_ids, items, ranks, present, scores, raw_scores)
+
+
+def rrf_scores(pool: CandidatePool, k: int = RRF_K) -> np.ndarray:
+    """
+    倒数排名融合：sum(1 / (rank + k))，未被某方法召回的候选按 该方法结果数 + 1 计排名
+    """
+    fused = np.zeros(len(pool.tool_ids), dtype=np.float64)
+    # 按方法顺序逐行累加，浮点求和顺序与逐个候选累加一致
+    for m in range(len(pool.methods)):
+        fused += 1.0 / (pool.ranks[m] + k)
+    return fused
+
+
+def weighted_scores(pool: CandidatePool, weights: Dict[str, float], power: float = 1.0) -> np.ndarray:
+    """
+    加权平均：sum(score ** power * weight)，只累加被召回且在 weights 中的方法
+
+    power != 1 时负分取复数幂的实部（与 Python float ** 1.5 后取 .real 一致）
+    """
+    fused = np.zeros(len(pool.tool_ids), dtype=np.float64)
+    for m, method in enumerate(pool.methods):
+        if method not in weights:
+            continue
+        score = pool.scores[m]
+        if power != 1.0:
+            enhanced = np.abs(score) ** power
+            enhanced = np.where(score < 0, enhanced * np.cos(power * np.pi), enhanced)
+        else:
+            enhanced = score
+        fused += np.where(pool.present[m], enhanced * weights[method], 0.0)
+    return fused
+
+
+def fuse(all_results: Dict[str, List[Dict[str, Any]]], n_results: int, strategy: str = "rank_fusion",
+         weights: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    融合各检索方法的结果
+
+    Args:
+        all_results: 方法名 -> 该方法的检索结果列表
+        n_results: 返回结果数量
+        strategy: "rank_fusion"（倒数排名融合）、"adaptive"（对分数做1.5次幂后加权）、"weighted"（加权平均）
+        weights: 各方法权重，rank_fusion 策略不使用
+
+    Returns:
+        按融合分数降序的结果列表，分数相同时保持候选首次出现的顺序
+    """
+    pool = build_pool(all_results)
+    if not pool.tool_ids:
+        return []
+
+    if strategy == "rank_fusion":
+        fused = rrf_scores(pool)
+    else:
+        fused = weighted_scores(pool, weights or {}, power=1.5 if strategy == "adaptive" else 1.0)
+
+    # 稳定排序，分数相同时保持候选首次出现的顺序
+    top = np.argsort(-fused, kind='stable')[:n_results]
+
+    formatted_results = []
+    for c in top:
+        item = pool.items[c]
+        methods_hit = [m for m in range(len(pool.methods)) if pool.present[m, c]]
+        formatted_results.append({
+            'tool_id': pool.tool_ids[c],
+            'score': float(fused[c]),  # 使用融合分数作为最终分数
+            'metadata': item['metadata'],
+            'document': item['document'],
+            'collection': item['collection'],
+            'score_type': 'hybrid',
+            'method_scores': {pool.methods[m]: float(pool.scores[m, c]) for m in methods_hit},  # 各方法的标准化分数
+            'raw_method_scores': {pool.methods[m]: float(pool.raw_scores[m, c]) for m in methods_hit}  # 各方法的原始分数
+        })
+    return formatted_results
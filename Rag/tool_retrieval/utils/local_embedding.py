@@ -0,0 +1,47 @@
+import hashlib
+import numpy as np
+from typing import List
+from utils.sparse_index import tokenize
+
+
+def _bucket(feature: str, dim: int):
+    """
+    特征哈希：用 md5 取桶号和符号（不使用 Python hash，保证跨进程结果一致）
+    """
+    digest = hashlib.md5(feature.encode("utf-8")).digest()
+    index = int.from_bytes(digest[:4], "little") % dim
+    sign = 1.0 if digest[4] & 1 else -1.0
+    return index, sign
+
+
+def local_embedding(texts: List[str], dim: int = 512) -> List[List[float]]:
+    """
+    确定性的本地向量：jieba 分词结果与字符二元组做特征哈希，按 1 + log(tf) 加权后 L2 归一化
+
+    不依赖网络，同一文本在任何机器上得到相同向量，用于离线基准测试和无法访问向量接口的环境；
+    语义能力远弱于真实向量模型，只用于比较检索流程本身的性能和相对效果
+
+    Args:
+        texts: 文本列表
+        dim: 向量维度
+
+    Returns:
+        与 texts 顺序一致的向量列表
+    """
+    vectors = []
+    for text in texts:
+        text = (text or "").lower()
+        features = tokenize(text) + [text[i:i + 2] for i in range(len(text) - 1) if not text[i:i + 2].isspace()]
+        counts = {}
+        for feature in features:
+            if feature.strip():
+                counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(dim, dtype=np.float64)
+        for feature, tf in counts.items():
+            index, sign = _bucket(feature, dim)
+            vector[index] += sign * (1.0 + np.log(tf))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        vectors.append(vector.tolist())
+    return vectors
@@ -0,0 +1,172 @@
+import re
+import time
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """
+    查询归一化：全角转半角（NFKC）、转小写、去首尾空白并合并连续空白
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query or "")).strip().lower()
+
+
+class RetrievalResultCache:
+    """
+    检索结果缓存，键为 (归一化查询, 检索方法, n_results)
+
+    - 每个条目记录写入时的工具库版本号，工具增删改后版本号递增，旧版本条目视为失效
+    - 按 LRU 淘汰，超过 max_entries 时淘汰最久未使用的条目；超过 ttl 秒的条目视为过期
+    - similarity_threshold > 0 时，精确未命中可按查询向量的余弦相似度匹配近似查询（同方法、同 n_results、同版本）
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, similarity_threshold: float = 0.0):
+        """
+        初始化检索结果缓存
+
+        Args:
+            max_entries: 最大条目数，<=0 表示不缓存
+            ttl: 条目有效期（秒），<=0 表示不过期
+            similarity_threshold: 近似查询匹配的余弦相似度阈值，<=0 表示不启用
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple[str, str, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def near_duplicate_enabled(self) -> bool:
+        return self.enabled and self.similarity_threshold > 0
+
+    def _is_valid(self, entry: Dict[str, Any], version: int, now: float) -> bool:
+        if entry["version"] != version:
+            self.invalidations += 1
+            return False
+        if self.ttl > 0 and now - entry["created_at"] > self.ttl:
+            self.expirations += 1
+            return False
+        return True
+
+    def get(self, query: str, method: str, n_results: int, version: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        精确查询缓存，未命中返回None（近似匹配见 get_similar，未命中计数由调用方在两者都未命中后记录）
+        """
+        if not self.enabled:
+            return None
+        key = (normalize_query(query), method, n_results)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not self._is_valid(entry, version, time.time()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["results"]
+
+    def get_similar(self, embedding: List[float], method: str, n_results: int,
+                    version: int) -> Optional[Tuple[str, float, List[Dict[str, Any]]]]:
+        """
+        按查询向量匹配近似查询
+
+        Returns:
+            (命中的归一化查询, 余弦相似度, 检索结果)，未命中返回None
+        """
+        if not self.near_duplicate_enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for key, entry in list(self._entries.items()):
+                if key[1] != method or key[2] != n_results or entry["embedding"] is None:
+                    continue
+                if not self._is_valid(entry, version, now):
+                    del self._entries[key]
+                    continue
+                candidates.append((key, entry))
+            if not candidates:
+                return None
+            matrix = np.stack([entry["embedding"] for _, entry in candidates])
+            vector = np.asarray(embedding, dtype=np.float64)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.near_hits += 1
+            return key[0], float(similarities[best]), entry["results"]
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def put(self, query: str, method: str, n_results: int, version: int, results: List[Dict[str, Any]],
+            embedding: Optional[List[float]] = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            query: 查询文本
+            method: 检索方法
+            n_results: 返回结果数量
+            version: 检索开始前的工具库版本号（检索期间工具库有变化时该条目会直接失效）
+            results: 检索结果
+            embedding: 查询向量，启用近似匹配时用于后续匹配
+        """
+        if not self.enabled:
+            return
+        if embedding is not None and self.near_duplicate_enabled:
+            vector = np.asarray(embedding, dtype=np.float64)
+            embedding = vector / (np.linalg.norm(vector) or 1.0)
+        else:
+            embedding = None
+        key = (normalize_query(query), method, n_results)
+        with self._lock:
+            self._entries[key] = {
+                "results": results,
+                "version": version,
+                "created_at": time.time(),
+                "embedding": embedding,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.near_hits) / total, 4) if total else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -1,19 +1,22 @@
+import asyncio
 import chromadb
 import logging
 import time
 import os
-import numpy as np
-import jieba.posseg as pseg
-from typing import Dict, Any, List
+import threading
+from typing import Dict, Any, List, Optional
 from utils.embedding_api import EmbeddingAPI
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from rank_bm25 import BM25Okapi
+from utils.sparse_index import get_sparse_index, warm_up_tokenizer
+from utils.fusion import fuse
+from utils.result_cache import RetrievalResultCache
 
 
 class RetrievalService:
     """
     检索服务类，提供多种检索方法
+
+    进程内共享一个实例（见 get_retrieval_service），持有 Chroma 客户端、两个集合、
+    稀疏索引和向量模型，请求处理时不再重复初始化
     """
     
     def __init__(self, db_path: str, logger: logging.Logger = None):
@@ -26,8 +29,11 @@ class RetrievalService:
         """
         self.db_path = db_path
         self.client = chromadb.PersistentClient(path=db_path)
-        self.embedding_api = EmbeddingAPI()
         self.logger = logger or logging.getLogger(__name__)
+        # 混合检索中单个检索分支的超时时间（秒），超时的分支不参与融合
+        self.branch_timeout = float(os.getenv('HYBRID_BRANCH_TIMEOUT', '5'))
+        # 混合检索中每个分支召回 n_results * 倍数 个候选参与融合
+        self.candidate_multiplier = max(1, int(os.getenv('HYBRID_CANDIDATE_MULTIPLIER', '2')))
         
         # 获取或创建集合
         self.tool_vector_collection = self.client.get_or_create_collection(name="tool_vector")
@@ -37,63 +43,34 @@ class RetrievalService:
         self.cache_dir = os.path.join(os.path.dirname(db_path), "db/cache")
         self.logger.info(f'Cache dir: {self.cache_dir}')
         os.makedirs(self.cache_dir, exist_ok=True)
-    
-    async def _get_document_collection(self, collection_name: str = None) -> List[Dict[str, Any]]:
-        """
-        获取文档集合
-        
-        Args:
-            collection_name: 集合名称，可选值为 "tool_vector" 或 "hypothetical_query"，
-                           如果为None，则返回两个集合的合并结果
-        
-        Returns:
-            文档列表，每个文档包含id、content和metadata
-        """
-        all_docs = []
-        
-        # 获取tool_vector_collection的文档
-        if collection_name is None or collection_name == "tool_vector":
-            tool_results = self.tool_vector_collection.get(
-                include=["documents", "metadatas"]
-            )
-            for i in range(len(tool_results['ids'])):
-                all_docs.append({
-                    'id': tool_results['ids'][i],
-                    'content': tool_results['documents'][i],
-                    'metadata': tool_results['metadatas'][i],
-                    'collection': 'tool_vector'
-                })
-        
-        # 获取hypothetical_query_collection的文档
-        if collection_name is None or collection_name == "hypothetical_query":
-            hypothetical_results = self.hypothetical_query_collection.get(
-                include=["documents", "metadatas"]
-            )
-            for i in range(len(hypothetical_results['ids'])):
-                all_docs.append({
-                    'id': hypothetical_results['ids'][i],
-                    'content': hypothetical_results['documents'][i],
-                    'metadata': hypothetical_results['metadatas'][i],
-                    'collection': 'hypothetical_query'
-                })
-        
-        return all_docs
 
-    def _tokenize(self, text: str) -> List[str]:
+        # 向量模型，按文本内容哈希缓存向量
+        self.embedding_api = EmbeddingAPI(cache_path=os.path.join(self.cache_dir, "embedding_cache.sqlite"))
+
+        # 常驻内存的 BM25 / TF-IDF 索引，进程内共享，首次使用时与 Chroma 对账
+        self.sparse_index = get_sparse_index(db_path, self.logger)
+        if not self.sparse_index.synced:
+            self.sparse_index.sync({
+                "tool_vector": self.tool_vector_collection,
+                "hypothetical_query": self.hypothetical_query_collection,
+            })
+        warm_up_tokenizer()
+
+        # 工具库版本号：工具增删改后递增，使检索结果缓存失效
+        self.catalog_version = 0
+        self.result_cache = RetrievalResultCache(
+            max_entries=int(os.getenv('RETRIEVAL_CACHE_MAX_ENTRIES', '1024')),
+            ttl=float(os.getenv('RETRIEVAL_CACHE_TTL', '300')),
+            similarity_threshold=float(os.getenv('RETRIEVAL_CACHE_SIMILARITY', '0')),
+        )
+
+    def bump_catalog_version(self) -> int:
         """
-        对文本进行分词
-        
-        Args:
-            text: 要分词的文本
-            
-        Returns:
-            分词结果列表
+        工具库发生变化（插入/更新/删除）后调用，递增版本号，之前缓存的检索结果全部失效
         """
-        # 使用jieba进行分词
-        words = pseg.cut(text)
-        # 过滤掉标点符号，只保留词语
-        return [word.word for word in words if word.flag != 'x']
-
+        self.catalog_version += 1
+        return self.catalog_version
+    
     def _deduplicate_results(self, results: List[Dict[str, Any]], n_results: int, score_key: str = 'score') -> List[Dict[str, Any]]:
         """
         根据工具名对检索结果进行去重
@@ -116,23 +93,27 @@ class RetrievalService:
         # 按分数排序并取前n_results个去重后的结果
         return sorted(unique_results.values(), key=lambda x: x[score_key], reverse=True)[:n_results]
 
-    async def dense_retrieval(self, query: str, n_results: int = 5, logger: logging.Logger = None) -> List[Dict[str, Any]]:
+    async def dense_retrieval(self, query: str, n_results: int = 5, logger: logging.Logger = None,
+                              query_embedding: List[float] = None) -> List[Dict[str, Any]]:
         log = logger or self.logger
         start_time = time.time()
         
-        # 生成查询嵌入
-        query_embedding = await self.embedding_api.get_embedding(query)
-        
-        # 从tool_vector_collection执行向量检索
-        tool_results = self.tool_vector_collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-        )
-        
-        # 从hypothetical_query_collection执行向量检索
-        hypothetical_results = self.hypothetical_query_collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+        # 生成查询嵌入（混合检索时由调用方提前计算并传入）
+        if query_embedding is None:
+            query_embedding = await self.embedding_api.get_embedding(query)
+        
+        # 两个集合的向量检索在线程池中并发执行
+        tool_results, hypothetical_results = await asyncio.gather(
+            asyncio.to_thread(
+                self.tool_vector_collection.query,
+                query_embeddings=[query_embedding],
+                n_results=n_results
+            ),
+            asyncio.to_thread(
+                self.hypothetical_query_collection.query,
+                query_embeddings=[query_embedding],
+                n_results=n_results
+            ),
         )
         
         # 合并结果
@@ -178,33 +159,26 @@ class RetrievalService:
         return formatted_results
 
     async def sparse_retrieval_bm25(self, query: str, n_results: int = 5, logger: logging.Logger = None) -> List[Dict[str, Any]]:
+        # 分词和打分是CPU密集操作，放到线程中执行，可与向量检索重叠
+        return await asyncio.to_thread(self._sparse_retrieval_bm25, query, n_results, logger)
+
+    def _sparse_retrieval_bm25(self, query: str, n_results: int = 5, logger: logging.Logger = None) -> List[Dict[str, Any]]:
         log = logger or self.logger
         start_time = time.time()
         
-        # 获取两个集合的文档
-        docs = await self._get_document_collection()
-        
-        # 对文档进行分词
-        tokenized_docs = [self._tokenize(doc['content']) for doc in docs]
-        
-        # 创建BM25索引
-        self.bm25 = BM25Okapi(tokenized_docs)
-        
-        # 执行BM25检索
-        tokenized_query = self._tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
-        top_indices = np.argsort(scores)[-n_results:][::-1]
+        # 使用常驻BM25索引检索，只计算查询词倒排表中的文档
+        top_docs, max_score = self.sparse_index.search_bm25(query, n_results)
         
         # 格式化结果
         results = [{
-            'tool_id': docs[i]['id'],
-            'score': float(scores[i]),  # BM25分数范围：0到正无穷，值越大表示越相关
-            'metadata': docs[i]['metadata'],
-            'document': docs[i]['content'],
-            'collection': docs[i]['collection'],  # 添加集合来源信息
+            'tool_id': doc['id'],
+            'score': float(score),  # BM25分数范围：0到正无穷，值越大表示越相关
+            'metadata': doc['metadata'],
+            'document': doc['content'],
+            'collection': doc['collection'],  # 添加集合来源信息
             'score_type': 'bm25',
-            'normalized_score': float(scores[i]) / (max(scores) + 1e-6)  # 添加归一化分数，用于混合检索
-        } for i in top_indices]
+            'normalized_score': float(score) / (max_score + 1e-6)  # 添加归一化分数，用于混合检索
+        } for doc, score in top_docs]
         
         # 根据工具名去重
         formatted_results = self._deduplicate_results(results, n_results, 'score')
@@ -214,7 +188,8 @@ class RetrievalService:
 
     async def hybrid_retrieval(self, query: str, n_results: int = 5, logger: logging.Logger = None, 
                            methods: List[str] = None, weights: Dict[str, float] = None,
-                           strategy: str = "rank_fusion") -> List[Dict[str, Any]]:
+                           strategy: str = "rank_fusion", timings: Dict[str, Any] = None,
+                           query_embedding: List[float] = None) -> List[Dict[str, Any]]:
         """
         混合检索方法，结合多种检索方法的结果
         
@@ -225,6 +200,8 @@ class RetrievalService:
             methods: 要使用的检索方法列表，默认为['dense', 'sparse', 'keyword']
             weights: 各检索方法的权重，默认为None（根据策略自动计算）
             strategy: 混合策略，可选值为"adaptive"（自适应）、"rank_fusion"（排序融合）、"weighted"（加权平均）
+            timings: 可选，传入字典时写入各阶段耗时（秒）及超时（timed_out）、失败（failed）的检索分支
+            query_embedding: 已计算好的查询向量，为None时在检索时计算
             
         Returns:
             检索结果列表
@@ -260,166 +237,111 @@ class RetrievalService:
                 log.warning(f"权重总和不为1 ({total_weight})，将进行归一化")
                 weights = {k: v / total_weight for k, v in weights.items()}
         
-        # 串行执行各检索方法
-        all_results = {}
-        method_times = {}
+        # 并发执行各检索方法：查询向量化与稀疏检索重叠，单个分支超时则只融合已完成的分支
+        all_results, method_times, timed_out, failed = await self._fan_out(query, n_results * self.candidate_multiplier, methods,
+                                                                          logger, query_embedding=query_embedding)  # 获取更多结果以提高混合质量
+        fusion_start = time.time()
         
-        for method in methods:
-            method_start = time.time()
-            if method == 'dense':
-                results = await self.dense_retrieval(query, n_results * 2, logger)  # 获取更多结果以提高混合质量
-            elif method == 'sparse':
-                results = await self.sparse_retrieval_bm25(query, n_results * 2, logger)
-            elif method == 'keyword':
-                results = await self.keyword_search(query, n_results * 2, logger)
-            else:
-                log.warning(f"不支持的检索方法: {method}，跳过")
-                continue
-            
-            method_times[method] = time.time() - method_start
-            all_results[method] = results
-        
-        # 合并结果并去重
-        merged_results = {}
-        
-        for method, results in all_results.items():
-            for item in results:
-                tool_id = item['tool_id']
-                
-                # 如果工具ID已存在，则更新分数
-                if tool_id in merged_results:
-                    # 使用各方法的分数
-                    if method == 'dense':
-                        # dense_retrieval的similarity已经在0-1范围
-                        normalized_score = item['similarity']
-                    elif method == 'sparse':
-                        # BM25分数使用预先计算的归一化分数
-                        normalized_score = item['normalized_score']
-                    elif method == 'keyword':
-                        # keyword_search的score已经在0-1范围
-                        normalized_score = item['score']
-                    
-                    # 更新合并结果中的分数
-                    if 'scores' not in merged_results[tool_id]:
-                        merged_results[tool_id]['scores'] = {}
-                    
-                    merged_results[tool_id]['scores'][method] = normalized_score
-                    merged_results[tool_id]['raw_scores'][method] = item.get('similarity', item.get('score', 0))
-                else:
-                    # 创建新条目
-                    merged_item = {
-                        'tool_id': tool_id,
-                        'metadata': item['metadata'],
-                        'document': item['document'],
-                        'collection': item['collection'],
-                        'scores': {},
-                        'raw_scores': {}
-                    }
-                    
-                    # 使用各方法的分数
-                    if method == 'dense':
-                        normalized_score = item['similarity']
-                        raw_score = item['similarity']
-                    elif method == 'sparse':
-                        normalized_score = item['normalized_score']
-                        raw_score = item['score']
-                    elif method == 'keyword':
-                        normalized_score = item['score']
-                        raw_score = item['score']
-                    
-                    merged_item['scores'][method] = normalized_score
-                    merged_item['raw_scores'][method] = raw_score
-                    merged_results[tool_id] = merged_item
-        
-        # 根据策略计算最终分数
-        if strategy == "rank_fusion":
-            # 倒数排名融合（Reciprocal Rank Fusion）
-            for tool_id, item in merged_results.items():
-                rrf_score = 0.0  # 确保初始化为浮点数
-                for method, scores in all_results.items():
-                    # 找到该工具在各方法中的排名
-                    rank = 1
-                    found = False
-                    for result in scores:
-                        if result['tool_id'] == tool_id:
-                            rrf_score += 1.0 / (rank + 60)  # 60是一个平滑参数，避免排名靠后的结果分数过低
-                            found = True
-                            break
-                        rank += 1
-                    if not found:
-                        # 如果该方法没有返回该工具，给它一个较低的分数
-                        rrf_score += 1.0 / (len(scores) + 60 + 1)
-                # 确保rrf_score是实数
-                if isinstance(rrf_score, complex):
-                    rrf_score = rrf_score.real
-                item['weighted_score'] = float(rrf_score)
-        else:
-            # 加权平均策略（包括adaptive策略）
-            for tool_id, item in merged_results.items():
-                weighted_score = 0.0  # 确保初始化为浮点数
-                # 计算各方法的加权分数
-                for method, score in item['scores'].items():
-                    if method in weights:
-                        # 确保score是实数
-                        if isinstance(score, complex):
-                            score = score.real
-                        
-                        # 对分数应用非线性变换，增强高分结果的权重
-                        if strategy == "adaptive":
-                            # 自适应策略：对高分结果应用更强的权重
-                            enhanced_score = float(score) ** 1.5
-                        else:
-                            enhanced_score = float(score)
-                        weighted_score += enhanced_score * weights[method]
-                
-                # 确保weighted_score是实数
-                if isinstance(weighted_score, complex):
-                    weighted_score = weighted_score.real
-                item['weighted_score'] = float(weighted_score)
-        
-        # 使用公共去重函数进行最终去重
-        # 将merged_results转换为适合_deduplicate_results函数的格式
-        dedup_input = []
-        for tool_id, item in merged_results.items():
-            dedup_item = {
-                'tool_id': tool_id,
-                'score': item['weighted_score'],  # 使用加权分数作为去重依据
-                'metadata': item['metadata'],
-                'document': item['document'],
-                'collection': item['collection'],
-                'scores': item['scores'],
-                'raw_scores': item['raw_scores']
-            }
-            dedup_input.append(dedup_item)
-        
-        # 使用公共去重函数
-        dedup_results = self._deduplicate_results(dedup_input, n_results, 'score')
-        
-        # 格式化最终结果
-        formatted_results = []
-        for item in dedup_results:
-            formatted_item = {
-                'tool_id': item['tool_id'],
-                'score': item['score'],  # 使用加权分数作为最终分数
-                'metadata': item['metadata'],
-                'document': item['document'],
-                'collection': item['collection'],
-                'score_type': 'hybrid',
-                'method_scores': item['scores'],  # 各方法的标准化分数
-                'raw_method_scores': item['raw_scores']  # 各方法的原始分数
-            }
-            formatted_results.append(formatted_item)
+        # 融合各方法结果：基于排名/分数数组计算，候选池规模线性扩展
+        formatted_results = fuse(all_results, n_results, strategy, weights)
         
         # 记录各方法耗时和策略信息
+        fusion_time = time.time() - fusion_start
         for method, t in method_times.items():
             log.info(f"{method}检索耗时: {t:.2f}s")
+        if timed_out:
+            log.warning(f"检索分支超时（{self.branch_timeout}s），未参与融合: {timed_out}")
         log.info(f"混合检索策略: {strategy}")
         if weights:
             log.info(f"混合检索权重: {weights}")
         log.info(f"混合检索总耗时: {time.time() - start_time:.2f}s")
         
+        if timings is not None:
+            timings.update({k: round(v, 4) for k, v in method_times.items()})
+            timings['fusion'] = round(fusion_time, 4)
+            timings['total'] = round(time.time() - start_time, 4)
+            timings['timed_out'] = timed_out
+            timings['failed'] = failed
+        
         return formatted_results
 
+    async def _fan_out(self, query: str, n_results: int, methods: List[str], logger: logging.Logger = None,
+                       query_embedding: List[float] = None):
+        """
+        并发执行混合检索的各个分支
+
+        Args:
+            query: 查询文本
+            n_results: 每个分支返回结果数量
+            methods: 检索方法列表
+            logger: 日志记录器
+            query_embedding: 已计算好的查询向量，为None时在此计算
+
+        Returns:
+            (各方法结果, 各阶段耗时, 超时的方法列表, 出错的方法列表)
+        """
+        log = logger or self.logger
+        method_times: Dict[str, float] = {}
+        start_time = time.time()
+
+        async def _embed():
+            if query_embedding is not None:
+                return query_embedding
+            embedding = await self.embedding_api.get_embedding(query)
+            method_times['embedding'] = time.time() - start_time
+            return embedding
+
+        async def _run(method: str):
+            if method == 'dense':
+                query_embedding = await embed_task
+                query_start = time.time()
+                results = await self.dense_retrieval(query, n_results, logger, query_embedding=query_embedding)
+                method_times['dense_query'] = time.time() - query_start
+            elif method == 'sparse':
+                results = await self.sparse_retrieval_bm25(query, n_results, logger)
+            else:
+                results = await self.keyword_search(query, n_results, logger)
+            method_times[method] = time.time() - start_time
+            return results
+
+        valid_methods = []
+        for method in methods:
+            if method in ('dense', 'sparse', 'keyword'):
+                valid_methods.append(method)
+            else:
+                log.warning(f"不支持的检索方法: {method}，跳过")
+
+        # 查询向量化最先启动，与稀疏检索、关键词检索并行
+        embed_task = asyncio.create_task(_embed()) if 'dense' in valid_methods else None
+        tasks = {method: asyncio.create_task(_run(method)) for method in valid_methods}
+        if not tasks:
+            return {}, method_times, [], []
+
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.branch_timeout)
+        for task in pending:
+            task.cancel()
+        if embed_task is not None and not embed_task.done():
+            embed_task.cancel()
+
+        all_results = {}
+        timed_out = []
+        failed = []
+        errors = []
+        # 按methods顺序收集结果，保证融合结果与串行执行时一致
+        for method, task in tasks.items():
+            if task in pending:
+                timed_out.append(method)
+            elif task.exception() is not None:
+                failed.append(method)
+                errors.append(task.exception())
+                log.error(f"{method}检索失败: {task.exception()!r}")
+            else:
+                all_results[method] = task.result()
+
+        if not all_results and errors:
+            raise errors[0]
+        return all_results, method_times, timed_out, failed
+
     async def keyword_search(self, query: str, n_results: int = 5, logger: logging.Logger = None) -> List[Dict[str, Any]]:
         """
         基于TF-IDF的关键词检索
@@ -432,40 +354,24 @@ class RetrievalService:
         Returns:
             检索结果列表
         """
+        return await asyncio.to_thread(self._keyword_search, query, n_results, logger)
+
+    def _keyword_search(self, query: str, n_results: int = 5, logger: logging.Logger = None) -> List[Dict[str, Any]]:
         log = logger or self.logger
         start_time = time.time()
         
-        # 获取两个集合的文档
-        docs = await self._get_document_collection()
-        
-        # 提取文档内容
-        doc_contents = [doc['content'] for doc in docs]
-        
-        # 创建TF-IDF向量化器
-        # 使用jieba分词作为tokenizer
-        vectorizer = TfidfVectorizer(tokenizer=self._tokenize)
-        
-        # 对文档进行向量化
-        tfidf_matrix = vectorizer.fit_transform(doc_contents)
-        
-        # 对查询进行向量化
-        query_tfidf = vectorizer.transform([query])
-        
-        # 计算查询与文档的余弦相似度
-        similarities = cosine_similarity(query_tfidf, tfidf_matrix).flatten()
-        
-        # 获取相似度最高的n_results个文档的索引
-        top_indices = np.argsort(similarities)[-n_results:][::-1]
+        # 使用常驻TF-IDF索引检索，只计算查询词倒排表中的文档
+        top_docs = self.sparse_index.search_tfidf(query, n_results)
         
         # 格式化结果
         results = [{
-            'tool_id': docs[i]['id'],
-            'score': float(similarities[i]),  # TF-IDF余弦相似度，范围：0到1，值越大表示越相关
-            'metadata': docs[i]['metadata'],
-            'document': docs[i]['content'],
-            'collection': docs[i]['collection'],  # 添加集合来源信息
+            'tool_id': doc['id'],
+            'score': float(similarity),  # TF-IDF余弦相似度，范围：0到1，值越大表示越相关
+            'metadata': doc['metadata'],
+            'document': doc['content'],
+            'collection': doc['collection'],  # 添加集合来源信息
             'score_type': 'tfidf'
-        } for i in top_indices]
+        } for doc, similarity in top_docs]
         
         # 根据工具名去重
         formatted_results = self._deduplicate_results(results, n_results, 'score')
@@ -474,9 +380,35 @@ class RetrievalService:
         return formatted_results
 
 
-async def retrieval_tool_func(db_path: str, query: str, method: str = "hybrid", n_results: int = 5, logger: logging.Logger = None) -> List[Dict[str, Any]]:
+_services: Dict[str, RetrievalService] = {}
+_services_lock = threading.Lock()
+
+
+def get_retrieval_service(db_path: str, logger: logging.Logger = None) -> RetrievalService:
+    """
+    获取进程内共享的检索服务（按数据库路径区分），首次调用时初始化
+
+    Args:
+        db_path: 数据库路径
+        logger: 日志记录器，仅在首次初始化时生效
+
+    Returns:
+        RetrievalService 实例
+    """
+    key = os.path.abspath(str(db_path))
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = RetrievalService(str(db_path), logger)
+            _services[key] = service
+        return service
+
+
+async def retrieval_tool_func(db_path: str, query: str, method: str = "hybrid", n_results: int = 5, logger: logging.Logger = None,
+                              retrieval_service: Optional[RetrievalService] = None,
+                              timings: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> List[Dict[str, Any]]:
     """
-    根据查询检索工具
+    根据查询检索工具，结果按 (归一化查询, 方法, n_results) 缓存，工具库变化后缓存失效
     
     Args:
         db_path: 数据库路径
@@ -484,6 +416,9 @@ async def retrieval_tool_func(db_path: str, query: str, method: str = "hybrid",
         method: 检索方法，可选值为 "dense", "sparse", "hybrid", "semantic", "keyword"
         n_results: 返回结果数量
         logger: 日志记录器
+        retrieval_service: 已初始化的检索服务，为None时使用进程内共享实例
+        timings: 可选，传入字典时写入各阶段耗时（秒）及缓存命中情况（cache: hit/near_hit/miss）
+        use_cache: 是否使用检索结果缓存
         
     Returns:
         检索结果列表
@@ -494,20 +429,52 @@ async def retrieval_tool_func(db_path: str, query: str, method: str = "hybrid",
     # 记录开始时间
     start_time = time.time()
     
-    # 初始化检索服务
+    # 获取检索服务（首次调用时初始化，之后复用）
     init_start = time.time()
-    retrieval_service = RetrievalService(db_path, logger)
+    retrieval_service = retrieval_service or get_retrieval_service(db_path)
     init_time = time.time() - init_start
-    log.info(f"初始化检索服务耗时: {init_time:.4f}秒")
+    log.info(f"获取检索服务耗时: {init_time:.4f}秒")
     
+    # 查询结果缓存：先精确匹配，再按查询向量匹配近似查询（仅稠密/混合检索，查询向量本来就要计算）
+    cache = retrieval_service.result_cache if use_cache else None
+    version = retrieval_service.catalog_version
+    query_embedding = None
+    if cache is not None and cache.enabled:
+        cache_start = time.time()
+        cached = cache.get(query, method, n_results, version)
+        cache_status = "hit" if cached is not None else "miss"
+        if cached is None and cache.near_duplicate_enabled and method in ("dense", "hybrid"):
+            query_embedding = await retrieval_service.embedding_api.get_embedding(query)
+            similar = cache.get_similar(query_embedding, method, n_results, version)
+            if similar is not None:
+                similar_query, similarity, cached = similar
+                cache_status = "near_hit"
+                log.info(f"检索结果缓存近似命中: {similar_query}, 相似度: {similarity:.4f}")
+        if cached is None:
+            cache.record_miss()
+        cache_time = time.time() - cache_start
+        if timings is not None:
+            timings['cache'] = cache_status
+            timings['cache_lookup'] = round(cache_time, 4)
+        if cached is not None:
+            log.info(f"检索结果缓存命中({cache_status})，耗时: {time.time() - start_time:.4f}秒")
+            if timings is not None:
+                timings['retrieval_total'] = round(time.time() - start_time, 4)
+            return cached
+
     # 根据方法调用相应的检索函数
     retrieval_start = time.time()
+    missing_branches = []
     if method == "dense":
-        results = await retrieval_service.dense_retrieval(query, n_results, logger)
+        results = await retrieval_service.dense_retrieval(query, n_results, logger, query_embedding=query_embedding)
     elif method == "sparse":
         results = await retrieval_service.sparse_retrieval_bm25(query, n_results, logger)
     elif method == "hybrid":
-        results = await retrieval_service.hybrid_retrieval(query, n_results, logger)
+        hybrid_timings = timings if timings is not None else {}
+        results = await retrieval_service.hybrid_retrieval(query, n_results, logger, timings=hybrid_timings,
+                                                           query_embedding=query_embedding)
+        # 有分支超时或出错时融合结果不完整，只返回不缓存
+        missing_branches = hybrid_timings.get('timed_out', []) + hybrid_timings.get('failed', [])
     elif method == "keyword":
         results = await retrieval_service.keyword_search(query, n_results, logger)
     else:
@@ -517,5 +484,13 @@ async def retrieval_tool_func(db_path: str, query: str, method: str = "hybrid",
     total_time = time.time() - start_time
     log.info(f"检索操作耗时: {retrieval_time:.4f}秒")
     log.info(f"retrieval_tool总耗时: {total_time:.4f}秒")
+    if timings is not None:
+        timings.setdefault(method, round(retrieval_time, 4))
+        timings['service_init'] = round(init_time, 4)
+        timings['retrieval_total'] = round(total_time, 4)
+
+    # 写入缓存，版本号取检索开始前的值，检索期间工具库有变化时该条目直接失效；空结果和不完整的混合检索结果不缓存
+    if cache is not None and results and not missing_branches:
+        cache.put(query, method, n_results, version, results, embedding=query_embedding)
     
     return results
@@ -0,0 +1,355 @@
+import os
+import math
+import pickle
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+import jieba.posseg as pseg
+
+
+# 缓存文件格式版本，结构变化时递增，旧缓存自动失效
+INDEX_VERSION = 1
+INDEX_FILE_NAME = "sparse_index.pkl"
+COLLECTION_NAMES = ("tool_vector", "hypothetical_query")
+
+# 与 rank_bm25.BM25Okapi 默认参数保持一致
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    对文本进行分词，过滤掉标点符号，只保留词语
+
+    Args:
+        text: 要分词的文本
+
+    Returns:
+        分词结果列表
+    """
+    words = pseg.cut(text)
+    return [word.word for word in words if word.flag != 'x']
+
+
+def warm_up_tokenizer() -> None:
+    """
+    预先加载 jieba 词典，避免首个查询承担约 1 秒的词典加载时间
+    """
+    tokenize("预热分词词典")
+
+
+def cache_dir_for(db_path: str) -> str:
+    """
+    根据数据库路径得到缓存目录（与 RetrievalService.cache_dir 相同）
+    """
+    return os.path.join(os.path.dirname(str(db_path)), "db/cache")
+
+
+def _digest(content: str) -> str:
+    return hashlib.md5((content or "").encode("utf-8")).hexdigest()
+
+
+class SparseIndex:
+    """
+    常驻内存的 BM25 / TF-IDF 倒排索引
+
+    - 文档以 (集合名, id) 为键，两个集合的文档共用一个索引
+    - 启动时与 Chroma 对账：内容摘要未变的文档直接复用缓存的分词结果，只对新增/变化的文档分词
+    - 增删改时增量维护倒排表，并持久化到 db/cache/sparse_index.pkl
+    - 查询只遍历查询词的倒排表，打分结果与 BM25Okapi / TfidfVectorizer(tokenizer=tokenize) 全量重建一致
+    """
+
+    def __init__(self, cache_dir: str, logger: logging.Logger = None):
+        self.cache_dir = cache_dir
+        self.cache_file = os.path.join(cache_dir, INDEX_FILE_NAME)
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self.synced = False
+
+        # 文档: key -> {id, collection, content, metadata, digest, bm25_tf, bm25_len, tfidf_tf}
+        self.docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # 倒排表: term -> {key: 词频}
+        self.bm25_postings: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self.tfidf_postings: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self.total_len = 0
+
+        # 依赖全局统计量的派生数据，文档变化后在下次查询时重新计算
+        self._bm25_idf: Optional[Dict[str, float]] = None
+        self._tfidf_idf: Optional[Dict[str, float]] = None
+        self._tfidf_norms: Optional[Dict[Tuple[str, str], float]] = None
+
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") != INDEX_VERSION:
+                self.logger.info(f"稀疏索引缓存版本不匹配，将重建: {self.cache_file}")
+                return
+            for doc in state["docs"]:
+                self._add_doc(doc)
+            self.logger.info(f"加载稀疏索引缓存: {len(self.docs)} 篇文档")
+        except Exception as e:
+            self.logger.warning(f"加载稀疏索引缓存失败，将重建: {e}")
+            self._reset()
+
+    def save(self) -> None:
+        """
+        原子写入缓存文件（先写临时文件再替换）
+        """
+        with self._lock:
+            state = {"version": INDEX_VERSION, "docs": list(self.docs.values())}
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, self.cache_file)
+
+    def _reset(self) -> None:
+        self.docs = {}
+        self.bm25_postings = {}
+        self.tfidf_postings = {}
+        self.total_len = 0
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self._bm25_idf = None
+        self._tfidf_idf = None
+        self._tfidf_norms = None
+
+    # ---------- 文档维护 ----------
+
+    @staticmethod
+    def _build_doc(collection: str, doc_id: str, content: str, metadata: Any = None) -> Dict[str, Any]:
+        content = content or ""
+        bm25_tokens = tokenize(content)
+        # TfidfVectorizer 默认先转小写再调用 tokenizer
+        tfidf_tokens = tokenize(content.lower())
+        return {
+            "id": doc_id,
+            "collection": collection,
+            "content": content,
+            "metadata": metadata,
+            "digest": _digest(content),
+            "bm25_tf": Counter(bm25_tokens),
+            "bm25_len": len(bm25_tokens),
+            "tfidf_tf": Counter(tfidf_tokens),
+        }
+
+    def _add_doc(self, doc: Dict[str, Any]) -> None:
+        key = (doc["collection"], doc["id"])
+        if key in self.docs:
+            self._remove_doc(key)
+        self.docs[key] = doc
+        self.total_len += doc["bm25_len"]
+        for term, tf in doc["bm25_tf"].items():
+            self.bm25_postings.setdefault(term, {})[key] = tf
+        for term, tf in doc["tfidf_tf"].items():
+            self.tfidf_postings.setdefault(term, {})[key] = tf
+        self._invalidate()
+
+    def _remove_doc(self, key: Tuple[str, str]) -> bool:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return False
+        self.total_len -= doc["bm25_len"]
+        for postings, tfs in ((self.bm25_postings, doc["bm25_tf"]), (self.tfidf_postings, doc["tfidf_tf"])):
+            for term in tfs:
+                term_postings = postings.get(term)
+                if term_postings is None:
+                    continue
+                term_postings.pop(key, None)
+                if not term_postings:
+                    del postings[term]
+        self._invalidate()
+        return True
+
+    def upsert(self, collection: str, doc_id: str, content: str, metadata: Any = None, persist: bool = True) -> None:
+        """
+        新增或更新一篇文档
+        """
+        with self._lock:
+            existing = self.docs.get((collection, doc_id))
+            if existing and existing["digest"] == _digest(content) and existing["metadata"] == metadata:
+                return
+            self._add_doc(self._build_doc(collection, doc_id, content, metadata))
+            if persist:
+                self.save()
+
+    def remove(self, doc_id: str, collections: Tuple[str, ...] = COLLECTION_NAMES, persist: bool = True) -> None:
+        """
+        删除指定 id 在各集合中的文档
+        """
+        with self._lock:
+            removed = [self._remove_doc((collection, doc_id)) for collection in collections]
+            if any(removed) and persist:
+                self.save()
+
+    def sync(self, collections: Dict[str, Any]) -> None:
+        """
+        与 Chroma 集合对账：复用内容未变的文档，只对新增/变化的文档重新分词
+
+        Args:
+            collections: 集合名 -> Chroma collection
+        """
+        with self._lock:
+            start_docs = len(self.docs)
+            seen = set()
+            changed = 0
+            for name, collection in collections.items():
+                results = collection.get(include=["documents", "metadatas"])
+                for i, doc_id in enumerate(results['ids']):
+                    key = (name, doc_id)
+                    seen.add(key)
+                    content = results['documents'][i] or ""
+                    metadata = results['metadatas'][i]
+                    existing = self.docs.get(key)
+                    if existing and existing["digest"] == _digest(content):
+                        existing["metadata"] = metadata
+                        continue
+                    self._add_doc(self._build_doc(name, doc_id, content, metadata))
+                    changed += 1
+            stale = [key for key in self.docs if key not in seen]
+            for key in stale:
+                self._remove_doc(key)
+            self.synced = True
+            if changed or stale or not os.path.exists(self.cache_file):
+                self.save()
+            self.logger.info(
+                f"稀疏索引已同步: 缓存 {start_docs} 篇, 当前 {len(self.docs)} 篇, 重新分词 {changed} 篇, 移除 {len(stale)} 篇"
+            )
+
+    # ---------- 打分 ----------
+
+    def _ensure_bm25_idf(self) -> Dict[str, float]:
+        if self._bm25_idf is None:
+            # 与 BM25Okapi._calc_idf 相同：负 idf 用 epsilon * 平均 idf 代替
+            corpus_size = len(self.docs)
+            idf = {}
+            idf_sum = 0.0
+            negative_idfs = []
+            for term, postings in self.bm25_postings.items():
+                freq = len(postings)
+                value = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+                idf[term] = value
+                idf_sum += value
+                if value < 0:
+                    negative_idfs.append(term)
+            eps = BM25_EPSILON * (idf_sum / len(idf)) if idf else 0.0
+            for term in negative_idfs:
+                idf[term] = eps
+            self._bm25_idf = idf
+        return self._bm25_idf
+
+    def _ensure_tfidf(self) -> Tuple[Dict[str, float], Dict[Tuple[str, str], float]]:
+        if self._tfidf_idf is None or self._tfidf_norms is None:
+            # 与 TfidfVectorizer(smooth_idf=True, norm='l2') 相同
+            n_docs = len(self.docs)
+            idf = {
+                term: math.log((1 + n_docs) / (1 + len(postings))) + 1
+                for term, postings in self.tfidf_postings.items()
+            }
+            norms = {}
+            for key, doc in self.docs.items():
+                norms[key] = math.sqrt(sum((tf * idf[term]) ** 2 for term, tf in doc["tfidf_tf"].items()))
+            self._tfidf_idf = idf
+            self._tfidf_norms = norms
+        return self._tfidf_idf, self._tfidf_norms
+
+    def _top(self, scores: Dict[Tuple[str, str], float], n_results: int) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        取分数最高的 n_results 篇；命中文档不足时按文档顺序补充 0 分文档，保持返回数量不变
+        """
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n_results]
+        if len(ranked) < n_results:
+            for key in self.docs:
+                if len(ranked) >= n_results:
+                    break
+                if key not in scores:
+                    ranked.append((key, 0.0))
+        return [(self.docs[key], score) for key, score in ranked]
+
+    def search_bm25(self, query: str, n_results: int) -> Tuple[List[Tuple[Dict[str, Any], float]], float]:
+        """
+        BM25 检索，只遍历查询词的倒排表
+
+        Returns:
+            ([(文档, 分数)], 全部文档中的最高分)
+        """
+        tokenized_query = tokenize(query)
+        with self._lock:
+            if not self.docs:
+                return [], 0.0
+            idf = self._ensure_bm25_idf()
+            avgdl = self.total_len / len(self.docs)
+            scores: Dict[Tuple[str, str], float] = {}
+            # 与 BM25Okapi.get_scores 一致：查询中重复的词重复计分
+            for term in tokenized_query:
+                postings = self.bm25_postings.get(term)
+                if not postings:
+                    continue
+                term_idf = idf[term]
+                for key, tf in postings.items():
+                    doc_len = self.docs[key]["bm25_len"]
+                    denom = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avgdl)
+                    scores[key] = scores.get(key, 0.0) + term_idf * (tf * (BM25_K1 + 1) / denom)
+            max_score = max(max(scores.values()), 0.0) if scores else 0.0
+            return self._top(scores, n_results), max_score
+
+    def search_tfidf(self, query: str, n_results: int) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        TF-IDF 余弦相似度检索，只遍历查询词的倒排表
+
+        Returns:
+            [(文档, 余弦相似度)]
+        """
+        query_tf = Counter(tokenize(query.lower()))
+        with self._lock:
+            if not self.docs:
+                return []
+            idf, norms = self._ensure_tfidf()
+            # 不在词表中的查询词被忽略，与 TfidfVectorizer.transform 一致
+            query_weights = {term: tf * idf[term] for term, tf in query_tf.items() if term in idf}
+            query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+            scores: Dict[Tuple[str, str], float] = {}
+            if query_norm > 0:
+                for term, q_weight in query_weights.items():
+                    term_idf = idf[term]
+                    for key, tf in self.tfidf_postings[term].items():
+                        scores[key] = scores.get(key, 0.0) + q_weight * tf * term_idf
+                for key in scores:
+                    doc_norm = norms.get(key) or 0.0
+                    scores[key] = scores[key] / (query_norm * doc_norm) if doc_norm > 0 else 0.0
+            return self._top(scores, n_results)
+
+
+_indexes: Dict[str, SparseIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_sparse_index(db_path: str, logger: logging.Logger = None) -> SparseIndex:
+    """
+    获取进程内共享的稀疏索引（按缓存目录区分），首次调用时从磁盘缓存加载
+
+    Args:
+        db_path: 数据库路径
+        logger: 日志记录器
+
+    Returns:
+        SparseIndex 实例
+    """
+    cache_dir = os.path.abspath(cache_dir_for(db_path))
+    with _indexes_lock:
+        index = _indexes.get(cache_dir)
+        if index is None:
+            index = SparseIndex(cache_dir, logger)
+            _indexes[cache_dir] = index
+        return index
@@ -0,0 +1,120 @@
+# coding:utf8
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def load_checkpoint(save_path, id_key='id'):
+    """
+    读取断点文件中已完成的结果，进程崩溃时写了一半的行直接跳过
+    :return: {id: 结果}
+    """
+    done = {}
+    if not os.path.exists(save_path):
+        return done
+    with open(save_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and id_key in record:
+                done[record[id_key]] = record
+    return done
+
+
+def write_records(save_path, records):
+    """先写临时文件再替换，中途崩溃不会留下半个文件"""
+    tmp_path = save_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, save_path)
+
+
+class BatchRunner():
+    """
+    批量回答
+    检索按批在主线程执行（prepare_fn，可一次向量化整批问题），LLM 调用交给有界线程池并发执行，
+    检索下一批时上一批的 LLM 调用仍在进行；每完成一题立即追加写入 JSONL 断点文件，重启后跳过已完成的 id 继续跑，
+    运行中输出吞吐量和预计剩余时间，全部完成后按输入顺序重写结果文件
+    """
+
+    def __init__(self, save_path, max_workers=8, batch_size=32, id_key='id'):
+        """
+        :param save_path: 结果 / 断点文件（JSONL）
+        :param max_workers: 并发执行 answer_fn 的线程数，受 LLM 接口限流约束，不宜过大
+        :param batch_size: 每批检索的问题数
+        :param id_key: 问题 id 字段名
+        """
+        self.save_path = save_path
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.id_key = id_key
+
+    def run(self, rows, answer_fn, prepare_fn=None):
+        """
+        :param rows: 问题列表 [{'id': xx, 'question': xx}, ...]
+        :param answer_fn: answer_fn(row, context) -> 结果 dict（须包含 id），在线程池中执行，抛异常的题不写断点，下次续跑时重做
+        :param prepare_fn: prepare_fn(batch_rows) -> 与 batch_rows 等长的 context 列表，不传则 context 为 None
+        :return: 按输入顺序排列的全部结果（含断点中已有的结果）
+        """
+        done = load_checkpoint(self.save_path, self.id_key)
+        # 重写一遍断点文件，去掉崩溃时写了一半的行，之后才能安全追加
+        write_records(self.save_path, done.values())
+        todo = [row for row in rows if row[self.id_key] not in done]
+        total = len(rows)
+        print(f'共 {total} 题，断点中已完成 {total - len(todo)} 题，本次需处理 {len(todo)} 题')
+
+        stats = {'finished': 0, 'failed': []}
+        start_time = time.time()
+        max_pending = self.max_workers * 2
+        pending = {}
+
+        def collect(return_when):
+            finished, _ = wait(pending, return_when=return_when)
+            for future in finished:
+                row = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    stats['failed'].append(row[self.id_key])
+                    print(f'id {row[self.id_key]} 失败：{e}')
+                    continue
+                checkpoint.write(json.dumps(record, ensure_ascii=False) + '\n')
+                checkpoint.flush()
+                done[record[self.id_key]] = record
+                stats['finished'] += 1
+                self._report(stats, len(todo), total - len(todo), total, start_time)
+
+        with open(self.save_path, 'a', encoding='utf-8') as checkpoint, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for i in range(0, len(todo), self.batch_size):
+                batch = todo[i:i + self.batch_size]
+                contexts = prepare_fn(batch) if prepare_fn else [None] * len(batch)
+                for row, context in zip(batch, contexts):
+                    while len(pending) >= max_pending:
+                        collect(FIRST_COMPLETED)
+                    pending[executor.submit(answer_fn, row, context)] = row
+            while pending:
+                collect(FIRST_COMPLETED)
+
+        # 按输入顺序重写，断点中不在本次输入里的结果保留在末尾
+        order = {row[self.id_key]: index for index, row in enumerate(rows)}
+        records = sorted(done.values(), key=lambda record: order.get(record[self.id_key], len(order)))
+        write_records(self.save_path, records)
+
+        if stats['failed']:
+            print(f"失败 {len(stats['failed'])} 题，重新运行即可续跑：{stats['failed']}")
+        print(f'总耗时：{time.time() - start_time:.1f}s')
+        return records
+
+    @staticmethod
+    def _report(stats, todo_count, done_before, total, start_time):
+        finished = stats['finished']
+        elapsed = time.time() - start_time
+        speed = finished / elapsed if elapsed > 0 else 0.0
+        remaining = todo_count - finished - len(stats['failed'])
+        eta = remaining / speed if speed > 0 else 0.0
+        print(f'-------------- {done_before + finished} / {total} | {speed:.2f} 题/秒 | 预计剩余 {eta:.0f}s -------------------')
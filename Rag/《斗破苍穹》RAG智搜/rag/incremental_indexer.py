@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain.embeddings import HuggingFaceEmbeddings
+
+
+MANIFEST_NAME = 'index_manifest.json'
+# 各向量库在存储目录下写入的文件，重建时只删除这些文件，目录中的其他文件保持不动
+STORE_FILES = {
+    'chroma': ['chroma.sqlite3', 'chroma-collections.parquet', 'chroma-embeddings.parquet', 'index'],
+    'faiss': ['index.faiss', 'index.pkl'],
+}
+
+# 进程池中每个子进程各自加载一份 embedding 模型
+_worker_model = None
+
+
+def _init_worker(embedding_model_path, device, threads):
+    global _worker_model
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    _worker_model = HuggingFaceEmbeddings(model_name=embedding_model_path, model_kwargs={'device': device})
+
+
+def _embed_batch(texts):
+    return _worker_model.embed_documents(texts)
+
+
+def _sha1(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class IncrementalIndexer():
+    """
+    增量构建向量库
+    manifest 记录每个文件的内容哈希和分块 id（由来源 + 分块内容计算，内容不变 id 就不变），
+    再次运行时跳过未变化的文件，变化的文件只向量化新出现的分块并删除消失的分块，被删除的文件整体移除；
+    向量化按固定大小分批交给进程池，主进程边收结果边写入向量库，并输出每秒处理的分块数；
+    重建时只删除向量库自己的文件，目录非空又没有 manifest 时默认拒绝执行
+    """
+
+    def __init__(self, vector_db_path, embedding_model_path, store='chroma', device='cpu', chunk_size=1000,
+                 chunk_overlap=20, batch_size=64, workers=2):
+        """
+        :param vector_db_path: 向量数据库存储路径，manifest 也存在该目录下
+        :param embedding_model_path: 本地 embedding 模型路径，子进程按路径各自加载
+        :param store: chroma / faiss
+        :param device: embedding 模型运行设备
+        :param chunk_size: 每块大小
+        :param chunk_overlap: 允许字数重叠大小
+        :param batch_size: 每批向量化的分块数
+        :param workers: 向量化进程数，<= 1 时在主进程中向量化
+        """
+        if store not in ('chroma', 'faiss'):
+            raise ValueError(f'不支持的向量库类型：{store}')
+        self.vector_db_path = vector_db_path
+        self.embedding_model_path = embedding_model_path
+        self.store = store
+        self.device = device
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.manifest_path = os.path.join(vector_db_path, MANIFEST_NAME)
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            is_separator_regex=True,
+            separators=["\n\n", "\n", " ", ""]
+        )
+        self._embedding_model = None
+
+    @property
+    def config(self):
+        """这些参数变化后已有向量全部失效，需要重建"""
+        return {'store': self.store, 'model': os.path.basename(os.path.normpath(self.embedding_model_path)),
+                'chunk_size': self.chunk_size, 'chunk_overlap': self.chunk_overlap}
+
+    @property
+    def embedding_model(self):
+        """主进程的 embedding 模型，只在单进程向量化时才加载"""
+        if self._embedding_model is None:
+            self._embedding_model = HuggingFaceEmbeddings(model_name=self.embedding_model_path,
+                                                          model_kwargs={'device': self.device})
+        return self._embedding_model
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(self, files):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': self.config, 'files': files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def split(self, source, docs, metadata_fn=None):
+        """
+        分块并计算分块 id，同一文件内内容重复的分块按出现次数区分
+        :return: [(chunk_id, text, metadata), ...]
+        """
+        chunks = []
+        seen = {}
+        for doc in docs:
+            metadata = metadata_fn(doc) if metadata_fn else dict(doc.metadata)
+            for text in self.text_splitter.split_text(doc.page_content):
+                occurrence = seen.get(text, 0)
+                seen[text] = occurrence + 1
+                chunk_id = _sha1(f'{source}\x00{occurrence}\x00{text}')
+                chunks.append((chunk_id, text, dict(metadata)))
+        return chunks
+
+    def _store_paths(self, store):
+        """目录下属于该向量库的文件；chroma 的分段数据目录以 uuid 命名"""
+        if not os.path.isdir(self.vector_db_path):
+            return []
+        paths = []
+        for name in os.listdir(self.vector_db_path):
+            if name in STORE_FILES[store]:
+                paths.append(os.path.join(self.vector_db_path, name))
+            elif store == 'chroma' and os.path.isdir(os.path.join(self.vector_db_path, name)):
+                try:
+                    uuid.UUID(name)
+                except ValueError:
+                    continue
+                paths.append(os.path.join(self.vector_db_path, name))
+        return paths
+
+    def _clear_store(self, store):
+        for path in self._store_paths(store):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def index(self, docs, metadata_fn=None, rebuild=False):
+        """
+        :param docs: langchain 加载的文档，按 metadata['source'] 归为同一个文件（如 pdf 的多页）
+        :param metadata_fn: metadata_fn(doc) -> 分块的元数据，不传则沿用文档的元数据
+        :param rebuild: 目录非空但没有 manifest（如旧脚本建的库）时，是否删除其中的向量库文件后重建，默认拒绝执行
+        :return: 本次增量更新的统计
+        """
+        start_time = time.time()
+        grouped = {}
+        for doc in docs:
+            grouped.setdefault(doc.metadata['source'], []).append(doc)
+
+        manifest = self.load_manifest()
+        if manifest is None:
+            if os.path.isdir(self.vector_db_path) and os.listdir(self.vector_db_path):
+                if not rebuild:
+                    raise RuntimeError(f'{self.vector_db_path} 非空且没有 {MANIFEST_NAME}，无法判断已有向量对应哪些分块；'
+                                       f'确认可以覆盖其中的 {self.store} 向量库后传 rebuild=True 重建')
+                print('没有 manifest，删除已有向量库文件后重建 =》', self.vector_db_path)
+                self._clear_store(self.store)
+            manifest = {'files': {}}
+        elif manifest.get('config') != self.config:
+            # manifest 由本类写入，目录中对应的向量库文件可以安全删除
+            print('分块/模型配置已变化，重建向量库 =》', self.vector_db_path)
+            self._clear_store(manifest.get('config', {}).get('store', self.store))
+            self._clear_store(self.store)
+            manifest = {'files': {}}
+        os.makedirs(self.vector_db_path, exist_ok=True)
+        old_files = manifest['files']
+
+        new_files = {}
+        to_add = []
+        to_delete = []
+        changed = 0
+        for source, source_docs in grouped.items():
+            file_hash = _sha1('\x00'.join(doc.page_content for doc in source_docs))
+            old = old_files.get(source)
+            if old and old['hash'] == file_hash:
+                new_files[source] = old
+                continue
+            changed += 1
+            chunks = self.split(source, source_docs, metadata_fn)
+            new_ids = [chunk[0] for chunk in chunks]
+            old_ids = set(old['chunk_ids']) if old else set()
+            to_add.extend(chunk for chunk in chunks if chunk[0] not in old_ids)
+            to_delete.extend(old_ids - set(new_ids))
+            new_files[source] = {'hash': file_hash, 'chunk_ids': new_ids}
+        removed = [source for source in old_files if source not in grouped]
+        for source in removed:
+            to_delete.extend(old_files[source]['chunk_ids'])
+
+        print(f'文件共 {len(grouped)} 个：变化/新增 {changed} 个，删除 {len(removed)} 个；'
+              f'新增分块 {len(to_add)} 个，删除分块 {len(to_delete)} 个')
+        if to_add or to_delete:
+            db = self._open_store()
+            if to_delete:
+                db = self._delete(db, to_delete)
+            db = self._embed_and_add(db, to_add)
+            self._persist(db)
+        self.save_manifest(new_files)
+
+        spend = time.time() - start_time
+        print(f'增量更新完成，耗时：{spend:.1f}s')
+        return {'files': len(grouped), 'files_changed': changed, 'files_removed': len(removed),
+                'chunks_added': len(to_add), 'chunks_deleted': len(to_delete), 'seconds': spend}
+
+    def _store_embedding(self):
+        # 写入时向量已算好，多进程时主进程不必再加载模型；查询时由调用方用 embedding 模型重新打开向量库
+        return self.embedding_model if self.workers <= 1 else None
+
+    def _open_store(self):
+        if self.store == 'chroma':
+            from langchain.vectorstores import Chroma
+            return Chroma(persist_directory=self.vector_db_path, embedding_function=self._store_embedding())
+        from langchain_community.vectorstores import FAISS
+        if os.path.exists(os.path.join(self.vector_db_path, 'index.faiss')):
+            return FAISS.load_local(self.vector_db_path, self._store_embedding(), allow_dangerous_deserialization=True)
+        return None
+
+    def _delete(self, db, ids):
+        if self.store == 'chroma':
+            for i in range(0, len(ids), 5000):
+                db._collection.delete(ids=ids[i:i + 5000])
+            return db
+        if db is not None:
+            db.delete(ids)
+        return db
+
+    def _add(self, db, chunks, vectors):
+        ids = [chunk[0] for chunk in chunks]
+        texts = [chunk[1] for chunk in chunks]
+        metadatas = [chunk[2] for chunk in chunks]
+        if self.store == 'chroma':
+            db._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+            return db
+        if db is None:
+            from langchain_community.vectorstores import FAISS
+            return FAISS.from_embeddings(list(zip(texts, vectors)), self._store_embedding(), metadatas=metadatas,
+                                         ids=ids)
+        db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        return db
+
+    def _embed_and_add(self, db, chunks):
+        if not chunks:
+            return db
+        batches = [chunks[i:i + self.batch_size] for i in range(0, len(chunks), self.batch_size)]
+        done = 0
+        start_time = time.time()
+
+        def report():
+            elapsed = time.time() - start_time
+            speed = done / elapsed if elapsed > 0 else 0.0
+            print(f'已向量化 {done} / {len(chunks)} 块，{speed:.1f} 块/秒')
+
+        if self.workers <= 1:
+            for batch in batches:
+                vectors = self.embedding_model.embed_documents([chunk[1] for chunk in batch])
+                db = self._add(db, batch, vectors)
+                done += len(batch)
+                report()
+            return db
+
+        # 子进程之间平分 CPU 线程，避免每个进程都按全部核数开线程互相抢占
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.embedding_model_path, self.device, threads)) as executor:
+            futures = {executor.submit(_embed_batch, [chunk[1] for chunk in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                db = self._add(db, batch, future.result())
+                done += len(batch)
+                report()
+        return db
+
+    def _persist(self, db):
+        if db is None:
+            return
+        if self.store == 'faiss':
+            db.save_local(self.vector_db_path)
+        elif hasattr(db, 'persist'):
+            db.persist()
@@ -1,8 +1,8 @@
 from rag.embedding_db import EmbeddingVectorDB
 from rag.retriver import Retriever
+from rag.batch_runner import BatchRunner
 from llm.llm_chain import base_llm_chain
 from llm.llm_glm import *
-import time
 import json
 import warnings
 
@@ -15,6 +15,9 @@ llm = zhipu_glm_4_long(temperature=0.1)
 chunk_size = 1000
 chunk_overlap = 20
 topk = 150
+# 同时回答的问题数（受 LLM 接口并发限制）、每批向量化检索的问题数
+max_workers = 8
+batch_size = 32
 
 # 本地调
 embedding_model_path = r'D:\Python_project\NLP\model\bge-small-zh-v1.5'
@@ -35,11 +38,30 @@ prompt = """
 """
 
 
-if __name__ == '__main__':
-    start_time = time.time()
+def retrieve_batch(rows):
+    """整批问题一次向量化，再逐题从向量库召回并混合重排"""
+    queries = [row['question'] for row in rows]
+    query_vectors = embedding_model.embed_documents(queries)
+    contexts = []
+    for query, query_vector in zip(queries, query_vectors):
+        # 召回方法：一阶段向量召回保持相似度顺序，混合重排直接复用该顺序，不再对候选重新向量化
+        retriver_doc = db.similarity_search_by_vector(query_vector, k=topk)
+        retriver_doc_2 = Retriever.ensemble_rerank(query, retriver_doc, bm25_topk=25, topk=25, long_context=True)
+        contexts.append([x.page_content for x in retriver_doc_2])
+    return contexts
+
+
+def answer_row(row, retriver_doc):
+    query = row['question']
+    full_prompt = prompt.format(retriver_doc=retriver_doc, query=query)
+    llm_res = base_llm_chain(llm, full_prompt)
+    print(f'query: {query}\nanswer: {llm_res}')
+    return {'id': row['id'], 'answer': llm_res, 'retriver_doc': str(retriver_doc)}
 
+
+if __name__ == '__main__':
     with open('data/doc_question.json', encoding='utf8') as f:
-        lines = f.readlines()
+        lines = [json.loads(line) for line in f]
 
     # 加载 embedding 模型
     embedding_model = EmbeddingVectorDB.load_local_embedding_model(embedding_model_path, device)
@@ -47,33 +69,6 @@ if __name__ == '__main__':
     # 读取向量数据库
     db = EmbeddingVectorDB.load_chroma_vector(vector_db_path, embedding_model)
 
-    # 循环每一个问题，先检索，再去回答
-    answer_lines = []
-    for i, line in enumerate(lines):
-        print(f'----------{i + 1}/{len(lines)}-----------')
-        cur_start_time = time.time()
-        line = json.loads(line)
-        id_ = line['id']
-        query = line['question']
-        print(f'query: {query}')
-
-        # 召回方法
-        retriver_doc = Retriever.similarity(db, query, topk=topk, long_context=True)
-        # retriver_doc = [x.page_content for x in retriver_doc]
-        retriver_doc_2 = Retriever.ensemble(query, retriver_doc, embedding_model, bm25_topk=25, topk=25, long_context=True)
-        retriver_doc = [x.page_content for x in retriver_doc_2]
-
-        full_prompt = prompt.format(retriver_doc=retriver_doc, query=query)
-        llm_res = base_llm_chain(llm, full_prompt)
-        answer_lines.append({'id': id_, 'answer': llm_res, 'retriver_doc': str(retriver_doc)})
-        print(f'answer: {llm_res}')
-        cur_end_time = time.time()
-        print(f'spend time: {cur_end_time - cur_start_time}s')
-
-    # 保存
-    with open('data/all_doc_answer.json', "w+", encoding='utf-8') as json_file:
-        for l in answer_lines:
-            json_file.write(json.dumps(l, ensure_ascii=False) + '\n')
-
-    end_time = time.time()
-    print(f'总耗时：{end_time - start_time}s')
+    # 按批检索，LLM 并发回答；每完成一题立即写入结果文件，中断后重新运行会跳过已完成的 id
+    runner = BatchRunner('data/all_doc_answer.json', max_workers=max_workers, batch_size=batch_size)
+    runner.run(lines, answer_row, prepare_fn=retrieve_batch)
@@ -1,9 +1,7 @@
 import os
 
 from rag.load_data import DocsLoader
-from rag.embedding_db import EmbeddingVectorDB
-from rag.doc_split import TextSpliter
-import time
+from rag.incremental_indexer import IncrementalIndexer
 
 
 # 按照多少字分割，允许重叠多少字
@@ -13,14 +11,16 @@ chunk_overlap = 20
 # 本地调
 embedding_model_path = r'D:\Python_project\NLP\model\bge-small-zh-v1.5'
 device = 'cpu'
+# 每批向量化的分块数、向量化进程数
+batch_size = 64
+workers = 2
+# 目录中已有旧脚本建的向量库（没有 manifest）时，确认可以覆盖后改为 True 重建一次
+rebuild = False
 data_path = ['data/pdf', 'data/word', 'data/markdown', 'data/txt',]
 vector_db_path = f'data/all_doc_vector/all_doc_vector_{chunk_size}_metadata'
 
 
 if __name__ == '__main__':
-    # 向量模型加载
-    embedding_model = EmbeddingVectorDB.load_local_embedding_model(embedding_model_path, device=device)
-
     # 加载按照目录加载数据
     docs = []
     for path in data_path:
@@ -32,19 +32,9 @@ if __name__ == '__main__':
         else:
             docs.extend(DocsLoader().file_directory_loader(path))
 
-    # 分块
-    all_split_doc = []
-    for doc in docs:
-        split_docs = TextSpliter.text_split_by_manychar_or_charnum(doc, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-        # 加上元数据，标题作为元数据
-        for _ in split_docs:
-            _.metadata = {'title': doc.metadata['source'].split()[-1].replace('.txt', '')}
-
-        all_split_doc.extend(split_docs)
-
-    # 保存到向量
-    start = time.time()
-    db = EmbeddingVectorDB.create_chroma_vector(all_split_doc, vector_db_path, embedding_model)
-    end = time.time()
-    print(f'向量库创建完成，耗时：{end - start}s')
+    # 增量分块、向量化并写入向量库，只处理新增或变化的章节，标题作为元数据
+    indexer = IncrementalIndexer(vector_db_path, embedding_model_path, store='chroma', device=device,
+                                 chunk_size=chunk_size, chunk_overlap=chunk_overlap, batch_size=batch_size,
+                                 workers=workers)
+    indexer.index(docs, metadata_fn=lambda doc: {'title': doc.metadata['source'].split()[-1].replace('.txt', '')},
+                  rebuild=rebuild)